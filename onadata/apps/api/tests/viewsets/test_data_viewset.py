@@ -6,6 +6,7 @@ import os
 from builtins import open
 from datetime import timedelta
 from tempfile import NamedTemporaryFile
+from urllib.parse import parse_qs, urlparse
 
 import geojson
 import requests
@@ -499,6 +500,123 @@ class TestDataViewSet(TestBase):
             **self.extra)
         response = view(request, pk=formid)
 
+    def _get_cursor(self, response):
+        link = response.get('Link')
+        if link is None:
+            return None
+        query = parse_qs(urlparse(link[1:link.index('>')]).query)
+
+        return query['cursor'][0]
+
+    def test_data_keyset_pagination(self):
+        self._make_submissions()
+        view = DataViewSet.as_view({'get': 'list'})
+        formid = self.xform.pk
+        instance_ids = list(self.xform.instances.order_by(
+            'id').values_list('id', flat=True))
+
+        request = self.factory.get(
+            '/', data={"cursor": "", "page_size": 3}, **self.extra)
+        response = view(request, pk=formid)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([i['_id'] for i in response.data], instance_ids[:3])
+        cursor = self._get_cursor(response)
+        self.assertIsNotNone(cursor)
+
+        request = self.factory.get(
+            '/', data={"cursor": cursor, "page_size": 3}, **self.extra)
+        response = view(request, pk=formid)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([i['_id'] for i in response.data], instance_ids[3:])
+        self.assertIsNone(self._get_cursor(response))
+
+        # sort by a json field in descending order with fields
+        data = {
+            "cursor": "",
+            "limit": 2,
+            "sort": '{"_submission_time": -1}',
+            "fields": '["_id"]'
+        }
+        expected = list(self.xform.instances.order_by(
+            '-date_created', '-id').values_list('id', flat=True))
+        request = self.factory.get('/', data=data, **self.extra)
+        response = view(request, pk=formid)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{'_id': i} for i in expected[:2]])
+
+        data['cursor'] = self._get_cursor(response)
+        request = self.factory.get('/', data=data, **self.extra)
+        response = view(request, pk=formid)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{'_id': i} for i in expected[2:]])
+
+        request = self.factory.get(
+            '/', data={"cursor": "", "sort": '{"_uuid": 1}'}, **self.extra)
+        response = view(request, pk=formid)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 4)
+        self.assertIsNone(self._get_cursor(response))
+
+        request = self.factory.get(
+            '/', data={"cursor": "invalid"}, **self.extra)
+        response = view(request, pk=formid)
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(STREAM_DATA=True)
+    def test_data_keyset_pagination_streaming(self):
+        self._make_submissions()
+        view = DataViewSet.as_view({'get': 'list'})
+        formid = self.xform.pk
+
+        request = self.factory.get(
+            '/', data={"cursor": "", "page_size": 3}, **self.extra)
+        response = view(request, pk=formid)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(data), 3)
+        self.assertIsNotNone(self._get_cursor(response))
+
+    @patch('onadata.apps.viewer.models.parsed_instance.is_cache_shared',
+           return_value=True)
+    def test_data_etag_from_data_version(self, is_cache_shared):
+        """Test the ETag changes with the data and 304 responses are sent"""
+        self._make_submissions()
+        url = '/api/v1/data/{}'.format(self.xform.pk)
+
+        with patch('onadata.apps.api.viewsets.data_viewset.'
+                   'get_etag_hash_from_query') as hash_from_query:
+            response = self.client.get(url, **self.extra)
+            self.assertFalse(hash_from_query.called)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.extra)
+        self.assertEqual(response.status_code, 304)
+
+        # the query params are part of the ETag
+        response = self.client.get(
+            url, {'sort': '{"_id": -1}'}, HTTP_IF_NONE_MATCH=etag,
+            **self.extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # a change to a submission changes the ETag
+        instance = self.xform.instances.first()
+        instance.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        etag = response['ETag']
+
+        # deleting a submission changes the ETag
+        self.xform.instances.last().delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+        self.assertNotEqual(response['ETag'], etag)
+
     def test_sort_query_param_with_invalid_values(self):
         self._make_submissions()
         view = DataViewSet.as_view({'get': 'list'})
@@ -1002,6 +1120,7 @@ class TestDataViewSet(TestBase):
         self.assertEqual(response.data, ['hello'])
         for i in self.xform.instances.all():
             self.assertIn('hello', i.tags.names())
+            self.assertEqual(i.json['_tags'], ['hello'])
 
         request = self.factory.get('/', {'tags': 'hello'}, **self.extra)
         response = data_view(request)
@@ -1021,6 +1140,7 @@ class TestDataViewSet(TestBase):
         self.assertEqual(response.data, [])
         for i in self.xform.instances.all():
             self.assertNotIn('hello', i.tags.names())
+            self.assertEqual(i.json['_tags'], [])
 
     def test_data_tags(self):
         """Test that when a tag is applied on an xform,
@@ -1062,6 +1182,8 @@ class TestDataViewSet(TestBase):
         self.assertEqual(response.status_code, 201)
         self.assertEqual(response.data, ['hello'])
         self.assertIn('hello', Instance.objects.get(pk=dataid).tags.names())
+        self.assertEqual(Instance.objects.get(pk=dataid).json['_tags'],
+                         ['hello'])
 
         request = self.factory.get('/', **self.extra)
         response = view(request, pk=pk, dataid=dataid)
@@ -1084,6 +1206,7 @@ class TestDataViewSet(TestBase):
         self.assertEqual(response.data, [])
         self.assertNotIn(
             'hello', Instance.objects.get(pk=dataid).tags.names())
+        self.assertEqual(Instance.objects.get(pk=dataid).json['_tags'], [])
 
     def test_labels_action_with_params(self):
         self._make_submissions()
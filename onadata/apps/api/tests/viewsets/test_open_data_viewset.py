@@ -9,10 +9,11 @@ from django.test import RequestFactory
 from django.utils.dateparse import parse_datetime
 from django.contrib.auth.models import User
 
-from onadata.apps.logger.models import OpenData, Instance
+from onadata.apps.logger.models import OpenData, Instance, XForm
 from onadata.apps.logger.models.open_data import get_or_create_opendata
 from onadata.apps.api.viewsets.open_data_viewset import (
-    OpenDataViewSet, replace_special_characters_with_underscores
+    OpenDataViewSet, get_tableau_layout,
+    replace_special_characters_with_underscores
 )
 from onadata.apps.main.tests.test_base import TestBase
 
@@ -194,6 +195,29 @@ class TestOpenDataViewSet(TestBase):
         # cast generator response to list so that we can get the response count
         self.assertEqual(len(streaming_data(response)), 3)
 
+    def test_get_data_greater_than_last_submission(self):
+        self._make_submissions()
+        self.view = OpenDataViewSet.as_view({
+            'get': 'data'
+        })
+        last_instance = Instance.objects.order_by('pk').last()
+        _open_data = self.get_open_data_object()
+
+        request = self.factory.get(
+            '/', {'gt_id': last_instance.id}, **self.extra
+        )
+        response = self.view(request, uuid=_open_data.uuid)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(streaming_data(response), [])
+
+    def test_tableau_layout_is_computed_once(self):
+        layout = get_tableau_layout(XForm.objects.get(pk=self.xform.pk))
+        self.assertIs(
+            get_tableau_layout(XForm.objects.get(pk=self.xform.pk)), layout)
+        self.assertIn('transport/available_transportation_types_to_'
+                      'referral_facility/ambulance', layout.headers)
+        self.assertNotIn('_submission_time', layout.headers)
+
     def test_update_open_data_with_valid_fields_and_data(self):
         _open_data = self.get_open_data_object()
         uuid = _open_data.uuid
@@ -2,7 +2,9 @@ import os
 
 from django.utils import timezone
 from django.core.files.base import ContentFile
+from django.db import connection
 from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
 from builtins import open
 from mock import patch
 
@@ -11,6 +13,7 @@ from onadata.apps.api.viewsets.stats_viewset import StatsViewSet
 from onadata.apps.api.viewsets.submissionstats_viewset import\
     SubmissionStatsViewSet
 from onadata.apps.logger.models import XForm
+from onadata.libs.data.statistics import get_all_stats
 from onadata.libs.utils.logger_tools import publish_xml_form, create_instance
 from onadata.libs.utils.user_auth import get_user_default_project
 
@@ -242,6 +245,33 @@ class TestStatsViewSet(TestBase):
         }
         self.assertDictContainsSubset(data, response.data)
 
+    @patch('onadata.libs.data.statistics.is_cache_shared', return_value=True)
+    def test_all_stats_single_query(self, is_cache_shared):
+        """Test the stats of all fields come from one cached query"""
+        self._contributions_form_submissions()
+
+        def count_instance_queries():
+            with CaptureQueriesContext(connection) as queries:
+                stats = get_all_stats(self.xform)
+            return stats, len([
+                query for query in queries.captured_queries
+                if 'logger_instance' in query['sql']])
+
+        stats, count = count_instance_queries()
+        self.assertEqual(count, 1)
+        self.assertEqual(stats['age']['max'], 34)
+        self.assertEqual(stats['amount']['mean'], 1455)
+
+        # the stats are cached until the data changes
+        cached_stats, count = count_instance_queries()
+        self.assertEqual(count, 0)
+        self.assertEqual(cached_stats['age']['max'], 34)
+
+        self.xform.instances.last().delete()
+        stats, count = count_instance_queries()
+        self.assertEqual(count, 1)
+        self.assertEqual(len(stats), 2)
+
     def test_wrong_stat_function_api(self):
         self._contributions_form_submissions()
         view = StatsViewSet.as_view({'get': 'retrieve'})
@@ -4,6 +4,7 @@ API util functions.
 """
 import os
 import tempfile
+from collections import OrderedDict
 from datetime import datetime
 
 from django import forms
@@ -23,7 +24,6 @@ from django.utils.translation import ugettext as _
 from django.utils.module_loading import import_string
 from future.utils import listitems
 from guardian.shortcuts import assign_perm, get_perms_for_model, remove_perm
-from guardian.shortcuts import get_perms
 from kombu.exceptions import OperationalError
 from registration.models import RegistrationProfile
 from rest_framework import exceptions
@@ -42,8 +42,8 @@ from onadata.libs.baseviewset import DefaultBaseViewset
 from onadata.libs.models.share_project import ShareProject
 from onadata.libs.permissions import (
     ROLES, DataEntryMinorRole, DataEntryOnlyRole, DataEntryRole,
-    EditorMinorRole, EditorRole, ManagerRole, OwnerRole, get_role,
-    get_role_in_org, is_organization)
+    EditorMinorRole, EditorRole, ManagerRole, OwnerRole, get_role_in_org,
+    is_organization)
 from onadata.libs.utils.api_export_tools import custom_response_handler
 from onadata.libs.utils.cache_tools import (
     PROJ_BASE_FORMS_CACHE, PROJ_FORMS_CACHE, PROJ_NUM_DATASET_CACHE,
@@ -51,6 +51,8 @@ from onadata.libs.utils.cache_tools import (
 from onadata.libs.utils.common_tags import MEMBERS, XFORM_META_PERMS
 from onadata.libs.utils.logger_tools import (publish_form,
                                              response_with_mimetype_and_name)
+from onadata.libs.utils.permission_matrix import (PermissionMatrix,
+                                                  get_user_details)
 from onadata.libs.utils.project_utils import (set_project_perms_to_xform,
                                               set_project_perms_to_xform_async)
 from onadata.libs.utils.user_auth import (check_and_set_form_by_id,
@@ -538,6 +540,9 @@ def add_tags_to_instance(request, instance):
         if tags:
             for tag in tags:
                 instance.tags.add(tag)
+            # refresh the tags in the instance json
+            instance.mark_changed('tags')
+            instance.save()
     else:
         raise exceptions.ParseError(form.errors)
 
@@ -683,41 +688,25 @@ def get_xform_users(xform):
     :param xform:
     :return:
     """
-    data = {}
-    org_members = []
-    for perm in xform.xformuserobjectpermission_set.all():
-        if perm.user not in data:
-            user = perm.user
-
-            if is_organization(user.profile):
-                org_members = get_team_members(user.username)
-
-            data[user] = {
-                'permissions': [],
-                'is_org': is_organization(user.profile),
-                'metadata': user.profile.metadata,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'user': user.username
-            }
-        if perm.user in data:
-            data[perm.user]['permissions'].append(perm.permission.codename)
-
+    matrix = PermissionMatrix(XForm, [xform.pk])
+    user_permissions = matrix.get_user_permissions(xform.pk)
+    users = matrix.load_users(list(user_permissions))
+    data = OrderedDict(
+        (users[user_id], get_user_details(
+            users[user_id], matrix.get_role(xform.pk, user_id)))
+        for user_id in user_permissions if user_id in users)
+
+    # the members of the organizations with permissions on the form
+    org_members = User.objects.filter(groups__name__in=[
+        "{}#{}".format(user.username, MEMBERS) for user in data
+        if is_organization(user.profile)]).exclude(
+            pk__in=[user.pk for user in data]).distinct().select_related(
+                'profile__organizationprofile')
+    org_members = list(org_members)
+    user_groups = matrix.get_user_groups([user.pk for user in org_members])
     for user in org_members:
-        if user not in data:
-            data[user] = {
-                'permissions': get_perms(user, xform),
-                'is_org': is_organization(user.profile),
-                'metadata': user.profile.metadata,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'user': user.username
-            }
-
-    for k in data:
-        data[k]['permissions'].sort()
-        data[k]['role'] = get_role(data[k]['permissions'], xform)
-        del data[k]['permissions']
+        data[user] = get_user_details(
+            user, matrix.get_role(xform.pk, user.pk, user_groups[user.pk]))
 
     return data
 
@@ -23,17 +23,17 @@ from onadata.libs.serializers.attachment_serializer import AttachmentSerializer
 from onadata.libs.renderers.renderers import MediaFileContentNegotiation, \
     MediaFileRenderer
 from onadata.libs.utils.image_tools import image_url
-from onadata.libs.utils.viewer_tools import get_path
 
 
 def get_attachment_data(attachment, suffix):
     if suffix in list(settings.THUMB_CONF):
         image_url(attachment, suffix)
-        suffix = settings.THUMB_CONF.get(suffix).get('suffix')
-        f = default_storage.open(
-            get_path(attachment.media_file.name, suffix))
+    name = attachment.thumbnails.get(suffix)
+    if name:
+        f = default_storage.open(name)
         data = f.read()
     else:
+        # the original until the thumbnail is generated
         data = attachment.media_file.read()
 
     return data
@@ -1,6 +1,7 @@
 import json
 import types
 from builtins import str as text
+from hashlib import md5
 
 from django.conf import settings
 from django.core.exceptions import PermissionDenied
@@ -32,6 +33,8 @@ from onadata.apps.logger.models.xform import XForm
 from onadata.apps.messaging.constants import XFORM, SUBMISSION_DELETED
 from onadata.apps.messaging.serializers import send_message
 from onadata.apps.viewer.models.parsed_instance import get_etag_hash_from_query
+from onadata.apps.viewer.models.parsed_instance import \
+    get_etag_hash_from_version
 from onadata.apps.viewer.models.parsed_instance import get_sql_with_params
 from onadata.apps.viewer.models.parsed_instance import get_where_clause
 from onadata.apps.viewer.models.parsed_instance import query_data
@@ -45,7 +48,8 @@ from onadata.libs.mixins.authenticate_header_mixin import \
     AuthenticateHeaderMixin
 from onadata.libs.mixins.cache_control_mixin import CacheControlMixin
 from onadata.libs.mixins.etags_mixin import ETagsMixin
-from onadata.libs.pagination import StandardPageNumberPagination
+from onadata.libs.pagination import (KeysetPagination,
+                                     StandardPageNumberPagination)
 from onadata.libs.permissions import CAN_DELETE_SUBMISSION, \
     filter_queryset_xform_meta_perms, filter_queryset_xform_meta_perms_sql
 from onadata.libs.renderers import renderers
@@ -58,7 +62,8 @@ from onadata.libs.serializers.data_serializer import OSMSerializer
 from onadata.libs.serializers.geojson_serializer import GeoJsonSerializer
 from onadata.libs.utils.api_export_tools import custom_response_handler
 from onadata.libs.utils.common_tools import json_stream
-from onadata.libs.utils.model_tools import queryset_iterator
+from onadata.libs.utils.model_tools import (QUERY_FETCH_SIZE,
+                                            queryset_iterator)
 from onadata.libs.utils.viewer_tools import get_form_url, get_enketo_urls
 
 SAFE_METHODS = ['GET', 'HEAD', 'OPTIONS']
@@ -135,7 +140,8 @@ class DataViewSet(AnonymousUserPublicFormsMixin,
             serializer_class = GeoJsonSerializer
         elif pk is not None and dataid is None \
                 and pk != self.public_data_endpoint:
-            if sort or fields:
+            if sort or fields or \
+                    KeysetPagination.is_requested(self.request):
                 serializer_class = JsonDataSerializer
             else:
                 serializer_class = DataInstanceSerializer
@@ -236,6 +242,9 @@ class DataViewSet(AnonymousUserPublicFormsMixin,
         elif request.method == 'DELETE' and label:
             count = tags.count()
             tags.remove(label)
+            # refresh the tags in the instance json
+            instance.mark_changed('tags')
+            instance.save()
 
             # Accepted, label does not exist hence nothing removed
             http_status = status.HTTP_200_OK if count > tags.count() \
@@ -413,6 +422,7 @@ class DataViewSet(AnonymousUserPublicFormsMixin,
                     pk=xform_id, xforms__deleted_at__isnull=True)\
                     .values_list('xforms', flat=True)
                 pks = [pk for pk in xforms if pk] or [xform_id]
+            self.xform_ids = pks
             self.object_list = Instance.objects.filter(
                 xform_id__in=pks, deleted_at=None).only('json').order_by('id')
             xform = self.get_object()
@@ -438,6 +448,10 @@ class DataViewSet(AnonymousUserPublicFormsMixin,
 
         if (export_type is None or export_type in ['json', 'jsonp', 'debug']) \
                 and hasattr(self, 'object_list'):
+            if lookup and not is_public_request and \
+                    KeysetPagination.is_requested(request):
+                return self._get_keyset_data(query, fields, sort)
+
             return self._get_data(query, fields, sort, start, limit,
                                   is_public_request)
 
@@ -495,14 +509,23 @@ class DataViewSet(AnonymousUserPublicFormsMixin,
                 except NoRecordsPermission:
                     self.object_list = []
 
-            if isinstance(self.object_list, QuerySet):
-                self.etag_hash = get_etag_hash_from_query(self.object_list)
-            else:
-                sql, params, records = get_sql_with_params(
-                    xform, query=query, sort=sort, start_index=start,
-                    limit=limit, fields=fields
-                )
-                self.etag_hash = get_etag_hash_from_query(records, sql, params)
+            # the data version of the forms changes with every submission
+            # change, only hash the data when the version is unavailable
+            self.etag_hash = get_etag_hash_from_version(
+                getattr(self, 'xform_ids', None), self.request.user.pk,
+                self.kwargs.get('format'),
+                sorted(self.request.query_params.lists()))
+            if self.etag_hash is None:
+                if isinstance(self.object_list, QuerySet):
+                    self.etag_hash = get_etag_hash_from_query(
+                        self.object_list)
+                else:
+                    sql, params, records = get_sql_with_params(
+                        xform, query=query, sort=sort, start_index=start,
+                        limit=limit, fields=fields
+                    )
+                    self.etag_hash = get_etag_hash_from_query(
+                        records, sql, params)
         except ValueError as e:
             raise ParseError(text(e))
         except DataError as e:
@@ -529,6 +552,39 @@ class DataViewSet(AnonymousUserPublicFormsMixin,
 
         return response
 
+    def _get_keyset_data(self, query, fields, sort):
+        """
+        Returns a page of data after the position in the `cursor` query
+        param, the link to the next page is in the `Link` header.
+        """
+        paginator = KeysetPagination()
+        try:
+            where, where_params = get_where_clause(query)
+            if where:
+                self.object_list = self.object_list.extra(
+                    where=where, params=where_params)
+            self.object_list = paginator.paginate_queryset(
+                self.object_list.only('json', 'date_modified'), self.request,
+                sort=sort, fields=fields)
+        except ValueError as e:
+            raise ParseError(text(e))
+        except DataError as e:
+            raise ParseError(text(e))
+
+        self.etag_hash = md5(text([
+            (record.pk, record.date_modified) for record in paginator.records
+        ]).encode('utf-8')).hexdigest()
+        link = paginator.get_link_header()
+        if link:
+            self.headers['Link'] = link
+
+        if getattr(settings, 'STREAM_DATA', False):
+            return self._get_streaming_response()
+
+        serializer = self.get_serializer(self.object_list, many=True)
+
+        return Response(serializer.data)
+
     def _get_streaming_response(self):
         """
         Get a StreamingHttpResponse response object
@@ -537,8 +593,11 @@ class DataViewSet(AnonymousUserPublicFormsMixin,
             return json.dumps(
                 item.json if isinstance(item, Instance) else item)
 
+        # stream the submissions from the database as they are sent
+        object_list = self.object_list.iterator(chunk_size=QUERY_FETCH_SIZE)\
+            if isinstance(self.object_list, QuerySet) else self.object_list
         response = StreamingHttpResponse(
-            json_stream(self.object_list, get_json_string),
+            json_stream(object_list, get_json_string),
             content_type="application/json"
         )
 
@@ -1,6 +1,5 @@
 import json
 import re
-from collections import OrderedDict
 
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
@@ -24,9 +23,9 @@ from onadata.libs.utils.logger_tools import remove_metadata_fields
 from onadata.libs.mixins.cache_control_mixin import CacheControlMixin
 from onadata.libs.mixins.etags_mixin import ETagsMixin
 from onadata.libs.pagination import StandardPageNumberPagination
-from onadata.libs.serializers.data_serializer import TableauDataSerializer
 from onadata.libs.serializers.open_data_serializer import OpenDataSerializer
 from onadata.libs.utils.common_tools import json_stream
+from onadata.libs.utils.model_tools import QUERY_FETCH_SIZE
 from onadata.libs.utils.common_tags import (
     ATTACHMENTS,
     NOTES,
@@ -49,109 +48,99 @@ def replace_special_characters_with_underscores(data):
     return [re.sub(r"\W", r"_", a) for a in data]
 
 
+class TableauLayout(object):
+    """
+    The flattened columns of a form's Tableau data, computed once per form
+    version.
+    """
+
+    def __init__(self, xform):
+        compiled = xform.get_compiled_survey()
+        self.headers = remove_metadata_fields(xform.get_headers())
+        self.types = {
+            xpath: elem.type
+            for (xpath, elem) in compiled.elements_by_xpath.items()}
+        self.gps_xpaths = {
+            xpath: DataDictionary.get_additional_geopoint_xpaths(xpath)
+            for xpath in compiled.geopoint_xpaths}
+        # the (xpath, column suffix, type) of the questions of each repeat in
+        # the order in which they appear in the form
+        self.repeats = {}
+        for repeat_xpath in compiled.repeat_xpaths:
+            self.repeats[repeat_xpath] = [
+                (elem.get_abbreviated_xpath(),
+                 elem.get_abbreviated_xpath()[len(repeat_xpath) + 1:],
+                 elem.type)
+                for elem in xform.get_child_elements(
+                    repeat_xpath, split_select_multiples=False)
+                if not question_types_to_exclude(elem.type)]
+
+    def flatten_repeat(self, repeat_xpath, item, prefix, row):
+        """
+        Adds the answers of a repeat item to the row, the columns start with
+        prefix, e.g. children[1].
+        """
+        for (xpath, suffix, qstn_type) in self.repeats.get(repeat_xpath, []):
+            value = item.get(xpath, DEFAULT_NA_REP)
+            column = prefix + '/' + suffix
+            if qstn_type == MULTIPLE_SELECT_TYPE and \
+                    isinstance(value, str) and value != DEFAULT_NA_REP:
+                for choice in value.split(" "):
+                    row[column + '/' + choice] = choice
+            elif qstn_type == REPEAT_SELECT_TYPE and isinstance(value, list):
+                for (index, nested_item) in enumerate(value, start=1):
+                    self.flatten_repeat(
+                        xpath, nested_item, '%s[%d]' % (column, index), row)
+            else:
+                row[column] = value
+
+    def flatten(self, data):
+        """Returns the Tableau row of a submission's data."""
+        row = dict.fromkeys(self.headers)
+        for (key, value) in data.items():
+            if isinstance(value, list) and key not in [
+                    ATTACHMENTS, NOTES, GEOLOCATION]:
+                for (index, item) in enumerate(value, start=1):
+                    if isinstance(item, dict):
+                        self.flatten_repeat(
+                            key, item, '%s[%d]' % (key, index), row)
+                continue
+
+            if key in self.gps_xpaths:
+                # only the components of a geopoint are columns
+                row.pop(key, None)
+                parts = value.split(' ') if isinstance(value, str) else []
+                if len(parts) == 4:
+                    row.update(zip(self.gps_xpaths[key], parts))
+                continue
+
+            if self.types.get(key) == MULTIPLE_SELECT_TYPE and \
+                    isinstance(value, str):
+                for choice in value.split(" "):
+                    row[key + '/' + choice] = choice
+            row[key] = value
+
+        return row
+
+
+def get_tableau_layout(xform):
+    """Returns the Tableau layout of the form's current version."""
+    return xform.get_compiled_survey().get_derived(
+        'tableau_layout', lambda: TableauLayout(xform))
+
+
 def process_tableau_data(data, xform):
     """
     Streamlines the row header fields
     with the column header fields for the same form.
     Handles Flattenning repeat data for tableau
-    """
 
-    def get_xpath(key, nested_key):
-        val = nested_key.split('/')
-        nested_key_diff = val[len(key.split('/')):]
-        xpaths = key + f'[{index}]/' + '/'.join(nested_key_diff)
-        return xpaths
-
-    def get_updated_data_dict(key, value, data_dict):
-        """
-        Generates key, value pairs for select multiple question types.
-        Defining the new xpaths from the
-        question name(key) and the choice name(value)
-        in accordance with how we generate the tableau schema.
-        """
-        if isinstance(value, str) and data_dict:
-            choices = value.split(" ")
-            for choice in choices:
-                xpaths = f'{key}/{choice}'
-                data_dict[xpaths] = choice
-        elif isinstance(value, list):
-            try:
-                for item in value:
-                    for (nested_key, nested_val) in item.items():
-                        xpath = get_xpath(key, nested_key)
-                        data_dict[xpath] = nested_val
-            except AttributeError:
-                data_dict[key] = value
-
-        return data_dict
-
-    def get_ordered_repeat_value(key, item, index):
-        """
-        Return Ordered Dict of repeats in the order in which they appear in
-        the XForm.
-        """
-        children = xform.get_child_elements(key, split_select_multiples=False)
-        item_list = OrderedDict()
-        data = {}
-
-        for elem in children:
-            if not question_types_to_exclude(elem.type):
-                new_xpath = elem.get_abbreviated_xpath()
-                item_list[new_xpath] = item.get(new_xpath, DEFAULT_NA_REP)
-                # Loop through repeat data and flatten it
-                # given the key "children/details" and nested_key/
-                # abbreviated xpath "children/details/immunization/polio_1",
-                # generate ["children", index, "immunization/polio_1"]
-                for (nested_key, nested_val) in item_list.items():
-                    qstn_type = xform.get_element(nested_key).type
-                    xpaths = get_xpath(key, nested_key)
-                    if qstn_type == MULTIPLE_SELECT_TYPE:
-                        data = get_updated_data_dict(
-                            xpaths, nested_val, data)
-                    elif qstn_type == REPEAT_SELECT_TYPE:
-                        data = get_updated_data_dict(
-                            xpaths, nested_val, data)
-                    else:
-                        data[xpaths] = nested_val
-        return data
-
-    result = []
-    if data:
-        headers = xform.get_headers()
-        tableau_headers = remove_metadata_fields(headers)
-        for row in data:
-            diff = set(tableau_headers).difference(set(row))
-            flat_dict = dict.fromkeys(diff, None)
-            for (key, value) in row.items():
-                if isinstance(value, list) and key not in [
-                        ATTACHMENTS, NOTES, GEOLOCATION]:
-                    for index, item in enumerate(value, start=1):
-                        # order repeat according to xform order
-                        item = get_ordered_repeat_value(key, item, index)
-                        flat_dict.update(item)
-                else:
-                    try:
-                        qstn_type = xform.get_element(key).type
-                        if qstn_type == MULTIPLE_SELECT_TYPE:
-                            flat_dict = get_updated_data_dict(
-                                key, value, flat_dict)
-                        if qstn_type == 'geopoint':
-                            parts = value.split(' ')
-                            gps_xpaths = \
-                                DataDictionary.get_additional_geopoint_xpaths(
-                                    key)
-                            gps_parts = dict(
-                                [(xpath, None) for xpath in gps_xpaths])
-                            if len(parts) == 4:
-                                gps_parts = dict(zip(gps_xpaths, parts))
-                                flat_dict.update(gps_parts)
-                        else:
-                            flat_dict[key] = value
-                    except AttributeError:
-                        flat_dict[key] = value
-
-            result.append(flat_dict)
-    return result
+    Yields the rows one at a time, data can be any iterable of the json of
+    the submissions.
+    """
+    layout = get_tableau_layout(xform)
+    for row in data:
+        yield layout.flatten(remove_metadata_fields(dict(row)))
 
 
 class OpenDataViewSet(ETagsMixin, CacheControlMixin,
@@ -263,11 +252,15 @@ class OpenDataViewSet(ETagsMixin, CacheControlMixin,
             if count:
                 return Response({'count': instances.count()})
 
+            instances = instances.values_list('json', flat=True)
             if should_paginate:
                 instances = self.paginate_queryset(instances)
+            else:
+                # read the submissions with a server-side cursor while the
+                # response is streamed
+                instances = instances.iterator(chunk_size=QUERY_FETCH_SIZE)
 
-            data = process_tableau_data(
-                TableauDataSerializer(instances, many=True).data, xform)
+            data = process_tableau_data(instances, xform)
 
             return self._get_streaming_response(data)
 
@@ -4,9 +4,11 @@ XFormSubmissionViewSet module
 """
 from django.conf import settings
 from django.http import UnreadablePostError
+from django.utils.encoding import smart_text
 from django.utils.translation import ugettext as _
 
 from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.decorators import action
 from rest_framework.authentication import (BasicAuthentication,
                                            TokenAuthentication)
 from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
@@ -26,8 +28,11 @@ from onadata.libs.renderers.renderers import FLOIPRenderer, TemplateXMLRenderer
 from onadata.libs.serializers.data_serializer import (
     FLOIPSubmissionSerializer, JSONSubmissionSerializer,
     RapidProSubmissionSerializer, SubmissionSerializer,
-    RapidProJSONSubmissionSerializer)
-from onadata.libs.utils.logger_tools import OpenRosaResponseBadRequest
+    RapidProJSONSubmissionSerializer, SubmissionSuccessMixin,
+    get_request_and_username)
+from onadata.libs.utils.logger_tools import (BulkSubmission,
+                                             OpenRosaResponseBadRequest,
+                                             safe_create_instances_in_bulk)
 
 BaseViewset = get_baseviewset_class()  # pylint: disable=C0103
 
@@ -111,6 +116,43 @@ class XFormSubmissionViewSet(AuthenticateHeaderMixin,  # pylint: disable=R0901
         return super(XFormSubmissionViewSet, self).create(
             request, *args, **kwargs)
 
+    @action(methods=['POST'], detail=False, renderer_classes=[JSONRenderer])
+    def bulk(self, request, *args, **kwargs):
+        """
+        Creates an instance for each `xml_submission_file` in the request and
+        returns the result of each submission in the same order.
+
+        Media files are saved with the submissions that reference them.
+        """
+        xml_files = request.FILES.getlist('xml_submission_file')
+        if not xml_files:
+            return Response({'detail': _("No XML submission file.")},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        media_files = [
+            f for key, files in request.FILES.lists()
+            if key != 'xml_submission_file' for f in files]
+        __, username = get_request_and_username(
+            {'request': request, 'view': self})
+        submitted_by = request.user \
+            if request.user.is_authenticated else None
+        items = [BulkSubmission(xml_file, media_files, submitted_by)
+                 for xml_file in xml_files]
+
+        data = []
+        success = SubmissionSuccessMixin()
+        for error, instance in safe_create_instances_in_bulk(
+                username, items, request):
+            if error:
+                data.append({'status': error.status_code,
+                             'message': smart_text(error.message)})
+            else:
+                result = success.to_representation(instance)
+                result['status'] = status.HTTP_201_CREATED
+                data.append(result)
+
+        return Response(data, status=status.HTTP_200_OK)
+
     def handle_exception(self, exc):
         """
         Handles exceptions thrown by handler method and
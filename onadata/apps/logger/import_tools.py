@@ -6,10 +6,13 @@ import zipfile
 from builtins import open
 
 from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.utils.encoding import smart_text
 
 from onadata.apps.logger.xform_fs import XFormInstanceFS
 from onadata.celery import app
-from onadata.libs.utils.logger_tools import create_instance
+from onadata.libs.utils.logger_tools import (BULK_BATCH_SIZE, BulkSubmission,
+                                             create_instance,
+                                             safe_create_instances_in_bulk)
 
 # odk
 # ├── forms
@@ -106,7 +109,77 @@ def iterate_through_instances(dirpath, callback, user=None, status='zip',
     return (total_file_count, success_count, errors)
 
 
-def import_instances_from_zip(zipfile_path, user, status="zip"):
+def import_instances_in_bulk(username, xform_fss, status):
+    """
+    Imports a batch of XFormInstanceFS submissions with
+    safe_create_instances_in_bulk.
+
+    Returns the number of submissions that were imported or are duplicates
+    and a list of errors.
+    """
+    items = []
+    media_files = []
+    for xfxs in xform_fss:
+        images = [django_file(jpg, field_name="image",
+                  content_type="image/jpeg") for jpg in xfxs.photos]
+        images += [
+            django_file(osm, field_name='image',
+                        content_type='text/xml')
+            for osm in xfxs.osm
+        ]
+        media_files.extend(images)
+        with open(xfxs.path, 'rb') as xml_file:
+            items.append(BulkSubmission(xml_file, images))
+
+    try:
+        results = safe_create_instances_in_bulk(username, items, status=status)
+    finally:
+        for media_file in media_files:
+            media_file.close()
+
+    success_count = 0
+    errors = []
+    for xfxs, (error, instance) in zip(xform_fss, results):
+        if error is None or error.status_code == 202:
+            success_count += 1
+        else:
+            errors.append(
+                "%s => %s" % (xfxs.filename, smart_text(error.message)))
+
+    return success_count, errors
+
+
+def iterate_through_instances_in_bulk(dirpath, user, status='zip',
+                                      batch_size=BULK_BATCH_SIZE):
+    total_file_count = 0
+    success_count = 0
+    errors = []
+    batch = []
+
+    def import_batch():
+        count, batch_errors = import_instances_in_bulk(
+            user.username, batch, status)
+        errors.extend(batch_errors)
+        del batch[:]
+
+        return count
+
+    for directory, subdirs, subfiles in os.walk(dirpath):
+        for filename in subfiles:
+            filepath = os.path.join(directory, filename)
+            if XFormInstanceFS.is_valid_instance(filepath):
+                batch.append(XFormInstanceFS(filepath))
+                total_file_count += 1
+                if len(batch) >= batch_size:
+                    success_count += import_batch()
+
+    if batch:
+        success_count += import_batch()
+
+    return (total_file_count, success_count, errors)
+
+
+def import_instances_from_zip(zipfile_path, user, status="zip", bulk=False):
     try:
         temp_directory = tempfile.mkdtemp()
         zf = zipfile.ZipFile(zipfile_path)
@@ -116,12 +189,14 @@ def import_instances_from_zip(zipfile_path, user, status="zip"):
         errors = [u"%s" % e]
         return 0, 0, errors
     else:
-        return import_instances_from_path(temp_directory, user, status)
+        return import_instances_from_path(
+            temp_directory, user, status, bulk=bulk)
     finally:
         shutil.rmtree(temp_directory)
 
 
-def import_instances_from_path(path, user, status="zip", is_async=False):
+def import_instances_from_path(path, user, status="zip", is_async=False,
+                               bulk=False):
     def callback(xform_fs):
         """
         This callback is passed an instance of a XFormInstanceFS.
@@ -142,6 +217,9 @@ def import_instances_from_path(path, user, status="zip", is_async=False):
             status=status,
             is_async=is_async
         )
+    elif bulk:
+        total_count, success_count, errors = \
+            iterate_through_instances_in_bulk(path, user, status=status)
     else:
         total_count, success_count, errors = iterate_through_instances(
             path, callback
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# vim: ai ts=4 sts=4 et sw=4 fileencoding=utf-8
+"""
+Compare the CPU time the minidom and expat submission parser engines take to
+build the dict of large submissions with nested repeats.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext_lazy
+
+from onadata.apps.logger.xform_instance_parser import (
+    _InstanceDictBuilder, _xml_node_to_dict, clean_and_parse_xml)
+
+
+def get_submission(repeats, depth, questions):
+    """
+    Returns a synthetic submission with `repeats` repeats nested `depth`
+    levels deep, each with `questions` answers, and the repeat xpaths.
+    """
+    def _repeat(level):
+        name = u'repeat%d' % level
+        children = u''.join(
+            u'<q%d>answer %d</q%d>' % (i, i, i) for i in range(questions))
+        if level < depth:
+            children += _repeat(level + 1) * 3
+
+        return u'<%s>%s</%s>' % (name, children, name)
+
+    xml = (u'<?xml version="1.0" ?><data id="benchmark"><group>%s</group>'
+           u'<meta><instanceID>uuid:benchmark</instanceID></meta></data>' % (
+               _repeat(1) * repeats))
+    xpaths = [
+        u'/'.join([u'group'] +
+                  [u'repeat%d' % i for i in range(1, level + 1)])
+        for level in range(1, depth + 1)]
+
+    return xml, xpaths
+
+
+def parse_minidom(xml, repeats):
+    """Builds the submission dict from a minidom document."""
+    return _xml_node_to_dict(clean_and_parse_xml(xml).documentElement,
+                             repeats)
+
+
+def parse_expat(xml, repeats):
+    """Builds the submission dict while expat parses the XML."""
+    return _InstanceDictBuilder(repeats).parse(xml)
+
+
+class Command(BaseCommand):
+    help = ugettext_lazy("Benchmark the submission parser engines")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-n', '--repeats', type=int, default=200,
+            help=ugettext_lazy("Number of top level repeats"))
+        parser.add_argument(
+            '-d', '--depth', type=int, default=3,
+            help=ugettext_lazy("Number of nested repeat levels"))
+        parser.add_argument(
+            '-q', '--questions', type=int, default=10,
+            help=ugettext_lazy("Number of questions in a repeat"))
+        parser.add_argument(
+            '-r', '--repeat', type=int, default=5,
+            help=ugettext_lazy("Number of times to parse the submission"))
+
+    def _time(self, func, xml, repeats, repeat):
+        start = time.process_time()
+        for _i in range(repeat):
+            result = func(xml, repeats)
+
+        return (time.process_time() - start) / repeat, result
+
+    def handle(self, *args, **options):
+        xml, repeats = get_submission(
+            options['repeats'], options['depth'], options['questions'])
+
+        minidom, minidom_dict = self._time(
+            parse_minidom, xml, repeats, options['repeat'])
+        expat, expat_dict = self._time(
+            parse_expat, xml, repeats, options['repeat'])
+
+        self.stdout.write("Parsed a %d KB submission %d times" % (
+            len(xml) // 1024, options['repeat']))
+        self.stdout.write("minidom: %.1f ms CPU" % (minidom * 1000))
+        self.stdout.write("expat: %.1f ms CPU" % (expat * 1000))
+        self.stdout.write(
+            "Speedup: %.2fx" % (minidom / expat if expat else 0))
+        self.stdout.write("Same dict: %s" % (minidom_dict == expat_dict))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# vim: ai ts=4 sts=4 et sw=4 fileencoding=utf-8
+"""
+Compare the per-submission CPU time of parsing a submission once with
+SubmissionXML against parsing it once for every step of create_instance.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import ugettext_lazy
+
+from onadata.apps.logger.models import XForm
+from onadata.apps.logger.models.instance import get_id_string_from_xml_str
+from onadata.apps.logger.xform_instance_parser import (
+    SubmissionXML, XFormInstanceParser, get_deprecated_uuid_from_xml,
+    get_submission_date_from_xml, get_uuid_from_xml)
+from onadata.libs.utils.validate_data import get_insect_names
+
+
+def parse_per_step(xml, xform):
+    """Parse the XML separately for each submission step."""
+    get_insect_names(SubmissionXML(xml))
+    get_id_string_from_xml_str(xml)
+    get_uuid_from_xml(xml)
+    get_deprecated_uuid_from_xml(xml)
+    get_submission_date_from_xml(xml)
+    XFormInstanceParser(xml, xform)
+
+
+def parse_once(xml, xform):
+    """Parse the XML once and share it across submission steps."""
+    submission = SubmissionXML(xml)
+    get_insect_names(submission)
+    get_id_string_from_xml_str(submission)
+    get_uuid_from_xml(submission)
+    get_deprecated_uuid_from_xml(submission)
+    get_submission_date_from_xml(submission)
+    XFormInstanceParser(submission, xform)
+
+
+class Command(BaseCommand):
+    help = ugettext_lazy("Benchmark submission XML parsing for a form")
+
+    def add_arguments(self, parser):
+        parser.add_argument('xform_id', type=int)
+        parser.add_argument(
+            '-l', '--limit', type=int, default=100,
+            help=ugettext_lazy("Number of submissions to parse"))
+        parser.add_argument(
+            '-r', '--repeat', type=int, default=5,
+            help=ugettext_lazy("Number of times to parse each submission"))
+
+    def _time(self, func, xmls, xform, repeat):
+        start = time.process_time()
+        for _i in range(repeat):
+            for xml in xmls:
+                func(xml, xform)
+
+        return (time.process_time() - start) / (len(xmls) * repeat)
+
+    def handle(self, *args, **options):
+        try:
+            xform = XForm.objects.get(pk=options['xform_id'])
+        except XForm.DoesNotExist:
+            raise CommandError("Form %s does not exist" % options['xform_id'])
+
+        xmls = [
+            xml.encode('utf-8') for xml in xform.instances.filter(
+                deleted_at__isnull=True).order_by('-pk').values_list(
+                    'xml', flat=True)[:options['limit']]]
+        if not xmls:
+            raise CommandError("Form %s has no submissions" % xform.pk)
+
+        before = self._time(parse_per_step, xmls, xform, options['repeat'])
+        after = self._time(parse_once, xmls, xform, options['repeat'])
+
+        self.stdout.write(
+            "Parsed %d submissions %d times" % (len(xmls), options['repeat']))
+        self.stdout.write("Parse per step: %.3f ms CPU per submission" %
+                          (before * 1000))
+        self.stdout.write("Parse once: %.3f ms CPU per submission" %
+                          (after * 1000))
+        self.stdout.write("Speedup: %.2fx" % (before / after if after else 0))
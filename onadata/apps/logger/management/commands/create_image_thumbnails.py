@@ -1,18 +1,21 @@
 #!/usr/bin/env python
-from django.conf import settings
+import multiprocessing
+
 from django.contrib.auth.models import User
-from django.core.files.storage import get_storage_class
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 from django.utils.translation import ugettext as _
 from django.utils.translation import ugettext_lazy
 
-from onadata.apps.logger.models.attachment import Attachment
+from onadata.apps.logger.models.attachment import (Attachment,
+                                                   create_thumbnails)
 from onadata.apps.logger.models.xform import XForm
-from onadata.libs.utils.image_tools import resize, resize_local_env
-from onadata.libs.utils.model_tools import queryset_iterator
-from onadata.libs.utils.viewer_tools import get_path
 
-THUMB_CONF = settings.THUMB_CONF
+
+def _create_thumbnails(args):
+    attachment_id, filename, force = args
+
+    return filename, create_thumbnails(attachment_id, force)
 
 
 class Command(BaseCommand):
@@ -29,12 +32,24 @@ class Command(BaseCommand):
         parser.add_argument(
             '-f',
             '--force',
-            action='store_false',
+            action='store_true',
             help=ugettext_lazy("regenerate thumbnails if they exist."))
+        parser.add_argument(
+            '-p',
+            '--processes',
+            type=int,
+            default=1,
+            help=ugettext_lazy("Number of worker processes"))
+        parser.add_argument(
+            '-q',
+            '--queue',
+            action='store_true',
+            help=ugettext_lazy("queue a task per image instead of creating "
+                               "the thumbnails in this command."))
 
     def handle(self, *args, **options):
-        attachments_qs = Attachment.objects.select_related(
-            'instance', 'instance__xform')
+        attachments_qs = Attachment.objects.filter(
+            mimetype__startswith='image', deleted_at__isnull=True)
         if options.get('username'):
             username = options.get('username')
             try:
@@ -53,34 +68,45 @@ class Command(BaseCommand):
                     "Error: Form with id_string %(id_string)s does not exist" %
                     {'id_string': id_string})
             attachments_qs = attachments_qs.filter(instance__xform=xform)
-        fs = get_storage_class('django.core.files.storage.FileSystemStorage')()
-        for att in queryset_iterator(attachments_qs):
-            filename = att.media_file.name
-            default_storage = get_storage_class()()
-            full_path = get_path(filename,
-                                 settings.THUMB_CONF['small']['suffix'])
-            if options.get('force') is not None:
-                for s in ['small', 'medium', 'large']:
-                    fp = get_path(filename, settings.THUMB_CONF[s]['suffix'])
-                    if default_storage.exists(fp):
-                        default_storage.delete(fp)
-            if not default_storage.exists(full_path):
-                try:
-                    if default_storage.__class__ != fs.__class__:
-                        resize(filename, att.extension)
-                    else:
-                        resize_local_env(filename, att.extension)
-                    path = get_path(
-                        filename, '%s' % THUMB_CONF['small']['suffix'])
-                    if default_storage.exists(path):
-                        self.stdout.write(
-                            _(u'Thumbnails created for %(file)s') %
-                            {'file': filename})
-                    else:
-                        self.stdout.write(
-                            _(u'Problem with the file %(file)s') %
-                            {'file': filename})
-                except (IOError, OSError) as e:
-                    self.stderr.write(_(
-                        u'Error on %(filename)s: %(error)s')
-                        % {'filename': filename, 'error': e})
+        force = options.get('force')
+        if not force:
+            # thumbnails are only missing from attachments without any
+            attachments_qs = attachments_qs.filter(thumbnails={})
+
+        attachments = [
+            (pk, filename, force) for (pk, filename) in
+            attachments_qs.order_by('pk').values_list('pk', 'media_file')]
+
+        if options.get('queue'):
+            for (pk, filename, force) in attachments:
+                create_thumbnails.apply_async(args=[pk, force])
+            self.stdout.write(
+                _(u'Queued thumbnails for %(count)d images') %
+                {'count': len(attachments)})
+            return
+
+        processes = options.get('processes')
+        pool = None
+        if processes > 1:
+            # the workers open their own database connections
+            connections.close_all()
+            pool = multiprocessing.get_context('fork').Pool(processes)
+            results = pool.imap_unordered(
+                _create_thumbnails, attachments, chunksize=10)
+        else:
+            results = map(_create_thumbnails, attachments)
+
+        try:
+            for (filename, thumbnails) in results:
+                if thumbnails:
+                    self.stdout.write(
+                        _(u'Thumbnails created for %(file)s') %
+                        {'file': filename})
+                else:
+                    self.stderr.write(
+                        _(u'Problem with the file %(file)s') %
+                        {'file': filename})
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
@@ -16,6 +16,11 @@ class Command(BaseCommand):
         parser.add_argument('-u', '--username', help=_("Username")),
         parser.add_argument('-p', '--password', help=_("Password"))
         parser.add_argument('--to', help=_("username in this server"))
+        parser.add_argument(
+            '-t', '--threads', type=int,
+            help=_("number of submissions pushed at a time, BRIEFCASE_THREADS"
+                   " by default; the submissions are pushed concurrently "
+                   "unless it is 1"))
 
     def handle(self, *args, **options):
         url = options.get('url')
@@ -24,5 +29,6 @@ class Command(BaseCommand):
         to = options.get('to')
         user = User.objects.get(username=to)
         bc = BriefcaseClient(
-            username=username, password=password, user=user, url=url)
+            username=username, password=password, user=user, url=url,
+            threads=options.get('threads'))
         bc.push()
@@ -52,7 +52,7 @@ class Command(BaseCommand):
                 subdirs.remove("odk")
                 self.stdout.write(_("Importing from dir %s..\n") % dir)
                 results = import_instances_from_path(
-                    dir, user, is_async=is_async
+                    dir, user, is_async=is_async, bulk=not is_async
                 )
                 self._log_import(results)
             for file in files:
@@ -61,5 +61,6 @@ class Command(BaseCommand):
                         os.path.splitext(filepath)[1].lower() == ".zip":
                     self.stdout.write(_(
                         "Importing from zip at %s..\n") % filepath)
-                    results = import_instances_from_zip(filepath, user)
+                    results = import_instances_from_zip(
+                        filepath, user, bulk=True)
                     self._log_import(results)
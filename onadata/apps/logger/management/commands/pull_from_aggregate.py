@@ -16,6 +16,14 @@ class Command(BaseCommand):
         parser.add_argument('-u', '--username', help=_("Username"))
         parser.add_argument('-p', '--password', help=_("Password"))
         parser.add_argument('--to', help=_("username in this server"))
+        parser.add_argument(
+            '-t', '--threads', type=int,
+            help=_("number of submissions and media files downloaded at a "
+                   "time"))
+        parser.add_argument(
+            '--restart', action='store_true', default=False,
+            help=_("pull the submissions from the start instead of resuming "
+                   "from the last pull"))
 
     def handle(self, *args, **kwargs):
         url = kwargs.get('url')
@@ -29,5 +37,7 @@ class Command(BaseCommand):
         else:
             user = User.objects.get(username=to)
             bc = BriefcaseClient(
-                username=username, password=password, user=user, url=url)
-            bc.download_xforms(include_instances=True)
+                username=username, password=password, user=user, url=url,
+                threads=kwargs.get('threads'))
+            bc.download_xforms(include_instances=True,
+                               restart=kwargs.get('restart'))
@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-18 11:40
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0061_auto_20200713_0814'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColumnSchema',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('repeat_counts', django.contrib.postgres.fields.jsonb.JSONField(default=dict)),
+                ('is_stale', models.BooleanField(default=False)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('date_modified', models.DateTimeField(auto_now=True)),
+                ('xform', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='column_schema', to='logger.XForm')),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 14:05
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0062_columnschema'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='thumbnails',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from onadata.apps.logger.models.attachment import Attachment  # noqa
+from onadata.apps.logger.models.column_schema import ColumnSchema  # noqa
 from onadata.apps.logger.models.data_view import DataView  # noqa
 from onadata.apps.logger.models.instance import Instance  # noqa
 from onadata.apps.logger.models.merged_xform import MergedXForm  # noqa
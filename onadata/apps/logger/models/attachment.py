@@ -1,9 +1,28 @@
+import logging
 import mimetypes
 import os
 from hashlib import md5
 
-from django.db import models
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.contrib.postgres.fields import JSONField
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models.signals import post_save
+
+from onadata.celery import app
+from onadata.libs.utils.cache_tools import (ATTACHMENT_THUMBNAILS_PENDING,
+                                            safe_delete)
+from onadata.libs.utils.image_tools import make_thumbnails
+
+# generate the thumbnails of image attachments in a task when they are saved
+# instead of when they are first requested
+ASYNC_THUMBNAIL_GENERATION_ENABLED = \
+    getattr(settings, 'ASYNC_THUMBNAIL_GENERATION_ENABLED', True)
+# seconds before the thumbnails of an attachment are requested again when
+# their generation is pending or failed
+THUMBNAIL_GENERATION_TIMEOUT = \
+    getattr(settings, 'THUMBNAIL_GENERATION_TIMEOUT', 3600)
 
 
 def get_original_filename(filename):
@@ -55,6 +74,8 @@ class Attachment(models.Model):
     name = models.CharField(max_length=100, null=True, blank=True)
     deleted_by = models.ForeignKey(User, related_name='deleted_attachments',
                                    null=True, on_delete=models.SET_NULL)
+    # the names of the generated thumbnails by size, e.g. {'small': ...}
+    thumbnails = JSONField(default=dict, blank=True)
 
     class Meta:
         app_label = 'logger'
@@ -89,3 +110,64 @@ class Attachment(models.Model):
     def filename(self):
         if self.media_file:
             return os.path.basename(self.media_file.name)
+
+    @property
+    def is_image(self):
+        return bool(self.media_file) and self.mimetype.startswith('image')
+
+    def request_thumbnails(self):
+        """
+        Generates the thumbnails of the image, in a task unless thumbnails
+        are generated synchronously. The thumbnails are requested at most
+        once in THUMBNAIL_GENERATION_TIMEOUT seconds.
+        """
+        if not ASYNC_THUMBNAIL_GENERATION_ENABLED:
+            self.thumbnails = create_thumbnails(self.pk)
+        elif cache.add('{}{}'.format(ATTACHMENT_THUMBNAILS_PENDING, self.pk),
+                       True, THUMBNAIL_GENERATION_TIMEOUT):
+            attachment_id = self.pk
+            transaction.on_commit(
+                lambda: create_thumbnails.apply_async(args=[attachment_id]))
+
+
+@app.task
+def create_thumbnails(attachment_id, force=False):
+    """
+    Generates the thumbnails of an image attachment and records their names
+    on the attachment.
+
+    :return: The names of the thumbnails by size.
+    """
+    try:
+        attachment = Attachment.objects.get(pk=attachment_id)
+    except Attachment.DoesNotExist:
+        return {}
+
+    if not attachment.is_image:
+        return {}
+
+    try:
+        thumbnails = make_thumbnails(attachment.media_file.name,
+                                     attachment.extension, force)
+    except Exception:  # pylint: disable=broad-except
+        # the image could not be read, it is not requested again until the
+        # timeout
+        logging.exception(
+            "Thumbnails of attachment %s failed", attachment_id)
+        return {}
+
+    Attachment.objects.filter(pk=attachment_id).update(thumbnails=thumbnails)
+    safe_delete('{}{}'.format(ATTACHMENT_THUMBNAILS_PENDING, attachment_id))
+
+    return thumbnails
+
+
+def queue_thumbnails(sender, instance=None, created=False, **kwargs):
+    """Requests the thumbnails of new image attachments."""
+    if ASYNC_THUMBNAIL_GENERATION_ENABLED and instance.is_image and \
+            not instance.thumbnails and instance.deleted_at is None:
+        instance.request_thumbnails()
+
+
+post_save.connect(queue_thumbnails, sender=Attachment,
+                  dispatch_uid='queue_thumbnails')
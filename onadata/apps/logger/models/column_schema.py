@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+ColumnSchema model class
+
+The column schema of a form records the largest number of repeats of every
+repeat in the form's submissions. The repeat columns of a flat CSV export
+are built from it instead of from a first pass over the submissions.
+
+The counts only grow when submissions are added. A schema is marked stale
+when a submission is edited or a deleted submission may have had the most
+repeats, and it is rebuilt by the next export of all the submissions.
+"""
+import json
+
+from django.contrib.postgres.fields import JSONField
+from django.db import connection, models, transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.utils.encoding import python_2_unicode_compatible
+from future.utils import iteritems
+
+from onadata.apps.logger.models.xform import XForm
+from onadata.libs.utils.common_tags import ATTACHMENTS, NOTES
+
+# merges the repeat counts in the parameter into the schema's counts keeping
+# the largest count of every repeat
+MERGE_REPEAT_COUNTS_SQL = (
+    "UPDATE logger_columnschema SET repeat_counts = ("
+    "SELECT COALESCE(jsonb_object_agg(key, value), '{}'::jsonb) FROM ("
+    "SELECT key, MAX(value::int) AS value FROM ("
+    "SELECT key, value FROM jsonb_each_text(repeat_counts) UNION ALL "
+    "SELECT key, value FROM jsonb_each_text(%s::jsonb)) AS counts "
+    "GROUP BY key) AS merged), date_modified = now()"
+)
+
+
+def get_repeat_counts(data, counts=None, parent=None):
+    """
+    Returns the number of repeats of every repeat in the submission data.
+
+    The repeats are keyed by their xpath with the index of the enclosing
+    repeats, e.g. {'children': 2, 'children[1]/immunization': 3,
+    'children[2]/immunization': 1}. The largest number is kept when
+    `counts` already has a repeat.
+    """
+    counts = {} if counts is None else counts
+    for (key, value) in iteritems(data):
+        if not isinstance(value, list) or not value or \
+                key in (ATTACHMENTS, NOTES) or \
+                not any(isinstance(item, dict) for item in value):
+            continue
+
+        # the xpath of a nested repeat starts with the enclosing repeat's
+        path = key if parent is None else parent[1] + key[len(parent[0]):]
+        counts[path] = max(counts.get(path, 0), len(value))
+        for (index, item) in enumerate(value, start=1):
+            if isinstance(item, dict):
+                get_repeat_counts(
+                    item, counts, (key, '{}[{}]'.format(path, index)))
+
+    return counts
+
+
+@python_2_unicode_compatible
+class ColumnSchema(models.Model):
+    """
+    The largest number of repeats of every repeat in a form's submissions.
+    """
+    xform = models.OneToOneField(XForm, related_name='column_schema',
+                                 on_delete=models.CASCADE)
+    repeat_counts = JSONField(default=dict)
+    # the counts may be too large for the form's submissions
+    is_stale = models.BooleanField(default=False)
+    # changes every time the schema is marked stale or is rebuilt
+    version = models.PositiveIntegerField(default=0)
+    date_modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'logger'
+
+    def __str__(self):
+        return "ColumnSchema: %s" % self.xform_id
+
+    @classmethod
+    def get_repeat_counts(cls, xform_id):
+        """
+        Returns the repeat counts of the form or None if the form has no
+        schema or the schema is stale.
+        """
+        return cls.objects.filter(xform_id=xform_id, is_stale=False)\
+            .values_list('repeat_counts', flat=True).first()
+
+    @classmethod
+    def add_repeat_counts(cls, xform_id, counts):
+        """
+        Adds the repeat counts of new submissions to the form's schema once
+        the transaction commits. The schema is only written, and locked,
+        when a count is larger than the schema's.
+        """
+        if not counts:
+            return
+
+        def _merge():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    MERGE_REPEAT_COUNTS_SQL + " WHERE xform_id = %s AND "
+                    "EXISTS (SELECT 1 FROM jsonb_each_text(%s::jsonb) AS new "
+                    "WHERE COALESCE((repeat_counts->>new.key)::int, 0) < "
+                    "new.value::int)",
+                    [json.dumps(counts), xform_id, json.dumps(counts)])
+
+        transaction.on_commit(_merge)
+
+    @classmethod
+    def remove_repeat_counts(cls, xform_id, counts):
+        """
+        Marks the form's schema stale if a deleted submission with the
+        repeat counts may have had the most repeats.
+        """
+        if not counts:
+            return
+
+        current = cls.objects.filter(xform_id=xform_id, is_stale=False)\
+            .values_list('repeat_counts', flat=True).first()
+        if current is not None and any(
+                current.get(path, 0) <= count
+                for (path, count) in iteritems(counts)):
+            cls.mark_stale(xform_id)
+
+    @classmethod
+    def mark_stale(cls, xform_id):
+        """Marks the form's schema stale until it is rebuilt."""
+        cls.objects.filter(xform_id=xform_id).update(
+            is_stale=True, version=F('version') + 1)
+
+    @classmethod
+    def start_rebuild(cls, xform_id):
+        """
+        Empties the form's schema before its submissions are counted.
+        Submissions added while they are counted are added to the schema.
+
+        :return: The version of the schema to pass to finish_rebuild.
+        """
+        with transaction.atomic():
+            schema, _created = cls.objects.select_for_update().get_or_create(
+                xform_id=xform_id)
+            schema.repeat_counts = {}
+            schema.is_stale = True
+            schema.version += 1
+            schema.save()
+
+        return schema.version
+
+    @classmethod
+    def finish_rebuild(cls, xform_id, version, counts):
+        """
+        Adds the repeat counts of all the form's submissions to the schema
+        and marks it up to date, unless it was marked stale since
+        start_rebuild.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                MERGE_REPEAT_COUNTS_SQL + ", is_stale = false "
+                "WHERE xform_id = %s AND version = %s",
+                [json.dumps(counts), xform_id, version])
+
+
+def create_column_schema(sender, instance=None, created=False, **kwargs):
+    """A new form has no submissions, its schema is empty."""
+    if created:
+        ColumnSchema.objects.get_or_create(xform=instance)
+
+
+post_save.connect(create_column_schema, sender=XForm,
+                  dispatch_uid='create_column_schema')
@@ -25,6 +25,7 @@ from onadata.libs.utils.cache_tools import (DATAVIEW_COUNT,
 from onadata.libs.utils.common_tags import (ATTACHMENTS, EDITED, GEOLOCATION,
                                             ID, LAST_EDITED, MONGO_STRFTIME,
                                             NOTES, SUBMISSION_TIME)
+from onadata.libs.utils.model_tools import iter_query_rows
 
 SUPPORTED_FILTERS = ['=', '>', '<', '>=', '<=', '<>', '!=']
 ATTACHMENT_TYPES = ['photo', 'audio', 'video']
@@ -245,7 +246,6 @@ class DataView(models.Model):
 
     @classmethod
     def query_iterator(cls, sql, fields=None, params=[], count=False):
-        cursor = connection.cursor()
         sql_params = tuple(
             i if isinstance(i, tuple) else text(i) for i in params)
 
@@ -260,17 +260,18 @@ class DataView(models.Model):
 
             fields = [u'count']
 
-        cursor.execute(sql, sql_params)
+        # stream the rows through a server-side cursor
+        rows = iter_query_rows(sql, sql_params, server_side=not count)
 
         if fields is None:
-            for row in cursor.fetchall():
+            for row in rows:
                 yield row[0]
         else:
             if count:
-                for row in cursor.fetchall():
+                for row in rows:
                     yield dict(zip(fields, row))
             else:
-                for row in cursor.fetchall():
+                for row in rows:
                     yield dict(zip(fields, [row[0].get(f) for f in fields]))
 
     @classmethod
@@ -351,12 +352,19 @@ class DataView(models.Model):
     @classmethod
     def query_data(cls, data_view, start_index=None, limit=None, count=None,
                    last_submission_time=False, all_data=False, sort=None,
-                   filter_query=None):
-
+                   filter_query=None, stream=False):
+        """
+        Returns the list of records of the data view or a dict with the
+        error. A generator of the records is returned when stream is True,
+        errors are then raised while iterating over it.
+        """
         (sql, columns, params) = cls.generate_query_string(
             data_view, start_index, limit, last_submission_time,
             all_data, sort, filter_query)
 
+        if stream:
+            return DataView.query_iterator(sql, columns, params, count)
+
         try:
             records = [record for record in DataView.query_iterator(sql,
                                                                     columns,
@@ -10,28 +10,28 @@ from django.contrib.auth.models import User
 from django.contrib.gis.db import models
 from django.contrib.gis.geos import GeometryCollection, Point
 from django.contrib.postgres.fields import JSONField
-from django.db import connection, transaction
+from django.db import transaction
 from django.db.models import Q
 from django.db.models.signals import post_delete, post_save
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import ugettext as _
-from future.utils import python_2_unicode_compatible
+from future.utils import iteritems, python_2_unicode_compatible
 from past.builtins import basestring  # pylint: disable=W0622
 from taggit.managers import TaggableManager
 
+from onadata.apps.logger.models.column_schema import (ColumnSchema,
+                                                      get_repeat_counts)
 from onadata.apps.logger.models.submission_review import SubmissionReview
 from onadata.apps.logger.models.survey_type import SurveyType
 from onadata.apps.logger.models.xform import XFORM_TITLE_LENGTH, XForm
-from onadata.apps.logger.xform_instance_parser import (XFormInstanceParser,
-                                                       clean_and_parse_xml,
-                                                       get_uuid_from_xml)
+from onadata.apps.logger.xform_instance_parser import (
+    SubmissionXML, XFormInstanceParser, clean_and_parse_xml,
+    get_id_string_from_xml_obj, get_uuid_from_xml)
 from onadata.celery import app
 from onadata.libs.data.query import get_numeric_fields
-from onadata.libs.utils.cache_tools import (DATAVIEW_COUNT, IS_ORG,
-                                            PROJ_NUM_DATASET_CACHE,
-                                            PROJ_SUB_DATE_CACHE, XFORM_COUNT,
-                                            XFORM_DATA_VERSIONS, safe_delete)
+from onadata.libs.utils.cache_tools import (IS_ORG, bump_xform_data_version,
+                                            safe_delete)
 from onadata.libs.utils.common_tags import (ATTACHMENTS, BAMBOO_DATASET_ID,
                                             DELETEDAT, DURATION, EDITED, END,
                                             GEOLOCATION, ID, LAST_EDITED,
@@ -42,6 +42,7 @@ from onadata.libs.utils.common_tags import (ATTACHMENTS, BAMBOO_DATASET_ID,
                                             TAGS, TOTAL_MEDIA, UUID, VERSION,
                                             XFORM_ID, XFORM_ID_STRING,
                                             REVIEW_COMMENT)
+from onadata.libs.utils.counter_tools import increment_submission_count
 from onadata.libs.utils.dict_tools import get_values_matching_key
 from onadata.libs.utils.model_tools import set_uuid
 from onadata.libs.utils.timing import calculate_duration
@@ -49,6 +50,25 @@ from onadata.libs.utils.timing import calculate_duration
 ASYNC_POST_SUBMISSION_PROCESSING_ENABLED = \
     getattr(settings, 'ASYNC_POST_SUBMISSION_PROCESSING_ENABLED', False)
 
+# the inputs of the json of an instance that are not fields of the instance,
+# mark them changed with Instance.mark_changed before saving the instance
+RELATED_INPUTS = ('attachments', 'tags', 'notes', 'review')
+# the fields of an instance that the json, geom and survey type are derived
+# from and the input each one is part of
+TRACKED_FIELDS = {
+    'xml': 'xml',
+    'deleted_at': 'deletion',
+    'has_a_review': 'review',
+    'date_created': 'fields',
+    'last_edited': 'fields',
+    'status': 'fields',
+    'user_id': 'fields',
+    'uuid': 'fields',
+    'total_media': 'fields',
+    'media_count': 'fields',
+    'media_all_received': 'fields',
+}
+
 
 def get_attachment_url(attachment, suffix=None):
     kwargs = {'pk': attachment.pk}
@@ -118,25 +138,10 @@ def numeric_checker(string_value):
 
 
 def get_id_string_from_xml_str(xml_str):
-    xml_obj = clean_and_parse_xml(xml_str)
-    root_node = xml_obj.documentElement
-    id_string = root_node.getAttribute(u"id")
-
-    if len(id_string) == 0:
-        # may be hidden in submission/data/id_string
-        elems = root_node.getElementsByTagName('data')
-
-        for data in elems:
-            for child in data.childNodes:
-                id_string = data.childNodes[0].getAttribute('id')
-
-                if len(id_string) > 0:
-                    break
+    if isinstance(xml_str, SubmissionXML):
+        return xml_str.id_string
 
-            if len(id_string) > 0:
-                break
-
-    return id_string
+    return get_id_string_from_xml_obj(clean_and_parse_xml(xml_str))
 
 
 def submission_time():
@@ -149,72 +154,45 @@ def update_xform_submission_count(instance_id, created):
     if created:
         try:
             instance = Instance.objects.select_related('xform').only(
-                'xform__user_id', 'date_created').get(pk=instance_id)
+                'xform__user_id', 'xform__project_id', 'date_created').get(
+                    pk=instance_id)
         except Instance.DoesNotExist:
             pass
         else:
-            # update xform.num_of_submissions
-            cursor = connection.cursor()
-            sql = (
-                'UPDATE logger_xform SET '
-                'num_of_submissions = num_of_submissions + 1, '
-                'last_submission_time = %s '
-                'WHERE id = %s'
-            )
-            params = [instance.date_created, instance.xform_id]
-
-            # update user profile.num_of_submissions
-            cursor.execute(sql, params)
-            sql = (
-                'UPDATE main_userprofile SET '
-                'num_of_submissions = num_of_submissions + 1 '
-                'WHERE user_id = %s'
-            )
-            cursor.execute(sql, [instance.xform.user_id])
-
-            safe_delete('{}{}'.format(XFORM_DATA_VERSIONS, instance.xform_id))
-            safe_delete('{}{}'.format(DATAVIEW_COUNT, instance.xform_id))
-            safe_delete('{}{}'.format(XFORM_COUNT, instance.xform_id))
-            # Clear project cache
-            from onadata.apps.logger.models.xform import clear_project_cache
-            clear_project_cache(instance.xform.project_id)
+            increment_submission_count(
+                instance.xform, 1, instance.date_created)
 
 
 def update_xform_submission_count_delete(sender, instance, **kwargs):
+    bump_xform_data_version(instance.xform_id)
+    if instance.deleted_at is None:
+        ColumnSchema.remove_repeat_counts(
+            instance.xform_id, get_repeat_counts(instance.json))
     try:
-        xform = XForm.objects.select_for_update().get(pk=instance.xform.pk)
+        xform = XForm.objects.get(pk=instance.xform_id)
     except XForm.DoesNotExist:
         pass
     else:
-        xform.num_of_submissions -= 1
-        if xform.num_of_submissions < 0:
-            xform.num_of_submissions = 0
-        xform.save(update_fields=['num_of_submissions'])
-        profile_qs = User.profile.get_queryset()
-        try:
-            profile = profile_qs.select_for_update()\
-                .get(pk=xform.user.profile.pk)
-        except profile_qs.model.DoesNotExist:
-            pass
-        else:
-            profile.num_of_submissions -= 1
-            if profile.num_of_submissions < 0:
-                profile.num_of_submissions = 0
-            profile.save()
-
-        for a in [PROJ_NUM_DATASET_CACHE, PROJ_SUB_DATE_CACHE]:
-            safe_delete('{}{}'.format(a, xform.project.pk))
-
+        increment_submission_count(xform, -1)
         safe_delete('{}{}'.format(IS_ORG, xform.pk))
-        safe_delete('{}{}'.format(XFORM_DATA_VERSIONS, xform.pk))
-        safe_delete('{}{}'.format(DATAVIEW_COUNT, xform.pk))
-        safe_delete('{}{}'.format(XFORM_COUNT, xform.pk))
 
         if xform.instances.exclude(geom=None).count() < 1:
             xform.instances_with_geopoints = False
             xform.save()
 
 
+def _save_full_json(instance):
+    # pylint: disable=protected-access
+    instance.json = instance.get_full_dict()
+    # a queryset update does not run the post save processing of the
+    # submission again, nor set the auto_now date_modified
+    instance.date_modified = timezone.now()
+    Instance.objects.filter(pk=instance.pk).update(
+        json=instance.json, date_modified=instance.date_modified)
+    instance._set_saved_values(['json'])
+    bump_xform_data_version(instance.xform_id)
+
+
 @app.task
 def save_full_json(instance_id, created):
     """set json data, ensure the primary key is part of the json data"""
@@ -224,8 +202,7 @@ def save_full_json(instance_id, created):
         except Instance.DoesNotExist:
             pass
         else:
-            instance.json = instance.get_full_dict()
-            instance.save(update_fields=['json'])
+            _save_full_json(instance)
 
 
 @app.task
@@ -314,53 +291,79 @@ class InstanceBaseClass(object):
         # pylint: disable=no-member
         if self.id:
             doc.update({
-                UUID: self.uuid,
-                ID: self.id,
-                BAMBOO_DATASET_ID: self.xform.bamboo_dataset,
-                ATTACHMENTS: _get_attachments_from_instance(self),
-                STATUS: self.status,
-                TAGS: list(self.tags.names()),
-                NOTES: self.get_notes(),
-                VERSION: self.version,
                 DURATION: self.get_duration(),
                 XFORM_ID_STRING: self._parser.get_xform_id_string(),
-                XFORM_ID: self.xform.pk,
                 GEOLOCATION: [self.point.y, self.point.x] if self.point
                 else [None, None],
-                SUBMITTED_BY: self.user.username if self.user else None
             })
+            doc.update(self._get_fields_dict())
+            doc.update(self._get_related_dict(RELATED_INPUTS))
+        return doc
 
-            for osm in self.osm_data.all():
-                doc.update(osm.get_tags_with_prefix())
-
-            if isinstance(self.deleted_at, datetime):
-                doc[DELETEDAT] = self.deleted_at.strftime(MONGO_STRFTIME)
+    def _get_fields_dict(self):
+        """
+        Returns the metadata of the json that is read from the fields of the
+        instance.
+        """
+        # pylint: disable=no-member
+        doc = {
+            UUID: self.uuid,
+            ID: self.id,
+            BAMBOO_DATASET_ID: self.xform.bamboo_dataset,
+            STATUS: self.status,
+            VERSION: self.version,
+            XFORM_ID: self.xform.pk,
+            SUBMITTED_BY: self.user.username if self.user else None
+        }
+
+        if isinstance(self.deleted_at, datetime):
+            doc[DELETEDAT] = self.deleted_at.strftime(MONGO_STRFTIME)
+
+        # pylint: disable=attribute-defined-outside-init
+        if not self.date_created:
+            self.date_created = submission_time()
+
+        doc[SUBMISSION_TIME] = self.date_created.strftime(MONGO_STRFTIME)
+
+        doc[TOTAL_MEDIA] = self.total_media
+        doc[MEDIA_COUNT] = self.media_count
+        doc[MEDIA_ALL_RECEIVED] = self.media_all_received
+
+        edited = False
+        if hasattr(self, 'last_edited'):
+            edited = self.last_edited is not None
+
+        doc[EDITED] = edited
+        edited and doc.update({
+            LAST_EDITED: convert_to_serializable_date(self.last_edited)
+        })
 
-            # pylint: disable=no-member
-            if self.has_a_review:
-                status, comment = self.get_review_status_and_comment()
-                doc[REVIEW_STATUS] = status
-                if comment:
-                    doc[REVIEW_COMMENT] = comment
+        return doc
 
-            # pylint: disable=attribute-defined-outside-init
-            if not self.date_created:
-                self.date_created = submission_time()
+    def _get_related_dict(self, inputs):
+        """
+        Returns the metadata of the json that is read from the attachments,
+        tags, notes and reviews of the instance in `inputs`.
+        """
+        doc = {}
+        # pylint: disable=no-member
+        if 'attachments' in inputs:
+            doc[ATTACHMENTS] = _get_attachments_from_instance(self)
+            for osm in self.osm_data.all():
+                doc.update(osm.get_tags_with_prefix())
 
-            doc[SUBMISSION_TIME] = self.date_created.strftime(MONGO_STRFTIME)
+        if 'tags' in inputs:
+            doc[TAGS] = list(self.tags.names())
 
-            doc[TOTAL_MEDIA] = self.total_media
-            doc[MEDIA_COUNT] = self.media_count
-            doc[MEDIA_ALL_RECEIVED] = self.media_all_received
+        if 'notes' in inputs:
+            doc[NOTES] = self.get_notes()
 
-            edited = False
-            if hasattr(self, 'last_edited'):
-                edited = self.last_edited is not None
+        if 'review' in inputs and self.has_a_review:
+            status, comment = self.get_review_status_and_comment()
+            doc[REVIEW_STATUS] = status
+            if comment:
+                doc[REVIEW_COMMENT] = comment
 
-            doc[EDITED] = edited
-            edited and doc.update({
-                LAST_EDITED: convert_to_serializable_date(self.last_edited)
-            })
         return doc
 
     def _set_parser(self):
@@ -368,9 +371,18 @@ class InstanceBaseClass(object):
             # pylint: disable=no-member
             self._parser = XFormInstanceParser(self.xml, self.xform)
 
+    def set_submission_xml(self, submission):
+        """
+        Use an already parsed SubmissionXML as this instance's XML to avoid
+        parsing the same XML again.
+        """
+        # pylint: disable=attribute-defined-outside-init
+        self.xml = submission.xml
+        # pylint: disable=no-member
+        self._parser = XFormInstanceParser(submission, self.xform)
+
     def _set_survey_type(self):
-        self.survey_type, created = \
-            SurveyType.objects.get_or_create(slug=self.get_root_node_name())
+        self.survey_type = SurveyType.get_by_slug(self.get_root_node_name())
 
     def _set_uuid(self):
         # pylint: disable=no-member, attribute-defined-outside-init
@@ -489,6 +501,13 @@ class Instance(models.Model, InstanceBaseClass):
         app_label = 'logger'
         unique_together = ('xform', 'uuid')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Instance, cls).from_db(db, field_names, values)
+        instance._set_saved_values()
+
+        return instance
+
     @classmethod
     def set_deleted_at(cls, instance_id, deleted_at=timezone.now(), user=None):
         try:
@@ -557,6 +576,75 @@ class Instance(models.Model, InstanceBaseClass):
             name__in=self.get_expected_media()
         ).distinct('name').order_by('name').count()
 
+    def _set_saved_values(self, update_fields=None):
+        """
+        Records the values of the tracked fields as saved and clears the
+        changed inputs once the json is saved.
+        """
+        # pylint: disable=attribute-defined-outside-init
+        if not hasattr(self, '_saved_values'):
+            self._saved_values = {}
+        if update_fields is not None:
+            update_fields = set(
+                self._meta.get_field(name).attname for name in update_fields)
+        for field in TRACKED_FIELDS:
+            # deferred fields that were not loaded are not tracked
+            if field in self.__dict__ and \
+                    (update_fields is None or field in update_fields):
+                self._saved_values[field] = self.__dict__[field]
+        if update_fields is None or 'json' in update_fields:
+            self._changed_inputs = set()
+
+    def mark_changed(self, *inputs):
+        """
+        Marks inputs of the json that are not fields of the instance, i.e.
+        its attachments, tags, notes or reviews, changed for the next save.
+        """
+        # pylint: disable=attribute-defined-outside-init
+        if not hasattr(self, '_changed_inputs'):
+            self._changed_inputs = set()
+        self._changed_inputs.update(inputs)
+
+    def get_changed_inputs(self):
+        """
+        Returns the inputs of the json, geom and survey type that changed
+        since the instance was loaded or saved.
+        """
+        changed = set(getattr(self, '_changed_inputs', ()))
+        for (field, value) in iteritems(getattr(self, '_saved_values', {})):
+            if self.__dict__.get(field, value) != value:
+                changed.add(TRACKED_FIELDS[field])
+
+        return changed
+
+    def _set_json(self, changed=None):
+        """
+        Sets the json of the instance, only the metadata read from the
+        inputs in `changed` and from the fields of the instance is read
+        again when the XML did not change.
+
+        A save without changed inputs reads all the attachments, tags, notes
+        and reviews again.
+        """
+        # pylint: disable=no-member
+        if changed is None or 'xml' in changed or not self.id or \
+                self.json.get(ID) != self.id:
+            self.json = self.get_full_dict()
+            return
+
+        doc = dict(self.json)
+        for key in (DELETEDAT, LAST_EDITED):
+            doc.pop(key, None)
+        doc.update(self._get_fields_dict())
+
+        inputs = [name for name in RELATED_INPUTS if name in changed] \
+            if changed else RELATED_INPUTS
+        if 'review' in inputs:
+            for key in (REVIEW_STATUS, REVIEW_COMMENT):
+                doc.pop(key, None)
+        doc.update(self._get_related_dict(inputs))
+        self.json = doc
+
     def save(self, *args, **kwargs):
         force = kwargs.get('force')
 
@@ -565,14 +653,19 @@ class Instance(models.Model, InstanceBaseClass):
 
         self._check_is_merged_dataset()
         self._check_active(force)
-        self._set_geom()
-        self._set_json()
-        self._set_survey_type()
-        self._set_uuid()
+        changed = self.get_changed_inputs()
+        if self._state.adding or 'xml' in changed:
+            self._set_geom()
+            self._set_json()
+            self._set_survey_type()
+            self._set_uuid()
+        else:
+            self._set_json(changed)
         # pylint: disable=no-member
         self.version = self.json.get(VERSION, self.xform.version)
 
         super(Instance, self).save(*args, **kwargs)
+        self._set_saved_values(kwargs.get('update_fields'))
 
     # pylint: disable=no-member
     def set_deleted(self, deleted_at=timezone.now(), user=None):
@@ -596,7 +689,33 @@ class Instance(models.Model, InstanceBaseClass):
         queryset.update(**kwargs)
 
 
+def update_column_schema(instance, created):
+    """
+    Updates the repeat counts of the form's column schema when the
+    submission is added, edited, deleted or restored.
+    """
+    if created:
+        ColumnSchema.add_repeat_counts(
+            instance.xform_id, get_repeat_counts(instance.json))
+        return
+
+    changed = instance.get_changed_inputs()
+    if instance.deleted_at is not None:
+        if 'deletion' in changed:
+            ColumnSchema.remove_repeat_counts(
+                instance.xform_id, get_repeat_counts(instance.json))
+    elif 'xml' in changed:
+        # the edit may have removed repeats
+        ColumnSchema.mark_stale(instance.xform_id)
+    elif 'deletion' in changed:
+        ColumnSchema.add_repeat_counts(
+            instance.xform_id, get_repeat_counts(instance.json))
+
+
 def post_save_submission(sender, instance=None, created=False, **kwargs):
+    bump_xform_data_version(instance.xform_id)
+    update_column_schema(instance, created)
+
     if ASYNC_POST_SUBMISSION_PROCESSING_ENABLED:
         update_xform_submission_count.apply_async(args=[instance.pk, created])
         save_full_json.apply_async(args=[instance.pk, created])
@@ -604,7 +723,10 @@ def post_save_submission(sender, instance=None, created=False, **kwargs):
 
     else:
         update_xform_submission_count(instance.pk, created)
-        save_full_json(instance.pk, created)
+        if created:
+            # the json of the saved instance itself is completed so that
+            # later saves of it only read the inputs that changed
+            _save_full_json(instance)
         update_project_date_modified(instance.pk, created)
 
 
@@ -8,7 +8,7 @@ from django.contrib.postgres.fields import JSONField
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
 from django.db.models import Prefetch
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 
@@ -167,3 +167,28 @@ class ProjectGroupObjectPermission(GroupObjectPermissionBase):
     """Guardian model to create direct foreign keys."""
 
     content_object = models.ForeignKey(Project, on_delete=models.CASCADE)
+
+
+def clear_project_permission_matrix(sender, instance=None, **kwargs):
+    """Removes the cached permissions of a project when they change."""
+    from onadata.libs.utils.permission_matrix import \
+        invalidate_permission_matrix
+    invalidate_permission_matrix(Project, [instance.content_object_id])
+
+
+post_save.connect(
+    clear_project_permission_matrix,
+    sender=ProjectUserObjectPermission,
+    dispatch_uid='clear_project_user_permission_matrix')
+post_delete.connect(
+    clear_project_permission_matrix,
+    sender=ProjectUserObjectPermission,
+    dispatch_uid='clear_project_user_permission_matrix')
+post_save.connect(
+    clear_project_permission_matrix,
+    sender=ProjectGroupObjectPermission,
+    dispatch_uid='clear_project_group_permission_matrix')
+post_delete.connect(
+    clear_project_permission_matrix,
+    sender=ProjectGroupObjectPermission,
+    dispatch_uid='clear_project_group_permission_matrix')
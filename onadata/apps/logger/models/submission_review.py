@@ -18,6 +18,7 @@ def update_instance_json_on_save(sender, instance, **kwargs):
     submission_instance = instance.instance
     if not submission_instance.has_a_review:
         submission_instance.has_a_review = True
+    submission_instance.mark_changed('review')
     submission_instance.save()
 
 
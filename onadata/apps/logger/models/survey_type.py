@@ -2,9 +2,15 @@
 """
 Survey type model class
 """
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_migrate
 from django.utils.encoding import python_2_unicode_compatible
 
+# the survey types read in this process by slug, a survey type is added once
+# the transaction that read it commits so that a rolled back survey type is
+# never cached
+_survey_types = {}
+
 
 @python_2_unicode_compatible
 class SurveyType(models.Model):
@@ -18,3 +24,28 @@ class SurveyType(models.Model):
 
     def __str__(self):
         return "SurveyType: %s" % self.slug
+
+    @classmethod
+    def get_by_slug(cls, slug):
+        """
+        Returns the survey type with the slug, creating it if it does not
+        exist. Survey types are cached in the process.
+        """
+        survey_type = _survey_types.get(slug)
+        if survey_type is None:
+            survey_type, _created = cls.objects.get_or_create(slug=slug)
+            transaction.on_commit(
+                lambda: _survey_types.setdefault(slug, survey_type))
+
+        return survey_type
+
+
+def clear_survey_types(sender, **kwargs):
+    """Clears the cached survey types when they are deleted or flushed."""
+    _survey_types.clear()
+
+
+post_delete.connect(clear_survey_types, sender=SurveyType,
+                    dispatch_uid='clear_survey_types')
+post_migrate.connect(clear_survey_types,
+                     dispatch_uid='clear_survey_types_post_migrate')
@@ -38,7 +38,7 @@ from onadata.libs.utils.cache_tools import (IS_ORG, PROJ_BASE_FORMS_CACHE,
                                             PROJ_NUM_DATASET_CACHE,
                                             PROJ_SUB_DATE_CACHE, XFORM_COUNT,
                                             PROJ_OWNER_CACHE, safe_delete)
-from onadata.libs.utils.common_tags import (DURATION, ID, KNOWN_MEDIA_TYPES,
+from onadata.libs.utils.common_tags import (DURATION, ID,
                                             MEDIA_ALL_RECEIVED, MEDIA_COUNT,
                                             NOTES, SUBMISSION_TIME,
                                             SUBMITTED_BY, TAGS, TOTAL_MEDIA,
@@ -47,6 +47,9 @@ from onadata.libs.utils.common_tags import (DURATION, ID, KNOWN_MEDIA_TYPES,
                                             MULTIPLE_SELECT_TYPE)
 from onadata.libs.utils.model_tools import queryset_iterator
 from onadata.libs.utils.mongo import _encode_for_mongo
+from onadata.libs.utils.survey_cache import (CompiledSurvey,
+                                             get_compiled_survey,
+                                             invalidate_survey)
 
 QUESTION_TYPES_TO_EXCLUDE = [
     u'note',
@@ -300,21 +303,43 @@ class XFormMixin(object):
 
         return id_string
 
+    def _build_survey(self):
+        try:
+            builder = SurveyElementBuilder()
+            return builder.create_survey_element_from_json(self.json)
+        except ValueError:
+            xml = b(bytearray(self.xml, encoding='utf-8'))
+            return create_survey_element_from_xml(xml)
+
+    def get_compiled_survey(self):
+        """
+        Returns the survey of the form with indexes of its elements, from
+        the process' cache for a saved form.
+        """
+        compiled = getattr(self, '_compiled_survey', None)
+        survey = getattr(self, '_survey', None)
+        if compiled is None or \
+                (survey is not None and survey is not compiled.survey):
+            if survey is None and self.pk and getattr(self, 'hash', None):
+                compiled = get_compiled_survey(
+                    self.pk, self.hash, self._build_survey)
+            else:
+                compiled = CompiledSurvey(
+                    self._build_survey() if survey is None else survey)
+            self._compiled_survey = compiled
+            self._survey = compiled.survey
+
+        return compiled
+
     def get_survey(self):
         if not hasattr(self, "_survey"):
-            try:
-                builder = SurveyElementBuilder()
-                self._survey = \
-                    builder.create_survey_element_from_json(self.json)
-            except ValueError:
-                xml = b(bytearray(self.xml, encoding='utf-8'))
-                self._survey = create_survey_element_from_xml(xml)
+            self._survey = self.get_compiled_survey().survey
         return self._survey
 
     survey = property(get_survey)
 
     def get_survey_elements(self):
-        return self.survey.iter_descendants()
+        return iter(self.get_compiled_survey().elements)
 
     def get_survey_element(self, name_or_xpath):
         """Searches survey element by xpath first,
@@ -327,12 +352,7 @@ class XFormMixin(object):
             return element
 
         # search by name if xpath fails
-        fields = [
-            field for field in self.get_survey_elements()
-            if field.name == name_or_xpath
-        ]
-
-        return fields[0] if len(fields) else None
+        return self.get_compiled_survey().elements_by_name.get(name_or_xpath)
 
     def get_child_elements(self, name_or_xpath, split_select_multiples=True):
         """Returns a list of survey elements children in a flat list.
@@ -396,12 +416,7 @@ class XFormMixin(object):
         ]
 
     def geopoint_xpaths(self):
-        survey_elements = self.get_survey_elements()
-
-        return [
-            e.get_abbreviated_xpath() for e in survey_elements
-            if e.bind.get(u'type') == u'geopoint'
-        ]
+        return list(self.get_compiled_survey().geopoint_xpaths)
 
     def xpath_of_first_geopoint(self):
         geo_xpaths = self.geopoint_xpaths()
@@ -417,6 +432,11 @@ class XFormMixin(object):
         Return a list of XPaths for this survey that will be used as
         headers for the csv export.
         """
+        if survey_element is None and result is None and not prefix:
+            return list(self.get_compiled_survey().get_derived(
+                ('xpaths', repeat_iterations),
+                lambda: self.xpaths(survey_element=self.survey,
+                                    repeat_iterations=repeat_iterations)))
         if survey_element is None:
             survey_element = self.survey
         elif question_types_to_exclude(survey_element.type):
@@ -482,7 +502,8 @@ class XFormMixin(object):
             xpath_list = xpath.split('/')
             return '/'.join(xpath_list[2:])
 
-        header_list = [shorten(xpath) for xpath in self.xpaths()]
+        header_list = list(self.get_compiled_survey().get_derived(
+            'headers', lambda: [shorten(xpath) for xpath in self.xpaths()]))
         header_list += [
             ID, UUID, SUBMISSION_TIME, TAGS, NOTES, REVIEW_STATUS,
             REVIEW_COMMENT, VERSION, DURATION, SUBMITTED_BY, TOTAL_MEDIA,
@@ -499,16 +520,11 @@ class XFormMixin(object):
         return [remove_first_index(header) for header in self.get_headers()]
 
     def get_element(self, abbreviated_xpath):
-        if not hasattr(self, "_survey_elements"):
-            self._survey_elements = {}
-            for e in self.get_survey_elements():
-                self._survey_elements[e.get_abbreviated_xpath()] = e
-
         def remove_all_indices(xpath):
             return re.sub(r"\[\d+\]", u"", xpath)
 
         clean_xpath = remove_all_indices(abbreviated_xpath)
-        return self._survey_elements.get(clean_xpath)
+        return self.get_compiled_survey().elements_by_xpath.get(clean_xpath)
 
     def get_default_language(self):
         if not hasattr(self, '_default_language'):
@@ -542,10 +558,7 @@ class XFormMixin(object):
             return label
 
     def get_xpath_cmp(self):
-        if not hasattr(self, "_xpaths"):
-            self._xpaths = [
-                e.get_abbreviated_xpath() for e in self.survey_elements
-            ]
+        positions = self.get_compiled_survey().xpath_positions
 
         def xpath_cmp(x, y):
             # For the moment, we aren't going to worry about repeating
@@ -554,13 +567,13 @@ class XFormMixin(object):
             new_y = re.sub(r"\[\d+\]", u"", y)
             if new_x == new_y:
                 return cmp(x, y)
-            if new_x not in self._xpaths and new_y not in self._xpaths:
+            if new_x not in positions and new_y not in positions:
                 return 0
-            elif new_x not in self._xpaths:
+            elif new_x not in positions:
                 return 1
-            elif new_y not in self._xpaths:
+            elif new_y not in positions:
                 return -1
-            return cmp(self._xpaths.index(new_x), self._xpaths.index(new_y))
+            return cmp(positions[new_x], positions[new_y])
 
         return xpath_cmp
 
@@ -624,9 +637,8 @@ class XFormMixin(object):
             self.has_start_time = False
 
     def get_survey_elements_of_type(self, element_type):
-        return [
-            e for e in self.get_survey_elements() if e.type == element_type
-        ]
+        return list(
+            self.get_compiled_survey().elements_by_type.get(element_type, []))
 
     def get_survey_elements_with_choices(self):
         if not hasattr(self, '_survey_elements_with_choices'):
@@ -645,10 +657,9 @@ class XFormMixin(object):
         Returns abbreviated_xpath for SELECT_ONE questions in the survey.
         """
         if not hasattr(self, '_select_one_xpaths'):
-            self._select_one_xpaths = [
-                e.get_abbreviated_xpath() for e in sum([
-                    self.get_survey_elements_of_type(select)
-                    for select in [constants.SELECT_ONE]], [])]
+            self._select_one_xpaths = \
+                self.get_compiled_survey().get_xpaths_of_type(
+                    constants.SELECT_ONE)
 
         return self._select_one_xpaths
 
@@ -658,28 +669,32 @@ class XFormMixin(object):
         survey.
         """
         if not hasattr(self, '_select_multiple_xpaths'):
-            self._select_multiple_xpaths = [
-                e.get_abbreviated_xpath() for e in sum([
-                    self.get_survey_elements_of_type(select)
-                    for select in [constants.SELECT_ALL_THAT_APPLY]], [])]
+            self._select_multiple_xpaths = list(
+                self.get_compiled_survey().select_multiple_choices)
 
         return self._select_multiple_xpaths
 
+    def get_select_multiple_choices(self):
+        """
+        Returns the choice names of the SELECT_ALL_THAT_APPLY questions in
+        the survey by abbreviated_xpath.
+        """
+        return self.get_compiled_survey().select_multiple_choices
+
+    def get_repeat_xpaths(self):
+        """
+        Returns abbreviated_xpath for the repeats in the survey.
+        """
+        return list(self.get_compiled_survey().repeat_xpaths)
+
     def get_media_survey_xpaths(self):
-        return [
-            e.get_abbreviated_xpath()
-            for e in sum([
-                self.get_survey_elements_of_type(m) for m in KNOWN_MEDIA_TYPES
-            ], [])
-        ]
+        return list(self.get_compiled_survey().media_xpaths)
 
     def get_osm_survey_xpaths(self):
         """
         Returns abbreviated_xpath for OSM question types in the survey.
         """
-        return [
-            elem.get_abbreviated_xpath()
-            for elem in self.get_survey_elements_of_type('osm')]
+        return list(self.get_compiled_survey().osm_xpaths)
 
 
 @python_2_unicode_compatible
@@ -935,6 +950,13 @@ class XForm(XFormMixin, BaseModel):
 
     def submission_count(self, force_update=False):
         if self.num_of_submissions == 0 or force_update:
+            if force_update:
+                from onadata.libs.utils.counter_tools import (
+                    flush_submission_count, is_submission_count_buffered)
+                if is_submission_count_buffered():
+                    # apply buffered changes so that they are not counted
+                    # again after the count is reconciled
+                    flush_submission_count(self.pk)
             if self.is_merged_dataset:
                 count = self.mergedxform.xforms.aggregate(
                     num=Sum('num_of_submissions')).get('num') or 0
@@ -1068,6 +1090,32 @@ post_delete.connect(
     dispatch_uid='xform_post_delete_callback')
 
 
+def invalidate_compiled_survey(sender, instance=None, **kwargs):
+    """
+    Removes the compiled survey of a saved or deleted form from the process'
+    cache.
+    """
+    invalidate_survey(instance.pk)
+    compiled = getattr(instance, '_compiled_survey', None)
+    if compiled is not None and compiled.key is not None and \
+            compiled.key != (instance.pk, instance.hash):
+        # the form was republished
+        for attr in ['_compiled_survey', '_survey', '_select_one_xpaths',
+                     '_select_multiple_xpaths',
+                     '_survey_elements_with_choices']:
+            instance.__dict__.pop(attr, None)
+
+
+post_save.connect(
+    invalidate_compiled_survey,
+    sender=XForm,
+    dispatch_uid='invalidate_compiled_survey_xform')
+post_delete.connect(
+    invalidate_compiled_survey,
+    sender=XForm,
+    dispatch_uid='invalidate_compiled_survey_xform')
+
+
 class XFormUserObjectPermission(UserObjectPermissionBase):
     """Guardian model to create direct foreign keys."""
 
@@ -1080,6 +1128,31 @@ class XFormGroupObjectPermission(GroupObjectPermissionBase):
     content_object = models.ForeignKey(XForm, on_delete=models.CASCADE)
 
 
+def clear_xform_permission_matrix(sender, instance=None, **kwargs):
+    """Removes the cached permissions of a form when they change."""
+    from onadata.libs.utils.permission_matrix import \
+        invalidate_permission_matrix
+    invalidate_permission_matrix(XForm, [instance.content_object_id])
+
+
+post_save.connect(
+    clear_xform_permission_matrix,
+    sender=XFormUserObjectPermission,
+    dispatch_uid='clear_xform_user_permission_matrix')
+post_delete.connect(
+    clear_xform_permission_matrix,
+    sender=XFormUserObjectPermission,
+    dispatch_uid='clear_xform_user_permission_matrix')
+post_save.connect(
+    clear_xform_permission_matrix,
+    sender=XFormGroupObjectPermission,
+    dispatch_uid='clear_xform_group_permission_matrix')
+post_delete.connect(
+    clear_xform_permission_matrix,
+    sender=XFormGroupObjectPermission,
+    dispatch_uid='clear_xform_group_permission_matrix')
+
+
 def check_xform_uuid(new_uuid):
     """
     Checks if a new_uuid has already been used, if it has it raises the
@@ -1,16 +1,19 @@
 import os
 from builtins import open
 
+from django.core.cache import cache
 from django.core.files.base import File
 from django.core.files.storage import default_storage
 from django.core.management import call_command
 from django.db.utils import DataError
 from django.utils import timezone
+from mock import patch
 
 from onadata.apps.main.tests.test_base import TestBase
 from onadata.apps.logger.models import Attachment, Instance
 from onadata.apps.logger.models.attachment import (get_original_filename,
                                                    upload_to)
+from onadata.libs.utils.cache_tools import ATTACHMENT_THUMBNAILS_PENDING
 from onadata.libs.utils.image_tools import image_url
 
 
@@ -78,6 +81,36 @@ class TestAttachment(TestBase):
                     default_storage.exists(thumbnail))
                 default_storage.delete(thumbnail)
 
+    def test_thumbnails_index(self):
+        """Test the thumbnails are recorded and resolved without storage"""
+        attachment = Attachment.objects.get(pk=self.attachment.pk)
+        self.assertEqual(sorted(attachment.thumbnails),
+                         ['large', 'medium', 'small'])
+
+        with patch('django.core.files.storage.FileSystemStorage.exists') \
+                as exists:
+            url = image_url(attachment, 'medium')
+        self.assertFalse(exists.called)
+        self.assertTrue(url.endswith(attachment.thumbnails['medium']))
+        self.assertTrue(attachment.thumbnails['medium'].endswith(
+            '1335783522563-medium.jpg'))
+
+    @patch('onadata.apps.logger.models.attachment.create_thumbnails.'
+           'apply_async')
+    def test_image_url_while_thumbnails_pending(self, apply_async):
+        """Test the original is returned until the thumbnail is generated"""
+        Attachment.objects.filter(pk=self.attachment.pk).update(thumbnails={})
+        cache.delete('{}{}'.format(ATTACHMENT_THUMBNAILS_PENDING,
+                                   self.attachment.pk))
+        attachment = Attachment.objects.get(pk=self.attachment.pk)
+
+        self.assertEqual(image_url(attachment, 'small'),
+                         attachment.media_file.url)
+        self.assertEqual(image_url(attachment, 'large'),
+                         attachment.media_file.url)
+        # the thumbnails are only requested once
+        apply_async.assert_called_once_with(args=[attachment.pk])
+
     def test_create_thumbnails_command(self):
         call_command("create_image_thumbnails")
         for attachment in Attachment.objects.filter(instance=self.instance):
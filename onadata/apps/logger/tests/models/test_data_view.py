@@ -1,4 +1,5 @@
 import os
+import types
 from builtins import str
 from django.conf import settings
 from django.db import connection
@@ -197,3 +198,16 @@ class TestIntegratedDataView(TestAbstractViewSet):
                                                                 self.count)]
 
         self.assertTrue(self.is_sorted_desc([r.get("age") for r in records]))
+
+    def test_query_data_stream(self):
+        """
+        Test DataView.query_data returns a generator of the records when
+        stream is True.
+        """
+        records = DataView.query_data(self.data_view, all_data=True)
+        streamed = DataView.query_data(self.data_view, all_data=True,
+                                       stream=True)
+
+        self.assertIsInstance(streamed, types.GeneratorType)
+        self.assertTrue(records)
+        self.assertEqual(list(streamed), records)
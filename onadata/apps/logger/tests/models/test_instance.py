@@ -2,7 +2,10 @@ import os
 from datetime import datetime
 from datetime import timedelta
 
+from django.db import connection
 from django.http.request import HttpRequest
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.utils.timezone import utc
 from django_digest.test import DigestAuth
 from mock import patch
@@ -16,7 +19,7 @@ from onadata.apps.viewer.models.parsed_instance import (
 from onadata.libs.serializers.submission_review_serializer import \
     SubmissionReviewSerializer
 from onadata.libs.utils.common_tags import MONGO_STRFTIME, SUBMISSION_TIME, \
-    XFORM_ID_STRING, SUBMITTED_BY
+    XFORM_ID_STRING, SUBMITTED_BY, TAGS, DELETEDAT
 
 
 class TestInstance(TestBase):
@@ -295,3 +298,65 @@ class TestInstance(TestBase):
         string_value = "Hello World"
         result = numeric_checker(string_value)
         self.assertEqual(result, "Hello World")
+
+    def test_submission_query_count(self):
+        """
+        Test a submission saves its instance twice and reads its survey type
+        from the cache.
+        """
+        self._publish_transportation_form_and_submit_instance()
+        with CaptureQueriesContext(connection) as queries:
+            self._submit_transport_instance(1)
+        self.assertEqual(self.response.status_code, 201)
+
+        sql = [query['sql'] for query in queries.captured_queries]
+        self.assertFalse([q for q in sql if 'logger_surveytype' in q])
+        # the complete json of the new instance and the attachment tracking
+        self.assertEqual(
+            len([q for q in sql if q.startswith('UPDATE "logger_instance"')]),
+            2)
+        instance = Instance.objects.order_by('-pk').first()
+        self.assertEqual(instance.json[u'_id'], instance.pk)
+        self.assertEqual(instance.json[u'_attachments'], [])
+
+    def test_save_reads_changed_inputs(self):
+        """
+        Test saving an instance only reads the inputs of its json that
+        changed.
+        """
+        self._publish_transportation_form_and_submit_instance()
+        instance = Instance.objects.first()
+
+        def _get_sql(func):
+            with CaptureQueriesContext(connection) as queries:
+                func()
+            return u' '.join(
+                query['sql'] for query in queries.captured_queries)
+
+        date_created = datetime(2020, 1, 1, tzinfo=utc)
+        instance.date_created = date_created
+        with patch.object(Instance, '_set_geom') as mock_set_geom:
+            sql = _get_sql(instance.save)
+        self.assertFalse(mock_set_geom.called)
+        for table in ['logger_attachment', 'logger_note', 'logger_osmdata',
+                      'taggit_', 'logger_surveytype']:
+            self.assertNotIn(table, sql)
+        self.assertEqual(instance.json[SUBMISSION_TIME],
+                         date_created.strftime(MONGO_STRFTIME))
+
+        instance.tags.add('hello')
+        instance.mark_changed('tags')
+        sql = _get_sql(instance.save)
+        self.assertIn('taggit_', sql)
+        self.assertNotIn('logger_attachment', sql)
+        self.assertEqual(instance.json[TAGS], ['hello'])
+        self.assertEqual(Instance.objects.get(pk=instance.pk).json[TAGS],
+                         ['hello'])
+
+        # a save without changes reads all the related inputs
+        sql = _get_sql(instance.save)
+        self.assertIn('logger_attachment', sql)
+        self.assertIn('logger_note', sql)
+
+        instance.set_deleted(timezone.now())
+        self.assertIn(DELETEDAT, instance.json)
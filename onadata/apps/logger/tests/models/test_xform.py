@@ -12,6 +12,8 @@ from onadata.apps.logger.models.xform import (DuplicateUUIDError,
                                               check_xform_uuid)
 from onadata.apps.main.tests.test_base import TestBase
 from onadata.apps.logger.xform_instance_parser import XLSFormError
+from onadata.libs.utils.survey_cache import (clear_survey_cache,
+                                             get_survey_cache_stats)
 
 
 class TestXForm(TestBase):
@@ -151,6 +153,34 @@ class TestXForm(TestBase):
 
         self.assertEqual(xform.get_child_elements('NoneExistent'), [])
 
+    def test_compiled_survey_cache(self):
+        """
+        Test the survey of a form is built once per form hash.
+        """
+        self._publish_transportation_form()
+        clear_survey_cache()
+
+        xform = XForm.objects.get(pk=self.xform.pk)
+        other = XForm.objects.get(pk=self.xform.pk)
+        self.assertIs(xform.survey, other.survey)
+        self.assertEqual(
+            xform.get_element('transport/available_transportation_types_to_'
+                              'referral_facility').type,
+            'select all that apply')
+        stats = get_survey_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']),
+                         (1, 1, 1))
+
+        # a republished form has a new hash
+        XForm.objects.filter(pk=xform.pk).update(hash='md5:republished')
+        republished = XForm.objects.get(pk=self.xform.pk)
+        self.assertIsNot(republished.survey, xform.survey)
+        self.assertEqual(get_survey_cache_stats()['misses'], 2)
+
+        # saving the form removes its surveys from the cache
+        republished.save()
+        self.assertEqual(get_survey_cache_stats()['size'], 0)
+
     def test_check_xform_uuid(self):
         """
         Test check_xform_uuid(new_uuid).
@@ -1,7 +1,11 @@
 import os.path
+import re
 import shutil
+import threading
 from builtins import open
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from io import BytesIO
+from socketserver import ThreadingMixIn
 
 import requests
 from django.contrib.auth import authenticate
@@ -10,7 +14,7 @@ from django.core.files.uploadedfile import UploadedFile
 from django.test import RequestFactory
 from django.urls import reverse
 from django_digest.test import Client as DigestClient
-from future.moves.urllib.parse import urljoin
+from future.moves.urllib.parse import parse_qs, urljoin, urlparse
 from httmock import HTTMock, urlmatch
 
 from onadata.apps.logger.models import Instance, XForm
@@ -76,6 +80,77 @@ def instances_xml(url, request, **kwargs):
     return response
 
 
+class FakeAggregateHandler(BaseHTTPRequestHandler):
+    """
+    Serves the briefcase api of an Aggregate server with the submissions of
+    the server's form.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, content, content_type='text/xml'):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(content)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        with server.lock:
+            server.requests.append((self.command, url.path, query))
+        base_url = 'http://%s:%s' % server.server_address
+        if url.path.endswith('formList'):
+            self._respond((
+                '<xforms xmlns="http://openrosa.org/xforms/xformsList">'
+                '<xform><formID>fake</formID><name>fake</name>'
+                '<downloadUrl>%s/fake.xml</downloadUrl><manifestUrl/>'
+                '</xform></xforms>' % base_url).encode('utf-8'))
+        elif url.path.endswith('fake.xml'):
+            self._respond(b'<h:html xmlns:h="http://www.w3.org/1999/xhtml"/>')
+        elif url.path.endswith('submissionList'):
+            cursor = int(query['cursor'][0] or 0)
+            num_entries = int(query['numEntries'][0])
+            uuids = server.uuids[cursor:cursor + num_entries]
+            self._respond((
+                '<idChunk xmlns="http://opendatakit.org/submissions">'
+                '<idList>%s</idList><resumptionCursor>%s</resumptionCursor>'
+                '</idChunk>' % (
+                    ''.join('<id>%s</id>' % uuid for uuid in uuids),
+                    cursor + len(uuids))).encode('utf-8'))
+        elif url.path.endswith('downloadSubmission'):
+            uuid = re.search(r'@key=([^\]]+)', query['formId'][0]).group(1)
+            self._respond((
+                '<submission xmlns="http://opendatakit.org/submissions">'
+                '<data><fake id="fake" instanceID="%(uuid)s">'
+                '<photo>photo.jpg</photo></fake></data><mediaFile>'
+                '<filename>photo.jpg</filename><downloadUrl>'
+                '%(url)s/media/%(uuid)s.jpg</downloadUrl></mediaFile>'
+                '</submission>' % {'uuid': uuid, 'url': base_url})
+                .encode('utf-8'))
+        elif url.path.startswith('/media/'):
+            self._respond(url.path.encode('utf-8'), 'image/jpeg')
+        else:
+            self.send_error(404)
+
+
+class FakeAggregateServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, uuids):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), FakeAggregateHandler)
+        self.uuids = uuids
+        self.requests = []
+        self.lock = threading.Lock()
+
+
 class TestBriefcaseClient(TestBase):
 
     def setUp(self):
@@ -154,6 +229,65 @@ class TestBriefcaseClient(TestBase):
             xform__user=self.user, xform__id_string=self.xform.id_string)
         self.assertEqual(instances.count(), 1)
 
+    def test_download_instances_from_aggregate(self):
+        """
+        Test the submissions are pulled concurrently page by page and a pull
+        resumes from the last page pulled.
+        """
+        server = FakeAggregateServer(
+            ['uuid:%d' % i for i in range(5)])
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = 'http://%s:%s/' % server.server_address
+        instances_path = os.path.join(
+            'deno', 'briefcase', 'forms', 'fake', 'instances')
+
+        bc = BriefcaseClient(
+            username='bob', password='bob', url=url, user=self.user,
+            threads=4)
+        bc.download_xforms()
+        bc.download_instances('fake', num_entries=2)
+        self.assertTrue(storage.exists(os.path.join(
+            'deno', 'briefcase', 'forms', 'fake', 'fake.xml')))
+        for i in range(5):
+            self.assertTrue(storage.exists(os.path.join(
+                instances_path, 'uuid%d' % i, 'submission.xml')))
+            self.assertTrue(storage.exists(os.path.join(
+                instances_path, 'uuid%d' % i, 'photo.jpg')))
+        self.assertEqual(
+            [query['cursor'] for (method, path, query) in server.requests
+             if path.endswith('submissionList')],
+            [['0'], ['2'], ['4'], ['5']])
+        self.assertEqual(bc.checkpoint.get_cursor('fake'), '5')
+
+        # only the new submissions are pulled by the next pull
+        server.uuids += ['uuid:5', 'uuid:6']
+        server.requests = []
+        bc = BriefcaseClient(
+            username='bob', password='bob', url=url, user=self.user,
+            threads=4)
+        bc.download_instances('fake', num_entries=2)
+        self.assertEqual(
+            sorted(re.search(r'@key=([^\]]+)', query['formId'][0]).group(1)
+                   for (method, path, query) in server.requests
+                   if path.endswith('downloadSubmission')),
+            ['uuid:5', 'uuid:6'])
+        self.assertTrue(storage.exists(os.path.join(
+            instances_path, 'uuid6', 'photo.jpg')))
+        self.assertEqual(bc.checkpoint.get_cursor('fake'), '7')
+
+        # a restarted pull lists the submissions from the start
+        server.requests = []
+        bc.download_instances('fake', num_entries=2, restart=True)
+        self.assertEqual(
+            [query['cursor'] for (method, path, query) in server.requests
+             if path.endswith('submissionList')],
+            [['0'], ['2'], ['4'], ['6'], ['7']])
+        self.assertEqual(bc.checkpoint.get_cursor('fake'), '7')
+
     def tearDown(self):
         # remove media files
         for username in ['bob', 'deno']:
@@ -8,11 +8,12 @@ from onadata.apps.main.tests.test_base import TestBase
 from onadata.apps.logger.xform_instance_parser import XFormInstanceParser,\
     xpath_from_xml_node
 from onadata.apps.logger.xform_instance_parser import get_uuid_from_xml,\
-    get_meta_from_xml, get_deprecated_uuid_from_xml
+    get_meta_from_xml, get_deprecated_uuid_from_xml, SubmissionXML
 from onadata.libs.utils.common_tags import XFORM_ID_STRING
 from onadata.apps.logger.models.xform import XForm
 from onadata.apps.logger.xform_instance_parser import _xml_node_to_dict,\
-    clean_and_parse_xml
+    clean_and_parse_xml, _get_all_attributes, _InstanceDictBuilder, \
+    EXPAT_ENGINE, MINIDOM_ENGINE
 
 
 XML = u"xml"
@@ -155,6 +156,27 @@ class TestXFormInstanceParser(TestBase):
         deprecatedID = get_deprecated_uuid_from_xml(xml_str)
         self.assertEqual(deprecatedID, "729f173c688e482486a48661700455ff")
 
+    def test_submission_xml_parses_once(self):
+        with open(
+            os.path.join(
+                os.path.dirname(__file__), "..", "fixtures", "tutorial",
+                "instances", "tutorial_2012-06-27_11-27-53_w_uuid_edited.xml"),
+                "rb") as xml_file:
+            xml_str = xml_file.read()
+        submission = SubmissionXML(xml_str)
+        xml_obj = submission.xml_obj
+
+        self.assertEqual(submission.uuid,
+                         "2d8c59eb-94e9-485d-a679-b28ffe2e9b98")
+        self.assertEqual(get_uuid_from_xml(submission), submission.uuid)
+        self.assertEqual(get_deprecated_uuid_from_xml(submission),
+                         "729f173c688e482486a48661700455ff")
+        self.assertEqual(submission.id_string, "tutorial")
+        self.assertIsNone(submission.submission_date)
+        self.assertEqual(submission.xml, xml_str.decode('utf-8'))
+        # the XML document is only parsed once
+        self.assertIs(submission.xml_obj, xml_obj)
+
     def test_parse_xform_nested_repeats_multiple_nodes(self):
         self._create_user_and_login()
         # publish our form which contains some some repeats
@@ -229,3 +251,66 @@ class TestXFormInstanceParser(TestBase):
                 xml_dict['#document']['RW_OUNIS_2016']['S2A']))
             with open(json_file) as file:
                 self.assertEqual(json.loads(file.read()), xml_dict)
+
+    def test_expat_engine_matches_minidom_engine(self):
+        """
+        Test the expat engine builds the same dict, flat dict and attributes
+        as the minidom engine.
+        """
+        self._publish_and_submit_new_repeats()
+        minidom_parser = XFormInstanceParser(
+            self.xml, self.xform, engine=MINIDOM_ENGINE)
+        expat_parser = XFormInstanceParser(
+            self.xml, self.xform, engine=EXPAT_ENGINE)
+
+        self.assertEqual(expat_parser.to_dict(), minidom_parser.to_dict())
+        self.assertEqual(expat_parser.to_flat_dict(),
+                         minidom_parser.to_flat_dict())
+        self.assertEqual(expat_parser.get_attributes(),
+                         minidom_parser.get_attributes())
+        self.assertEqual(expat_parser.get_flat_dict_with_attributes(),
+                         minidom_parser.get_flat_dict_with_attributes())
+        self.assertEqual(expat_parser.get_root_node_name(), u'new_repeats')
+        self.assertEqual(expat_parser.get_root_node().toxml(),
+                         minidom_parser.get_root_node().toxml())
+
+    def test_expat_engine_conformance(self):
+        """
+        Test the expat engine builds the same dict as the minidom engine
+        for every fixture XML document.
+        """
+        fixtures = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "..", "..")
+        xml_documents = [
+            u'<a><b>x<![CDATA[y]]>z</b><b><c>1</c></b></a>',
+            u'<a><b><![CDATA[y]]><![CDATA[w]]></b><c><!--c--></c></a>',
+            u'<a><b>x<!--c-->y</b><b>3</b><d><e>1</e><?pi d?></d></a>',
+            u'<a xmlns="u" xmlns:o="v" k="1"><o:b o:k="2">t</o:b><m/></a>',
+            u'<a><media><file>1</file></media><media><file>2</file></media>'
+            u'</a>']
+        for (path, _dirs, files) in os.walk(fixtures):
+            for name in files:
+                if name.endswith('.xml') and '/fixtures' in path:
+                    with open(os.path.join(path, name), 'rb') as xml_file:
+                        xml_documents.append(xml_file.read())
+
+        checked = 0
+        for xml_str in xml_documents:
+            try:
+                root_node = clean_and_parse_xml(xml_str).documentElement
+            except Exception:  # pylint: disable=broad-except
+                # not every fixture is an XML document
+                continue
+            xpaths = [xpath_from_xml_node(node) for node in
+                      root_node.getElementsByTagName('*')]
+            for (repeats, encrypted) in [([], False), (xpaths, True)]:
+                builder = _InstanceDictBuilder(repeats, encrypted)
+                self.assertEqual(
+                    builder.parse(xml_str),
+                    _xml_node_to_dict(root_node, repeats, encrypted))
+                self.assertEqual(builder.root_name, root_node.nodeName)
+                self.assertEqual(builder.attributes,
+                                 list(_get_all_attributes(root_node)))
+                checked += 1
+
+        self.assertGreater(checked, 100)
@@ -4,12 +4,23 @@ import dateutil.parser
 from builtins import str as text
 from future.utils import python_2_unicode_compatible
 from xml.dom import minidom, Node
+from xml.parsers import expat
 
+from django.conf import settings
 from django.utils.encoding import smart_text, smart_str
 from django.utils.translation import ugettext as _
 
 from onadata.libs.utils.common_tags import XFORM_ID_STRING, VERSION
 
+UUID_REGEX = re.compile(r"uuid:(.*)")
+
+# builds the submission dict from a minidom document
+MINIDOM_ENGINE = 'minidom'
+# builds the submission dict while expat parses the XML
+EXPAT_ENGINE = 'expat'
+SUBMISSION_PARSER_ENGINE = getattr(
+    settings, 'SUBMISSION_PARSER_ENGINE', MINIDOM_ENGINE)
+
 
 class XLSFormError(Exception):
     pass
@@ -53,14 +64,17 @@ class NonUniqueFormIdError(Exception):
     pass
 
 
-def get_meta_from_xml(xml_str, meta_name):
-    xml = clean_and_parse_xml(xml_str)
-    children = xml.childNodes
+def _get_survey_node(xml_obj):
+    children = xml_obj.childNodes
     # children ideally contains a single element
     # that is the parent of all survey elements
     if children.length == 0:
         raise ValueError(_("XML string must have a survey element."))
-    survey_node = children[0]
+    return children[0]
+
+
+def _get_meta_from_xml_obj(xml_obj, meta_name):
+    survey_node = _get_survey_node(xml_obj)
     meta_tags = [n for n in survey_node.childNodes if
                  n.nodeType == Node.ELEMENT_NODE and
                  (n.tagName.lower() == "meta" or
@@ -82,59 +96,102 @@ def get_meta_from_xml(xml_str, meta_name):
         else None
 
 
-def get_uuid_from_xml(xml):
-    def _uuid_only(uuid, regex):
-        matches = regex.match(uuid)
-        if matches and len(matches.groups()) > 0:
-            return matches.groups()[0]
-        return None
-    uuid = get_meta_from_xml(xml, "instanceID")
-    regex = re.compile(r"uuid:(.*)")
+def _uuid_only(uuid):
+    matches = UUID_REGEX.match(uuid)
+    if matches and len(matches.groups()) > 0:
+        return matches.groups()[0]
+    return None
+
+
+def _get_uuid_from_xml_obj(xml_obj):
+    uuid = _get_meta_from_xml_obj(xml_obj, "instanceID")
     if uuid:
-        return _uuid_only(uuid, regex)
+        return _uuid_only(uuid)
     # check in survey_node attributes
-    xml = clean_and_parse_xml(xml)
-    children = xml.childNodes
-    # children ideally contains a single element
-    # that is the parent of all survey elements
-    if children.length == 0:
-        raise ValueError(_("XML string must have a survey element."))
-    survey_node = children[0]
+    survey_node = _get_survey_node(xml_obj)
     uuid = survey_node.getAttribute('instanceID')
     if uuid != '':
-        return _uuid_only(uuid, regex)
+        return _uuid_only(uuid)
     return None
 
 
-def get_submission_date_from_xml(xml):
+def _get_deprecated_uuid_from_xml_obj(xml_obj):
+    uuid = _get_meta_from_xml_obj(xml_obj, "deprecatedID")
+    if uuid:
+        return _uuid_only(uuid)
+    return None
+
+
+def _get_submission_date_from_xml_obj(xml_obj):
     # check in survey_node attributes
-    xml = clean_and_parse_xml(xml)
-    children = xml.childNodes
-    # children ideally contains a single element
-    # that is the parent of all survey elements
-    if children.length == 0:
-        raise ValueError(_("XML string must have a survey element."))
-    survey_node = children[0]
+    survey_node = _get_survey_node(xml_obj)
     submissionDate = survey_node.getAttribute('submissionDate')
     if submissionDate != '':
         return dateutil.parser.parse(submissionDate)
     return None
 
 
+def get_id_string_from_xml_obj(xml_obj):
+    root_node = xml_obj.documentElement
+    id_string = root_node.getAttribute(u"id")
+
+    if len(id_string) == 0:
+        # may be hidden in submission/data/id_string
+        elems = root_node.getElementsByTagName('data')
+
+        for data in elems:
+            for child in data.childNodes:
+                id_string = data.childNodes[0].getAttribute('id')
+
+                if len(id_string) > 0:
+                    break
+
+            if len(id_string) > 0:
+                break
+
+    return id_string
+
+
+def _get_xml_obj(xml):
+    if isinstance(xml, SubmissionXML):
+        return xml.xml_obj
+
+    return clean_and_parse_xml(xml)
+
+
+def get_meta_from_xml(xml_str, meta_name):
+    return _get_meta_from_xml_obj(_get_xml_obj(xml_str), meta_name)
+
+
+def get_uuid_from_xml(xml):
+    if isinstance(xml, SubmissionXML):
+        return xml.uuid
+
+    return _get_uuid_from_xml_obj(clean_and_parse_xml(xml))
+
+
+def get_submission_date_from_xml(xml):
+    if isinstance(xml, SubmissionXML):
+        return xml.submission_date
+
+    return _get_submission_date_from_xml_obj(clean_and_parse_xml(xml))
+
+
 def get_deprecated_uuid_from_xml(xml):
-    uuid = get_meta_from_xml(xml, "deprecatedID")
-    regex = re.compile(r"uuid:(.*)")
-    if uuid:
-        matches = regex.match(uuid)
-        if matches and len(matches.groups()) > 0:
-            return matches.groups()[0]
-    return None
+    if isinstance(xml, SubmissionXML):
+        return xml.deprecated_uuid
 
+    return _get_deprecated_uuid_from_xml_obj(clean_and_parse_xml(xml))
 
-def clean_and_parse_xml(xml_string):
+
+def _clean_xml(xml_string):
     clean_xml_str = xml_string.strip()
     clean_xml_str = re.sub(r">\s+<", u"><", smart_text(clean_xml_str))
-    xml_obj = minidom.parseString(smart_str(clean_xml_str))
+    return smart_str(clean_xml_str)
+
+
+def clean_and_parse_xml(xml_string):
+    xml_obj = minidom.parseString(_clean_xml(xml_string))
     return xml_obj
 
 
@@ -195,6 +252,176 @@ def _xml_node_to_dict(node, repeats=[], encrypted=False):
             return {node.nodeName: value}
 
 
+def _qualified_name(name):
+    # expat reports namespaced names as "uri localname prefix"
+    if ' ' not in name:
+        return name
+    parts = name.split(' ')
+
+    return u'%s:%s' % (parts[2], parts[1]) if len(parts) == 3 else parts[1]
+
+
+class _Element(object):
+    """An open element and the child nodes it has so far."""
+    __slots__ = ('name', 'xpath', 'value', 'nodes', 'last', 'text', 'cdata',
+                 'cdata_open')
+
+    def __init__(self, name, xpath):
+        self.name = name
+        self.xpath = xpath
+        self.value = {}
+        # the number of child nodes and the type of the last one
+        self.nodes = 0
+        self.last = None
+        # the text of the last text node
+        self.text = None
+        # the text of the first CDATA section node
+        self.cdata = None
+        self.cdata_open = False
+
+    def get_value(self):
+        """Returns the value _xml_node_to_dict returns for the element."""
+        if self.nodes == 0:
+            return None
+        if self.nodes == 1 and self.last == Node.TEXT_NODE:
+            return u''.join(self.text)
+        if self.cdata is not None:
+            return u''.join(self.cdata)
+
+        return self.value or None
+
+
+class _InstanceDictBuilder(object):
+    """
+    Builds the dict of a submission from the events of an expat parser.
+
+    The open elements and their xpaths are kept on a stack so that every
+    element is visited once. The dict, root node name and attributes are the
+    same as the ones built from the minidom document of the XML, including
+    the text and CDATA section nodes minidom would create.
+    """
+
+    def __init__(self, repeats=(), encrypted=False):
+        self.repeats = set(repeats)
+        self.encrypted = encrypted
+        self.result = None
+        self.root_name = None
+        self.attributes = []
+        self._stack = []
+        self._namespaces = []
+        self._cdata = False
+        self._cdata_continue = False
+
+    def parse(self, xml_str):
+        """Parses the XML and returns the submission dict."""
+        parser = expat.ParserCreate(namespace_separator=" ")
+        parser.namespace_prefixes = True
+        parser.buffer_text = True
+        parser.ordered_attributes = True
+        parser.specified_attributes = True
+        parser.StartNamespaceDeclHandler = self.start_namespace
+        parser.StartElementHandler = self.start_element
+        parser.EndElementHandler = self.end_element
+        parser.CharacterDataHandler = self.characters
+        parser.StartCdataSectionHandler = self.start_cdata
+        parser.EndCdataSectionHandler = self.end_cdata
+        parser.CommentHandler = self.other_node
+        parser.ProcessingInstructionHandler = self.other_node
+        parser.Parse(_clean_xml(xml_str), True)
+
+        return self.result
+
+    def _add_node(self, node_type):
+        element = self._stack[-1]
+        element.nodes += 1
+        element.last = node_type
+        element.cdata_open = False
+
+        return element
+
+    def start_namespace(self, prefix, uri):
+        self._namespaces.append((prefix, uri))
+
+    def start_element(self, name, attributes):
+        name = _qualified_name(name)
+        if self._stack:
+            parent = self._add_node(Node.ELEMENT_NODE)
+            xpath = name if parent.xpath is None \
+                else parent.xpath + u'/' + name
+        else:
+            self.root_name = name
+            xpath = None
+
+        # minidom adds the namespace declarations before the attributes
+        for (prefix, uri) in self._namespaces:
+            self.attributes.append(
+                (u'xmlns:' + prefix if prefix else u'xmlns', uri))
+        del self._namespaces[:]
+        for i in range(0, len(attributes), 2):
+            self.attributes.append(
+                (_qualified_name(attributes[i]), attributes[i + 1]))
+
+        self._stack.append(_Element(name, xpath))
+
+    def end_element(self, name):
+        element = self._stack.pop()
+        value = element.get_value()
+        if not self._stack:
+            self.result = None if value is None else {element.name: value}
+            return
+        if value is None:
+            return
+
+        parent = self._stack[-1]
+        child_name = element.name
+        # All the photo attachments in an encrypted form use name media
+        if element.xpath in self.repeats or (
+                self.encrypted and parent.xpath is None and
+                child_name == 'media'):
+            parent.value.setdefault(child_name, []).append(value)
+        elif child_name not in parent.value:
+            parent.value[child_name] = value
+        else:
+            # node is repeated, aggregate node values
+            if not isinstance(parent.value[child_name], list):
+                parent.value[child_name] = [parent.value[child_name]]
+            parent.value[child_name].append(value)
+
+    def characters(self, data):
+        if not self._stack:
+            return
+        element = self._stack[-1]
+        if self._cdata:
+            if self._cdata_continue and \
+                    element.last == Node.CDATA_SECTION_NODE:
+                if element.cdata_open:
+                    element.cdata.append(data)
+                return
+            self._add_node(Node.CDATA_SECTION_NODE)
+            self._cdata_continue = True
+            if element.cdata is None:
+                element.cdata = [data]
+                element.cdata_open = True
+        elif element.last == Node.TEXT_NODE:
+            element.text.append(data)
+        else:
+            self._add_node(Node.TEXT_NODE)
+            element.text = [data]
+
+    def start_cdata(self):
+        self._cdata = True
+        self._cdata_continue = False
+
+    def end_cdata(self):
+        self._cdata = False
+        self._cdata_continue = False
+
+    def other_node(self, *args):
+        # comments and processing instructions
+        if self._stack:
+            self._add_node(Node.COMMENT_NODE)
+
+
 def _flatten_dict(d, prefix):
     """
     Return a list of XPath, value pairs.
@@ -293,20 +520,100 @@ def _get_all_attributes(node):
             yield pair
 
 
+class SubmissionXML(object):
+    """
+    A submission's XML that is parsed at most once.
+
+    The parsed document and the values read from it (uuid, deprecated uuid,
+    id_string and submission date) are cached on the object so that every
+    step of the submission pipeline can share a single parse of the XML.
+    """
+
+    def __init__(self, xml):
+        self._xml = xml
+        self._xml_obj = None
+        self._values = {}
+
+    def __str__(self):
+        return self.xml
+
+    @property
+    def raw_xml(self):
+        """The XML as received, str or bytes."""
+        return self._xml
+
+    @property
+    def xml(self):
+        """The XML as a unicode string."""
+        if isinstance(self._xml, bytes):
+            self._xml = self._xml.decode('utf-8')
+
+        return self._xml
+
+    @property
+    def xml_obj(self):
+        """The parsed minidom document."""
+        if self._xml_obj is None:
+            self._xml_obj = clean_and_parse_xml(self._xml)
+
+        return self._xml_obj
+
+    @property
+    def survey_node(self):
+        return _get_survey_node(self.xml_obj)
+
+    def _get_value(self, name, func):
+        if name not in self._values:
+            self._values[name] = func(self.xml_obj)
+
+        return self._values[name]
+
+    @property
+    def uuid(self):
+        return self._get_value('uuid', _get_uuid_from_xml_obj)
+
+    @property
+    def deprecated_uuid(self):
+        return self._get_value(
+            'deprecated_uuid', _get_deprecated_uuid_from_xml_obj)
+
+    @property
+    def submission_date(self):
+        return self._get_value(
+            'submission_date', _get_submission_date_from_xml_obj)
+
+    @property
+    def id_string(self):
+        return self._get_value('id_string', get_id_string_from_xml_obj)
+
+
 class XFormInstanceParser(object):
 
-    def __init__(self, xml_str, data_dictionary):
+    def __init__(self, xml_str, data_dictionary, engine=None):
         self.dd = data_dictionary
+        self.engine = engine or SUBMISSION_PARSER_ENGINE
         self.parse(xml_str)
 
     def parse(self, xml_str):
-        self._xml_obj = clean_and_parse_xml(xml_str)
-        self._root_node = self._xml_obj.documentElement
         repeats = [e.get_abbreviated_xpath()
                    for e in self.dd.get_survey_elements_of_type(u"repeat")]
 
-        self._dict = _xml_node_to_dict(self._root_node, repeats,
-                                       self.dd.encrypted)
+        if self.engine == EXPAT_ENGINE:
+            self._xml_str = xml_str
+            self._root_node = None
+            builder = _InstanceDictBuilder(repeats, self.dd.encrypted)
+            self._dict = builder.parse(
+                xml_str.xml if isinstance(xml_str, SubmissionXML)
+                else xml_str)
+            self._root_node_name = builder.root_name
+            all_attributes = builder.attributes
+        else:
+            self._xml_obj = _get_xml_obj(xml_str)
+            self._root_node = self._xml_obj.documentElement
+            self._root_node_name = self._root_node.nodeName
+            self._dict = _xml_node_to_dict(self._root_node, repeats,
+                                           self.dd.encrypted)
+            all_attributes = None
         self._flat_dict = {}
 
         if self._dict is None:
@@ -314,13 +621,18 @@ class XFormInstanceParser(object):
 
         for path, value in _flatten_dict_nest_repeats(self._dict, []):
             self._flat_dict[u"/".join(path[1:])] = value
-        self._set_attributes()
+        self._set_attributes(all_attributes)
 
     def get_root_node(self):
+        if self._root_node is None:
+            # the expat engine does not build a document
+            self._xml_obj = _get_xml_obj(self._xml_str)
+            self._root_node = self._xml_obj.documentElement
+
         return self._root_node
 
     def get_root_node_name(self):
-        return self._root_node.nodeName
+        return self._root_node_name
 
     def get(self, abbreviated_xpath):
         return self.to_flat_dict()[abbreviated_xpath]
@@ -334,9 +646,10 @@ class XFormInstanceParser(object):
     def get_attributes(self):
         return self._attributes
 
-    def _set_attributes(self):
+    def _set_attributes(self, all_attributes=None):
         self._attributes = {}
-        all_attributes = list(_get_all_attributes(self._root_node))
+        if all_attributes is None:
+            all_attributes = list(_get_all_attributes(self._root_node))
         for key, value in all_attributes:
             # Since enketo forms may have the template attribute in
             # multiple xml tags, overriding and log when this occurs
@@ -272,6 +272,9 @@ urlpatterns = [
             XFormSubmissionViewSet.as_view(
                 {'post': 'create', 'head': 'create'}),
             name='submissions'),
+    re_path(r'^(?P<username>\w+)/submission/bulk$',
+            XFormSubmissionViewSet.as_view({'post': 'bulk'}),
+            name='submissions-bulk'),
     re_path(r'^(?P<username>\w+)/bulk-submission$',
             logger_views.bulksubmission),
     re_path(r'^(?P<username>\w+)/bulk-submission-form$',
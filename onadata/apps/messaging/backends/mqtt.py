@@ -4,9 +4,15 @@ Messaging notification backend for MQTT
 """
 from __future__ import unicode_literals
 
+import atexit
 import json
+import logging
+import os
 import ssl
+import threading
+import time
 
+import paho.mqtt.client as mqtt
 import paho.mqtt.publish as publish
 from django.conf import settings
 
@@ -16,6 +22,10 @@ from onadata.apps.messaging.constants import MESSAGE
 from onadata.apps.messaging.constants import PROJECT, USER, XFORM, \
     VERB_TOPIC_DICT
 
+# seconds between logs of the metrics of a connection
+MQTT_METRICS_LOG_INTERVAL = getattr(settings, 'MQTT_METRICS_LOG_INTERVAL',
+                                    300)
+
 
 def get_target_metadata(target_obj):
     """
@@ -71,6 +81,204 @@ def get_payload(instance):
     return json.dumps(payload)
 
 
+class MQTTClient(object):
+    """
+    A long-lived connection of the process to an MQTT broker.
+
+    Messages are published without waiting for the broker, the network
+    thread of the client writes them out in batches. Publishing blocks while
+    `max_inflight` messages are waiting to be written, or to be acknowledged
+    by the broker when their QoS is above 0. The client reconnects when the
+    connection is lost and sends the messages with a QoS above 0 again,
+    messages with a QoS of 0 that were not written are dropped.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, host, port=None, tls=None, keepalive=60,
+                 max_inflight=20, timeout=10, reconnect_delay=(1, 120)):
+        self.host = host
+        self.port = port or 1883
+        self.max_inflight = max_inflight
+        self.timeout = timeout
+        self.connected = threading.Event()
+        self.condition = threading.Condition()
+        # the QoS of the messages in flight by mid
+        self.inflight = {}
+        # mids written or acknowledged before publish returned them
+        self.early = set()
+        self.metrics = dict(published=0, delivered=0, dropped=0, connects=0,
+                            disconnects=0)
+        self.started = time.time()
+        self.last_logged = self.started
+
+        self.client = mqtt.Client()
+        if tls:
+            self.client.tls_set(**tls)
+        self.client.max_inflight_messages_set(max_inflight)
+        self.client.reconnect_delay_set(*reconnect_delay)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_publish = self._on_publish
+        self.client.connect_async(self.host, self.port, keepalive)
+        self.client.loop_start()
+
+    def _on_connect(self, client, userdata, flags, rc):
+        # pylint: disable=unused-argument
+        if rc == mqtt.CONNACK_ACCEPTED:
+            self.metrics['connects'] += 1
+            self.connected.set()
+        else:
+            logging.warning("MQTT broker %s:%s refused the connection: %s",
+                            self.host, self.port, mqtt.connack_string(rc))
+
+    def _on_disconnect(self, client, userdata, rc):
+        # pylint: disable=unused-argument
+        self.connected.clear()
+        with self.condition:
+            self.metrics['disconnects'] += 1
+            dropped = [mid for (mid, qos) in self.inflight.items() if not qos]
+            for mid in dropped:
+                del self.inflight[mid]
+            self.metrics['dropped'] += len(dropped)
+            self.condition.notify_all()
+
+    def _on_publish(self, client, userdata, mid):
+        # pylint: disable=unused-argument
+        with self.condition:
+            if self.inflight.pop(mid, None) is None:
+                self.early.add(mid)
+            else:
+                self.metrics['delivered'] += 1
+            self.condition.notify_all()
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        """
+        Queues a message for the broker.
+
+        :return: The MQTTMessageInfo of the message, None if it was dropped
+                 because the broker could not be reached.
+        """
+        if not self.connected.wait(self.timeout) and not qos:
+            self.metrics['dropped'] += 1
+            logging.warning("Dropped a message for MQTT broker %s:%s, not "
+                            "connected", self.host, self.port)
+            return None
+
+        with self.condition:
+            self.condition.wait_for(
+                lambda: len(self.inflight) < self.max_inflight, self.timeout)
+        # not under the condition, paho holds its locks when it calls
+        # on_publish
+        info = self.client.publish(topic, payload=payload, qos=qos,
+                                   retain=retain)
+        with self.condition:
+            if info.rc == mqtt.MQTT_ERR_SUCCESS or \
+                    (qos and info.rc == mqtt.MQTT_ERR_NO_CONN):
+                # messages with a QoS above 0 are sent once connected
+                self.metrics['published'] += 1
+                if info.mid in self.early:
+                    self.early.discard(info.mid)
+                    self.metrics['delivered'] += 1
+                else:
+                    self.inflight[info.mid] = qos
+            else:
+                self.metrics['dropped'] += 1
+                info = None
+        self._log_metrics()
+
+        return info
+
+    def publish_many(self, messages, qos=0, retain=False):
+        """
+        Queues the (topic, payload) messages for the broker and waits for
+        them to be delivered.
+
+        :return: True if all the messages were delivered.
+        """
+        for (topic, payload) in messages:
+            self.publish(topic, payload, qos=qos, retain=retain)
+
+        return self.flush()
+
+    def flush(self, timeout=None):
+        """
+        Waits for the messages in flight to be delivered.
+
+        :return: True if no message is in flight.
+        """
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: not self.inflight,
+                self.timeout if timeout is None else timeout)
+
+    def close(self, timeout=None):
+        """Delivers the messages in flight and disconnects."""
+        self.flush(timeout)
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def get_metrics(self):
+        """
+        Returns the message counts of the connection and its throughput in
+        delivered messages per second.
+        """
+        with self.condition:
+            metrics = dict(self.metrics, inflight=len(self.inflight))
+        elapsed = time.time() - self.started
+        metrics.update(connected=self.connected.is_set(), elapsed=elapsed,
+                       throughput=metrics['delivered'] / elapsed
+                       if elapsed else 0)
+
+        return metrics
+
+    def _log_metrics(self):
+        now = time.time()
+        if now - self.last_logged >= MQTT_METRICS_LOG_INTERVAL:
+            self.last_logged = now
+            logging.info("MQTT broker %s:%s %s", self.host, self.port,
+                         self.get_metrics())
+
+
+# the clients of this process by connection options
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+def get_client(host, port=None, tls=None, **kwargs):
+    """Returns the connection of this process to the MQTT broker."""
+    global _clients_pid  # pylint: disable=global-statement
+
+    key = (host, port, json.dumps(tls, sort_keys=True, default=str))
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            # the network threads of the clients are not forked
+            _clients.clear()
+            _clients_pid = os.getpid()
+        if key not in _clients:
+            _clients[key] = MQTTClient(host, port, tls, **kwargs)
+
+        return _clients[key]
+
+
+def get_pool_metrics():
+    """Returns the metrics of the connections of this process."""
+    return {'{}:{}'.format(client.host, client.port): client.get_metrics()
+            for client in list(_clients.values())}
+
+
+def close_clients(timeout=None):
+    """Closes the connections of this process to MQTT brokers."""
+    with _clients_lock:
+        if _clients_pid == os.getpid():
+            for client in _clients.values():
+                client.close(timeout)
+        _clients.clear()
+
+
+atexit.register(close_clients)
+
+
 class MQTTBackend(BaseBackend):
     """
     Notification backend for MQTT
@@ -101,6 +309,19 @@ class MQTTBackend(BaseBackend):
         self.qos = options.get('QOS', 0)
         self.retain = options.get('RETAIN', False)
         self.topic_base = options.get('TOPIC_BASE', 'onadata')
+        # publish through a long-lived connection of the process
+        self.persistent = options.get('PERSISTENT', True)
+        self.client_options = dict(
+            keepalive=options.get('KEEPALIVE', 60),
+            max_inflight=options.get('MAX_INFLIGHT', 20),
+            timeout=options.get('TIMEOUT', 10),
+            reconnect_delay=(options.get('MIN_RECONNECT_DELAY', 1),
+                             options.get('MAX_RECONNECT_DELAY', 120)))
+
+    def get_client(self):
+        """Returns the connection of this process to the broker."""
+        return get_client(self.host, self.port, self.cert_info,
+                          **self.client_options)
 
     def get_topic(self, instance):
         """
@@ -139,6 +360,9 @@ class MQTTBackend(BaseBackend):
         topic = self.get_topic(instance)
         payload = get_payload(instance)
         # send it
+        if self.persistent:
+            return self.get_client().publish(
+                topic, payload, qos=self.qos, retain=self.retain)
 
         return publish.single(topic, payload=payload, hostname=self.host,
                               port=self.port, tls=self.cert_info, qos=self.qos,
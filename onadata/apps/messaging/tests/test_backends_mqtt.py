@@ -5,19 +5,118 @@ Tests for MQTT notification backend
 from __future__ import unicode_literals
 
 import json
+import socket
 import ssl
+import struct
+import threading
+import time
 
 from django.test import TestCase
 
 from mock import MagicMock, patch
 
-from onadata.apps.messaging.backends.mqtt import (MQTTBackend, get_payload,
+from onadata.apps.messaging.backends.mqtt import (MQTTBackend, close_clients,
+                                                  get_payload,
                                                   get_target_metadata)
 from onadata.apps.messaging.constants import PROJECT, XFORM
 from onadata.apps.messaging.tests.test_base import (_create_message,
                                                     _create_user)
 
 
+class MQTTBrokerStandIn(object):
+    """
+    A local stand-in for an MQTT broker that accepts connections,
+    acknowledges the published messages and records them.
+    """
+
+    def __init__(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(5)
+        self.port = self.server.getsockname()[1]
+        self.connections = []
+        self.messages = []
+        self.lock = threading.Lock()
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _address = self.server.accept()
+            except OSError:
+                return
+            self.connections.append(conn)
+            thread = threading.Thread(target=self._serve, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def _read(self, conn, size):
+        data = b''
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise EOFError()
+            data += chunk
+
+        return data
+
+    def _serve(self, conn):
+        try:
+            while True:
+                header = self._read(conn, 1)[0]
+                length = shift = 0
+                while True:
+                    byte = self._read(conn, 1)[0]
+                    length |= (byte & 0x7f) << shift
+                    shift += 7
+                    if not byte & 0x80:
+                        break
+                body = self._read(conn, length)
+                packet_type = header >> 4
+                if packet_type == 1:  # CONNECT
+                    conn.sendall(b'\x20\x02\x00\x00')
+                elif packet_type == 3:  # PUBLISH
+                    qos = (header >> 1) & 3
+                    size = struct.unpack('!H', body[:2])[0]
+                    offset = 2 + size + (2 if qos else 0)
+                    with self.lock:
+                        self.messages.append(
+                            (body[2:2 + size].decode(), body[offset:], qos))
+                    if qos == 1:
+                        conn.sendall(b'\x40\x02' + body[2 + size:offset])
+                    elif qos == 2:
+                        conn.sendall(b'\x50\x02' + body[2 + size:offset])
+                elif packet_type == 6:  # PUBREL
+                    conn.sendall(b'\x70\x02' + body[:2])
+                elif packet_type == 12:  # PINGREQ
+                    conn.sendall(b'\xd0\x00')
+                elif packet_type == 14:  # DISCONNECT
+                    break
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def drop_connections(self):
+        """Closes the connections of the clients."""
+        for conn in self.connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def stop(self):
+        """Stops accepting connections and closes them."""
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server.close()
+        self.drop_connections()
+
+
 class TestMQTTBackend(TestCase):
     """
     Test MQTT Backend
@@ -111,6 +210,7 @@ class TestMQTTBackend(TestCase):
         mqtt = MQTTBackend(options={
             'HOST': 'localhost',
             'PORT': 8883,
+            'PERSISTENT': False,
             'SECURE': True,
             'CA_CERT_FILE': 'cacert.pem',
             'CERT_FILE': 'emq.pem',
@@ -132,3 +232,61 @@ class TestMQTTBackend(TestCase):
                  tls_version=ssl.PROTOCOL_TLSv1_2,
                  cert_reqs=ssl.CERT_NONE),
             kwargs['tls'])
+
+    def _wait_for(self, condition, timeout=10):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.05)
+
+        return condition()
+
+    def test_mqtt_send_persistent(self):
+        """
+        Test MQTT Backend send method publishes through one connection
+        """
+        broker = MQTTBrokerStandIn()
+        self.addCleanup(broker.stop)
+        self.addCleanup(close_clients, 1)
+        from_user = _create_user('Bob')
+        to_user = _create_user('Alice')
+        instances = [_create_message(from_user, to_user, 'I love oov %d' % i)
+                     for i in range(3)]
+        options = {'HOST': '127.0.0.1', 'PORT': broker.port, 'QOS': 1}
+
+        for instance in instances:
+            MQTTBackend(options=options).send(instance=instance)
+        client = MQTTBackend(options=options).get_client()
+        self.assertTrue(client.flush(5))
+
+        self.assertEqual(len(broker.connections), 1)
+        self.assertEqual(
+            [(MQTTBackend(options=options).get_topic(instance),
+              get_payload(instance).encode(), 1) for instance in instances],
+            broker.messages)
+        metrics = client.get_metrics()
+        self.assertEqual(metrics['published'], 3)
+        self.assertEqual(metrics['delivered'], 3)
+        self.assertEqual(metrics['inflight'], 0)
+        self.assertTrue(metrics['throughput'] > 0)
+
+    def test_mqtt_client_reconnects(self):
+        """
+        Test the MQTT connection of the process reconnects to the broker
+        """
+        broker = MQTTBrokerStandIn()
+        self.addCleanup(broker.stop)
+        self.addCleanup(close_clients, 1)
+        client = MQTTBackend(options={
+            'HOST': '127.0.0.1', 'PORT': broker.port}).get_client()
+        self.assertTrue(client.publish_many([('/onadata/a', 'a')], qos=1))
+
+        broker.drop_connections()
+        self.assertTrue(self._wait_for(
+            lambda: client.get_metrics()['connects'] == 2))
+        self.assertTrue(client.publish_many(
+            [('/onadata/b', 'b'), ('/onadata/c', 'c')], qos=2))
+        self.assertEqual(
+            [(topic, payload) for (topic, payload, _qos) in broker.messages],
+            [('/onadata/a', b'a'), ('/onadata/b', b'b'),
+             ('/onadata/c', b'c')])
+        self.assertEqual(len(broker.connections), 2)
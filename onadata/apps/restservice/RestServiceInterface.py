@@ -1,3 +1,11 @@
+import requests
+
+
 class RestServiceInterface(object):
+    def __init__(self, session=None, timeout=None):
+        # a pooled requests.Session, or the requests module
+        self.session = session or requests
+        self.timeout = timeout
+
     def send(self, url, data=None):
         raise NotImplementedError
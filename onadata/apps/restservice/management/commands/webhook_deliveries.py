@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+Report the outbox of the rest services and send the submissions in it.
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy
+
+from onadata.apps.restservice.models import Delivery, RestService
+from onadata.apps.restservice.utils import deliver_queued
+
+
+class Command(BaseCommand):
+    help = ugettext_lazy("Report and send the submissions waiting to be "
+                         "sent to rest services")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-d', '--deliver', action='store_true',
+            help=ugettext_lazy("send the submissions that are due"))
+        parser.add_argument(
+            '-r', '--retry-failed', action='store_true',
+            help=ugettext_lazy("queue the failed submissions again"))
+
+    def handle(self, *args, **options):
+        services = RestService.objects.annotate(
+            pending=Count('deliveries',
+                          filter=Q(deliveries__status=Delivery.PENDING)),
+            failed=Count('deliveries',
+                         filter=Q(deliveries__status=Delivery.FAILED)))\
+            .filter(Q(pending__gt=0) | Q(failed__gt=0)).order_by('pk')
+
+        for service in services:
+            if options.get('retry_failed') and service.failed:
+                Delivery.objects.filter(
+                    rest_service=service, status=Delivery.FAILED).update(
+                        status=Delivery.PENDING, attempts=0,
+                        next_attempt=timezone.now())
+            if options.get('deliver'):
+                deliver_queued(service.pk)
+
+            counts = Delivery.objects.filter(rest_service=service).aggregate(
+                pending=Count('pk', filter=Q(status=Delivery.PENDING)),
+                failed=Count('pk', filter=Q(status=Delivery.FAILED)))
+            self.stdout.write(
+                "%s %s: %d pending, %d failed, lag %s" % (
+                    service.pk, service.service_url, counts['pending'],
+                    counts['failed'], service.get_delivery_lag()))
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-18 15:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0063_attachment_thumbnails'),
+        ('restservice', '0005_auto_20190125_0517'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Delivery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('failed', 'failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='logger.Instance')),
+                ('rest_service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='restservice.RestService')),
+            ],
+            options={
+                'index_together': {('rest_service', 'status', 'next_attempt')},
+            },
+        ),
+    ]
@@ -8,6 +8,7 @@ from future.utils import python_2_unicode_compatible
 from django.conf import settings
 from django.db import models
 from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy
 
 from onadata.apps.logger.models.xform import XForm
@@ -60,6 +61,46 @@ class RestService(models.Model):
 
         return service_definition.verbose_name
 
+    def get_delivery_lag(self):
+        """
+        Returns how long the oldest submission waiting to be sent to the
+        service has been waiting, None if no submission is waiting.
+        """
+        oldest = self.deliveries.filter(status=Delivery.PENDING).order_by(
+            'date_created').values_list('date_created', flat=True).first()
+
+        return timezone.now() - oldest if oldest else None
+
+
+@python_2_unicode_compatible
+class Delivery(models.Model):
+    """
+    A submission in the outbox of a rest service, until it is sent.
+    """
+    PENDING = 'pending'
+    # the submission could not be sent in WEBHOOK_MAX_ATTEMPTS attempts
+    FAILED = 'failed'
+    STATUS_CHOICES = ((PENDING, PENDING), (FAILED, FAILED))
+
+    class Meta:
+        app_label = 'restservice'
+        index_together = ('rest_service', 'status', 'next_attempt')
+
+    rest_service = models.ForeignKey(RestService, related_name='deliveries',
+                                     on_delete=models.CASCADE)
+    instance = models.ForeignKey('logger.Instance', on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # the submission is not sent before, the attempt in progress holds it
+    # until then
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return u"%s - %s" % (self.rest_service_id, self.instance_id)
+
 
 def delete_metadata(sender, instance, **kwargs):  # pylint: disable=W0613
     """
@@ -1,7 +1,5 @@
 import json
 
-import requests
-
 from onadata.apps.restservice.RestServiceInterface import RestServiceInterface
 
 
@@ -12,4 +10,5 @@ class ServiceDefinition(RestServiceInterface):
     def send(self, url, submission_instance):
         post_data = json.dumps(submission_instance.json)
         headers = {"Content-Type": "application/json"}
-        requests.post(url, headers=headers, data=post_data)
+        return self.session.post(url, headers=headers, data=post_data,
+                                 timeout=self.timeout)
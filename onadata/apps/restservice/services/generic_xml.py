@@ -1,5 +1,3 @@
-import requests
-
 from onadata.apps.restservice.RestServiceInterface import RestServiceInterface
 
 
@@ -9,4 +7,5 @@ class ServiceDefinition(RestServiceInterface):
 
     def send(self, url, submission_instance):
         headers = {"Content-Type": "application/xml"}
-        requests.post(url, data=submission_instance.xml, headers=headers)
+        return self.session.post(url, data=submission_instance.xml,
+                                 headers=headers, timeout=self.timeout)
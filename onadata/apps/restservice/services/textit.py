@@ -1,5 +1,4 @@
 import json
-import requests
 from future.utils import iteritems
 from six import string_types
 
@@ -34,7 +33,9 @@ class ServiceDefinition(RestServiceInterface):
             headers = {"Content-Type": "application/json",
                        "Authorization": "Token {}".format(token)}
 
-            requests.post(url, headers=headers, data=json.dumps(post_data))
+            return self.session.post(url, headers=headers,
+                                     data=json.dumps(post_data),
+                                     timeout=self.timeout)
 
     def clean_keys_of_slashes(self, record):
         """
@@ -2,10 +2,14 @@
 """
 RestService signals module
 """
+from functools import partial
+
 import django.dispatch
 from django.conf import settings
+from django.db import transaction
 
-from onadata.apps.restservice.tasks import call_service_async
+from onadata.apps.restservice.tasks import schedule_delivery
+from onadata.apps.restservice.utils import deliver_queued, queue_deliveries
 
 ASYNC_POST_SUBMISSION_PROCESSING_ENABLED = \
     getattr(settings, 'ASYNC_POST_SUBMISSION_PROCESSING_ENABLED', False)
@@ -18,11 +22,15 @@ def call_webhooks(sender, **kwargs):  # pylint: disable=W0613
     """
     Call webhooks signal.
     """
-    instance_id = kwargs['instance'].pk
-    if ASYNC_POST_SUBMISSION_PROCESSING_ENABLED:
-        call_service_async.apply_async(args=[instance_id], countdown=1)
-    else:
-        call_service_async(instance_id)
+    for service_id in queue_deliveries(kwargs['instance']):
+        if ASYNC_POST_SUBMISSION_PROCESSING_ENABLED:
+            transaction.on_commit(partial(schedule_delivery, service_id))
+        else:
+            delay = deliver_queued(service_id, kwargs['instance'].pk)
+            if delay is not None:
+                # the retries and the rest of the outbox are sent by a task
+                transaction.on_commit(partial(
+                    schedule_delivery, service_id, max(int(delay), 1)))
 
 
 trigger_webhook.connect(call_webhooks, dispatch_uid='call_webhooks')
@@ -1,5 +1,10 @@
-from onadata.apps.restservice.utils import call_service
+from django.core.cache import cache
+
+from onadata.apps.restservice.utils import (WEBHOOK_LEASE, call_service,
+                                            deliver_queued)
 from onadata.celery import app
+from onadata.libs.utils.cache_tools import (WEBHOOK_DELIVERY_QUEUED,
+                                            WEBHOOK_RETRY_QUEUED, safe_delete)
 
 
 @app.task()
@@ -15,3 +20,31 @@ def call_service_async(instance_pk):
         pass
     else:
         call_service(instance)
+
+
+def schedule_delivery(rest_service_id, countdown=0):
+    """
+    Queues a task to send the outbox of the rest service after countdown
+    seconds, unless one is already queued.
+    """
+    if countdown:
+        key = '{}{}'.format(WEBHOOK_RETRY_QUEUED, rest_service_id)
+        timeout = countdown
+    else:
+        key = '{}{}'.format(WEBHOOK_DELIVERY_QUEUED, rest_service_id)
+        timeout = WEBHOOK_LEASE
+    if cache.add(key, True, timeout):
+        deliver_rest_service.apply_async(
+            args=[rest_service_id], countdown=countdown)
+
+
+@app.task()
+def deliver_rest_service(rest_service_id):
+    """
+    Sends the outbox of the rest service and schedules the next retry.
+    """
+    # submissions queued from now on need another task
+    safe_delete('{}{}'.format(WEBHOOK_DELIVERY_QUEUED, rest_service_id))
+    delay = deliver_queued(rest_service_id)
+    if delay is not None:
+        schedule_delivery(rest_service_id, countdown=max(int(delay), 1))
@@ -1,18 +1,23 @@
 import os
 import time
 
+from django.core.cache import cache
 from django.test.utils import override_settings
 from django.urls import reverse
-from mock import patch
+from django.utils import timezone
+from mock import MagicMock, patch
 
 from onadata.apps.logger.models.xform import XForm
 from onadata.apps.main.models import MetaData
 from onadata.apps.main.tests.test_base import TestBase
 from onadata.apps.main.views import show
 from onadata.apps.restservice.RestServiceInterface import RestServiceInterface
-from onadata.apps.restservice.models import RestService
+from onadata.apps.restservice.models import Delivery, RestService
 from onadata.apps.restservice.services.textit import ServiceDefinition
+from onadata.apps.restservice.utils import (WEBHOOK_MAX_CONCURRENCY,
+                                            deliver_queued)
 from onadata.apps.restservice.views import add_service, delete_service
+from onadata.libs.utils.cache_tools import WEBHOOK_ENDPOINT_SLOT, safe_key
 
 
 class RestServiceTest(TestBase):
@@ -110,7 +115,7 @@ class RestServiceTest(TestBase):
         self.assertEqual(response.status_code, 404)
 
     @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_textit_service(self, mock_http):
         service_url = "https://textit.io/api/v1/runs.json"
         service_name = "textit"
@@ -137,7 +142,7 @@ class RestServiceTest(TestBase):
         self.assertEquals(mock_http.call_count, 1)
 
     @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_rest_service_not_set(self, mock_http):
         xml_submission = os.path.join(self.this_directory,
                                       u'fixtures',
@@ -148,6 +153,64 @@ class RestServiceTest(TestBase):
         self.assertFalse(mock_http.called)
         self.assertEquals(mock_http.call_count, 0)
 
+    @patch('onadata.apps.restservice.signals.schedule_delivery')
+    @patch('requests.Session.post')
+    def test_retry_failed_delivery(self, mock_http, mock_schedule):
+        mock_http.return_value = MagicMock(status_code=503)
+        self._add_rest_service('https://example.com/hook', 'json')
+        xml_submission = os.path.join(self.this_directory,
+                                      u'fixtures',
+                                      u'dhisform_submission1.xml')
+
+        self._make_submission(xml_submission)
+        self.assertEquals(mock_http.call_count, 1)
+        self.assertEquals(mock_http.call_args[1]['timeout'], 30)
+        delivery = Delivery.objects.get()
+        self.assertEquals(delivery.status, Delivery.PENDING)
+        self.assertEquals(delivery.attempts, 1)
+        self.assertEquals(delivery.last_error, 'HTTP 503')
+        self.assertTrue(delivery.next_attempt > timezone.now())
+        self.assertIsNotNone(delivery.rest_service.get_delivery_lag())
+        # the retry is scheduled after the failed delivery
+        self.assertEqual(mock_schedule.call_count, 1)
+        self.assertEqual(mock_schedule.call_args[0][0],
+                         delivery.rest_service_id)
+        self.assertTrue(mock_schedule.call_args[0][1] > 1)
+
+        # the submission is not sent again before its retry is due
+        self.assertIsNotNone(deliver_queued(delivery.rest_service_id))
+        self.assertEquals(mock_http.call_count, 1)
+
+        mock_http.return_value = MagicMock(status_code=201)
+        Delivery.objects.update(next_attempt=timezone.now())
+        # a new submission is sent without the retries in the outbox
+        self._make_submission(os.path.join(
+            self.this_directory, u'fixtures', u'dhisform_submission2.xml'))
+        self.assertEquals(mock_http.call_count, 2)
+        self.assertEquals(
+            list(Delivery.objects.values_list('pk', flat=True)),
+            [delivery.pk])
+
+        self.assertIsNone(deliver_queued(delivery.rest_service_id))
+        self.assertEquals(mock_http.call_count, 3)
+        self.assertFalse(Delivery.objects.exists())
+
+    @patch('requests.Session.post')
+    def test_deliver_when_endpoint_busy(self, mock_http):
+        mock_http.return_value = MagicMock(status_code=201)
+        self._add_rest_service('https://example.com/hook', 'json')
+        # the endpoint's slots are taken by batches sent by tasks
+        for i in range(WEBHOOK_MAX_CONCURRENCY):
+            cache.set('{}{}-{}'.format(
+                WEBHOOK_ENDPOINT_SLOT, safe_key('https://example.com/hook'),
+                i), True)
+        self.addCleanup(cache.clear)
+
+        self._make_submission(os.path.join(
+            self.this_directory, u'fixtures', u'dhisform_submission1.xml'))
+        self.assertEquals(mock_http.call_count, 1)
+        self.assertFalse(Delivery.objects.exists())
+
     def test_clean_keys_of_slashes(self):
         service = ServiceDefinition()
 
@@ -243,7 +243,7 @@ class TestRestServicesViewSet(TestAbstractViewSet):
         self.assertEquals(response.status_code, 400)
 
     @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_textit_flow(self, mock_http):
         rest = RestService(name="textit",
                            service_url="https://server.io",
@@ -262,7 +262,7 @@ class TestRestServicesViewSet(TestAbstractViewSet):
         self.assertEquals(mock_http.call_count, 4)
 
     @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_textit_flow_without_parsed_instances(self, mock_http):
         rest = RestService(name="textit",
                            service_url="https://server.io",
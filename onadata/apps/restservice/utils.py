@@ -1,21 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Delivery of submissions to rest services.
+
+Submissions are queued in the outbox of every rest service of their form and
+sent in batches. A requests.Session is kept per endpoint so that connections
+are reused, and at most WEBHOOK_MAX_CONCURRENCY batches are sent to an
+endpoint at a time. A submission that could not be sent is retried with an
+exponential backoff, the submissions queued behind it wait for it.
+"""
 import logging
+from datetime import timedelta
 
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
 from django.utils.translation import ugettext as _
+from future.moves.urllib.parse import urlparse
 
-from onadata.apps.restservice.models import RestService
+from onadata.apps.restservice.models import Delivery, RestService
+from onadata.libs.utils.cache_tools import (WEBHOOK_ENDPOINT_SLOT,
+                                            safe_delete, safe_key)
 from onadata.libs.utils.common_tags import GOOGLE_SHEET
 
+# number of submissions claimed from the outbox at a time
+WEBHOOK_BATCH_SIZE = getattr(settings, 'WEBHOOK_BATCH_SIZE', 100)
+# number of batches sent to an endpoint at a time
+WEBHOOK_MAX_CONCURRENCY = getattr(settings, 'WEBHOOK_MAX_CONCURRENCY', 2)
+# seconds to wait for an endpoint to respond
+WEBHOOK_TIMEOUT = getattr(settings, 'WEBHOOK_TIMEOUT', 30)
+# number of attempts before a submission is marked failed
+WEBHOOK_MAX_ATTEMPTS = getattr(settings, 'WEBHOOK_MAX_ATTEMPTS', 8)
+# seconds before the first retry, doubled for every retry after it
+WEBHOOK_RETRY_BACKOFF = getattr(settings, 'WEBHOOK_RETRY_BACKOFF', 30)
+WEBHOOK_MAX_RETRY_DELAY = getattr(settings, 'WEBHOOK_MAX_RETRY_DELAY',
+                                  6 * 3600)
+# seconds a claimed batch is held before it can be claimed again
+WEBHOOK_LEASE = getattr(settings, 'WEBHOOK_LEASE', 600)
+# responses that mean the submission should be sent again later
+RETRY_STATUS_CODES = (408, 429)
 
-def call_service(submission_instance):
+# pooled sessions by endpoint
+_sessions = {}
+
+
+def get_session(url):
+    """Returns the requests.Session of the endpoint of the url."""
+    parsed = urlparse(url)
+    key = (parsed.scheme, parsed.netloc)
+    if key not in _sessions:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=WEBHOOK_MAX_CONCURRENCY)
+        session.mount(parsed.scheme + '://', adapter)
+        _sessions[key] = session
+
+    return _sessions[key]
+
+
+def get_retry_delay(attempts):
+    """Returns the seconds to wait after the number of failed attempts."""
+    return min(WEBHOOK_RETRY_BACKOFF * 2 ** (attempts - 1),
+               WEBHOOK_MAX_RETRY_DELAY)
+
+
+def _acquire_slot(service_url):
+    """
+    Returns the cache key of a free concurrency slot of the endpoint, None
+    if all its slots are taken.
+    """
+    prefix = WEBHOOK_ENDPOINT_SLOT + safe_key(service_url)
+    for i in range(WEBHOOK_MAX_CONCURRENCY):
+        key = '{}-{}'.format(prefix, i)
+        if cache.add(key, True, WEBHOOK_LEASE):
+            return key
+
+    return None
+
+
+def _get_error(response):
+    """Returns the error of a response that should be retried, or None."""
+    status_code = getattr(response, 'status_code', None)
+    if isinstance(status_code, int) and \
+            (status_code in RETRY_STATUS_CODES or status_code >= 500):
+        return u'HTTP %d' % status_code
+
+    return None
+
+
+def queue_deliveries(submission_instance):
+    """
+    Adds the submission to the outbox of the rest services of its form.
+
+    :return: The ids of the rest services.
+    """
     # lookup service which is not google sheet service
-    services = RestService.objects.filter(
-        xform_id=submission_instance.xform_id).exclude(name=GOOGLE_SHEET)
-    # call service send with url and data parameters
-    for sv in services:
-        # TODO: Queue service
+    service_ids = list(RestService.objects.filter(
+        xform_id=submission_instance.xform_id).exclude(
+            name=GOOGLE_SHEET).values_list('pk', flat=True))
+    Delivery.objects.bulk_create([
+        Delivery(rest_service_id=service_id, instance=submission_instance)
+        for service_id in service_ids])
+
+    return service_ids
+
+
+def _claim_batch(rest_service, instance_id=None):
+    """
+    Claims the submissions in the outbox of the rest service that are due,
+    or only the submission instance_id when set, and holds them for
+    WEBHOOK_LEASE seconds.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        deliveries = Delivery.objects.select_for_update(skip_locked=True)\
+            .filter(rest_service=rest_service, status=Delivery.PENDING,
+                    next_attempt__lte=now)
+        if instance_id is not None:
+            deliveries = deliveries.filter(instance_id=instance_id)
+        ids = list(deliveries.order_by('next_attempt', 'pk')
+                   .values_list('pk', flat=True)[:WEBHOOK_BATCH_SIZE])
+        Delivery.objects.filter(pk__in=ids).update(
+            next_attempt=now + timedelta(seconds=WEBHOOK_LEASE))
+
+    return Delivery.objects.filter(pk__in=ids).select_related(
+        'instance').order_by('pk')
+
+
+def _deliver_batch(rest_service, service, instance_id=None):
+    """
+    Sends a batch of submissions from the outbox of the rest service.
+
+    :return: A (sent, failed) tuple, failed is True if a submission could
+             not be sent.
+    """
+    deliveries = list(_claim_batch(rest_service, instance_id))
+    sent = []
+    failed = None
+    for delivery in deliveries:
         try:
-            service = sv.get_service_definition()()
-            service.send(sv.service_url, submission_instance)
-        except Exception as e:
-            # TODO: Handle gracefully | requeue/resend
-            logging.exception(_(u'Service threw exception: %s' % str(e)))
+            error = _get_error(
+                service.send(rest_service.service_url, delivery.instance))
+        except Exception as e:  # pylint: disable=broad-except
+            error = str(e)
+            logging.exception(_(u'Service threw exception: %s' % error))
+        if error:
+            failed = delivery
+            failed.last_error = error
+            break
+        sent.append(delivery.pk)
+
+    Delivery.objects.filter(pk__in=sent).delete()
+    if failed is not None:
+        failed.attempts += 1
+        failed.next_attempt = timezone.now() + timedelta(
+            seconds=get_retry_delay(failed.attempts))
+        if failed.attempts >= WEBHOOK_MAX_ATTEMPTS:
+            failed.status = Delivery.FAILED
+        failed.save(update_fields=[
+            'attempts', 'next_attempt', 'status', 'last_error'])
+        # the endpoint is failing, the rest of the batch waits for the retry
+        Delivery.objects.filter(pk__in=[
+            delivery.pk for delivery in deliveries[len(sent) + 1:]]).update(
+                next_attempt=failed.next_attempt)
+
+    return len(sent), failed is not None
+
+
+def get_next_attempt_delay(rest_service_id):
+    """
+    Returns the seconds until the next submission in the outbox of the rest
+    service is due, None if the outbox is empty.
+    """
+    next_attempt = Delivery.objects.filter(
+        rest_service_id=rest_service_id, status=Delivery.PENDING).aggregate(
+            next_attempt=Min('next_attempt'))['next_attempt']
+    if next_attempt is None:
+        return None
+
+    return max((next_attempt - timezone.now()).total_seconds(), 0)
+
+
+def deliver_queued(rest_service_id, instance_id=None):
+    """
+    Sends the submissions that are due in the outbox of the rest service in
+    batches until none is due or the endpoint fails.
+
+    :param instance_id: only the submission is sent when set, even when
+                        the endpoint is busy. The other submissions in the
+                        outbox and the retries are left to the
+                        deliver_rest_service task.
+    :return: The seconds until the next submission in the outbox is due,
+             None if the outbox is empty.
+    """
+    try:
+        rest_service = RestService.objects.get(pk=rest_service_id)
+    except RestService.DoesNotExist:
+        return None
+
+    slot = _acquire_slot(rest_service.service_url)
+    if slot is None and instance_id is None:
+        # the endpoint is busy, try again after the batches being sent
+        return WEBHOOK_RETRY_BACKOFF
+
+    total = 0
+    try:
+        service = rest_service.get_service_definition()(
+            session=get_session(rest_service.service_url),
+            timeout=WEBHOOK_TIMEOUT)
+        while True:
+            sent, failed = _deliver_batch(rest_service, service, instance_id)
+            total += sent
+            if failed or not sent or instance_id is not None:
+                break
+    finally:
+        # a single submission is sent without a slot when all are taken
+        if slot is not None:
+            safe_delete(slot)
+
+    lag = rest_service.get_delivery_lag()
+    logging.info(
+        u'Sent %d submissions to rest service %s, delivery lag %s', total,
+        rest_service_id, lag)
+
+    return get_next_attempt_delay(rest_service_id)
+
+
+def call_service(submission_instance):
+    """Sends the submission to the rest services of its form."""
+    for service_id in queue_deliveries(submission_instance):
+        deliver_queued(service_id, submission_instance.pk)
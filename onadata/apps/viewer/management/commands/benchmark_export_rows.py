@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# vim: ai ts=4 sts=4 et sw=4 fileencoding=utf-8
+"""
+Compare the throughput of the precompiled section plans of ExportBuilder
+with the per row lookups they replaced, on synthetic wide forms.
+"""
+import copy
+import random
+import re
+import time
+from builtins import str as text
+
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext_lazy
+from pyxform.builder import create_survey_element_from_dict
+
+from onadata.libs.utils.common_tags import SUBMISSION_TIME
+from onadata.libs.utils.export_builder import (ExportBuilder,
+                                               get_choice_label_value)
+
+CHOICES = ['a', 'b', 'c', 'd', 'e', 'f']
+# (name, export options) of the benchmarked option sets
+OPTION_SETS = [
+    ('default', {}),
+    ('binary select multiples', {'BINARY_SELECT_MULTIPLES': True}),
+    ('choice labels', {'SHOW_CHOICE_LABELS': True}),
+    ('choice labels, no split', {'SHOW_CHOICE_LABELS': True,
+                                 'SPLIT_SELECT_MULTIPLES': False}),
+]
+
+
+class LegacyExportBuilder(ExportBuilder):
+    """
+    ExportBuilder that looks up the fields of a section and the export
+    options for every row.
+    """
+
+    def get_section_plan(self, section):
+        return [lambda row: self.legacy_pre_process_row(row, section)]
+
+    def legacy_pre_process_row(self, row, section):
+        section_name = section['name']
+
+        if section_name in self.encoded_fields:
+            row = ExportBuilder.decode_mongo_encoded_fields(
+                row, self.encoded_fields[section_name])
+
+        if section_name in self.select_multiples:
+            select_multiples = self.select_multiples[section_name]
+            if self.SPLIT_SELECT_MULTIPLES:
+                row = ExportBuilder.split_select_multiples(
+                    row, select_multiples, self.VALUE_SELECT_MULTIPLES,
+                    self.BINARY_SELECT_MULTIPLES,
+                    show_choice_labels=self.SHOW_CHOICE_LABELS,
+                    data_dictionary=self.dd, language=self.language)
+            if not self.SPLIT_SELECT_MULTIPLES and self.SHOW_CHOICE_LABELS:
+                for xpath in select_multiples:
+                    data = row.get(xpath) and text(row.get(xpath))
+                    if data:
+                        row[xpath] = get_choice_label_value(
+                            xpath, data, self.dd, self.language)
+
+        if section_name in self.gps_fields:
+            row = ExportBuilder.split_gps_components(
+                row, self.gps_fields[section_name])
+
+        if section_name in self.select_ones and self.SHOW_CHOICE_LABELS:
+            for key in self.select_ones[section_name]:
+                if key in row:
+                    row[key] = get_choice_label_value(key, row[key], self.dd,
+                                                      self.language)
+
+        for elm in section['elements']:
+            value = row.get(elm['xpath'])
+            if elm['type'] in ExportBuilder.TYPES_TO_CONVERT\
+                    and value is not None and value != '':
+                row[elm['xpath']] = ExportBuilder.convert_type(
+                    value, elm['type'])
+
+        if SUBMISSION_TIME in row:
+            row[SUBMISSION_TIME] = ExportBuilder.convert_type(
+                row[SUBMISSION_TIME], 'dateTime')
+
+        for key, value in row.items():
+            if isinstance(value, str):
+                result = re.findall(r'\$\{\w+\}', value)
+                if result:
+                    for val in result:
+                        val_key = val.replace('${', '').replace('}', '')
+                        if row.get(val_key):
+                            value = value.replace(val, row.get(val_key))
+                    row[key] = value
+
+        return row
+
+
+def _questions(prefix, count):
+    """Returns `count` questions of mixed types named with `prefix`."""
+    choices = [{'name': c, 'label': c.upper()} for c in CHOICES]
+    questions = []
+    for i in range(count):
+        kind = i % 7
+        name = '%s%d' % (prefix, i)
+        if kind == 0:
+            question = {'type': 'integer'}
+        elif kind == 1:
+            question = {'type': 'decimal'}
+        elif kind == 2:
+            question = {'type': 'select all that apply', 'children': choices}
+        elif kind == 3:
+            question = {'type': 'select one', 'children': choices}
+        elif kind == 4:
+            question = {'type': 'geopoint'}
+        elif kind == 5:
+            question = {'type': 'date'}
+        else:
+            question = {'type': 'text'}
+        question.update({'name': name, 'label': name})
+        questions.append(question)
+
+    return questions
+
+
+def _answers(questions, prefix=''):
+    """Returns a random answer to each of the questions."""
+    answers = {}
+    for question in questions:
+        name = prefix + question['name']
+        kind = question['type']
+        if kind == 'integer':
+            answers[name] = text(random.randint(0, 1000))
+        elif kind == 'decimal':
+            answers[name] = text(random.random() * 1000)
+        elif kind == 'select all that apply':
+            answers[name] = ' '.join(
+                random.sample(CHOICES, random.randint(1, 3)))
+        elif kind == 'select one':
+            answers[name] = random.choice(CHOICES)
+        elif kind == 'geopoint':
+            answers[name] = '-1.2625 36.7924 0.0 4.0'
+        elif kind == 'date':
+            answers[name] = '2020-01-%02d' % random.randint(1, 28)
+        else:
+            answers[name] = 'text with ${%s6}' % question['name'][0] \
+                if random.random() < 0.05 else 'text'
+
+    return answers
+
+
+def get_survey(questions, repeat_questions):
+    """Returns a synthetic survey of the questions with a repeat."""
+    return create_survey_element_from_dict(copy.deepcopy({
+        'type': 'survey', 'name': 'wide', 'id_string': 'wide',
+        'title': 'wide', 'default_language': 'default',
+        'children': questions + [{
+            'type': 'repeat', 'name': 'rep', 'label': 'rep',
+            'children': repeat_questions}]}))
+
+
+def get_records(questions, repeat_questions, count, repeats):
+    """Returns `count` synthetic submissions of the questions."""
+    records = []
+    for i in range(count):
+        record = _answers(questions)
+        record['rep'] = [_answers(repeat_questions, 'rep/')
+                         for _j in range(repeats)]
+        record.update({'_id': i + 1, SUBMISSION_TIME: '2020-01-01T10:00:00'})
+        records.append(record)
+
+    return records
+
+
+class Command(BaseCommand):
+    help = ugettext_lazy("Benchmark the processing of export rows")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-c', '--columns', type=int, default=500,
+            help=ugettext_lazy("Number of questions outside the repeat"))
+        parser.add_argument(
+            '-r', '--repeat-columns', type=int, default=50,
+            help=ugettext_lazy("Number of questions in the repeat"))
+        parser.add_argument(
+            '-n', '--records', type=int, default=200,
+            help=ugettext_lazy("Number of submissions"))
+        parser.add_argument(
+            '--repeats', type=int, default=3,
+            help=ugettext_lazy("Number of repeats in a submission"))
+
+    def _run(self, builder_class, survey, records, options):
+        builder = builder_class()
+        builder.INCLUDE_IMAGES = False
+        for (name, value) in options.items():
+            setattr(builder, name, value)
+        builder.set_survey(survey)
+        records = copy.deepcopy(records)
+
+        start = time.perf_counter()
+        rows = list(builder.iter_section_rows(records, track_progress=False))
+
+        return len(rows), time.perf_counter() - start, rows
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        questions = _questions('q', options['columns'])
+        repeat_questions = _questions('r', options['repeat_columns'])
+        survey = get_survey(questions, repeat_questions)
+        records = get_records(questions, repeat_questions,
+                              options['records'], options['repeats'])
+        self.stdout.write(
+            "%d submissions, %d questions, %d questions in %d repeats" % (
+                options['records'], options['columns'],
+                options['repeat_columns'], options['repeats']))
+
+        for (name, export_options) in OPTION_SETS:
+            count, legacy, legacy_rows = self._run(
+                LegacyExportBuilder, survey, records, export_options)
+            count, compiled, rows = self._run(
+                ExportBuilder, survey, records, export_options)
+            self.stdout.write(
+                "%s: %d rows, per row lookups %.0f rows/s, compiled %.0f "
+                "rows/s, speedup %.2fx, same output: %s" % (
+                    name, count, count / legacy, count / compiled,
+                    legacy / compiled if compiled else 0,
+                    legacy_rows == rows))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# vim: ai ts=4 sts=4 et sw=4 fileencoding=utf-8
+"""
+Compare the time it takes to export a form's submissions in one process
+with the time it takes to export them in shards across worker processes.
+"""
+import time
+import zipfile
+
+from django.core.files.temp import NamedTemporaryFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.query import QuerySet
+from django.utils.translation import ugettext_lazy
+
+from onadata.apps.logger.models import XForm
+from onadata.apps.viewer.models.export import Export
+from onadata.apps.viewer.models.parsed_instance import query_data
+from onadata.libs.utils.export_builder import ExportBuilder
+from onadata.libs.utils.export_shards import ExportShards
+from onadata.libs.utils.export_tools import SHARDED_EXPORT_TYPES
+
+EXPORT_FUNCTIONS = {
+    Export.XLS_EXPORT: ('to_xls_export', 'xlsx'),
+    Export.CSV_ZIP_EXPORT: ('to_zipped_csv', 'zip'),
+    Export.SAV_ZIP_EXPORT: ('to_zipped_sav', 'zip'),
+}
+
+
+def _read_zip(path):
+    with zipfile.ZipFile(path) as zip_file:
+        return {name: zip_file.read(name) for name in zip_file.namelist()}
+
+
+class Command(BaseCommand):
+    help = ugettext_lazy("Benchmark serial and sharded exports of a form")
+
+    def add_arguments(self, parser):
+        parser.add_argument('xform_id', type=int)
+        parser.add_argument(
+            '-t', '--export-type', default=Export.CSV_ZIP_EXPORT,
+            choices=SHARDED_EXPORT_TYPES,
+            help=ugettext_lazy("Type of export"))
+        parser.add_argument(
+            '-p', '--processes', type=int, default=4,
+            help=ugettext_lazy("Number of worker processes"))
+        parser.add_argument(
+            '-s', '--shard-size', type=int, default=1000,
+            help=ugettext_lazy("Number of submissions in a shard"))
+
+    def _export(self, xform, export_type, records):
+        func_name, extension = EXPORT_FUNCTIONS[export_type]
+        builder = ExportBuilder()
+        builder.TRUNCATE_GROUP_TITLE = export_type == Export.SAV_ZIP_EXPORT
+        builder.set_survey(xform.survey, xform)
+        temp_file = NamedTemporaryFile(suffix='.' + extension)
+
+        start = time.perf_counter()
+        getattr(builder, func_name)(
+            temp_file.name, records, xform.user.username, xform.id_string,
+            None, xform=xform, options={})
+
+        return time.perf_counter() - start, temp_file
+
+    def handle(self, *args, **options):
+        try:
+            xform = XForm.objects.get(pk=options['xform_id'])
+        except XForm.DoesNotExist:
+            raise CommandError("Form %s does not exist" % options['xform_id'])
+
+        export_type = options['export_type']
+        shards = ExportShards(xform, processes=options['processes'],
+                              shard_size=options['shard_size'])
+        if not shards.can_fork():
+            raise CommandError("Worker processes cannot be started")
+
+        records = query_data(xform)
+        if isinstance(records, QuerySet):
+            records = records.iterator()
+        serial, serial_file = self._export(xform, export_type, records)
+        sharded, sharded_file = self._export(xform, export_type, shards)
+
+        self.stdout.write(
+            "Exported %d submissions to %s" % (
+                xform.instances.filter(deleted_at__isnull=True).count(),
+                export_type))
+        self.stdout.write("Serial: %.2f s" % serial)
+        self.stdout.write("Sharded, %d processes: %.2f s" % (
+            options['processes'], sharded))
+        self.stdout.write(
+            "Speedup: %.2fx" % (serial / sharded if sharded else 0))
+        if export_type == Export.CSV_ZIP_EXPORT:
+            self.stdout.write("Same output: %s" % (
+                _read_zip(serial_file.name) == _read_zip(sharded_file.name)))
+
+        serial_file.close()
+        sharded_file.close()
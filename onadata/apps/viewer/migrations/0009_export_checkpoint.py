@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 09:12
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewer', '0008_auto_20190125_0517'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='export',
+            name='checkpoint',
+            field=django.contrib.postgres.fields.jsonb.JSONField(default=dict),
+        ),
+    ]
@@ -20,7 +20,8 @@ from pyxform.utils import has_external_choices
 from pyxform.xls2json import parse_file_to_json
 
 from onadata.apps.logger.models.xform import (XForm, check_version_set,
-                                              check_xform_uuid)
+                                              check_xform_uuid,
+                                              invalidate_compiled_survey)
 from onadata.apps.logger.xform_instance_parser import XLSFormError
 from onadata.libs.utils.cache_tools import (PROJ_BASE_FORMS_CACHE,
                                             PROJ_FORMS_CACHE, safe_delete)
@@ -266,6 +267,8 @@ def set_object_permissions(sender, instance=None, created=False, **kwargs):
 
 post_save.connect(set_object_permissions, sender=DataDictionary,
                   dispatch_uid='xform_object_permissions')
+post_save.connect(invalidate_compiled_survey, sender=DataDictionary,
+                  dispatch_uid='invalidate_compiled_survey_datadictionary')
 
 
 # pylint: disable=unused-argument
@@ -152,6 +152,9 @@ class Export(models.Model):
     export_url = models.URLField(null=True, default=None)
 
     options = JSONField(default=dict, null=False)
+    # submissions included in the export file, see
+    # onadata.libs.utils.export_tools.get_appendable_export
+    checkpoint = JSONField(default=dict, null=False)
     error_message = models.CharField(max_length=255, null=True, blank=True)
 
     class Meta:
@@ -2,11 +2,11 @@ import datetime
 import json
 import types
 from builtins import str as text
+from hashlib import md5
 
 import six
 from dateutil import parser
 from django.conf import settings
-from django.db import connection
 from django.db import models
 from django.db.models.query import EmptyQuerySet
 from django.utils.translation import ugettext as _
@@ -19,12 +19,15 @@ from onadata.apps.viewer.parsed_instance_tools import (get_where_clause,
                                                        NONE_JSON_FIELDS)
 from onadata.libs.models.sorting import (
     json_order_by, json_order_by_params, sort_from_mongo_sort_str)
+from onadata.libs.utils.cache_tools import (get_xform_data_version,
+                                            is_cache_shared)
 from onadata.libs.utils.common_tags import ID, UUID, ATTACHMENTS, \
     GEOLOCATION, SUBMISSION_TIME, MONGO_STRFTIME, BAMBOO_DATASET_ID, \
     DELETEDAT, TAGS, NOTES, SUBMITTED_BY, VERSION, DURATION, EDITED, \
     MEDIA_COUNT, TOTAL_MEDIA, MEDIA_ALL_RECEIVED, XFORM_ID, REVIEW_STATUS, \
     REVIEW_COMMENT
-from onadata.libs.utils.model_tools import queryset_iterator
+from onadata.libs.utils.model_tools import (iter_query_rows,
+                                            queryset_iterator)
 from onadata.libs.utils.mongo import _is_invalid_for_mongo
 
 DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
@@ -77,7 +80,6 @@ def _parse_sort_fields(fields):
 def _query_iterator(sql, fields=None, params=[], count=False):
     if not sql:
         raise ValueError(_(u"Bad SQL: %s" % sql))
-    cursor = connection.cursor()
     sql_params = fields + params if fields is not None else params
 
     if count:
@@ -86,13 +88,15 @@ def _query_iterator(sql, fields=None, params=[], count=False):
         sql = u"SELECT COUNT(*) FROM (" + sql + ") AS CQ"
         fields = [u'count']
 
-    cursor.execute(sql, [text(i) for i in sql_params])
+    # stream the rows through a server-side cursor
+    rows = iter_query_rows(sql, [text(i) for i in sql_params],
+                           server_side=not count)
 
     if fields is None:
-        for row in cursor.fetchall():
+        for row in rows:
             yield row[0]
     else:
-        for row in cursor.fetchall():
+        for row in rows:
             yield dict(zip(fields, row))
 
 
@@ -115,6 +119,20 @@ def get_etag_hash_from_query(queryset, sql=None, params=None):
     return u'%s' % datetime.datetime.utcnow()
 
 
+def get_etag_hash_from_version(xform_ids, *args):
+    """
+    Returns an md5 hash of the data versions of the forms and args, without
+    querying the data. Returns None when the data versions are not shared
+    between processes.
+    """
+    if not xform_ids or not is_cache_shared():
+        return None
+
+    versions = [get_xform_data_version(pk) for pk in sorted(xform_ids)]
+
+    return md5(text([versions, args]).encode('utf-8')).hexdigest()
+
+
 def _start_index_limit(records, sql, fields, params, sort, start_index, limit):
     if start_index is not None and \
             (start_index < 0 or (limit is not None and limit < 0)):
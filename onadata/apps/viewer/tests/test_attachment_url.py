@@ -1,6 +1,7 @@
 import os
 
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.urls import reverse
 
 from onadata.apps.logger.models import Attachment
@@ -39,6 +40,15 @@ class TestAttachmentUrl(TestBase):
             self.url, {"media_file": "non_existent_attachment.jpg"})
         self.assertEqual(response.status_code, 404)
 
+    def test_attachment_file_not_found(self):
+        attachment = Attachment.objects.all().reverse()[0]
+        Attachment.objects.filter(pk=attachment.pk).update(thumbnails={})
+        default_storage.delete(attachment.media_file.name)
+        response = self.client.get(
+            reverse(attachment_url, kwargs={'size': 'small'}),
+            {"media_file": attachment.media_file.name})
+        self.assertEqual(response.status_code, 404)
+
     def test_attachment_has_mimetype(self):
         attachment = Attachment.objects.all().reverse()[0]
         self.assertEqual(attachment.mimetype, 'image/jpeg')
@@ -48,4 +48,5 @@ class TestKMLExport(TestBase):
 
             self.assertMultiLineEqual(
                 expected_content.strip(),
-                response.content.decode('utf-8').strip())
+                b''.join(response.streaming_content).decode(
+                    'utf-8').strip())
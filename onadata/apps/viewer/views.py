@@ -7,7 +7,6 @@ import os
 from datetime import datetime
 from tempfile import NamedTemporaryFile
 from time import strftime, strptime
-from wsgiref.util import FileWrapper
 
 import pytz
 import requests
@@ -18,7 +17,7 @@ from django.contrib.auth.models import User
 from django.core.files.storage import FileSystemStorage, get_storage_class
 from django.http import (HttpResponse, HttpResponseBadRequest,
                          HttpResponseForbidden, HttpResponseNotFound,
-                         HttpResponseRedirect)
+                         HttpResponseRedirect, StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template import loader
 from django.urls import reverse
@@ -40,7 +39,7 @@ from onadata.apps.viewer.xls_writer import XlsWriter
 from onadata.libs.exceptions import NoRecordsFoundError
 from onadata.libs.utils.chart_tools import build_chart_data
 from onadata.libs.utils.export_tools import (
-    DEFAULT_GROUP_DELIMITER, generate_export, kml_export_data,
+    DEFAULT_GROUP_DELIMITER, generate_export, iter_kml_export,
     newest_export_for, should_create_new_export, str_to_bool)
 from onadata.libs.utils.google import google_flow
 from onadata.libs.utils.image_tools import image_url
@@ -50,7 +49,7 @@ from onadata.libs.utils.logger_tools import (
 from onadata.libs.utils.user_auth import (get_xform_and_perms, has_permission,
                                           helper_auth_helper)
 from onadata.libs.utils.viewer_tools import (
-    create_attachments_zipfile, export_def_from_filename, get_form)
+    export_def_from_filename, get_form, iter_attachments_zipfile)
 from onadata.libs.utils.common_tools import get_uuid
 
 
@@ -651,30 +650,22 @@ def zip_export(request, username, id_string):
         id_string = None
 
     attachments = Attachment.objects.filter(instance__xform=xform)
-    zip_file = None
-
-    try:
-        zip_file = create_attachments_zipfile(attachments)
-        audit = {"xform": xform.id_string, "export_type": Export.ZIP_EXPORT}
-        audit_log(Actions.EXPORT_CREATED, request.user, owner,
-                  _("Created ZIP export on '%(id_string)s'.") % {
-                      'id_string': xform.id_string,
-                  }, audit, request)
-        # log download as well
-        audit_log(Actions.EXPORT_DOWNLOADED, request.user, owner,
-                  _("Downloaded ZIP export on '%(id_string)s'.") % {
-                      'id_string': xform.id_string,
-                  }, audit, request)
-        if request.GET.get('raw'):
-            id_string = None
+    audit = {"xform": xform.id_string, "export_type": Export.ZIP_EXPORT}
+    audit_log(Actions.EXPORT_CREATED, request.user, owner,
+              _("Created ZIP export on '%(id_string)s'.") % {
+                  'id_string': xform.id_string,
+              }, audit, request)
+    # log download as well
+    audit_log(Actions.EXPORT_DOWNLOADED, request.user, owner,
+              _("Downloaded ZIP export on '%(id_string)s'.") % {
+                  'id_string': xform.id_string,
+              }, audit, request)
 
-        response = response_with_mimetype_and_name('zip', id_string)
-        response.write(FileWrapper(zip_file))
-        response['Content-Length'] = zip_file.tell()
-        zip_file.seek(0)
-    finally:
-        if zip_file:
-            zip_file.close()
+    # the zip file is streamed while it is written
+    response = StreamingHttpResponse(iter_attachments_zipfile(attachments),
+                                     content_type='application/zip')
+    response['Content-Disposition'] = generate_content_disposition_header(
+        id_string, 'zip')
 
     return response
 
@@ -690,11 +681,9 @@ def kml_export(request, username, id_string):
     helper_auth_helper(request)
     if not has_permission(xform, owner, request):
         return HttpResponseForbidden(_(u'Not shared.'))
-    data = {'data': kml_export_data(id_string, user=owner, xform=xform)}
-    response = render(
-        request,
-        "survey.kml",
-        data,
+    # the placemarks are streamed while they are read
+    response = StreamingHttpResponse(
+        iter_kml_export(xform),
         content_type="application/vnd.google-earth.kml+xml")
     response['Content-Disposition'] = \
         generate_content_disposition_header(id_string, 'kml')
@@ -1,6 +1,18 @@
+from hashlib import md5
+
 import numpy as np
+from builtins import str as text
+from django.core.cache import cache
+from django.db import DataError, connection, transaction
+from django.utils.translation import ugettext as _
+
 from onadata.apps.api.tools import DECIMAL_PRECISION
-from onadata.libs.data.query import get_field_records, get_numeric_fields
+from onadata.apps.logger.models.instance import Instance
+from onadata.libs.data.query import (_json_query, get_field_records,
+                                     get_numeric_fields)
+from onadata.libs.utils.cache_tools import (XFORM_STATS,
+                                            get_xform_data_version,
+                                            is_cache_shared)
 
 
 def _chk_asarray(a, axis):
@@ -45,40 +57,16 @@ def get_median_for_field(field, xform):
     return np.median(get_field_records(field, xform))
 
 
-def get_median_for_numeric_fields_in_form(xform, field=None):
-    data = {}
-    for field_name in [field] if field else get_numeric_fields(xform):
-        median = get_median_for_field(field_name, xform)
-        data.update({field_name: median})
-    return data
-
-
 def get_mean_for_field(field, xform):
     return np.mean(get_field_records(field, xform))
 
 
-def get_mean_for_numeric_fields_in_form(xform, field):
-    data = {}
-    for field_name in [field] if field else get_numeric_fields(xform):
-        mean = get_mean_for_field(field_name, xform)
-        data.update({field_name: np.round(mean, DECIMAL_PRECISION)})
-    return data
-
-
 def get_mode_for_field(field, xform):
     a = np.array(get_field_records(field, xform))
     m, count = get_mode(a)
     return m
 
 
-def get_mode_for_numeric_fields_in_form(xform, field=None):
-    data = {}
-    for field_name in [field] if field else get_numeric_fields(xform):
-        mode = get_mode_for_field(field_name, xform)
-        data.update({field_name: np.round(mode, DECIMAL_PRECISION)})
-    return data
-
-
 def get_min_max_range_for_field(field, xform):
     a = np.array(get_field_records(field, xform))
     _max = np.max(a)
@@ -87,27 +75,157 @@ def get_min_max_range_for_field(field, xform):
     return _min, _max, _range
 
 
-def get_min_max_range(xform, field=None):
+def _get_xform_ids(xform):
+    if xform.is_merged_dataset:
+        return list(xform.mergedxform.xforms.filter(
+            deleted_at__isnull=True).values_list('id', flat=True)) or \
+            [xform.pk]
+
+    return [xform.pk]
+
+
+def _format_stats(_min, _max, mean, median, mode):
+    return {
+        'mean': np.round(np.float64(mean), DECIMAL_PRECISION),
+        'median': np.float64(median),
+        # the mode is an array like get_mode returns
+        'mode': np.round(np.array([mode], dtype=np.float64),
+                         DECIMAL_PRECISION),
+        'max': np.float64(_max),
+        'min': np.float64(_min),
+        'range': np.float64(_max) - np.float64(_min)
+    }
+
+
+def _no_values_error(field):
+    return ValueError(_(u"%s has no numeric values.") % field)
+
+
+def get_column_stats(values):
+    """
+    Returns the mean, median, mode, max, min and range of the values. The
+    mode is the smallest of the most frequent values, like get_mode.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scores, counts = np.unique(values, return_counts=True)
+
+    return _format_stats(values.min(), values.max(), values.mean(),
+                         np.median(values), scores[np.argmax(counts)])
+
+
+def _query_stats(fields, xform_ids):
+    """
+    Returns the statistics of the fields from a single query that
+    aggregates every field, Postgres only.
+    """
+    columns = u", ".join(
+        u"(%s)::float8 AS v%d" % (_json_query(field), i)
+        for (i, field) in enumerate(fields))
+    aggregates = u", ".join(
+        u"min(v{0}), max(v{0}), avg(v{0}), percentile_cont(0.5) WITHIN GROUP "
+        u"(ORDER BY v{0}), mode() WITHIN GROUP (ORDER BY v{0}), "
+        u"count(v{0})".format(i) for i in range(len(fields)))
+    sql = (u"SELECT " + aggregates + u" FROM (SELECT " + columns +
+           u" FROM logger_instance WHERE xform_id IN %s"
+           u" AND deleted_at IS NULL) AS submissions")
+
+    try:
+        # a value that is not a number fails the whole query
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [tuple(xform_ids)])
+            row = cursor.fetchone()
+    except DataError as e:
+        raise ValueError(text(e))
+
     data = {}
-    for field_name in [field] if field else get_numeric_fields(xform):
-        _min, _max, _range = get_min_max_range_for_field(field_name, xform)
-        data[field_name] = {'max': _max, 'min': _min, 'range': _range}
+    for (i, field) in enumerate(fields):
+        _min, _max, mean, median, mode, count = row[i * 6:i * 6 + 6]
+        if not count:
+            raise _no_values_error(field)
+        data[field] = _format_stats(_min, _max, mean, median, mode)
+
     return data
 
 
-def get_all_stats(xform, field=None):
+def _compute_stats(fields, xform_ids):
+    """
+    Returns the statistics of the fields computed with NumPy over the
+    columns of the fields, read in a single query.
+    """
+    columns = dict((field, []) for field in fields)
+    records = Instance.objects.filter(
+        xform_id__in=xform_ids, deleted_at__isnull=True).values_list(
+            'json', flat=True)
+    for record in records.iterator():
+        for field in fields:
+            value = record.get(field)
+            if value is not None:
+                columns[field].append(float(value))
+
+    data = {}
+    for field in fields:
+        if not columns[field]:
+            raise _no_values_error(field)
+        data[field] = get_column_stats(columns[field])
+
+    return data
+
+
+def get_numeric_stats(xform, field=None):
+    """
+    Returns the mean, median, mode, max, min and range of the numeric
+    fields of the form, or of `field`, from a single query.
+
+    The statistics are cached by the data version of the form when the
+    cache is shared between processes.
+    """
+    fields = [field] if field else get_numeric_fields(xform)
+    if not fields:
+        return {}
+
+    xform_ids = _get_xform_ids(xform)
+    key = None
+    if is_cache_shared():
+        versions = [get_xform_data_version(pk) for pk in sorted(xform_ids)]
+        key = u'{}{}-{}'.format(XFORM_STATS, xform.pk, md5(
+            text([versions, fields]).encode('utf-8')).hexdigest())
+        data = cache.get(key)
+        if data is not None:
+            return data
+
+    if connection.vendor == 'postgresql':
+        data = _query_stats(fields, xform_ids)
+    else:
+        data = _compute_stats(fields, xform_ids)
+
+    if key is not None:
+        cache.set(key, data)
+
+    return data
+
+
+def get_median_for_numeric_fields_in_form(xform, field=None):
+    return dict((field_name, stats['median']) for (field_name, stats)
+                in get_numeric_stats(xform, field).items())
+
+
+def get_mean_for_numeric_fields_in_form(xform, field):
+    return dict((field_name, stats['mean']) for (field_name, stats)
+                in get_numeric_stats(xform, field).items())
+
+
+def get_mode_for_numeric_fields_in_form(xform, field=None):
+    return dict((field_name, stats['mode']) for (field_name, stats)
+                in get_numeric_stats(xform, field).items())
+
+
+def get_min_max_range(xform, field=None):
     data = {}
-    for field_name in [field] if field else get_numeric_fields(xform):
-        _min, _max, _range = get_min_max_range_for_field(field_name, xform)
-        mode = get_mode_for_field(field_name, xform)
-        mean = get_mean_for_field(field_name, xform)
-        median = get_median_for_field(field_name, xform)
-        data[field_name] = {
-            'mean': np.round(mean, DECIMAL_PRECISION),
-            'median': median,
-            'mode': np.round(mode, DECIMAL_PRECISION),
-            'max': _max,
-            'min': _min,
-            'range': _range
-        }
+    for (field_name, stats) in get_numeric_stats(xform, field).items():
+        data[field_name] = {'max': stats['max'], 'min': stats['min'],
+                            'range': stats['range']}
     return data
+
+
+def get_all_stats(xform, field=None):
+    return get_numeric_stats(xform, field)
@@ -1,6 +1,8 @@
 from builtins import str as text
 from hashlib import md5
 
+from django.utils.http import quote_etag
+
 MODELS_WITH_DATE_MODIFIED = ('XForm', 'Instance', 'Project', 'Attachment',
                              'MetaData', 'Note', 'OrganizationProfile',
                              'UserProfile', 'Team')
@@ -18,7 +20,8 @@ class ETagsMixin(object):
         if etag_value:
             etag_hash = md5(text(etag_value).encode('utf-8')).hexdigest()
         if etag_hash:
-            self.headers.update({'ETag': etag_hash})
+            # quoted so that ConditionalGetMiddleware can match If-None-Match
+            self.headers.update({'ETag': quote_etag(etag_hash)})
 
     def finalize_response(self, request, response, *args, **kwargs):
         if request.method == 'GET' and not response.streaming and \
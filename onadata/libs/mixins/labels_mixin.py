@@ -4,7 +4,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from taggit.forms import TagField
 
-from onadata.apps.logger.models import XForm
+from onadata.apps.logger.models import Instance, XForm
 from onadata.libs.models.signals import xform_tags_add, xform_tags_delete
 
 
@@ -28,7 +28,11 @@ def _labels_post(request, instance):
             for tag in tags:
                 instance.tags.add(tag)
 
-            if isinstance(instance, XForm):
+            if isinstance(instance, Instance):
+                # refresh the tags in the instance json
+                instance.mark_changed('tags')
+                instance.save()
+            elif isinstance(instance, XForm):
                 xform_tags_add.send(sender=XForm, xform=instance, tags=tags)
 
             return status.HTTP_201_CREATED
@@ -45,7 +49,11 @@ def _labels_delete(label, instance):
     count = instance.tags.count()
     instance.tags.remove(label)
 
-    if isinstance(instance, XForm):
+    if isinstance(instance, Instance):
+        # refresh the tags in the instance json
+        instance.mark_changed('tags')
+        instance.save()
+    elif isinstance(instance, XForm):
         xform_tags_delete.send(sender=XForm, xform=instance, tag=label)
 
     # Accepted, label does not exist hence nothing removed
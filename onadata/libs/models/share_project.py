@@ -2,21 +2,27 @@ from django.contrib.auth.models import User
 from django.db import transaction
 
 from onadata.libs.permissions import ROLES
-from onadata.libs.permissions import EditorRole, EditorMinorRole,\
-    DataEntryRole, DataEntryMinorRole, DataEntryOnlyRole
+from onadata.libs.utils.bulk_permissions import (BulkPermissions,
+                                                 add_project_permissions)
 from onadata.libs.utils.cache_tools import (
     PROJ_PERM_CACHE, PROJ_OWNER_CACHE, safe_delete)
 
 
-def remove_xform_permissions(project, user, role):
+def remove_xform_permissions(project, user, role, permissions=None):
     # remove role from project forms as well
+    bulk = BulkPermissions() if permissions is None else permissions
     for xform in project.xform_set.all():
-        role._remove_obj_permissions(user, xform)
+        bulk.remove(user, xform)
+    if permissions is None:
+        bulk.apply()
 
 
-def remove_dataview_permissions(project, user, role):
-    for dataview in project.dataview_set.all():
-        role._remove_obj_permissions(user, dataview.xform)
+def remove_dataview_permissions(project, user, role, permissions=None):
+    bulk = BulkPermissions() if permissions is None else permissions
+    for dataview in project.dataview_set.select_related('xform'):
+        bulk.remove(user, dataview.xform)
+    if permissions is None:
+        bulk.apply()
 
 
 class ShareProject(object):
@@ -33,45 +39,37 @@ class ShareProject(object):
 
     @transaction.atomic()
     def save(self, **kwargs):
+        """
+        Shares the project, its forms and filtered datasets with the user,
+        the permissions are applied in bulk.
+
+        :param progress: called with the number of objects shared so far and
+        the total.
+        """
+        progress = kwargs.get('progress')
 
         if self.remove:
-            self.__remove_user()
+            self.__remove_user(progress)
         else:
             role = ROLES.get(self.role)
 
-            if role and self.user and self.project:
-                role.add(self.user, self.project)
-
-                # apply same role to forms under the project
-                for xform in self.project.xform_set.all():
-                    # check if there is xform meta perms set
-                    meta_perms = xform.metadata_set \
-                        .filter(data_type='xform_meta_perms')
-                    if meta_perms:
-                        meta_perm = meta_perms[0].data_value.split("|")
-
-                        if len(meta_perm) > 1:
-                            if role in [EditorRole, EditorMinorRole]:
-                                role = ROLES.get(meta_perm[0])
-
-                            elif role in [DataEntryRole, DataEntryMinorRole,
-                                          DataEntryOnlyRole]:
-                                role = ROLES.get(meta_perm[1])
-                    role.add(self.user, xform)
-
-                for dataview in self.project.dataview_set.all():
-                    if dataview.matches_parent:
-                        role.add(self.user, dataview.xform)
+            if role and self.project:
+                add_project_permissions(
+                    BulkPermissions(), self.project, self.user, role)\
+                    .apply(progress)
 
         # clear cache
         safe_delete('{}{}'.format(PROJ_OWNER_CACHE, self.project.pk))
         safe_delete('{}{}'.format(PROJ_PERM_CACHE, self.project.pk))
 
     @transaction.atomic()
-    def __remove_user(self):
+    def __remove_user(self, progress=None):
         role = ROLES.get(self.role)
 
-        if role and self.user and self.project:
-            remove_xform_permissions(self.project, self.user, role)
-            remove_dataview_permissions(self.project, self.user, role)
-            role._remove_obj_permissions(self.user, self.project)
+        if role and self.project:
+            user = self.user
+            permissions = BulkPermissions()
+            remove_xform_permissions(self.project, user, role, permissions)
+            remove_dataview_permissions(self.project, user, role, permissions)
+            permissions.remove(user, self.project)
+            permissions.apply(progress)
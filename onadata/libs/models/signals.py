@@ -15,11 +15,13 @@ def add_tags_to_xform_instances(sender, **kwargs):
     if isinstance(xform, XForm) and isinstance(tags, list):
         # update existing instances with the new tag
         for instance in xform.instances.all():
-            for tag in tags:
-                if tag not in instance.tags.names():
-                    instance.tags.add(tag)
-            # ensure mongodb is updated
-            instance.parsed_instance.save()
+            names = set(instance.tags.names())
+            new_tags = [tag for tag in tags if tag not in names]
+            if new_tags:
+                instance.tags.add(*new_tags)
+                # refresh the tags in the instance json
+                instance.mark_changed('tags')
+                instance.save()
 
 
 @django.dispatch.receiver(xform_tags_delete, sender=XForm)
@@ -31,5 +33,6 @@ def delete_tag_from_xform_instances(sender, **kwargs):
         for instance in xform.instances.all():
             if tag in instance.tags.names():
                 instance.tags.remove(tag)
-                # ensure mongodb is updated
-                instance.parsed_instance.save()
+                # refresh the tags in the instance json
+                instance.mark_changed('tags')
+                instance.save()
@@ -1,7 +1,164 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.utils.translation import ugettext as _
+from django.utils.translation import ugettext_lazy
+from rest_framework.exceptions import ParseError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
+
+from onadata.libs.models.sorting import sort_from_mongo_sort_str
+from onadata.libs.utils.common_tags import ID
+
+# sort keys that are not in the submission json
+KEYSET_MODEL_FIELDS = {
+    '_submission_time': u'{table}.date_created',
+    '_version': u"COALESCE({table}.version, '')",
+}
 
 
 class StandardPageNumberPagination(PageNumberPagination):
     page_size = 1000
     page_size_query_param = 'page_size'
     max_page_size = 10000
+
+
+class KeysetPagination(object):
+    """
+    Paginates submissions from the position of the last submission of the
+    previous page instead of an offset.
+
+    The position is the value of the requested sort key and the submission
+    id. It is sent to the client as an opaque `cursor` token in the
+    `next` link of the `Link` header, the first page is requested with an
+    empty `cursor`.
+    """
+    cursor_query_param = 'cursor'
+    page_size = StandardPageNumberPagination.page_size
+    page_size_query_params = ('page_size', 'limit')
+    max_page_size = StandardPageNumberPagination.max_page_size
+    invalid_cursor_message = ugettext_lazy(u"Invalid cursor")
+
+    def __init__(self):
+        self.request = None
+        self.records = []
+        self.next_position = None
+
+    @classmethod
+    def is_requested(cls, request):
+        """Returns True if the request asks for keyset pagination."""
+        return cls.cursor_query_param in request.query_params
+
+    def get_page_size(self, request):
+        for param in self.page_size_query_params:
+            try:
+                page_size = int(request.query_params[param])
+            except (KeyError, ValueError):
+                continue
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+
+        return self.page_size
+
+    def encode_cursor(self, position):
+        return urlsafe_b64encode(
+            json.dumps(position).encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request):
+        """Returns the [sort key value, id] position in the cursor."""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+
+        try:
+            value, pk = json.loads(
+                urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise ParseError(self.invalid_cursor_message)
+
+        return [value, pk]
+
+    def get_sort_key(self, sort):
+        """Returns the sort key and whether the sort order is descending."""
+        sort = sort_from_mongo_sort_str(sort) if sort else []
+        if len(sort) > 1:
+            raise ParseError(
+                _(u"Cursor pagination supports sorting by one field only."))
+        if not sort:
+            return None, False
+
+        key = sort[0]
+        descending = key.startswith('-')
+        key = key.lstrip('-')
+
+        return (None if key in (ID, 'id') else key), descending
+
+    def paginate_queryset(self, queryset, request, sort=None, fields=None):
+        """
+        Returns the json, or the requested `fields` of the json, of the
+        submissions in the page.
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        key, descending = self.get_sort_key(sort)
+        position = self.decode_cursor(request)
+        table = queryset.model._meta.db_table
+        id_column = u'{}.id'.format(table)
+        operator = u'<' if descending else u'>'
+        order = u'-' if descending else u''
+
+        if key is None:
+            ordering = [order + 'id']
+            if position is not None:
+                queryset = queryset.extra(
+                    where=[u'{} {} %s'.format(id_column, operator)],
+                    params=[position[1]])
+        else:
+            key_params = []
+            if key in KEYSET_MODEL_FIELDS:
+                key_sql = KEYSET_MODEL_FIELDS[key].format(table=table)
+            else:
+                key_sql = u"COALESCE({}.json->>%s, '')".format(table)
+                key_params = [key]
+            queryset = queryset.extra(select={'_cursor_key': key_sql},
+                                      select_params=key_params)
+            ordering = [order + '_cursor_key', order + 'id']
+            if position is not None:
+                queryset = queryset.extra(
+                    where=[u'({}, {}) {} (%s, %s)'.format(
+                        key_sql, id_column, operator)],
+                    params=key_params + position)
+
+        records = list(queryset.order_by(*ordering)[:page_size + 1])
+        if len(records) > page_size:
+            records = records[:page_size]
+            last = records[-1]
+            value = getattr(last, '_cursor_key', None)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            self.next_position = [value, last.pk]
+
+        self.records = records
+        if fields and isinstance(fields, str):
+            fields = json.loads(fields)
+
+        if fields:
+            return [{field: record.json.get(field) for field in fields}
+                    for record in records]
+
+        return [record.json for record in records]
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.encode_cursor(self.next_position))
+
+    def get_link_header(self):
+        """Returns the value of the `Link` header for the page or None."""
+        next_link = self.get_next_link()
+
+        return u'<{}>; rel="next"'.format(next_link) if next_link else None
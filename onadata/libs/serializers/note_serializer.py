@@ -45,6 +45,7 @@ class NoteSerializer(serializers.ModelSerializer):
             assign_perm('view_note', request.user, obj)
 
         # should update instance json
+        obj.instance.mark_changed('notes')
         obj.instance.save()
 
         return obj
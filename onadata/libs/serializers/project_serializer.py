@@ -2,8 +2,6 @@
 """
 Project Serializer module.
 """
-from future.utils import listvalues
-
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.cache import cache
@@ -27,6 +25,8 @@ from onadata.libs.utils.cache_tools import (
     PROJ_PERM_CACHE, PROJ_SUB_DATE_CACHE, PROJ_TEAM_USERS_CACHE,
     PROJECT_LINKED_DATAVIEWS, PROJ_OWNER_CACHE, safe_delete)
 from onadata.libs.utils.decorators import check_obj
+from onadata.libs.utils.permission_matrix import (
+    PermissionMatrix, get_serializer_permission_matrix)
 
 
 def get_project_xforms(project):
@@ -122,40 +122,22 @@ def get_teams(project):
 
 
 @check_obj
-def get_users(project, context, all_perms=True):
+def get_users(project, context, all_perms=True, matrix=None):
     """
     Return a list of users and organizations that have access to the project.
+
+    :param matrix: the permission matrix of the project, loaded when None.
     """
     if all_perms:
         users = cache.get('{}{}'.format(PROJ_PERM_CACHE, project.pk))
         if users:
             return users
 
-    data = {}
-    for perm in project.projectuserobjectpermission_set.all():
-        if perm.user_id not in data:
-            user = perm.user
-
-            if all_perms or user in [
-                    context['request'].user, project.organization
-            ]:
-                data[perm.user_id] = {
-                    'permissions': [],
-                    'is_org': is_organization(user.profile),
-                    'metadata': user.profile.metadata,
-                    'first_name': user.first_name,
-                    'last_name': user.last_name,
-                    'user': user.username
-                }
-        if perm.user_id in data:
-            data[perm.user_id]['permissions'].append(perm.permission.codename)
-
-    for k in list(data):
-        data[k]['permissions'].sort()
-        data[k]['role'] = get_role(data[k]['permissions'], project)
-        del data[k]['permissions']
-
-    results = listvalues(data)
+    if matrix is None:
+        matrix = PermissionMatrix(Project, [project.pk])
+    results = matrix.get_users(
+        project.pk, None if all_perms else
+        [context['request'].user, project.organization])
 
     if all_perms:
         cache.set('{}{}'.format(PROJ_PERM_CACHE, project.pk), results)
@@ -254,7 +236,10 @@ class BaseProjectSerializer(serializers.HyperlinkedModelSerializer):
         """
         owner_query_param_in_request = 'request' in self.context and\
             "owner" in self.context['request'].GET
-        return get_users(obj, self.context, owner_query_param_in_request)
+        return get_users(
+            obj, self.context, owner_query_param_in_request,
+            get_serializer_permission_matrix(self, Project, obj)
+            if obj else None)
 
     @check_obj
     def get_forms(self, obj):
@@ -458,7 +443,9 @@ class ProjectSerializer(serializers.HyperlinkedModelSerializer):
         Return a list of users and organizations that have access to the
         project.
         """
-        return get_users(obj, self.context)
+        return get_users(
+            obj, self.context, matrix=get_serializer_permission_matrix(
+                self, Project, obj) if obj else None)
 
     @check_obj
     def get_forms(self, obj):  # pylint: disable=no-self-use
@@ -12,7 +12,6 @@ from django.core.validators import URLValidator
 from django.db.models import Count
 from django.utils.translation import ugettext as _
 from future.moves.urllib.parse import urlparse
-from future.utils import listvalues
 from requests.exceptions import ConnectionError
 from rest_framework import serializers
 from rest_framework.reverse import reverse
@@ -20,7 +19,6 @@ from rest_framework.reverse import reverse
 from onadata.apps.logger.models import DataView, Instance, XForm
 from onadata.apps.main.models.meta_data import MetaData
 from onadata.libs.exceptions import EnketoError
-from onadata.libs.permissions import get_role, is_organization
 from onadata.libs.serializers.dataview_serializer import \
     DataViewMinimalSerializer
 from onadata.libs.serializers.metadata_serializer import MetaDataSerializer
@@ -32,6 +30,8 @@ from onadata.libs.utils.cache_tools import (
 from onadata.libs.utils.common_tags import (GROUP_DELIMETER_TAG,
                                             REPEAT_INDEX_TAGS)
 from onadata.libs.utils.decorators import check_obj
+from onadata.libs.utils.permission_matrix import \
+    get_serializer_permission_matrix
 from onadata.libs.utils.viewer_tools import (
     get_enketo_urls, get_form_url)
 
@@ -116,29 +116,8 @@ class XFormMixin(object):
 
             cache.set('{}{}'.format(XFORM_PERMISSIONS_CACHE, obj.pk),
                       xform_perms)
-        data = {}
-        for perm in obj.xformuserobjectpermission_set.all():
-            if perm.user_id not in data:
-                user = perm.user
-
-                data[perm.user_id] = {
-                    'permissions': [],
-                    'is_org': is_organization(user.profile),
-                    'metadata': user.profile.metadata,
-                    'first_name': user.first_name,
-                    'last_name': user.last_name,
-                    'user': user.username
-                }
-            if perm.user_id in data:
-                data[perm.user_id]['permissions'].append(
-                    perm.permission.codename)
-
-        for k in list(data):
-            data[k]['permissions'].sort()
-            data[k]['role'] = get_role(data[k]['permissions'], XForm)
-            del (data[k]['permissions'])
-
-        xform_perms = listvalues(data)
+        xform_perms = get_serializer_permission_matrix(
+            self, XForm, obj).get_users(obj.pk)
 
         cache.set('{}{}'.format(XFORM_PERMISSIONS_CACHE, obj.pk), xform_perms)
 
@@ -13,3 +13,19 @@ class TestStatistics(unittest.TestCase):
         values = [1, 2, 3, 2, 5, 5]
         result = stats.get_median(values)
         self.assertEqual(result, 2.5)
+
+    def test_get_column_stats(self):
+        values = [1, 2, 3, 2, 5, 5]
+        result = stats.get_column_stats(values)
+        self.assertEqual(result['mean'], 3)
+        self.assertEqual(result['median'], 2.5)
+        # the smallest of the most frequent values
+        self.assertEqual(list(result['mode']), [2])
+        self.assertEqual(list(result['mode']),
+                         list(stats.get_mode(values)[0]))
+        self.assertEqual(result['max'], 5)
+        self.assertEqual(result['min'], 1)
+        self.assertEqual(result['range'], 4)
+
+        result = stats.get_column_stats([24, 25.5, 28.123])
+        self.assertEqual(result['mean'], 25.87)
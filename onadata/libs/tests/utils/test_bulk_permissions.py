@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Test onadata.libs.utils.bulk_permissions
+"""
+from onadata.apps.main.models.meta_data import MetaData
+from onadata.apps.main.tests.test_base import TestBase
+from onadata.libs.permissions import (EditorMinorRole, EditorRole,
+                                      ReadOnlyRole)
+from onadata.libs.utils.bulk_permissions import (BulkPermissions,
+                                                 add_project_permissions,
+                                                 remove_project_permissions)
+
+
+class TestBulkPermissions(TestBase):
+    """
+    Test BulkPermissions.
+    """
+
+    def setUp(self):
+        super(TestBulkPermissions, self).setUp()
+        self._publish_transportation_form()
+        self.alice = self._create_user('alice', 'alice', create_profile=True)
+
+    def test_apply(self):
+        """
+        Test only the guardian rows that differ are created or deleted.
+        """
+        permissions = BulkPermissions(batch_size=1)
+        permissions.add(self.alice, EditorRole, self.project)
+        permissions.add(self.alice, EditorRole, self.xform)
+        progress = []
+        created, deleted = permissions.apply(
+            lambda applied, total: progress.append((applied, total)))
+        self.assertEqual(progress, [(1, 2), (2, 2)])
+        self.assertEqual(
+            (created, deleted),
+            (len(EditorRole.class_to_permissions[type(self.project)]) +
+             len(EditorRole.class_to_permissions[type(self.xform)]), 0))
+        self.assertTrue(EditorRole.user_has_role(self.alice, self.project))
+        self.assertTrue(EditorRole.user_has_role(self.alice, self.xform))
+
+        # the read only permissions are a subset of the editor permissions
+        permissions = BulkPermissions()
+        permissions.add(self.alice, ReadOnlyRole, self.xform)
+        created, deleted = permissions.apply()
+        self.assertEqual(created, 0)
+        self.assertEqual(
+            deleted,
+            len(EditorRole.class_to_permissions[type(self.xform)]) -
+            len(ReadOnlyRole.class_to_permissions[type(self.xform)]))
+        self.assertTrue(ReadOnlyRole.user_has_role(self.alice, self.xform))
+        self.assertFalse(EditorRole.user_has_role(self.alice, self.xform))
+
+        permissions = remove_project_permissions(
+            BulkPermissions(), self.project, self.alice)
+        permissions.apply()
+        self.assertFalse(self.alice.has_perm('view_project', self.project))
+        self.assertFalse(self.alice.has_perm('view_xform', self.xform))
+
+    def test_add_project_permissions(self):
+        """
+        Test the xform meta perms of a form replace the role on the project.
+        """
+        MetaData.xform_meta_permission(
+            self.xform, data_value='editor-minor|dataentry')
+        add_project_permissions(
+            BulkPermissions(), self.project, self.alice, EditorRole).apply()
+
+        self.assertTrue(EditorRole.user_has_role(self.alice, self.project))
+        self.assertTrue(EditorMinorRole.user_has_role(self.alice, self.xform))
+        self.assertFalse(EditorRole.user_has_role(self.alice, self.xform))
@@ -4,6 +4,7 @@ Test onadata.libs.utils.cache_tools module.
 """
 from django.core.cache import cache
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.http.request import HttpRequest
 from unittest import TestCase
 
@@ -12,7 +13,8 @@ from onadata.apps.logger.models.project import Project
 from onadata.libs.utils.cache_tools import (
     PROJ_PERM_CACHE, PROJ_NUM_DATASET_CACHE, PROJ_SUB_DATE_CACHE,
     PROJ_FORMS_CACHE, PROJ_BASE_FORMS_CACHE, PROJ_OWNER_CACHE,
-    safe_key, reset_project_cache, project_cache_prefixes)
+    safe_key, reset_project_cache, project_cache_prefixes,
+    bump_xform_data_version, get_xform_data_version)
 
 
 class TestCacheTools(TestCase):
@@ -94,3 +96,14 @@ class TestCacheTools(TestCase):
         self.assertEqual(
             project_cache,
             expected_project_cache)
+
+    def test_bump_xform_data_version_on_commit(self):
+        """
+        Test bump_xform_data_version() changes the version when the
+        transaction commits
+        """
+        version = get_xform_data_version(1)
+        with transaction.atomic():
+            bump_xform_data_version(1)
+            self.assertEqual(get_xform_data_version(1), version)
+        self.assertNotEqual(get_xform_data_version(1), version)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Test onadata.libs.utils.counter_tools module.
+"""
+from django.core.cache import cache
+from django.utils import timezone
+from mock import patch
+
+from onadata.apps.logger.models import XForm
+from onadata.apps.main.tests.test_base import TestBase
+from onadata.libs.utils.cache_tools import (XFORM_SUBMISSION_COUNT_FLUSH,
+                                            XFORM_SUBMISSIONS_ADDED,
+                                            XFORM_SUBMISSIONS_REMOVED)
+from onadata.libs.utils.counter_tools import (buffer_submission_count,
+                                              flush_submission_count,
+                                              update_submission_count)
+
+
+class TestCounterTools(TestBase):
+    """Test submission counter functions"""
+
+    def setUp(self):
+        super(TestCounterTools, self).setUp()
+        self._publish_transportation_form()
+        cache.clear()
+
+    def test_update_submission_count(self):
+        """Test the form and profile counts are updated in one statement"""
+        now = timezone.now()
+        project_id = update_submission_count(self.xform.pk, 3, now)
+
+        self.assertEqual(project_id, self.xform.project_id)
+        self.xform.refresh_from_db()
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.xform.num_of_submissions, 3)
+        self.assertEqual(self.xform.last_submission_time, now)
+        self.assertEqual(self.user.profile.num_of_submissions, 3)
+
+        # counts are never negative
+        update_submission_count(self.xform.pk, -5)
+        self.xform.refresh_from_db()
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.xform.num_of_submissions, 0)
+        self.assertEqual(self.xform.last_submission_time, now)
+        self.assertEqual(self.user.profile.num_of_submissions, 0)
+
+        self.assertIsNone(update_submission_count(0, 1))
+
+    @patch('onadata.libs.utils.counter_tools.SUBMISSION_COUNT_FLUSH_INTERVAL',
+           10)
+    @patch('onadata.libs.utils.counter_tools.flush_submission_count')
+    def test_buffer_submission_count(self, flush_mock):
+        """Test buffered changes are applied in one flush"""
+        now = timezone.now()
+        buffer_submission_count(self.xform.pk, 1, now)
+        buffer_submission_count(self.xform.pk, 1, now)
+        buffer_submission_count(self.xform.pk, 2, now)
+        buffer_submission_count(self.xform.pk, -1)
+
+        # a single flush is scheduled for the form
+        self.assertEqual(flush_mock.apply_async.call_count, 1)
+        self.assertEqual(
+            cache.get('{}{}'.format(XFORM_SUBMISSIONS_ADDED, self.xform.pk)),
+            4)
+        self.assertEqual(
+            cache.get('{}{}'.format(XFORM_SUBMISSIONS_REMOVED,
+                                    self.xform.pk)), 1)
+        self.xform.refresh_from_db()
+        self.assertEqual(self.xform.num_of_submissions, 0)
+
+        flush_submission_count(self.xform.pk)
+
+        self.xform.refresh_from_db()
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.xform.num_of_submissions, 3)
+        self.assertEqual(self.xform.last_submission_time, now)
+        self.assertEqual(self.user.profile.num_of_submissions, 3)
+        self.assertEqual(
+            cache.get('{}{}'.format(XFORM_SUBMISSIONS_ADDED, self.xform.pk)),
+            0)
+        self.assertIsNone(cache.get(
+            '{}{}'.format(XFORM_SUBMISSION_COUNT_FLUSH, self.xform.pk)))
+
+        # nothing left to flush
+        flush_submission_count(self.xform.pk)
+        self.assertEqual(
+            XForm.objects.get(pk=self.xform.pk).num_of_submissions, 3)
+        self.assertEqual(flush_mock.apply_async.call_count, 1)
+
+    def test_flush_submission_count_evicted(self):
+        """Test a flush tolerates a buffered count evicted while flushing"""
+        added_key = '{}{}'.format(XFORM_SUBMISSIONS_ADDED, self.xform.pk)
+        cache.set(added_key, 2, None)
+        update = update_submission_count
+
+        def evict_and_update(*args):
+            cache.delete(added_key)
+            return update(*args)
+
+        with patch('onadata.libs.utils.counter_tools.update_submission_count',
+                   side_effect=evict_and_update):
+            flush_submission_count(self.xform.pk)
+
+        self.xform.refresh_from_db()
+        self.assertEqual(self.xform.num_of_submissions, 2)
+        self.assertIsNone(cache.get(added_key))
@@ -3,6 +3,7 @@
 Test CSVDataFrameBuilder
 """
 import csv
+import json
 import os
 from tempfile import NamedTemporaryFile
 
@@ -11,6 +12,7 @@ from django.test.utils import override_settings
 from django.utils.dateparse import parse_datetime
 from mock import patch
 
+from onadata.apps.logger.models.column_schema import ColumnSchema
 from onadata.apps.logger.models.xform import XForm
 from onadata.apps.logger.xform_instance_parser import xform_instance_to_dict
 from onadata.apps.main.tests.test_base import TestBase
@@ -115,6 +117,82 @@ class TestCSVDataFrameBuilder(TestBase):
             self._test_csv_files(csv_file, csv_fixture_path)
         os.unlink(temp_file.name)
 
+    def test_csv_export_from_column_schema(self):
+        """
+        Test CSVDataFrameBuilder.export_to() builds the repeat columns from
+        the form's column schema and rebuilds a stale schema.
+        """
+        self._publish_nested_repeats_form()
+        self._submit_fixture_instance(
+            "nested_repeats", "01", submission_time=self._submission_time)
+        self._submit_fixture_instance(
+            "nested_repeats", "02", submission_time=self._submission_time)
+        repeat_counts = {
+            'kids/kids_details': 3,
+            'kids/kids_details[1]/kids_immunization': 3,
+            'kids/kids_details[2]/kids_immunization': 3,
+            'kids/kids_details[3]/kids_immunization': 1}
+        self.assertEqual(
+            ColumnSchema.get_repeat_counts(self.xform.pk), repeat_counts)
+        csv_fixture_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "fixtures",
+            "nested_repeats", "nested_repeats.csv")
+
+        for is_stale in [False, True]:
+            if is_stale:
+                ColumnSchema.mark_stale(self.xform.pk)
+                self.assertIsNone(
+                    ColumnSchema.get_repeat_counts(self.xform.pk))
+            csv_df_builder = CSVDataFrameBuilder(
+                self.user.username, self.xform.id_string,
+                include_images=False)
+            temp_file = NamedTemporaryFile(suffix=".csv", delete=False)
+            with patch.object(
+                    CSVDataFrameBuilder, '_update_columns_from_data',
+                    autospec=True,
+                    side_effect=CSVDataFrameBuilder._update_columns_from_data
+            ) as mock_update_columns:
+                csv_df_builder.export_to(temp_file.name)
+            self.assertEqual(mock_update_columns.called, is_stale)
+            temp_file.close()
+            with open(temp_file.name) as csv_file:
+                self._test_csv_files(csv_file, csv_fixture_path)
+            os.unlink(temp_file.name)
+            self.assertEqual(
+                ColumnSchema.get_repeat_counts(self.xform.pk), repeat_counts)
+
+    def test_csv_export_from_column_schema_up_to_id(self):
+        """
+        Test the column schema is used by an export of the submissions up to
+        an id and is not marked stale by saves that do not edit a
+        submission.
+        """
+        self._publish_nested_repeats_form()
+        self._submit_fixture_instance(
+            "nested_repeats", "01", submission_time=self._submission_time)
+        self._submit_fixture_instance(
+            "nested_repeats", "02", submission_time=self._submission_time)
+        instance = self.xform.instances.latest('id')
+        instance.tags.add('hello')
+        instance.save()
+        self.assertIsNotNone(ColumnSchema.get_repeat_counts(self.xform.pk))
+
+        csv_df_builder = CSVDataFrameBuilder(
+            self.user.username, self.xform.id_string, include_images=False,
+            filter_query=json.dumps({'_id': {'$lte': instance.pk}}))
+        temp_file = NamedTemporaryFile(suffix=".csv", delete=False)
+        with patch.object(CSVDataFrameBuilder, '_update_columns_from_data',
+                          autospec=True) as mock_update_columns:
+            csv_df_builder.export_to(temp_file.name)
+        self.assertFalse(mock_update_columns.called)
+        temp_file.close()
+        csv_fixture_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "fixtures",
+            "nested_repeats", "nested_repeats.csv")
+        with open(temp_file.name) as csv_file:
+            self._test_csv_files(csv_file, csv_fixture_path)
+        os.unlink(temp_file.name)
+
     # pylint: disable=invalid-name
     def test_csv_columns_for_gps_within_groups(self):
         """
@@ -10,6 +10,9 @@ import mock
 import unicodecsv as ucsv
 from celery.backends.rpc import BacklogLimitExceeded
 from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError
 from mock import patch
 
 from onadata.apps.logger.models import Instance, XForm
@@ -53,39 +56,35 @@ class CSVImportTestCase(TestBase):
         resp = csv_import.submit_csv('userX', XForm(), 123456)
         self.assertIsNotNone(resp.get('error'))
 
-    @mock.patch('onadata.libs.utils.csv_import.safe_create_instance')
-    def test_submit_csv_xml_params(self, safe_create_instance):
+    @mock.patch('onadata.libs.utils.csv_import.create_instances_in_bulk')
+    def test_submit_csv_xml_params(self, create_instances_in_bulk):
         self._publish_xls_file(self.xls_file_path)
         self.xform = XForm.objects.get()
 
-        safe_create_instance.return_value = {}
+        create_instances_in_bulk.return_value = []
         single_csv = open(os.path.join(self.fixtures_dir, 'single.csv'), 'rb')
         csv_import.submit_csv(self.user.username, self.xform, single_csv)
         xml_file_param = BytesIO(
             open(os.path.join(self.fixtures_dir, 'single.xml'), 'rb').read())
-        safe_create_args = list(safe_create_instance.call_args[0])
+        create_args = list(create_instances_in_bulk.call_args[0])
 
-        self.assertEqual(safe_create_args[0], self.user.username,
-                         'Wrong username passed')
+        self.assertEqual(create_args[0], self.xform, 'Wrong xform passed')
+        self.assertEqual(len(create_args[1]), 1)
+        submission = create_args[1][0]
         self.assertEqual(
-            strip_xml_uuid(safe_create_args[1].getvalue()),
+            strip_xml_uuid(submission.xml),
             strip_xml_uuid(xml_file_param.getvalue()),
             'Wrong xml param passed')
-        self.assertEqual(safe_create_args[2], [],
+        self.assertEqual(submission.media_files, [],
                          'Wrong media array param passed')
-        self.assertEqual(safe_create_args[3], self.xform.uuid,
-                         'Wrong xform uuid passed')
-        self.assertEqual(safe_create_args[4], None)
 
-    @mock.patch('onadata.libs.utils.csv_import.safe_create_instance')
+    @mock.patch('onadata.libs.utils.csv_import.create_instances_in_bulk')
     @mock.patch('onadata.libs.utils.csv_import.dict2xmlsubmission')
     def test_submit_csv_xml_location_property_test(self, d2x,
-                                                   safe_create_instance):
+                                                   create_instances_in_bulk):
         self._publish_xls_file(self.xls_file_path)
         self.xform = XForm.objects.get()
-        safe_create_instance.return_value = [
-            None,
-        ]
+        create_instances_in_bulk.return_value = []
         single_csv = open(os.path.join(self.fixtures_dir, 'single.csv'), 'rb')
         csv_import.submit_csv(self.user.username, self.xform, single_csv)
 
@@ -122,6 +121,72 @@ class CSVImportTestCase(TestBase):
         self.xform.refresh_from_db()
         self.assertEqual(self.xform.num_of_submissions, count + 9)
 
+    @patch('onadata.libs.utils.csv_import.CSV_IMPORT_CHUNK_SIZE', 4)
+    def test_submit_csv_resumes_from_checkpoint(self):
+        """A failed import resumes from the last chunk it committed"""
+        xls_file_path = os.path.join(settings.PROJECT_ROOT, "apps", "main",
+                                     "tests", "fixtures", "tutorial.xls")
+        self._publish_xls_file(xls_file_path)
+        self.xform = XForm.objects.get()
+        checkpoints = []
+        submit_csv_batch = csv_import.submit_csv_batch
+
+        def fail_second_chunk(xform, batch):
+            if len(checkpoints) == 1:
+                raise DatabaseError('connection lost')
+            return submit_csv_batch(xform, batch)
+
+        with patch('onadata.libs.utils.csv_import.submit_csv_batch',
+                   side_effect=fail_second_chunk):
+            with self.assertRaises(DatabaseError):
+                csv_import.submit_csv(
+                    self.user.username, self.xform, self.good_csv,
+                    import_id='good.csv', on_checkpoint=checkpoints.append)
+        self.assertEqual(Instance.objects.count(), 4)
+        self.assertEqual(
+            checkpoints,
+            [{'row': 4, 'additions': 4, 'duplicates': 0, 'updates': 0}])
+
+        result = csv_import.submit_csv(
+            self.user.username, self.xform, self.good_csv,
+            import_id='good.csv', checkpoint=checkpoints[-1],
+            on_checkpoint=checkpoints.append)
+        self.assertEqual(result['additions'], 9)
+        self.assertEqual(Instance.objects.count(), 9)
+        self.assertEqual([c['row'] for c in checkpoints], [4, 8, 9])
+        self.xform.refresh_from_db()
+        self.assertEqual(self.xform.num_of_submissions, 9)
+
+    @patch('onadata.libs.utils.csv_import.CSV_IMPORT_CHUNK_SIZE', 4)
+    def test_submit_csv_async_reports_partial_import(self):
+        """A failed asynchronous import reports the rows it committed and
+        removes its checkpoint"""
+        xls_file_path = os.path.join(settings.PROJECT_ROOT, "apps", "main",
+                                     "tests", "fixtures", "tutorial.xls")
+        self._publish_xls_file(xls_file_path)
+        self.xform = XForm.objects.get()
+        file_path = default_storage.save(
+            'bob/csv_imports/good.csv', ContentFile(self.good_csv.read()))
+        submit_csv_batch = csv_import.submit_csv_batch
+        calls = []
+
+        def fail_second_chunk(xform, batch):
+            calls.append(batch)
+            if len(calls) == 2:
+                return 0, 0, 'Invalid submission'
+            return submit_csv_batch(xform, batch)
+
+        with patch('onadata.libs.utils.csv_import.submit_csv_batch',
+                   side_effect=fail_second_chunk):
+            result = csv_import.submit_csv_async.apply(
+                args=(self.user.username, self.xform.pk, file_path)).get()
+        self.assertEqual(result['error'], 'Invalid submission')
+        self.assertEqual(result['additions'], 4)
+        self.assertEqual(Instance.objects.count(), 4)
+        _dirs, files = default_storage.listdir('bob/csv_imports')
+        self.assertEqual(files, [os.path.basename(file_path)])
+        default_storage.delete(file_path)
+
     @patch('onadata.libs.utils.logger_tools.send_message')
     def test_submit_csv_edits(self, send_message_mock):
         xls_file_path = os.path.join(settings.PROJECT_ROOT, "apps", "main",
@@ -318,19 +383,20 @@ class CSVImportTestCase(TestBase):
         self.assertEqual(
             g_csv_reader.fieldnames[10], c_csv_reader.fieldnames[10])
 
-    @mock.patch('onadata.libs.utils.csv_import.safe_create_instance')
-    def test_submit_csv_instance_id_consistency(self, safe_create_instance):
+    @mock.patch('onadata.libs.utils.csv_import.create_instances_in_bulk')
+    def test_submit_csv_instance_id_consistency(self,
+                                                create_instances_in_bulk):
         self._publish_xls_file(self.xls_file_path)
         self.xform = XForm.objects.get()
 
-        safe_create_instance.return_value = {}
+        create_instances_in_bulk.return_value = []
         single_csv = open(os.path.join(self.fixtures_dir, 'single.csv'), 'rb')
         csv_import.submit_csv(self.user.username, self.xform, single_csv)
         xml_file_param = BytesIO(
             open(os.path.join(self.fixtures_dir, 'single.xml'), 'rb').read())
-        safe_create_args = list(safe_create_instance.call_args[0])
+        create_args = list(create_instances_in_bulk.call_args[0])
 
-        instance_xml = fromstring(safe_create_args[1].getvalue())
+        instance_xml = fromstring(create_args[1][0].xml)
         single_instance_xml = fromstring(xml_file_param.getvalue())
 
         instance_id = [
@@ -2678,6 +2678,44 @@ class TestExportBuilder(TestBase):
 
         self.assertEqual(expected_result, result)
 
+    def test_pre_process_row_options_changed(self):
+        """
+        Test rows are processed with the export options set after
+        set_survey.
+        """
+        md_xform = """
+        | survey  |
+        |         | type                   | name  | label  |
+        |         | integer                | age   | Age    |
+        |         | select_multiple fruits | fruit | Fruit  |
+        |         |                        |       |        |
+        | choices | list name              | name  | label  |
+        |         | fruits                 | 1     | Mango  |
+        |         | fruits                 | 2     | Orange |
+        |         | fruits                 | 3     | Apple  |
+        """
+        survey = self.md_to_pyxform_survey(md_xform, {'name': 'data'})
+        export_builder = ExportBuilder()
+        export_builder.set_survey(survey)
+        section = export_builder.sections[0]
+
+        row = export_builder.pre_process_row(
+            {'age': '25', 'fruit': '1 3'}, section)
+        self.assertEqual(row, {'age': 25, 'fruit': '1 3', 'fruit/1': True,
+                               'fruit/2': False, 'fruit/3': True})
+
+        export_builder.BINARY_SELECT_MULTIPLES = True
+        row = export_builder.pre_process_row(
+            {'age': '25', 'fruit': '1 3'}, section)
+        self.assertEqual(row, {'age': 25, 'fruit': '1 3', 'fruit/1': 1,
+                               'fruit/2': 0, 'fruit/3': 1})
+
+        export_builder.SPLIT_SELECT_MULTIPLES = False
+        export_builder.SHOW_CHOICE_LABELS = True
+        row = export_builder.pre_process_row(
+            {'age': '25', 'fruit': '1 3'}, section)
+        self.assertEqual(row, {'age': 25, 'fruit': 'Mango Apple'})
+
     # pylint: disable=C0103
     def test_show_choice_labels_select_multiple_1(self):
         """
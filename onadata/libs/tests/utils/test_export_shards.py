@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Test onadata.libs.utils.export_shards module.
+"""
+import copy
+import os
+from unittest import TestCase
+
+from django.conf import settings
+from django.db import connection
+from mock import patch
+from pyxform.builder import create_survey_from_xls
+
+from onadata.apps.main.tests.test_base import TestBase
+from onadata.libs.tests.utils import test_export_builder
+from onadata.libs.utils.export_builder import ExportBuilder
+from onadata.libs.utils.export_shards import ExportShards
+
+
+class TestExportShardsSectionRows(TestCase):
+    """Test rows processed in shards match rows processed serially"""
+
+    def setUp(self):
+        survey = create_survey_from_xls(os.path.join(
+            settings.PROJECT_ROOT, 'apps', 'logger', 'tests', 'fixtures',
+            'childrens_survey.xls'), default_name='childrens_survey')
+        self.builder = ExportBuilder()
+        self.builder.set_survey(survey)
+        self.data = test_export_builder.TestExportBuilder.data * 5
+
+    def test_iter_section_rows(self):
+        """Test the _index and _parent_index of rows across shards"""
+        serial_rows = list(self.builder.iter_section_rows(
+            copy.deepcopy(self.data), index=3, indices={'children': 4}))
+        serial_checkpoint = copy.deepcopy(self.builder.checkpoint)
+
+        shards = ExportShards(None, processes=3)
+        with patch.object(ExportShards, 'get_shards',
+                          return_value=[(0, 3), (3, 4), (4, 4), (4, 10)]), \
+                patch.object(ExportShards, 'query_shard',
+                             lambda shards, start, end: copy.deepcopy(
+                                 self.data[start:end])), \
+                patch.object(ExportShards, 'can_fork', return_value=True):
+            sharded_rows = list(self.builder.iter_export_section_rows(
+                shards, index=3, indices={'children': 4}))
+
+        self.assertEqual(sharded_rows, serial_rows)
+        self.assertEqual(self.builder.checkpoint, serial_checkpoint)
+
+
+class TestExportShards(TestBase):
+    """Test splitting the submissions of a form into shards"""
+
+    def test_get_shards(self):
+        """Test every submission is in exactly one shard"""
+        self._publish_transportation_form()
+        self._make_submissions()
+        ids = list(self.xform.instances.order_by('id').values_list(
+            'id', flat=True))
+
+        shards = ExportShards(self.xform, shard_size=2)
+        self.assertEqual(
+            shards.get_shards(),
+            [(None, ids[1]), (ids[1], ids[3]), (ids[3], None)])
+        self.assertEqual(
+            [[record['_id'] for record in shards.query_shard(*shard)]
+             for shard in shards.get_shards()],
+            [ids[:2], ids[2:], []])
+        self.assertEqual([record['_id'] for record in shards], ids)
+
+    def test_iter_section_rows_keeps_connection(self):
+        """Test the workers do not close the exporting process' connection"""
+        self._publish_transportation_form()
+        self._make_submissions()
+        builder = ExportBuilder()
+        builder.set_survey(self.xform.survey, self.xform)
+        shards = ExportShards(self.xform, processes=2, shard_size=2)
+        self.assertTrue(shards.can_fork())
+        connection.ensure_connection()
+        db_connection = connection.connection
+
+        rows = list(builder.iter_export_section_rows(shards))
+        self.assertEqual(
+            [row['_id'] for (section, row) in rows
+             if section == builder.survey.name],
+            list(self.xform.instances.order_by('id').values_list(
+                'id', flat=True)))
+        self.assertIs(connection.connection, db_connection)
+        self.assertEqual(self.xform.instances.count(), 4)
+
+    def test_get_shard_query(self):
+        """Test the query of a shard includes the export query"""
+        shards = ExportShards(None, query='{"name": "Abe"}')
+        self.assertEqual(shards.get_shard_query(None, None),
+                         '{"name": "Abe"}')
+        self.assertEqual(
+            shards.get_shard_query(1, 5),
+            ['{"name": "Abe"}', {'_id': {'$gt': 1, '$lte': 5}}])
+        self.assertEqual(ExportShards(None).get_shard_query(1, None),
+                         {'_id': {'$gt': 1}})
@@ -15,6 +15,8 @@ from django.core.files.storage import default_storage
 from django.core.files.temp import NamedTemporaryFile
 from django.test.utils import override_settings
 from django.utils import timezone
+from mock import MagicMock, PropertyMock, patch
+from openpyxl import load_workbook
 from pyxform.builder import create_survey_from_xls
 from rest_framework import exceptions
 from savReaderWriter import SavWriter
@@ -31,7 +33,8 @@ from onadata.libs.utils.export_builder import (encode_if_str,
 from onadata.libs.utils.export_tools import (
     ExportBuilder, check_pending_export, generate_attachments_zip_export,
     generate_export, generate_kml_export, generate_osm_export,
-    get_repeat_index_tags, kml_export_data, parse_request_export_options,
+    get_appendable_export, get_export_checkpoint, get_repeat_index_tags,
+    iter_kml_export, kml_export_data, parse_request_export_options,
     should_create_new_export, str_to_bool)
 
 
@@ -40,6 +43,21 @@ def _logger_fixture_path(*args):
                         *args)
 
 
+def _read_export_file(export):
+    path = default_storage.path(export.filepath)
+    if export.export_type == Export.CSV_EXPORT:
+        with open(path) as csv_file:
+            return csv_file.read()
+    if export.export_type == Export.CSV_ZIP_EXPORT:
+        with zipfile.ZipFile(path) as zip_file:
+            return {name: zip_file.read(name)
+                    for name in zip_file.namelist()}
+
+    workbook = load_workbook(path, read_only=True)
+    return {ws.title: list(ws.iter_rows(values_only=True))
+            for ws in workbook.worksheets}
+
+
 class TestExportTools(TestBase):
     """
     Test export_tools functions.
@@ -431,6 +449,49 @@ class TestExportTools(TestBase):
         self.assertEqual(
             kml_export_data(xform.id_string, xform.user), expected_data)
 
+    def test_kml_export_data_with_repeats(self):
+        """
+        Test the KML tables of submissions with repeats list the fields of
+        every repeat item together, in the order of the items.
+        """
+        kml_md = """
+        | survey |
+        |        | type         | name   | label  |
+        |        | geopoint     | gps    | GPS    |
+        |        | begin repeat | kids   | Kids   |
+        |        | text         | name   | Name   |
+        |        | begin repeat | pets   | Pets   |
+        |        | text         | pet    | Pet    |
+        |        | end repeat   |        |        |
+        |        | end repeat   |        |        |
+        |        | integer      | age    | Age    |
+        """
+        xform = self._publish_markdown(kml_md, self.user, id_string='kids')
+        xml = ('<data id="kids"><gps>-1.28 36.83</gps>'
+               '<kids><name>Ann</name><pets><pet>cat</pet></pets></kids>'
+               '<kids><name>Ben</name><pets><pet>dog</pet></pets>'
+               '<pets><pet>fish</pet></pets></kids><age>7</age></data>')
+        Instance(xform=xform, xml=xml).save()
+
+        data = kml_export_data(xform.id_string, xform.user, xform=xform)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(
+            data[0]['table'],
+            '<table border="1"><a href="#"><img width="210" '
+            'class="thumbnail" src="" alt=""></a>'
+            '<tr><td>GPS</td><td>-1.28 36.83</td></tr>'
+            '<tr><td>Name</td><td>Ann</td></tr>'
+            '<tr><td>Pet</td><td>cat</td></tr>'
+            '<tr><td>Name</td><td>Ben</td></tr>'
+            '<tr><td>Pet</td><td>dog</td></tr>'
+            '<tr><td>Pet</td><td>fish</td></tr>'
+            '<tr><td>Age</td><td>7</td></tr></table>')
+
+        content = ''.join(iter_kml_export(xform))
+        self.assertTrue(content.startswith('<?xml'))
+        self.assertEqual(content.count('<Placemark>'), 1)
+        self.assertIn('<![CDATA[%s]]>' % data[0]['table'], content)
+
     def test_kml_exports(self):
         """
         Test generate_kml_export()
@@ -729,3 +790,82 @@ class TestExportTools(TestBase):
             self.assertTrue(
                 os.path.exists(os.path.join(temp_dir, a.media_file.name)))
         shutil.rmtree(temp_dir)
+
+    @override_settings(INCREMENTAL_EXPORTS=True)
+    def test_generate_incremental_export(self):
+        """Test new submissions are appended to the previous export"""
+        self._publish_transportation_form()
+        self._submit_transport_instance(0)
+        self._submit_transport_instance(1)
+        export_types = [
+            (Export.CSV_EXPORT, 'csv'), (Export.CSV_ZIP_EXPORT, 'zip'),
+            (Export.XLS_EXPORT, 'xlsx')]
+
+        for (export_type, extension) in export_types:
+            export = generate_export(
+                export_type, self.xform, None, {'extension': extension})
+            self.assertEqual(export.checkpoint['count'], 2)
+
+        self._submit_transport_instance(2)
+        self._submit_transport_instance(3)
+        last_id = Instance.objects.filter(xform=self.xform).latest('id').id
+
+        for (export_type, extension) in export_types:
+            previous_export = Export.objects.filter(
+                xform=self.xform, export_type=export_type).latest('created_on')
+            self.assertEqual(
+                get_appendable_export(
+                    self.xform, export_type, {'extension': extension},
+                    get_export_checkpoint(self.xform)),
+                previous_export)
+
+            export = generate_export(
+                export_type, self.xform, None, {'extension': extension})
+            self.assertEqual(export.checkpoint['last_id'], last_id)
+            self.assertEqual(export.checkpoint['count'], 4)
+
+            # the appended export matches a full export
+            with override_settings(INCREMENTAL_EXPORTS=False):
+                full_export = generate_export(
+                    export_type, self.xform, None, {'extension': extension})
+            self.assertEqual(full_export.checkpoint, {})
+            self.assertEqual(_read_export_file(export),
+                             _read_export_file(full_export))
+
+        # exports are rebuilt when submissions are edited
+        instance = Instance.objects.filter(xform=self.xform).first()
+        instance.save()
+        self.assertIsNone(get_appendable_export(
+            self.xform, Export.CSV_EXPORT, {'extension': 'csv'},
+            get_export_checkpoint(self.xform)))
+
+    @override_settings(INCREMENTAL_EXPORTS=True)
+    def test_incremental_export_removes_local_copy(self):
+        """
+        Test the local copy of a remote previous export is removed when the
+        export fails.
+        """
+        self._publish_transportation_form()
+        self._submit_transport_instance(0)
+        options = {'extension': 'csv'}
+        generate_export(Export.CSV_EXPORT, self.xform, None, options)
+        self._submit_transport_instance(1)
+        # an export with other options is not appended to
+        self.assertIsNone(get_appendable_export(
+            self.xform, Export.CSV_EXPORT,
+            {'extension': 'csv', 'remove_group_name': True},
+            get_export_checkpoint(self.xform)))
+
+        local_copy = NamedTemporaryFile(suffix='.csv', delete=False)
+        local_copy.close()
+        storage = MagicMock()
+        storage.path.side_effect = NotImplementedError
+        with patch('onadata.libs.utils.export_tools.default_storage',
+                   storage), \
+                patch.object(Export, 'full_filepath',
+                             PropertyMock(return_value=local_copy.name)), \
+                patch.object(ExportBuilder, 'to_flat_csv_export',
+                             side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                generate_export(Export.CSV_EXPORT, self.xform, None, options)
+        self.assertFalse(os.path.exists(local_copy.name))
@@ -11,8 +11,11 @@ from onadata.apps.logger.models import Instance
 from onadata.apps.main.tests.test_base import TestBase
 from onadata.libs.utils.common_tags import (MEDIA_ALL_RECEIVED, MEDIA_COUNT,
                                             TOTAL_MEDIA)
+from onadata.apps.logger.xform_instance_parser import DuplicateInstance
 from onadata.libs.utils.logger_tools import (
-    create_instance, generate_content_disposition_header, get_first_record)
+    BulkSubmission, create_instance, create_instances_in_bulk,
+    generate_content_disposition_header, get_first_record,
+    safe_create_instances_in_bulk)
 
 
 class TestLoggerTools(PyxformTestCase, TestBase):
@@ -446,3 +449,80 @@ class TestLoggerTools(PyxformTestCase, TestBase):
         record = get_first_record(Instance.objects.all().only('id'))
         self.assertIsNotNone(record)
         self.assertEqual(record.id, instance.id)
+
+    def test_create_instances_in_bulk(self):
+        """
+        Test create_instances_in_bulk() creates new submissions and detects
+        duplicates within the batch and in the database.
+        """
+        md = """
+        | survey |       |        |       |
+        |        | type  | name   | label |
+        |        | text  | name   | Name  |
+        |        | image | image1 | Photo |
+        """
+        self._create_user_and_login()
+        self.xform = self._publish_markdown(md, self.user)
+
+        xml_string = """
+        <data id="{}">
+            <meta>
+                <instanceID>uuid:{}</instanceID>
+            </meta>
+            <name>{}</name>
+            <image1>1300221157303.jpg</image1>
+        </data>
+        """
+        existing = create_instance(
+            self.user.username,
+            BytesIO(xml_string.format(
+                self.xform.id_string, 'existing', 'Alice'
+            ).strip().encode('utf-8')),
+            media_files=[])
+        file_path = "{}/apps/logger/tests/Health_2011_03_13."\
+                    "xml_2011-03-15_20-30-28/1300221157303"\
+                    ".jpg".format(settings.PROJECT_ROOT)
+        media_file = django_file(
+            path=file_path, field_name="image1", content_type="image/jpeg")
+        items = [
+            BulkSubmission(xml_string.format(
+                self.xform.id_string, 'new-1', 'Bob'
+            ).strip().encode('utf-8'), [media_file]),
+            BulkSubmission(xml_string.format(
+                self.xform.id_string, 'new-2', 'Carol'
+            ).strip().encode('utf-8')),
+            BulkSubmission(xml_string.format(
+                self.xform.id_string, 'new-2', 'Carol'
+            ).strip().encode('utf-8')),
+            BulkSubmission(xml_string.format(
+                self.xform.id_string, 'existing', 'Alice'
+            ).strip().encode('utf-8')),
+            BulkSubmission(b'<data><a></data>'),
+        ]
+
+        results = create_instances_in_bulk(self.xform, items)
+
+        self.assertIsInstance(results[0], Instance)
+        self.assertIsInstance(results[1], Instance)
+        self.assertIsInstance(results[2], DuplicateInstance)
+        self.assertIsInstance(results[3], DuplicateInstance)
+        self.assertIsInstance(results[4], Exception)
+        self.xform.refresh_from_db()
+        self.assertEqual(self.xform.num_of_submissions, 3)
+        self.assertEqual(
+            self.xform.instances.filter(deleted_at__isnull=True).count(), 3)
+
+        instance = Instance.objects.get(pk=results[0].pk)
+        self.assertEqual(instance.uuid, 'new-1')
+        self.assertEqual(instance.json['name'], 'Bob')
+        self.assertEqual(instance.attachments.count(), 1)
+        self.assertTrue(instance.json[MEDIA_ALL_RECEIVED])
+        self.assertEqual(instance.json[MEDIA_COUNT], 1)
+        self.assertEqual(instance.parsed_instance.instance_id, instance.pk)
+        self.assertNotEqual(existing.pk, results[1].pk)
+
+        responses = safe_create_instances_in_bulk(
+            self.user.username, items[1:])
+        self.assertEqual(
+            [error.status_code for error, instance in responses],
+            [202, 202, 202, 400])
@@ -2,7 +2,8 @@ from unittest import TestCase
 
 from django.contrib.auth import get_user_model
 
-from onadata.libs.utils.model_tools import queryset_iterator
+from onadata.libs.utils.model_tools import (iter_query_rows,
+                                            queryset_iterator)
 
 
 class TestsForModelTools(TestCase):
@@ -19,3 +20,12 @@ class TestsForModelTools(TestCase):
             queryset_iterator(
                 user_model.objects.all(), chunksize=1).__class__.__name__
         )
+
+    def test_iter_query_rows(self):
+        sql = 'SELECT generate_series(1, %s)'
+        self.assertEqual(
+            [(i,) for i in range(1, 6)],
+            list(iter_query_rows(sql, [5], fetch_size=2)))
+        self.assertEqual(
+            [(i,) for i in range(1, 6)],
+            list(iter_query_rows(sql, [5], fetch_size=2, server_side=False)))
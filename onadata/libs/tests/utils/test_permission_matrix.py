@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Test onadata.libs.utils.permission_matrix
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from onadata.apps.api.tools import get_xform_users
+from onadata.apps.logger.models import XForm
+from onadata.apps.main.tests.test_base import TestBase
+from onadata.libs.permissions import EditorRole, ReadOnlyRole
+from onadata.libs.utils.bulk_permissions import BulkPermissions
+from onadata.libs.utils.permission_matrix import (PermissionMatrix,
+                                                  get_cache_key)
+
+
+class TestPermissionMatrix(TestBase):
+    """
+    Test PermissionMatrix.
+    """
+
+    def setUp(self):
+        super(TestPermissionMatrix, self).setUp()
+        self._publish_transportation_form()
+        self.alice = self._create_user('alice', 'alice', create_profile=True)
+        cache.clear()
+
+    def test_get_role(self):
+        """
+        Test the roles are resolved from the cached matrix until the
+        permissions change.
+        """
+        matrix = PermissionMatrix(XForm, [self.xform.pk])
+        self.assertEqual(matrix.get_role(self.xform.pk, self.user.pk),
+                         'owner')
+        self.assertIsNone(matrix.get_role(self.xform.pk, self.alice.pk))
+
+        with self.assertNumQueries(0):
+            PermissionMatrix(XForm, [self.xform.pk])
+
+        ReadOnlyRole.add(self.alice, self.xform)
+        matrix = PermissionMatrix(XForm, [self.xform.pk])
+        self.assertEqual(matrix.get_role(self.xform.pk, self.alice.pk),
+                         ReadOnlyRole.name)
+
+        # bulk_create does not send the post_save signals
+        permissions = BulkPermissions()
+        permissions.add(self.alice, EditorRole, self.xform)
+        permissions.apply()
+        matrix = PermissionMatrix(XForm, [self.xform.pk])
+        self.assertEqual(matrix.get_role(self.xform.pk, self.alice.pk),
+                         EditorRole.name)
+        self.assertEqual(
+            [(user['user'], user['role'])
+             for user in matrix.get_users(self.xform.pk, [self.alice])],
+            [('alice', EditorRole.name)])
+
+    def test_not_cached_in_transaction(self):
+        """
+        Test the permissions read in a transaction are not cached and the
+        cache is cleared when the transaction commits.
+        """
+        PermissionMatrix(XForm, [self.xform.pk])
+        with transaction.atomic():
+            ReadOnlyRole.add(self.alice, self.xform)
+            matrix = PermissionMatrix(XForm, [self.xform.pk])
+            self.assertEqual(matrix.get_role(self.xform.pk, self.alice.pk),
+                             ReadOnlyRole.name)
+            EditorRole.add(self.alice, self.xform)
+
+        self.assertIsNone(cache.get(get_cache_key(XForm, self.xform.pk)))
+        matrix = PermissionMatrix(XForm, [self.xform.pk])
+        self.assertEqual(matrix.get_role(self.xform.pk, self.alice.pk),
+                         EditorRole.name)
+
+    def test_get_xform_users(self):
+        """
+        Test get_xform_users returns the users with a role on the form.
+        """
+        ReadOnlyRole.add(self.alice, self.xform)
+        users = get_xform_users(self.xform)
+        self.assertEqual(users[self.user]['role'], 'owner')
+        self.assertEqual(users[self.alice]['role'], ReadOnlyRole.name)
+        self.assertFalse(users[self.alice]['is_org'])
@@ -11,7 +11,8 @@ from onadata.apps.logger.models import Project
 from onadata.apps.main.tests.test_base import TestBase
 from onadata.libs.permissions import DataEntryRole
 from onadata.libs.utils.project_utils import (set_project_perms_to_xform,
-                                              set_project_perms_to_xform_async)
+                                              set_project_perms_to_xform_async,
+                                              share_project_async)
 
 
 class TestProjectUtils(TestBase):
@@ -66,6 +67,23 @@ class TestProjectUtils(TestBase):
         self.assertEqual(args[0], self.xform)
         self.assertEqual(args[1], self.project)
 
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_share_project_async(self):
+        """
+        Test the share_project_async task shares the project and its forms.
+        """
+        self._publish_transportation_form()
+        alice = self._create_user('alice', 'alice', create_profile=True)
+        share_project_async.delay(
+            self.project.pk, 'alice', DataEntryRole.name)
+        self.assertTrue(DataEntryRole.user_has_role(alice, self.project))
+        self.assertTrue(DataEntryRole.user_has_role(alice, self.xform))
+
+        share_project_async.delay(
+            self.project.pk, 'alice', DataEntryRole.name, remove=True)
+        self.assertFalse(DataEntryRole.user_has_role(alice, self.project))
+        self.assertFalse(DataEntryRole.user_has_role(alice, self.xform))
+
     @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
     @patch(
         'onadata.libs.utils.project_utils.set_project_perms_to_xform_async.delay'  # noqa
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Test onadata.libs.utils.validate_data module.
+"""
+import json
+from unittest import TestCase
+
+import requests
+from django.core.cache import cache
+from httmock import HTTMock, urlmatch
+
+from onadata.libs.utils.validate_data import (BaseSpeciesNameValidator,
+                                              get_species_name_validator,
+                                              validate_data)
+
+SUBMISSION = """
+<data id="insects">
+    <repeat_group>
+        <capture_insect_details>
+            <insect_scientific_name_other>{}</insect_scientific_name_other>
+        </capture_insect_details>
+    </repeat_group>
+</data>
+"""
+
+gbif_requests = []
+
+
+@urlmatch(netloc=r'api\.gbif\.org$', path=r'^/v1/occurrence/search$')
+def gbif_mock(url, request):
+    gbif_requests.append(url.query)
+    response = requests.Response()
+    response.status_code = 200
+    response._content = json.dumps({
+        'results': [{'species': 'Apis mellifera'}]}).encode('utf-8')
+    return response
+
+
+class TestValidateData(TestCase):
+    """Test species name validation of submissions"""
+
+    def setUp(self):
+        del gbif_requests[:]
+        BaseSpeciesNameValidator.name_cache.clear()
+        cache.clear()
+
+    def test_validate_data_caches_names(self):
+        """Test a name is only looked up once"""
+        with HTTMock(gbif_mock):
+            self.assertTrue(
+                validate_data(SUBMISSION.format('Apis mellifera')))
+            self.assertTrue(
+                validate_data(SUBMISSION.format('Apis mellifera')))
+            self.assertFalse(
+                validate_data(SUBMISSION.format('Apis unknown')))
+            self.assertFalse(
+                validate_data(SUBMISSION.format('Apis unknown')))
+
+        self.assertEqual(len(gbif_requests), 2)
+
+        # the Django cache is used when the process cache misses
+        BaseSpeciesNameValidator.name_cache.clear()
+        with HTTMock(gbif_mock):
+            self.assertTrue(
+                validate_data(SUBMISSION.format('Apis mellifera')))
+        self.assertEqual(len(gbif_requests), 2)
+
+    def test_validate_data_deferred(self):
+        """Test deferred validation only uses cached names"""
+        with HTTMock(gbif_mock):
+            self.assertTrue(validate_data(
+                SUBMISSION.format('Apis unknown'), deferred=True))
+            self.assertEqual(len(gbif_requests), 0)
+
+            get_species_name_validator().is_valid(['Apis unknown'])
+            self.assertEqual(len(gbif_requests), 1)
+            self.assertFalse(validate_data(
+                SUBMISSION.format('Apis unknown'), deferred=True))
+
+    def test_validate_data_without_names(self):
+        """Test submissions without a repeat_group are not validated"""
+        self.assertIsNone(validate_data('<data id="insects"><a>1</a></data>'))
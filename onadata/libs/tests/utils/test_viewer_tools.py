@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 """Test onadata.libs.utils.viewer_tools."""
 import os
+import zipfile
+from io import BytesIO
 
-from django.core.files.base import File
+from django.core.files.base import ContentFile, File
 from django.http import Http404
 from django.test.client import RequestFactory
 from django.test.utils import override_settings
@@ -15,7 +17,8 @@ from onadata.libs.utils.viewer_tools import (create_attachments_zipfile,
                                              export_def_from_filename,
                                              generate_enketo_form_defaults,
                                              get_client_ip, get_form,
-                                             get_form_url)
+                                             get_form_url,
+                                             iter_attachments_zipfile)
 
 
 class TestViewerTools(TestBase):
@@ -179,3 +182,70 @@ class TestViewerTools(TestBase):
 
         self.assertTrue(rpt_mock.called)
         rpt_mock.assert_called_with(message[0], message[1])
+
+    @patch('onadata.libs.utils.viewer_tools.ZIP_EXPORT_CHUNK_SIZE', 1024)
+    @patch('onadata.libs.utils.viewer_tools.report_exception')
+    def test_iter_attachments_zipfile(self, rpt_mock):
+        """
+        Test attachments are streamed into the zip file in blocks and files
+        larger than allowed are left out.
+        """
+        self._publish_transportation_form_and_submit_instance()
+        media_file = os.path.join(
+            self.this_directory, 'fixtures', 'transportation', 'instances',
+            self.surveys[0], '1335783522563.jpg')
+        instance = Instance.objects.all()[0]
+        for _i in range(3):
+            Attachment.objects.create(
+                instance=instance,
+                media_file=File(open(media_file, 'rb'), media_file))
+        small_file = ContentFile(b'small', name='small.txt')
+        Attachment.objects.create(instance=instance, media_file=small_file)
+        attachments = Attachment.objects.all()
+
+        zip_data = b''.join(iter_attachments_zipfile(attachments))
+        with zipfile.ZipFile(BytesIO(zip_data)) as zip_file:
+            self.assertEqual(
+                sorted(zip_file.namelist()),
+                sorted(a.media_file.name for a in attachments))
+            for attachment in attachments:
+                with attachment.media_file.storage.open(
+                        attachment.media_file.name) as f:
+                    self.assertEqual(
+                        zip_file.read(attachment.media_file.name), f.read())
+        self.assertFalse(rpt_mock.called)
+
+        with override_settings(ZIP_REPORT_ATTACHMENT_LIMIT=100):
+            zip_data = b''.join(iter_attachments_zipfile(attachments))
+        with zipfile.ZipFile(BytesIO(zip_data)) as zip_file:
+            self.assertEqual(zip_file.namelist(),
+                             [attachments.last().media_file.name])
+        self.assertEqual(rpt_mock.call_count, attachments.count() - 1)
+
+    @patch('onadata.libs.utils.viewer_tools.ZIP_EXPORT_CHUNK_SIZE', 4)
+    @patch('onadata.libs.utils.viewer_tools.report_exception')
+    def test_iter_attachments_zipfile_read_error(self, rpt_mock):
+        """
+        Test the zip file is abandoned when a file fails after part of it
+        was written.
+        """
+        self._publish_transportation_form_and_submit_instance()
+        instance = Instance.objects.all()[0]
+        Attachment.objects.create(
+            instance=instance,
+            media_file=ContentFile(b'small file', name='small.txt'))
+
+        class FailingFile(BytesIO):
+            size = 10
+
+            def read(self, *args):
+                if self.tell():
+                    raise IOError("Read failed")
+                return BytesIO.read(self, *args)
+
+        with patch('django.core.files.storage.FileSystemStorage.open',
+                   side_effect=lambda *args: FailingFile(b'small file')):
+            with self.assertRaises(IOError):
+                b''.join(iter_attachments_zipfile(Attachment.objects.all()))
+        rpt_mock.assert_called_with(
+            "Create attachment zip exception", "Read failed")
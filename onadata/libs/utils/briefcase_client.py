@@ -1,26 +1,40 @@
+import json
 import logging
 import mimetypes
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from io import StringIO
 from xml.parsers.expat import ExpatError
 
 from future.moves.urllib.parse import urljoin
 
+from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import InMemoryUploadedFile
-from django.db import transaction
+from django.db import connection, transaction
 from django.utils.translation import ugettext as _
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPDigestAuth
 
 from onadata.apps.logger.xform_instance_parser import clean_and_parse_xml
-from onadata.libs.utils.common_tools import retry
 from onadata.libs.utils.logger_tools import (PublishXForm, create_instance,
                                              publish_form)
 
 NUM_RETRIES = 3
+# number of submissions and media files downloaded or pushed at a time
+BRIEFCASE_THREADS = getattr(settings, 'BRIEFCASE_THREADS', 8)
+# number of submission ids requested per submissionList page
+BRIEFCASE_PAGE_SIZE = getattr(settings, 'BRIEFCASE_PAGE_SIZE', 100)
+# (connect, read) timeouts in seconds
+BRIEFCASE_REQUEST_TIMEOUT = getattr(
+    settings, 'BRIEFCASE_REQUEST_TIMEOUT', (10, 120))
+# seconds before the first retry of a failed request, doubled every retry
+BRIEFCASE_RETRY_DELAY = getattr(settings, 'BRIEFCASE_RETRY_DELAY', 1)
 
 
 def django_file(file_obj, field_name, content_type):
@@ -73,24 +87,110 @@ def _get_instances_uuids(xml_doc):
     return uuids
 
 
+def _get_resumption_cursor(xml_doc):
+    cursor_nodes = xml_doc.getElementsByTagName('resumptionCursor')
+    if cursor_nodes and cursor_nodes[0].childNodes:
+        return cursor_nodes[0].childNodes[0].nodeValue
+
+    return None
+
+
+def _get_media_files(xml_doc):
+    """Returns the filename and download url of the media files."""
+    media_files = []
+    for media_node in xml_doc.getElementsByTagName('mediaFile'):
+        filename_node = media_node.getElementsByTagName('filename')
+        url_node = media_node.getElementsByTagName('downloadUrl')
+        if filename_node and url_node:
+            media_files.append((filename_node[0].childNodes[0].nodeValue,
+                                url_node[0].childNodes[0].nodeValue))
+
+    return media_files
+
+
+def _list_dirs(path):
+    if not default_storage.exists(path):
+        return set()
+
+    return set(default_storage.listdir(path)[0])
+
+
+class BriefcaseCheckpoint(object):
+    """
+    The resumption cursor of the last page of submissions of each form pulled
+    from a server, kept in the storage so that an interrupted pull resumes
+    from the page it stopped at.
+    """
+
+    def __init__(self, path, url):
+        self.path = path
+        self.url = url
+        self.servers = {}
+        if default_storage.exists(path):
+            with default_storage.open(path) as checkpoint_file:
+                try:
+                    self.servers = json.loads(checkpoint_file.read())
+                except ValueError:
+                    pass
+
+    def get_cursor(self, form_id):
+        """Returns the cursor of the form or None."""
+        return self.servers.get(self.url, {}).get(form_id)
+
+    def set_cursor(self, form_id, cursor):
+        """Records the cursor of the form and saves the checkpoint."""
+        self.servers.setdefault(self.url, {})[form_id] = cursor
+        self.save()
+
+    def save(self):
+        # the storage does not overwrite files, it renames new ones
+        if default_storage.exists(self.path):
+            default_storage.delete(self.path)
+        default_storage.save(
+            self.path, ContentFile(json.dumps(self.servers).encode('utf-8')))
+
+
 class BriefcaseClient(object):
-    def __init__(self, url, username, password, user):
+    def __init__(self, url, username, password, user, threads=None):
         self.url = url
         self.user = user
         self.auth = HTTPDigestAuth(username, password)
+        self.threads = threads or BRIEFCASE_THREADS
+        # the connections to the server are shared by the threads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.threads)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.form_list_url = urljoin(self.url, 'formList')
         self.submission_list_url = urljoin(self.url, 'view/submissionList')
         self.download_submission_url = urljoin(self.url,
                                                'view/downloadSubmission')
         self.forms_path = os.path.join(
             self.user.username, 'briefcase', 'forms')
+        self.checkpoint = BriefcaseCheckpoint(
+            os.path.join(self.user.username, 'briefcase', 'checkpoint.json'),
+            self.url)
         self.resumption_cursor = 0
         self.logger = logging.getLogger('console_logger')
 
-    def download_manifest(self, manifest_url, id_string):
-        if self._get_response(manifest_url):
-            manifest_res = self._current_response
+    def _map(self, func, items, executor=None):
+        """
+        Returns the results of func on the items, computed by the threads
+        of the executor or of a new pool.
+        """
+        items = list(items)
+        if self.threads < 2 or len(items) < 2:
+            return [func(item) for item in items]
+        if executor is not None:
+            return list(executor.map(func, items))
+
+        with ThreadPoolExecutor(
+                max_workers=min(self.threads, len(items))) as pool:
+            return list(pool.map(func, items))
 
+    def download_manifest(self, manifest_url, id_string):
+        manifest_res = self._get_response(manifest_url)
+        if manifest_res is not None:
             try:
                 manifest_doc = clean_and_parse_xml(manifest_res.content)
             except ExpatError:
@@ -100,18 +200,26 @@ class BriefcaseClient(object):
                 self.forms_path, id_string, 'form-media')
             self.logger.debug("Downloading media files for %s" % id_string)
 
-            self.download_media_files(manifest_doc, manifest_path)
-
-    def download_xforms(self, include_instances=False):
+            self._map(
+                lambda media_file: self._download_media_file(
+                    manifest_path, *media_file),
+                _get_media_files(manifest_doc))
+
+    def download_xforms(self, include_instances=False, restart=False):
+        """
+        Downloads the forms of the server and their media files, and their
+        submissions when include_instances is True. The submissions are
+        pulled from the start instead of the checkpoint when restart is
+        True.
+        """
         # fetch formList
-        if not self._get_response(self.form_list_url):
-            response = self._current_response.content \
-                if self._current_response else "Unknown Error"
-            self.logger.error("Failed to download xforms %s." % response)
+        response = self._get_response(self.form_list_url)
+        if response is None:
+            self.logger.error("Failed to download xforms %s." %
+                              self.form_list_url)
 
             return
 
-        response = self._current_response
         forms = _get_form_list(response.content)
 
         self.logger.debug('Successfull fetched %s.' % self.form_list_url)
@@ -121,17 +229,14 @@ class BriefcaseClient(object):
                 self.forms_path, id_string, '%s.xml' % id_string)
 
             if not default_storage.exists(form_path):
-                if not self._get_response(download_url):
+                form_res = self._get_response(download_url)
+                if form_res is None:
                     self.logger.error("Failed to download xform %s."
                                       % download_url)
                     continue
 
-                form_res = self._current_response
                 content = ContentFile(form_res.content.strip())
                 default_storage.save(form_path, content)
-            else:
-                form_res = default_storage.open(form_path)
-                content = form_res.read()
 
             self.logger.debug("Fetched %s." % download_url)
 
@@ -139,110 +244,175 @@ class BriefcaseClient(object):
                 self.download_manifest(manifest_url, id_string)
 
             if include_instances:
-                self.download_instances(id_string)
+                self.download_instances(id_string, restart=restart)
                 self.logger.debug("Done downloading submissions for %s" %
                                   id_string)
 
-    @retry(NUM_RETRIES)
+    def _request(self, method, url, **kwargs):
+        """
+        Returns the response of the request, retried with a backoff on
+        connection errors and server errors, or None.
+        """
+        kwargs.setdefault('auth', self.auth)
+        response = None
+        delay = BRIEFCASE_RETRY_DELAY
+        for attempt in range(NUM_RETRIES):
+            if attempt:
+                time.sleep(delay)
+                delay *= 2
+            try:
+                response = self.session.request(
+                    method, url, timeout=BRIEFCASE_REQUEST_TIMEOUT, **kwargs)
+            except requests.RequestException as e:
+                self.logger.debug("Request to %s failed: %s" % (url, e))
+                response = None
+                continue
+            if response.status_code < 500:
+                break
+
+        return response
+
     def _get_response(self, url, params=None):
-        self._current_response = None
-        response = requests.get(url, auth=self.auth, params=params)
-        success = response.status_code == 200
-        self._current_response = response
+        response = self._request('GET', url, params=params)
 
-        return success
+        return response if response is not None and \
+            response.status_code == 200 else None
 
-    @retry(NUM_RETRIES)
     def _get_media_response(self, url):
-        self._current_response = None
-        head_response = requests.head(url, auth=self.auth)
+        head_response = self._request('HEAD', url, allow_redirects=False)
 
         # S3 redirects, avoid using formhub digest on S3
-        if head_response.status_code == 302:
-            url = head_response.headers.get('location')
-
-        response = requests.get(url)
-        success = response.status_code == 200
-        self._current_response = response
-
-        return success
-
-    def download_media_files(self, xml_doc, media_path):
-        for media_node in xml_doc.getElementsByTagName('mediaFile'):
-            filename_node = media_node.getElementsByTagName('filename')
-            url_node = media_node.getElementsByTagName('downloadUrl')
-            if filename_node and url_node:
-                filename = filename_node[0].childNodes[0].nodeValue
-                path = os.path.join(media_path, filename)
-                if default_storage.exists(path):
-                    continue
-                download_url = url_node[0].childNodes[0].nodeValue
-                if self._get_media_response(download_url):
-                    download_res = self._current_response
-                    media_content = ContentFile(download_res.content)
-                    default_storage.save(path, media_content)
-                    self.logger.debug("Fetched %s." % filename)
-                else:
-                    self.logger.error("Failed to fetch %s." % filename)
-
-    def download_instances(self, form_id, cursor=0, num_entries=100):
-        self.logger.debug("Starting submissions download for %s" % form_id)
-        if not self._get_response(self.submission_list_url,
-                                  params={'formId': form_id,
-                                          'numEntries': num_entries,
-                                          'cursor': cursor}):
-            self.logger.error("Fetching %s formId: %s, cursor: %s" %
-                              (self.submission_list_url, form_id, cursor))
-            return
-
-        response = self._current_response
-        self.logger.debug("Fetching %s formId: %s, cursor: %s" %
-                          (self.submission_list_url, form_id, cursor))
-        try:
-            xml_doc = clean_and_parse_xml(response.content)
-        except ExpatError:
-            return
-
-        instances = _get_instances_uuids(xml_doc)
-        path = os.path.join(self.forms_path, form_id, 'instances')
-
-        for uuid in instances:
-            self.logger.debug("Fetching %s %s submission" % (uuid, form_id))
+        if head_response is not None and head_response.status_code == 302:
+            response = self._request(
+                'GET', head_response.headers.get('location'), auth=None)
+        else:
+            response = self._request('GET', url)
+
+        return response if response is not None and \
+            response.status_code == 200 else None
+
+    def _download_media_file(self, media_path, filename, download_url,
+                             check_exists=True):
+        path = os.path.join(media_path, filename)
+        if check_exists and default_storage.exists(path):
+            return True
+        download_res = self._get_media_response(download_url)
+        if download_res is None:
+            self.logger.error("Failed to fetch %s." % filename)
+            return False
+
+        default_storage.save(path, ContentFile(download_res.content))
+        self.logger.debug("Fetched %s." % filename)
+
+        return True
+
+    def download_media_files(self, xml_doc, media_path, check_exists=True):
+        """
+        Downloads the media files of the document, the files in the storage
+        are skipped when check_exists is True.
+
+        :return: True if all the media files were downloaded.
+        """
+        results = [
+            self._download_media_file(
+                media_path, filename, download_url, check_exists)
+            for (filename, download_url) in _get_media_files(xml_doc)]
+
+        return all(results)
+
+    def _download_instance(self, form_id, path, existing, uuid):
+        self.logger.debug("Fetching %s %s submission" % (uuid, form_id))
+        instance_dir = uuid.replace(':', '')
+        instance_path = os.path.join(path, instance_dir, 'submission.xml')
+        # only the submissions of a page that was interrupted are in the
+        # storage, the others are pulled without checking the storage
+        exists = instance_dir in existing and \
+            default_storage.exists(instance_path)
+        if exists:
+            with default_storage.open(instance_path) as instance_file:
+                content = instance_file.read()
+        else:
             form_str = u'%(formId)s[@version=null and @uiVersion=null]/'\
                 u'%(formId)s[@key=%(instanceId)s]' % {
                     'formId': form_id,
                     'instanceId': uuid
                 }
-            instance_path = os.path.join(path, uuid.replace(':', ''),
-                                         'submission.xml')
-            if not default_storage.exists(instance_path):
-                if self._get_response(self.download_submission_url,
-                                      params={'formId': form_str}):
-                    instance_res = self._current_response
-                    content = instance_res.content.strip()
-                    default_storage.save(instance_path, ContentFile(content))
-                else:
-                    continue
-            else:
-                instance_res = default_storage.open(instance_path)
-                content = instance_res.read()
+            instance_res = self._get_response(self.download_submission_url,
+                                              params={'formId': form_str})
+            if instance_res is None:
+                self.logger.error("Failed to fetch %s %s submission" %
+                                  (form_id, uuid))
+                return False
+            content = instance_res.content.strip()
+            default_storage.save(instance_path, ContentFile(content))
 
-            try:
-                instance_doc = clean_and_parse_xml(content)
-            except ExpatError:
-                continue
+        try:
+            instance_doc = clean_and_parse_xml(content)
+        except ExpatError:
+            self.logger.error("Invalid %s %s submission" % (form_id, uuid))
+            return True
 
-            media_path = os.path.join(path, uuid.replace(':', ''))
-            self.download_media_files(instance_doc, media_path)
-            self.logger.debug("Fetched %s %s submission" % (form_id, uuid))
+        downloaded = self.download_media_files(
+            instance_doc, os.path.join(path, instance_dir), exists)
+        self.logger.debug("Fetched %s %s submission" % (form_id, uuid))
 
-        if xml_doc.getElementsByTagName('resumptionCursor'):
-            rs_node = xml_doc.getElementsByTagName('resumptionCursor')[0]
-            cursor = rs_node.childNodes[0].nodeValue
+        return downloaded
 
-            if self.resumption_cursor != cursor:
-                self.resumption_cursor = cursor
-                self.download_instances(form_id, cursor)
+    def download_instances(self, form_id, cursor=None, num_entries=None,
+                           restart=False):
+        """
+        Downloads the submissions of the form page by page, the submissions
+        and their media files of a page are downloaded by a pool of threads.
+
+        The cursor of every page downloaded without errors is recorded in
+        the checkpoint, the pull starts from the checkpoint's cursor unless
+        cursor is set or restart is True.
+        """
+        self.logger.debug("Starting submissions download for %s" % form_id)
+        if cursor is None:
+            cursor = 0 if restart else \
+                self.checkpoint.get_cursor(form_id) or 0
+        num_entries = num_entries or BRIEFCASE_PAGE_SIZE
+        path = os.path.join(self.forms_path, form_id, 'instances')
+        existing = _list_dirs(path)
+        failed = False
+
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            while True:
+                self.logger.debug("Fetching %s formId: %s, cursor: %s" %
+                                  (self.submission_list_url, form_id, cursor))
+                response = self._get_response(
+                    self.submission_list_url,
+                    params={'formId': form_id, 'numEntries': num_entries,
+                            'cursor': cursor})
+                if response is None:
+                    self.logger.error(
+                        "Fetching %s formId: %s, cursor: %s" %
+                        (self.submission_list_url, form_id, cursor))
+                    break
+                try:
+                    xml_doc = clean_and_parse_xml(response.content)
+                except ExpatError:
+                    break
+
+                uuids = _get_instances_uuids(xml_doc)
+                results = self._map(
+                    partial(self._download_instance, form_id, path,
+                            existing), uuids, executor)
+                # the checkpoint stays at the page of the first error so
+                # that the failed submissions are pulled again
+                failed = failed or not all(results)
+
+                next_cursor = _get_resumption_cursor(xml_doc)
+                if not uuids or next_cursor is None or next_cursor == cursor:
+                    break
+                cursor = self.resumption_cursor = next_cursor
+                if not failed:
+                    self.checkpoint.set_cursor(form_id, cursor)
+
+        if failed:
+            self.logger.error("Some %s submissions were not downloaded, "
+                              "pull again to retry them." % form_id)
 
     @transaction.atomic
     def _upload_xform(self, path, file_name):
@@ -275,34 +445,50 @@ class BriefcaseClient(object):
 
         create_instance(self.user.username, new_xml_file, attachments)
 
-    def _upload_instances(self, path):
+    def _upload_instance_dirs(self, path, close_connection, dirs):
         instances_count = 0
-        dirs, not_in_use = default_storage.listdir(path)
 
-        for instance_dir in dirs:
-            instance_dir_path = os.path.join(path, instance_dir)
-            i_dirs, files = default_storage.listdir(instance_dir_path)
-            xml_file = None
-
-            if 'submission.xml' in files:
-                file_obj = default_storage.open(
-                    os.path.join(instance_dir_path, 'submission.xml'))
-                xml_file = file_obj
-
-            if xml_file:
-                try:
-                    self._upload_instance(xml_file, instance_dir_path, files)
-                except ExpatError:
-                    continue
-                except Exception as e:
-                    logging.exception(_(
-                        u'Ignoring exception, processing XML submission '
-                        'raised exception: %s' % str(e)))
-                else:
-                    instances_count += 1
+        try:
+            for instance_dir in dirs:
+                instance_dir_path = os.path.join(path, instance_dir)
+                i_dirs, files = default_storage.listdir(instance_dir_path)
+                xml_file = None
+
+                if 'submission.xml' in files:
+                    file_obj = default_storage.open(
+                        os.path.join(instance_dir_path, 'submission.xml'))
+                    xml_file = file_obj
+
+                if xml_file:
+                    try:
+                        self._upload_instance(
+                            xml_file, instance_dir_path, files)
+                    except ExpatError:
+                        continue
+                    except Exception as e:
+                        logging.exception(_(
+                            u'Ignoring exception, processing XML submission '
+                            'raised exception: %s' % str(e)))
+                    else:
+                        instances_count += 1
+        finally:
+            # the database connections of the threads are not reused
+            if close_connection:
+                connection.close()
 
         return instances_count
 
+    def _upload_instances(self, path):
+        dirs, not_in_use = default_storage.listdir(path)
+        # every thread uploads a share of the submissions
+        shares = [share for share in
+                  (dirs[i::self.threads] for i in range(self.threads))
+                  if share]
+
+        return sum(self._map(
+            partial(self._upload_instance_dirs, path, len(shares) > 1),
+            shares))
+
     def push(self):
         dirs, files = default_storage.listdir(self.forms_path)
         for form_dir in dirs:
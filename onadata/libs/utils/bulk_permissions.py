@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk assignment of object permissions.
+
+Role.add reads and writes the guardian rows of a user or group one object
+and one permission at a time. BulkPermissions collects the permissions that
+users and groups should have on many objects, reads the existing guardian
+rows of a batch of them in one query per permission model and only creates
+or deletes the rows that differ.
+"""
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from guardian.utils import get_group_obj_perms_model, get_user_obj_perms_model
+
+from onadata.apps.logger.models import XForm
+from onadata.apps.main.models.meta_data import MetaData
+from onadata.libs.permissions import (ROLES, DataEntryMinorRole,
+                                      DataEntryOnlyRole, DataEntryRole,
+                                      EditorMinorRole, EditorRole)
+from onadata.libs.utils.common_tags import XFORM_META_PERMS
+from onadata.libs.utils.permission_matrix import invalidate_permission_matrix
+
+# number of (user or group, object) pairs applied at a time
+PERMISSIONS_BATCH_SIZE = getattr(settings, 'PERMISSIONS_BATCH_SIZE', 500)
+
+
+class BulkPermissions(object):
+    """
+    The permissions users and groups should have on objects, applied to the
+    guardian object permission tables in bulk.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or PERMISSIONS_BATCH_SIZE
+        # the permission codenames of each (user or group, object)
+        self.targets = OrderedDict()
+        self._models = {}
+        self._permissions = {}
+
+    def __len__(self):
+        return len(self.targets)
+
+    def add(self, user_or_group, role, obj):
+        """
+        Gives the user or group the permissions of the role on obj and
+        removes any other permissions they have on it, like Role.add.
+        """
+        self.targets[(user_or_group, obj)] = set(
+            role.class_to_permissions.get(obj.__class__, []))
+
+    def remove(self, user_or_group, obj):
+        """Removes all the permissions of the user or group on obj."""
+        self.targets[(user_or_group, obj)] = set()
+
+    def get_model(self, user_or_group, obj):
+        """Returns the guardian model of the permissions on obj."""
+        key = (isinstance(user_or_group, Group), obj.__class__)
+        if key not in self._models:
+            self._models[key] = get_group_obj_perms_model(obj) if key[0] \
+                else get_user_obj_perms_model(obj)
+
+        return self._models[key]
+
+    def get_permission_ids(self, content_type, codenames):
+        """Returns the ids of the permissions of a content type."""
+        if content_type.pk not in self._permissions:
+            self._permissions[content_type.pk] = dict(
+                Permission.objects.filter(content_type=content_type)
+                .values_list('codename', 'pk'))
+        permissions = self._permissions[content_type.pk]
+        missing = set(codenames) - set(permissions)
+        if missing:
+            raise Permission.DoesNotExist(
+                "Permissions %s of %s do not exist." % (
+                    ', '.join(sorted(missing)), content_type))
+
+        return set(permissions[codename] for codename in codenames)
+
+    def apply(self, progress=None):
+        """
+        Creates and deletes the guardian rows so that the users and groups
+        have exactly the permissions set with add and remove.
+
+        :param progress: called with the number of (user or group, object)
+        pairs applied so far and the total after each batch.
+        :return: the number of rows created and deleted.
+        """
+        targets = list(self.targets.items())
+        created = deleted = 0
+        for start in range(0, len(targets), self.batch_size):
+            batch = targets[start:start + self.batch_size]
+            by_model = defaultdict(list)
+            for ((user_or_group, obj), codenames) in batch:
+                key = (self.get_model(user_or_group, obj),
+                       isinstance(user_or_group, Group))
+                by_model[key].append((user_or_group, obj, codenames))
+            for ((model, is_group), items) in by_model.items():
+                (model_created, model_deleted) = self._apply(
+                    model, is_group, items)
+                created += model_created
+                deleted += model_deleted
+            if progress is not None:
+                progress(start + len(batch), len(targets))
+
+        return created, deleted
+
+    def _apply(self, model, is_group, items):
+        identity = 'group_id' if is_group else 'user_id'
+        generic = model.objects.is_generic()
+
+        def get_object_key(obj):
+            if generic:
+                return (ContentType.objects.get_for_model(obj).pk,
+                        str(obj.pk))
+            return obj.pk
+
+        object_keys = set(get_object_key(item[1]) for item in items)
+        rows = model.objects.filter(**{
+            identity + '__in': set(item[0].pk for item in items)})
+        if generic:
+            rows = rows.filter(
+                content_type_id__in=set(key[0] for key in object_keys),
+                object_pk__in=set(key[1] for key in object_keys))\
+                .values_list('pk', identity, 'permission_id',
+                             'content_type_id', 'object_pk')
+        else:
+            rows = rows.filter(content_object_id__in=object_keys)\
+                .values_list('pk', identity, 'permission_id',
+                             'content_object_id')
+        # the ids of the rows of each permission by (user or group, object)
+        existing = defaultdict(dict)
+        for row in rows:
+            object_key = tuple(row[3:]) if generic else row[3]
+            existing[(row[1], object_key)][row[2]] = row[0]
+
+        new_rows = []
+        delete_ids = []
+        for (user_or_group, obj, codenames) in items:
+            content_type = ContentType.objects.get_for_model(obj)
+            permission_ids = self.get_permission_ids(content_type, codenames)
+            current = existing.get(
+                (user_or_group.pk, get_object_key(obj)), {})
+            delete_ids += [row_id for (permission_id, row_id)
+                           in current.items()
+                           if permission_id not in permission_ids]
+            for permission_id in permission_ids - set(current):
+                fields = {identity: user_or_group.pk,
+                          'permission_id': permission_id}
+                if generic:
+                    fields.update(content_type_id=content_type.pk,
+                                  object_pk=str(obj.pk))
+                else:
+                    fields['content_object_id'] = obj.pk
+                new_rows.append(model(**fields))
+
+        if delete_ids:
+            model.objects.filter(pk__in=delete_ids).delete()
+        # rows assigned at the same time by another process are kept
+        model.objects.bulk_create(new_rows, ignore_conflicts=True)
+        if (new_rows or delete_ids) and not generic:
+            # bulk_create does not send the signals that clear the cache
+            invalidate_permission_matrix(
+                model._meta.get_field('content_object').related_model,
+                object_keys)
+
+        return len(new_rows), len(delete_ids)
+
+
+def get_xform_meta_perms(xforms):
+    """Returns the xform meta perms of each of the forms by form id."""
+    meta_perms = {}
+    for (object_id, data_value) in MetaData.objects.filter(
+            content_type=ContentType.objects.get_for_model(XForm),
+            object_id__in=set(xform.pk for xform in xforms),
+            data_type=XFORM_META_PERMS).order_by('pk').values_list(
+                'object_id', 'data_value'):
+        meta_perms.setdefault(object_id, data_value)
+
+    return meta_perms
+
+
+def get_xform_role(role, meta_perm):
+    """
+    Returns the role on a form of a user with the role on its project, the
+    xform meta perms of the form replace the editor and data entry roles.
+    """
+    meta_perm = meta_perm.split("|") if meta_perm else []
+    if len(meta_perm) > 1:
+        if role in [EditorRole, EditorMinorRole]:
+            return ROLES.get(meta_perm[0], role)
+        elif role in [DataEntryRole, DataEntryMinorRole, DataEntryOnlyRole]:
+            return ROLES.get(meta_perm[1], role)
+
+    return role
+
+
+def add_project_permissions(permissions, project, user_or_group, role):
+    """
+    Adds the role of the user or group on the project, its forms and the
+    forms of its filtered datasets that match the parent form to
+    permissions.
+    """
+    xforms = list(project.xform_set.all()) + [
+        dataview.xform for dataview in
+        project.dataview_set.filter(matches_parent=True)
+        .select_related('xform')]
+    meta_perms = get_xform_meta_perms(xforms)
+
+    permissions.add(user_or_group, role, project)
+    for xform in xforms:
+        permissions.add(user_or_group,
+                        get_xform_role(role, meta_perms.get(xform.pk)), xform)
+
+    return permissions
+
+
+def remove_project_permissions(permissions, project, user_or_group):
+    """
+    Adds the removal of the permissions of the user or group on the project,
+    its forms and the forms of its filtered datasets to permissions.
+    """
+    permissions.remove(user_or_group, project)
+    for xform in project.xform_set.all():
+        permissions.remove(user_or_group, xform)
+    for dataview in project.dataview_set.select_related('xform'):
+        permissions.remove(user_or_group, dataview.xform)
+
+    return permissions
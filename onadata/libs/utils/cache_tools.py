@@ -1,6 +1,9 @@
 import hashlib
+from uuid import uuid4
 
+from django.conf import settings
 from django.core.cache import cache
+from django.db import transaction
 from django.utils.encoding import force_bytes
 
 # Cache names used in project serializer
@@ -26,6 +29,8 @@ ENKETO_PREVIEW_URL_CACHE = "xfs-get_enketo_preview_url"
 XFORM_METADATA_CACHE = "xfs-get_xform_metadata"
 XFORM_DATA_VERSIONS = "xfs-get_xform_data_versions"
 XFORM_COUNT = "xfs-submission_count"
+XFORM_DATA_VERSION = "xfs-data_version-"
+XFORM_STATS = "xfs-stats-"
 DATAVIEW_COUNT = "dvs-get_data_count"
 DATAVIEW_LAST_SUBMISSION_TIME = "dvs-last_submission_time"
 PROJ_TEAM_USERS_CACHE = "ps-project-team-users"
@@ -35,6 +40,31 @@ PROJECT_LINKED_DATAVIEWS = "ps-project-linked_dataviews"
 # Cache names used in organization profile viewset
 ORG_PROFILE_CACHE = 'org-profile-'
 
+# Cache names used for buffered submission counts
+XFORM_SUBMISSIONS_ADDED = "xfs-submissions_added-"
+XFORM_SUBMISSIONS_REMOVED = "xfs-submissions_removed-"
+XFORM_LAST_SUBMISSION_TIME = "xfs-last_submission_time-"
+XFORM_SUBMISSION_COUNT_FLUSH = "xfs-submission_count_flush-"
+
+# Cache names used for attachment thumbnails
+ATTACHMENT_THUMBNAILS_PENDING = "att-thumbnails_pending-"
+
+# Cache names used for webhook deliveries
+WEBHOOK_ENDPOINT_SLOT = "webhook-endpoint_slot-"
+WEBHOOK_DELIVERY_QUEUED = "webhook-delivery_queued-"
+WEBHOOK_RETRY_QUEUED = "webhook-retry_queued-"
+
+# Cache names used for the permissions of forms and projects
+PERMISSION_MATRIX_CACHE = "pm-permission_matrix-"
+
+# Cache names used in submission validation
+SPECIES_NAME_CACHE = "species-name-"
+
+# values cached in these backends are only visible to the process that
+# cached them
+LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.dummy.DummyCache',
+                        'django.core.cache.backends.locmem.LocMemCache')
+
 # cache login attempts
 LOCKOUT_USER = "lockout_user-"
 LOGIN_ATTEMPTS = "login_attempts-"
@@ -52,6 +82,38 @@ def safe_key(key):
     return hashlib.sha256(force_bytes(key)).hexdigest()
 
 
+def is_cache_shared():
+    """Returns True if the default cache is shared between processes."""
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+
+    return backend not in LOCAL_CACHE_BACKENDS
+
+
+def get_xform_data_version(xform_id):
+    """
+    Returns the version of a form's submission data, the version changes
+    whenever a submission of the form is added, changed or deleted.
+    """
+    key = '{}{}'.format(XFORM_DATA_VERSION, xform_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+
+    return version
+
+
+def bump_xform_data_version(xform_id):
+    """
+    Changes the version of a form's submission data when the current
+    transaction commits, a version read before the commit would otherwise
+    be cached with the old submissions.
+    """
+    transaction.on_commit(lambda: cache.set(
+        '{}{}'.format(XFORM_DATA_VERSION, xform_id), uuid4().hex, None))
+
+
 def reset_project_cache(project, request):
     """
     Clears and sets project cache
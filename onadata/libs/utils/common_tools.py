@@ -129,7 +129,7 @@ def json_stream(data, json_string):
     yield '['
     try:
         data = data.__iter__()
-        item = next(data)
+        item = next(data, None)
         while item:
             try:
                 next_item = next(data)
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Submission counter utility functions.
+
+The number of submissions of a form and its owner's profile are updated on
+every new or deleted submission. When SUBMISSION_COUNT_FLUSH_INTERVAL is set
+the changes are buffered in the cache and applied to the database in one
+statement per form every SUBMISSION_COUNT_FLUSH_INTERVAL seconds, instead of
+locking the form and profile rows once for every submission.
+
+`XForm.submission_count(force_update=True)` reconciles a form's count with
+the number of submissions in the database.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from onadata.celery import app
+from onadata.libs.utils.cache_tools import (DATAVIEW_COUNT, XFORM_COUNT,
+                                            XFORM_DATA_VERSIONS,
+                                            XFORM_LAST_SUBMISSION_TIME,
+                                            XFORM_SUBMISSION_COUNT_FLUSH,
+                                            XFORM_SUBMISSIONS_ADDED,
+                                            XFORM_SUBMISSIONS_REMOVED,
+                                            is_cache_shared, safe_delete)
+
+# seconds, 0 updates the counts on every submission
+SUBMISSION_COUNT_FLUSH_INTERVAL = getattr(
+    settings, 'SUBMISSION_COUNT_FLUSH_INTERVAL', 0)
+LAST_SUBMISSION_TIME_TIMEOUT = 86400
+
+
+def is_submission_count_buffered():
+    """Returns True if submission counts are buffered in the cache."""
+    return SUBMISSION_COUNT_FLUSH_INTERVAL > 0 and is_cache_shared()
+
+
+def clear_submission_count_cache(xform_id, project_id):
+    """Clears the cached values that depend on a form's submission count."""
+    from onadata.apps.logger.models.xform import clear_project_cache
+
+    safe_delete('{}{}'.format(XFORM_DATA_VERSIONS, xform_id))
+    safe_delete('{}{}'.format(DATAVIEW_COUNT, xform_id))
+    safe_delete('{}{}'.format(XFORM_COUNT, xform_id))
+    clear_project_cache(project_id)
+
+
+def update_submission_count(xform_id, count, last_submission_time=None):
+    """
+    Adds `count` to the number of submissions of the form and its owner's
+    profile in one statement. The counts are never set below 0.
+
+    :return: The form's project id or None if the form does not exist.
+    """
+    sql = (
+        'WITH xform AS ('
+        'UPDATE logger_xform SET '
+        'num_of_submissions = GREATEST(num_of_submissions + %s, 0), '
+        'last_submission_time = GREATEST(last_submission_time, %s) '
+        'WHERE id = %s '
+        'RETURNING user_id, project_id), '
+        'profile AS ('
+        'UPDATE main_userprofile SET '
+        'num_of_submissions = GREATEST(num_of_submissions + %s, 0) '
+        'WHERE user_id IN (SELECT user_id FROM xform)) '
+        'SELECT project_id FROM xform'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [count, last_submission_time, xform_id, count])
+        row = cursor.fetchone()
+
+    return row[0] if row else None
+
+
+def _incr(key, delta):
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # the key was evicted after it was added
+        cache.set(key, delta, None)
+
+
+def _decr(key, delta):
+    try:
+        cache.decr(key, delta)
+    except ValueError:
+        # the key was evicted, the changes buffered since were lost with it
+        pass
+
+
+def _schedule_flush(xform_id):
+    key = '{}{}'.format(XFORM_SUBMISSION_COUNT_FLUSH, xform_id)
+    # the key expires in case the flush task is lost
+    if cache.add(key, True, SUBMISSION_COUNT_FLUSH_INTERVAL * 6):
+        flush_submission_count.apply_async(
+            args=[xform_id], countdown=SUBMISSION_COUNT_FLUSH_INTERVAL)
+
+
+def buffer_submission_count(xform_id, count, last_submission_time=None):
+    """
+    Adds `count` to the buffered change in the number of submissions of a
+    form and schedules a flush of the buffered changes.
+    """
+    if count > 0:
+        _incr('{}{}'.format(XFORM_SUBMISSIONS_ADDED, xform_id), count)
+    elif count < 0:
+        _incr('{}{}'.format(XFORM_SUBMISSIONS_REMOVED, xform_id), -count)
+
+    if last_submission_time is not None:
+        key = '{}{}'.format(XFORM_LAST_SUBMISSION_TIME, xform_id)
+        current = cache.get(key)
+        if current is None or current < last_submission_time:
+            cache.set(key, last_submission_time, LAST_SUBMISSION_TIME_TIMEOUT)
+
+    _schedule_flush(xform_id)
+
+
+def increment_submission_count(xform, count, last_submission_time=None):
+    """
+    Adds `count` to the number of submissions of a form and its owner's
+    profile. A negative `count` removes submissions.
+
+    The change is buffered when `is_submission_count_buffered()` is True and
+    is applied when the current transaction commits.
+    """
+    if is_submission_count_buffered():
+        xform_id = xform.pk
+        transaction.on_commit(lambda: buffer_submission_count(
+            xform_id, count, last_submission_time))
+    else:
+        update_submission_count(xform.pk, count, last_submission_time)
+        clear_submission_count_cache(xform.pk, xform.project_id)
+
+
+@app.task(ignore_result=True)
+def flush_submission_count(xform_id):
+    """Applies the buffered submission count changes of a form."""
+    safe_delete('{}{}'.format(XFORM_SUBMISSION_COUNT_FLUSH, xform_id))
+
+    added_key = '{}{}'.format(XFORM_SUBMISSIONS_ADDED, xform_id)
+    removed_key = '{}{}'.format(XFORM_SUBMISSIONS_REMOVED, xform_id)
+    added = cache.get(added_key) or 0
+    removed = cache.get(removed_key) or 0
+    last_submission_time = cache.get(
+        '{}{}'.format(XFORM_LAST_SUBMISSION_TIME, xform_id))
+
+    if added or removed or last_submission_time:
+        project_id = update_submission_count(
+            xform_id, added - removed, last_submission_time)
+        # changes buffered while flushing are kept for the next flush
+        if added:
+            _decr(added_key, added)
+        if removed:
+            _decr(removed_key, removed)
+        if project_id is not None:
+            clear_submission_count_cache(xform_id, project_id)
+
+    if cache.get(added_key) or cache.get(removed_key):
+        _schedule_flush(xform_id)
@@ -1,3 +1,5 @@
+import json
+import shutil
 from collections import OrderedDict
 from itertools import chain
 
@@ -10,7 +12,8 @@ from past.builtins import basestring
 from pyxform.question import Question
 from pyxform.section import RepeatingSection, Section
 
-from onadata.apps.logger.models import OsmData
+from onadata.apps.logger.models import ColumnSchema, OsmData
+from onadata.apps.logger.models.column_schema import get_repeat_counts
 from onadata.apps.logger.models.xform import XForm, question_types_to_exclude
 from onadata.apps.viewer.models.data_dictionary import DataDictionary
 from onadata.apps.viewer.models.parsed_instance import (ParsedInstance,
@@ -30,7 +33,8 @@ from onadata.libs.utils.common_tags import (ATTACHMENTS, BAMBOO_DATASET_ID,
 from onadata.libs.utils.export_builder import (get_choice_label,
                                                get_value_or_attachment_uri,
                                                track_task_progress)
-from onadata.libs.utils.model_tools import get_columns_with_hxl
+from onadata.libs.utils.model_tools import (QUERY_FETCH_SIZE,
+                                            get_columns_with_hxl)
 
 # the bind type of select multiples that we use to compare
 MULTIPLE_SELECT_BIND_TYPE = u"select"
@@ -52,6 +56,13 @@ YES = 1
 NO = 0
 
 
+class RepeatCountsExceeded(Exception):
+    """
+    A submission has more repeats than the column schema the columns of the
+    export were built from.
+    """
+
+
 def remove_dups_from_list_maintain_order(lst):
     return list(OrderedDict.fromkeys(lst))
 
@@ -107,7 +118,6 @@ def write_to_csv(path, rows, columns, columns_with_hxl=None,
                  include_labels_only=False, include_hxl=False,
                  win_excel_utf8=False, total_records=None,
                  index_tags=DEFAULT_INDEX_TAGS):
-    na_rep = getattr(settings, 'NA_REP', NA_REP)
     encoding = 'utf-8-sig' if win_excel_utf8 else 'utf-8'
     with open(path, 'wb') as csvfile:
         writer = csv.writer(csvfile, encoding=encoding, lineterminator='\n')
@@ -136,11 +146,40 @@ def write_to_csv(path, rows, columns, columns_with_hxl=None,
             hxl_row = [columns_with_hxl.get(col, '') for col in columns]
             hxl_row and writer.writerow(hxl_row)
 
-        for i, row in enumerate(rows, start=1):
-            for col in AbstractDataFrameBuilder.IGNORED_COLUMNS:
-                row.pop(col, None)
-            writer.writerow([row.get(col, na_rep) for col in columns])
-            track_task_progress(i, total_records)
+        _write_rows(writer, rows, columns, total_records)
+
+
+def _write_rows(writer, rows, columns, total_records=None):
+    na_rep = getattr(settings, 'NA_REP', NA_REP)
+    for i, row in enumerate(rows, start=1):
+        for col in AbstractDataFrameBuilder.IGNORED_COLUMNS:
+            row.pop(col, None)
+        writer.writerow([row.get(col, na_rep) for col in columns])
+        track_task_progress(i, total_records)
+
+
+def append_to_csv(path, previous_path, rows, columns, total_records=None):
+    """
+    Writes a copy of the CSV file at previous_path with rows appended to it
+    to path. The file at previous_path must have the same columns.
+    """
+    with open(previous_path, 'rb') as previous, open(path, 'wb') as csvfile:
+        shutil.copyfileobj(previous, csvfile)
+        writer = csv.writer(csvfile, encoding='utf-8', lineterminator='\n')
+        _write_rows(writer, rows, columns, total_records)
+
+
+def read_csv_rows(path, columns, header_rows=1, win_excel_utf8=False):
+    """
+    Yields the data rows of a CSV file written by write_to_csv as dicts of
+    its columns.
+    """
+    encoding = 'utf-8-sig' if win_excel_utf8 else 'utf-8'
+    with open(path, 'rb') as csvfile:
+        reader = csv.reader(csvfile, encoding=encoding)
+        for i, row in enumerate(reader):
+            if i >= header_rows:
+                yield dict(zip(columns, row))
 
 
 class AbstractDataFrameBuilder(object):
@@ -400,6 +439,11 @@ class CSVDataFrameBuilder(AbstractDataFrameBuilder):
             show_choice_labels, include_reviews, language)
 
         self.ordered_columns = OrderedDict()
+        # columns of the export, used to append to it, see export_to
+        self.checkpoint = {}
+        # the largest number of repeats of the repeats in the submissions
+        self.repeat_counts = {}
+        self.use_column_schema = True
 
     def _setup(self):
         super(CSVDataFrameBuilder, self)._setup()
@@ -536,7 +580,7 @@ class CSVDataFrameBuilder(AbstractDataFrameBuilder):
                 # generated when we reindex
                 ordered_columns[child.get_abbreviated_xpath()] = None
 
-    def _update_columns_from_data(self, cursor):
+    def _update_split_columns(self):
         # add ordered columns for select multiples
         if self.split_select_multiples:
             for key, choices in self.select_multiples.items():
@@ -552,10 +596,15 @@ class CSVDataFrameBuilder(AbstractDataFrameBuilder):
         for key in self.gps_fields:
             gps_xpaths = self.dd.get_additional_geopoint_xpaths(key)
             self.ordered_columns[key] = [key] + gps_xpaths
+
+    def _update_columns_from_data(self, cursor):
+        self._update_split_columns()
         image_xpaths = [] if not self.include_images \
             else self.dd.get_media_survey_xpaths()
+        self.repeat_counts = {}
 
         for record in cursor:
+            get_repeat_counts(record, self.repeat_counts)
             # split select multiples
             if self.split_select_multiples:
                 record = self._split_select_multiples(
@@ -576,7 +625,74 @@ class CSVDataFrameBuilder(AbstractDataFrameBuilder):
                     show_choice_labels=self.show_choice_labels,
                     language=self.language)
 
-    def _format_for_dataframe(self, cursor):
+    def _add_repeat_columns(self, repeat, repeat_counts, parent=None):
+        """
+        Adds the columns of the repeat's items to ordered_columns, in the
+        order _reindex adds them, from the number of items in repeat_counts.
+
+        parent is the (xpath, repeat_counts key, column) of the enclosing
+        repeat item of a nested repeat.
+        """
+        xpath = repeat.get_abbreviated_xpath()
+        if parent is None:
+            path = column = xpath
+        else:
+            (parent_xpath, parent_path, parent_column) = parent
+            path = parent_path + xpath[len(parent_xpath):]
+            column = parent_column + xpath[len(parent_xpath):]
+
+        children = [
+            elem for elem in self.dd.get_child_elements(
+                xpath, self.split_select_multiples)
+            if not question_types_to_exclude(elem.type)]
+        for index in range(1, repeat_counts.get(path, 0) + 1):
+            item_column = u'{}{}{}{}'.format(
+                column, self.index_tags[0], index, self.index_tags[1])
+            for elem in children:
+                if not isinstance(elem, RepeatingSection):
+                    self.ordered_columns[xpath].append(
+                        item_column + elem.get_abbreviated_xpath()[
+                            len(xpath):])
+            for elem in children:
+                if isinstance(elem, RepeatingSection):
+                    self._add_repeat_columns(
+                        elem, repeat_counts,
+                        (xpath, u'{}[{}]'.format(path, index), item_column))
+
+    def _update_columns_from_schema(self, repeat_counts):
+        """
+        Adds the split and repeat columns to ordered_columns without reading
+        the submissions, the repeat columns are built from the largest
+        number of repeats in the form's column schema.
+        """
+        self._update_split_columns()
+        for elem in self.dd.get_survey_elements():
+            if not isinstance(elem, RepeatingSection):
+                continue
+            parent = elem.parent
+            while parent is not None and \
+                    not isinstance(parent, RepeatingSection):
+                parent = parent.parent
+            # nested repeats are added with their enclosing repeat's items
+            if parent is None:
+                self._add_repeat_columns(elem, repeat_counts)
+
+    def _can_use_column_schema(self, append):
+        # the schema holds the repeats of all the submissions of a form, an
+        # incremental export of the submissions up to an id may only have a
+        # few empty repeat columns more
+        filter_query = self.filter_query
+        if isinstance(filter_query, basestring):
+            filter_query = json.loads(filter_query)
+        return self.use_column_schema and not append and \
+            (not filter_query or
+             list(filter_query) == ['_id'] and
+             isinstance(filter_query['_id'], dict) and
+             list(filter_query['_id']) == ['$lte']) and \
+            self.start is None and self.end is None and \
+            not self.xform.is_merged_dataset
+
+    def _format_for_dataframe(self, cursor, repeat_counts=None):
         # TODO: check for and handle empty results
         # add ordered columns for select multiples
         if self.split_select_multiples:
@@ -592,6 +708,11 @@ class CSVDataFrameBuilder(AbstractDataFrameBuilder):
             else self.dd.get_media_survey_xpaths()
 
         for record in cursor:
+            if repeat_counts is not None:
+                # a submission saved after the schema was read
+                for (path, count) in iteritems(get_repeat_counts(record)):
+                    if count > repeat_counts.get(path, 0):
+                        raise RepeatCountsExceeded(path)
             # split select multiples
             if self.split_select_multiples:
                 record = self._split_select_multiples(
@@ -616,15 +737,48 @@ class CSVDataFrameBuilder(AbstractDataFrameBuilder):
 
             yield flat_dict
 
-    def export_to(self, path, dataview=None):
+    def _query_export_data(self, append=False):
+        try:
+            cursor = self._query_data(self.filter_query)
+        except NoRecordsFoundError:
+            # there may be no new submissions to append to an export
+            if not append:
+                raise
+            return []
+
+        return cursor.iterator(chunk_size=QUERY_FETCH_SIZE) \
+            if isinstance(cursor, QuerySet) else cursor
+
+    def export_to(self, path, dataview=None, previous_path=None,
+                  checkpoint=None):
+        """
+        Writes the CSV export to path.
+
+        When the file and checkpoint of a previous export are given the
+        submissions of the query are merged into a copy of the previous
+        export. The rows are appended as is when the submissions do not add
+        columns, otherwise the previous rows are rewritten with the new
+        columns.
+
+        The submissions of an export of all of a form's submissions are read
+        once, the repeat columns are built from the form's column schema.
+        The submissions are read twice to find the repeat columns otherwise,
+        and the schema is rebuilt when it is missing or stale.
+        """
         self.ordered_columns = OrderedDict()
         self._build_ordered_columns(self.dd.survey, self.ordered_columns)
-
+        append = previous_path is not None and checkpoint is not None
+        if append:
+            # repeat columns of the submissions in the previous export
+            for (xpath, cols) in iteritems(checkpoint['repeat_columns']):
+                if isinstance(self.ordered_columns.get(xpath), list):
+                    self.ordered_columns[xpath] = list(cols)
+
+        rebuild_version = None
         if dataview:
             cursor = dataview.query_data(dataview, all_data=True,
-                                         filter_query=self.filter_query)
-            if isinstance(cursor, QuerySet):
-                cursor = cursor.iterator()
+                                         filter_query=self.filter_query,
+                                         stream=True)
             self._update_columns_from_data(cursor)
 
             columns = list(chain.from_iterable(
@@ -633,15 +787,23 @@ class CSVDataFrameBuilder(AbstractDataFrameBuilder):
                  if [c for c in dataview.columns if xpath.startswith(c)]]
             ))
             cursor = dataview.query_data(dataview, all_data=True,
-                                         filter_query=self.filter_query)
-            if isinstance(cursor, QuerySet):
-                cursor = cursor.iterator()
+                                         filter_query=self.filter_query,
+                                         stream=True)
             data = self._format_for_dataframe(cursor)
         else:
-            cursor = self._query_data(self.filter_query)
-            if isinstance(cursor, QuerySet):
-                cursor = cursor.iterator()
-            self._update_columns_from_data(cursor)
+            repeat_counts = None
+            if self._can_use_column_schema(append):
+                repeat_counts = ColumnSchema.get_repeat_counts(self.xform.pk)
+                # the submissions after the query's are not counted
+                if repeat_counts is None and not self.filter_query:
+                    rebuild_version = ColumnSchema.start_rebuild(
+                        self.xform.pk)
+
+            if repeat_counts is not None:
+                self._update_columns_from_schema(repeat_counts)
+            else:
+                cursor = self._query_export_data(append)
+                self._update_columns_from_data(cursor)
 
             columns = list(chain.from_iterable(
                 [[xpath] if cols is None else cols
@@ -653,21 +815,53 @@ class CSVDataFrameBuilder(AbstractDataFrameBuilder):
                 columns += OsmData.get_tag_keys(self.xform,
                                                 field.get_abbreviated_xpath(),
                                                 include_prefix=True)
-            cursor = self._query_data(self.filter_query)
-            if isinstance(cursor, QuerySet):
-                cursor = cursor.iterator()
-            data = self._format_for_dataframe(cursor)
+            cursor = self._query_export_data(append)
+            data = self._format_for_dataframe(cursor, repeat_counts)
+            self.checkpoint = {
+                'columns': columns,
+                'repeat_columns': {
+                    xpath: cols
+                    for (xpath, cols) in iteritems(self.ordered_columns)
+                    if isinstance(cols, list)}}
 
         columns_with_hxl = self.include_hxl and get_columns_with_hxl(
             self.dd.survey_elements)
 
-        write_to_csv(path, data, columns,
-                     columns_with_hxl=columns_with_hxl,
-                     remove_group_name=self.remove_group_name,
-                     dd=self.dd, group_delimiter=self.group_delimiter,
-                     include_labels=self.include_labels,
-                     include_labels_only=self.include_labels_only,
-                     include_hxl=self.include_hxl,
-                     win_excel_utf8=self.win_excel_utf8,
-                     total_records=self.total_records,
-                     index_tags=self.index_tags)
+        if append:
+            previous_columns = checkpoint['columns']
+            if columns == previous_columns:
+                append_to_csv(path, previous_path, data, columns,
+                              total_records=self.total_records)
+                return
+
+            header_rows = len([
+                flag for flag in (
+                    not self.include_labels_only,
+                    self.include_labels or self.include_labels_only,
+                    self.include_hxl and columns_with_hxl)
+                if flag])
+            data = chain(
+                read_csv_rows(previous_path, previous_columns, header_rows,
+                              self.win_excel_utf8),
+                data)
+
+        try:
+            write_to_csv(path, data, columns,
+                         columns_with_hxl=columns_with_hxl,
+                         remove_group_name=self.remove_group_name,
+                         dd=self.dd, group_delimiter=self.group_delimiter,
+                         include_labels=self.include_labels,
+                         include_labels_only=self.include_labels_only,
+                         include_hxl=self.include_hxl,
+                         win_excel_utf8=self.win_excel_utf8,
+                         total_records=self.total_records,
+                         index_tags=self.index_tags)
+        except RepeatCountsExceeded:
+            # find the repeat columns from the submissions instead
+            self.use_column_schema = False
+            self.export_to(path, dataview, previous_path, checkpoint)
+            return
+
+        if rebuild_version is not None:
+            ColumnSchema.finish_rebuild(
+                self.xform.pk, rebuild_version, self.repeat_counts)
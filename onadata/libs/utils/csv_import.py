@@ -6,6 +6,7 @@ import functools
 import json
 import logging
 import sys
+import time
 import uuid
 from builtins import str as text
 from collections import defaultdict
@@ -22,19 +23,22 @@ from celery.result import AsyncResult
 from dateutil.parser import parse
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
+from django.db import transaction
 from django.utils import timezone
 from django.utils.translation import ugettext as _
 from future.utils import iteritems
 from multidb.pinning import use_master
 
-from onadata.apps.logger.models import Instance, XForm
+from onadata.apps.logger.models import ColumnSchema, Instance, XForm
 from onadata.apps.messaging.constants import XFORM, SUBMISSION_DELETED
 from onadata.apps.messaging.serializers import send_message
 from onadata.celery import app
 from onadata.libs.utils import analytics
 from onadata.libs.utils.async_status import (FAILED, async_status,
                                              celery_state_to_status)
+from onadata.libs.utils.cache_tools import bump_xform_data_version
 from onadata.libs.utils.common_tags import (MULTIPLE_SELECT_TYPE, EXCEL_TRUE,
                                             XLS_DATE_FIELDS,
                                             XLS_DATETIME_FIELDS, UUID, NA_REP,
@@ -42,16 +46,30 @@ from onadata.libs.utils.common_tags import (MULTIPLE_SELECT_TYPE, EXCEL_TRUE,
                                             INSTANCE_UPDATE_EVENT)
 from onadata.libs.utils.common_tools import report_exception
 from onadata.libs.utils.dict_tools import csv_dict_to_nested_dict
-from onadata.libs.utils.logger_tools import (OpenRosaResponse, dict2xml,
-                                             safe_create_instance)
+from onadata.apps.logger.xform_instance_parser import DuplicateInstance
+from onadata.libs.utils.logger_tools import (BulkSubmission,
+                                             create_instances_in_bulk,
+                                             dict2xml,
+                                             get_submission_error_response)
 
 DEFAULT_UPDATE_BATCH = 100
 PROGRESS_BATCH_UPDATE = getattr(settings, 'EXPORT_TASK_PROGRESS_UPDATE_BATCH',
                                 DEFAULT_UPDATE_BATCH)
+# number of rows submitted in one transaction
+CSV_IMPORT_CHUNK_SIZE = getattr(settings, 'CSV_IMPORT_CHUNK_SIZE',
+                                PROGRESS_BATCH_UPDATE)
+# number of times an asynchronous import is resumed after it fails
+CSV_IMPORT_MAX_RETRIES = getattr(settings, 'CSV_IMPORT_MAX_RETRIES', 3)
+# suffix of the file of the checkpoint of the import of a stored CSV file
+CHECKPOINT_SUFFIX = '.checkpoint'
+# least number of seconds between two saves of the checkpoint of an import
+CSV_IMPORT_CHECKPOINT_INTERVAL = getattr(
+    settings, 'CSV_IMPORT_CHECKPOINT_INTERVAL', 60)
 IGNORED_COLUMNS = ['formhub/uuid', 'meta/instanceID']
 
 
-def get_submission_meta_dict(xform, instance_id):
+def get_submission_meta_dict(xform, instance_id, existing_uuids=None,
+                             new_uuid=None):
     """Generates metadata for our submission
 
     Checks if `instance_id` belongs to an existing submission.
@@ -60,18 +78,24 @@ def get_submission_meta_dict(xform, instance_id):
 
     :param onadata.apps.logger.models.XForm xform: The submission's XForm.
     :param string instance_id: The submission/instance `uuid`.
+    :param set existing_uuids: The uuids of the existing submissions among
+        those checked, the database is queried when it is None.
+    :param string new_uuid: The uuid to assign instead of a random one.
 
     :return: The metadata dict
     :rtype:  dict
     """
-    uuid_arg = instance_id or 'uuid:{}'.format(uuid.uuid4())
+    new_uuid = new_uuid or uuid.uuid4()
+    uuid_arg = instance_id or 'uuid:{}'.format(new_uuid)
     meta = {'instanceID': uuid_arg}
 
     update = 0
 
-    if instance_id and xform.instances.filter(
-            uuid=instance_id.replace('uuid:', '')).count() > 0:
-        uuid_arg = 'uuid:{}'.format(uuid.uuid4())
+    if instance_id and (
+            instance_id.replace('uuid:', '') in existing_uuids
+            if existing_uuids is not None else xform.instances.filter(
+                uuid=instance_id.replace('uuid:', '')).count() > 0):
+        uuid_arg = 'uuid:{}'.format(new_uuid)
         meta.update({
             'instanceID': uuid_arg,
             'deprecatedID': instance_id
@@ -143,13 +167,99 @@ def dict_pathkeys_to_nested_dicts(dictionary):
     return data
 
 
-@app.task()
-def submit_csv_async(username, xform_id, file_path, overwrite=False):
-    """Imports CSV data to an existing xform asynchrounously."""
+def get_csv_import_checkpoint_name(file_path, import_id):
+    """Returns the name of the checkpoint file of an import of a stored CSV
+    file."""
+    return u'{}.{}{}'.format(file_path, import_id, CHECKPOINT_SUFFIX)
+
+
+def get_csv_import_checkpoint(file_path, import_id):
+    """Returns the checkpoint of an import of a stored CSV file or None."""
+    name = get_csv_import_checkpoint_name(file_path, import_id)
+    if not default_storage.exists(name):
+        return None
+
+    with default_storage.open(name) as checkpoint_file:
+        return json.loads(checkpoint_file.read().decode('utf-8'))
+
+
+def save_csv_import_checkpoint(file_path, import_id, checkpoint):
+    """Saves the checkpoint of an import of a stored CSV file, None deletes
+    it."""
+    name = get_csv_import_checkpoint_name(file_path, import_id)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    if checkpoint is not None:
+        default_storage.save(
+            name, ContentFile(json.dumps(checkpoint).encode('utf-8')))
+
+
+@app.task(bind=True, max_retries=CSV_IMPORT_MAX_RETRIES)
+def submit_csv_async(self, username, xform_id, file_path, overwrite=False):
+    """Imports CSV data to an existing xform asynchrounously.
+
+    The progress of the import is saved next to the file at most every
+    CSV_IMPORT_CHECKPOINT_INTERVAL seconds and when a chunk of rows fails.
+    The task is retried when a chunk fails and the retry resumes the import
+    from the last checkpoint. The checkpoint is keyed by the id of the task,
+    an upload of the same file is imported again.
+    """
     xform = XForm.objects.get(pk=xform_id)
+    # retries keep the id of the task
+    import_id = self.request.id or uuid.uuid4().hex
+    progress = {}
+    saved = [get_csv_import_checkpoint(file_path, import_id), time.time()]
+
+    def on_checkpoint(checkpoint):
+        progress.update(checkpoint)
+        if time.time() - saved[1] >= CSV_IMPORT_CHECKPOINT_INTERVAL:
+            save_csv_import_checkpoint(file_path, import_id, checkpoint)
+            saved[:] = [checkpoint, time.time()]
 
     with default_storage.open(file_path) as csv_file:
-        return submit_csv(username, xform, csv_file, overwrite)
+        try:
+            result = submit_csv(
+                username, xform, csv_file, overwrite, import_id=import_id,
+                checkpoint=saved[0], on_checkpoint=on_checkpoint)
+        except Exception as e:  # pylint: disable=broad-except
+            if self.request.retries < self.max_retries:
+                if progress and progress != saved[0]:
+                    save_csv_import_checkpoint(file_path, import_id, progress)
+                raise self.retry(
+                    exc=e, countdown=60 * (self.request.retries + 1))
+            result = failed_import([], xform, e, text(e))
+
+    save_csv_import_checkpoint(file_path, import_id, None)
+    if result.get('error') is not None and progress:
+        # the chunks before the failed one are not rolled back
+        result.update({
+            'additions': progress['additions'] - progress['updates'],
+            'duplicates': progress['duplicates'],
+            'updates': progress['updates']})
+
+    return result
+
+
+def submit_csv_batch(xform, batch):
+    """Submits a batch of CSV rows.
+
+    :param onadata.apps.logger.models.XForm xform: The submission's XForm.
+    :param list batch: A list of BulkSubmission objects.
+    :return: A tuple of the number of additions and duplicates and the error
+        response of the first failed submission or None.
+    :rtype: tuple
+    """
+    additions = duplicates = 0
+    for result in create_instances_in_bulk(xform, batch):
+        if isinstance(result, DuplicateInstance):
+            duplicates += 1
+        elif isinstance(result, Exception):
+            return additions, duplicates, get_submission_error_response(
+                result)
+        else:
+            additions += 1
+
+    return additions, duplicates, None
 
 
 def failed_import(rollback_uuids, xform, exception, status_message):
@@ -268,17 +378,91 @@ def flatten_split_select_multiples(
     return row
 
 
+def _clean_row(row, additional_col):
+    """Removes the additional columns and the 'n/a' and '' values of a
+    row"""
+    for index in additional_col:
+        del row[index]
+
+    return {k: v for (k, v) in row.items() if v not in [NA_REP, '']}
+
+
+def _row_to_submission(row, select_multiples):
+    """Turns a validated CSV row into the dict of a submission
+
+    :return: A tuple of the submission dict, its instanceID, submitting
+        username and submission date.
+    :rtype: tuple
+    """
+    location_data = {}
+
+    for key in list(row):
+        # Collect row location data into separate location_data dict
+        if key.endswith(('.latitude', '.longitude', '.altitude',
+                         '.precision')):
+            location_key, location_prop = key.rsplit(u'.', 1)
+            location_data.setdefault(location_key, {}).update({
+                location_prop:
+                row.get(key, '0')
+            })
+
+    # collect all location K-V pairs into single geopoint field(s) in
+    # location_data dict
+    for location_key in list(location_data):
+        location_data.update({
+            location_key:
+            (u'%(latitude)s %(longitude)s '
+                '%(altitude)s %(precision)s') % defaultdict(
+                lambda: '', location_data.get(location_key))
+        })
+
+    nested_dict = csv_dict_to_nested_dict(
+        row, select_multiples=select_multiples)
+    row = flatten_split_select_multiples(
+        nested_dict, select_multiples=select_multiples)
+    location_data = csv_dict_to_nested_dict(location_data)
+    # Merge location_data into the Row data
+    row = dict_merge(row, location_data)
+
+    submission_time = datetime.utcnow().isoformat()
+    row_uuid = row.get('meta/instanceID') or 'uuid:{}'.format(
+        row.get(UUID)) if row.get(UUID) else None
+    submitted_by = row.get('_submitted_by')
+    submission_date = row.get('_submission_time', submission_time)
+
+    for key in list(row):
+        # remove metadata (keys starting with '_')
+        if key.startswith('_'):
+            del row[key]
+
+    return row, row_uuid, submitted_by, submission_date
+
+
 @use_master
-def submit_csv(username, xform, csv_file, overwrite=False):
+def submit_csv(username, xform, csv_file, overwrite=False, import_id=None,
+               checkpoint=None, on_checkpoint=None):
     """Imports CSV data to an existing form
 
     Takes a csv formatted file or string containing rows of submission/instance
-    and converts those to xml submissions and finally submits them by calling
-    :py:func:`onadata.libs.utils.logger_tools.safe_create_instance`
+    and converts those to xml submissions and finally submits them in chunks
+    of CSV_IMPORT_CHUNK_SIZE rows by calling
+    :py:func:`onadata.libs.utils.logger_tools.create_instances_in_bulk`
+
+    The rows are validated before any is submitted. The existing uuids of
+    a chunk are looked up in one query and every chunk is committed in one
+    transaction. Submissions without a uuid get one derived from the
+    `import_id` and their row so that an import resumed from a `checkpoint`
+    skips the rows it had already imported.
 
     :param str username: the submission user
     :param onadata.apps.logger.models.XForm xform: The submission's XForm.
     :param (str or file) csv_file: A CSV formatted file with submission rows.
+    :param str import_id: Identifies the import of the file when it is
+        resumed, e.g. the id of the task importing the file.
+    :param dict checkpoint: The checkpoint of a previous run of the import.
+    :param func on_checkpoint: Called with the checkpoint after every chunk.
+        Exceptions are raised instead of rolling back the import when it is
+        given.
     :return: If sucessful, a dict with import summary else dict with error str.
     :rtype: Dict
     """
@@ -292,20 +476,21 @@ def submit_csv(username, xform, csv_file, overwrite=False):
             csv_file_validation_summary.get('error_msg')
         )
 
-    num_rows = sum(1 for row in csv_file) - 1
-
-    # Change stream position to start of file
-    csv_file.seek(0)
-
-    csv_reader = ucsv.DictReader(csv_file, encoding='utf-8-sig')
     xform_json = json.loads(xform.json)
     select_multiples = [
         qstn.name for qstn in
         xform.get_survey_elements_of_type(MULTIPLE_SELECT_TYPE)]
     ona_uuid = {'formhub': {'uuid': xform.uuid}}
-    additions = duplicates = inserts = 0
+    import_id = import_id or uuid.uuid4().hex
+    checkpoint = dict(checkpoint or {})
+    start_row = checkpoint.get('row', 0)
+    additions = checkpoint.get('additions', 0)
+    duplicates = checkpoint.get('duplicates', 0)
+    inserts = checkpoint.get('updates', 0)
     rollback_uuids = []
     errors = {}
+    chunk = []
+    users = {}
 
     # Retrieve the columns we should validate values for
     # Currently validating date, datetime, integer and decimal columns
@@ -317,177 +502,177 @@ def submit_csv(username, xform, csv_file, overwrite=False):
         'decimal': (get_columns_by_type(['decimal'], xform_json), float)
     }
 
-    if overwrite:
-        instance_ids = [i['id'] for i in xform.instances.values('id')]
-        xform.instances.filter(deleted_at__isnull=True)\
-            .update(deleted_at=timezone.now(),
-                    deleted_by=User.objects.get(username=username))
-        # send message
-        send_message(
-            instance_id=instance_ids, target_id=xform.id,
-            target_type=XFORM, user=User.objects.get(username=username),
-            message_verb=SUBMISSION_DELETED)
+    def submit_chunk(next_row):
+        """Submits the rows in the chunk, returns the async status of a
+        failed import"""
+        nonlocal additions, duplicates, inserts
+        row_uuids = {row_no: text(uuid.uuid5(
+            uuid.NAMESPACE_URL, u'{}:{}'.format(import_id, row_no)))
+            for (row_no, row, row_uuid, submitted_by, submission_date)
+            in chunk}
+        # one query for the existing uuids of the chunk
+        existing_uuids = set(xform.instances.filter(uuid__in=[
+            row_uuid.replace('uuid:', '') for (_no, _row, row_uuid, _by, _date)
+            in chunk if row_uuid] + list(row_uuids.values())).values_list(
+                'uuid', flat=True))
+        batch = []
+        updates = 0
+        for (row_no, row, row_uuid, submitted_by, submission_date) in chunk:
+            if row_uuids[row_no] in existing_uuids:
+                # imported before the import was resumed
+                additions += 1
+                continue
+
+            # Inject our forms uuid into the submission
+            row.update(ona_uuid)
+
+            old_meta = row.get('meta', {})
+            new_meta, update = get_submission_meta_dict(
+                xform, row_uuid, existing_uuids, row_uuids[row_no])
+            updates += update
+            old_meta.update(new_meta)
+            row.update({'meta': old_meta})
+
+            row_uuid = row.get('meta').get('instanceID')
+            if on_checkpoint is None:
+                rollback_uuids.append(row_uuid.replace('uuid:', ''))
 
+            if submitted_by not in users:
+                users[submitted_by] = User.objects.filter(
+                    username=submitted_by).first() \
+                    if submitted_by else None
+            batch.append(BulkSubmission(
+                dict2xmlsubmission(row, xform, row_uuid, submission_date),
+                submitted_by=users[submitted_by]))
+        del chunk[:]
+
+        try:
+            with transaction.atomic():
+                added, duplicated, error = submit_csv_batch(xform, batch)
+                if error:
+                    transaction.set_rollback(True)
+        except Exception as e:
+            if on_checkpoint is not None:
+                # the import resumes from the last checkpoint
+                raise
+            return failed_import(rollback_uuids, xform, e, text(e))
+        finally:
+            xform.submission_count(True)
+
+        if error:
+            Instance.objects.filter(
+                uuid__in=rollback_uuids, xform=xform).delete()
+            return async_status(FAILED, text(error))
+
+        additions += added
+        duplicates += duplicated
+        inserts += updates
+        checkpoint.update(row=next_row, additions=additions,
+                          duplicates=duplicates, updates=inserts)
+        if on_checkpoint is not None:
+            on_checkpoint(dict(checkpoint))
+
+        try:
+            current_task.update_state(
+                state='PROGRESS',
+                meta={
+                    'progress': additions,
+                    'total': num_rows,
+                    'info': additional_col,
+                    'checkpoint': checkpoint
+                })
+        except Exception:
+            logging.exception(
+                _(u'Could not update state of '
+                    'import CSV batch process.'))
+
+        return None
+
+    # Validate all the rows before submitting any
+    num_rows = 0
     try:
-        for row_no, row in enumerate(csv_reader):
-            # Remove additional columns
-            for index in additional_col:
-                del row[index]
-
-            # Remove 'n/a' and '' values from csv
-            row = {k: v for (k, v) in row.items() if v not in [NA_REP, '']}
-
-            row, error = validate_row(row, col_to_validate)
-
+        csv_file.seek(0)
+        for row_no, row in enumerate(
+                ucsv.DictReader(csv_file, encoding='utf-8-sig')):
+            num_rows += 1
+            row, error = validate_row(
+                _clean_row(row, additional_col), col_to_validate)
             if error:
                 errors[row_no] = error
-
-            # Only continue the process if no errors where encountered while
-            # validating the data
-            if not errors:
-                location_data = {}
-
-                for key in list(row):
-                    # Collect row location data into separate location_data
-                    # dict
-                    if key.endswith(('.latitude', '.longitude', '.altitude',
-                                    '.precision')):
-                        location_key, location_prop = key.rsplit(u'.', 1)
-                        location_data.setdefault(location_key, {}).update({
-                            location_prop:
-                            row.get(key, '0')
-                        })
-
-                # collect all location K-V pairs into single geopoint field(s)
-                # in location_data dict
-                for location_key in list(location_data):
-                    location_data.update({
-                        location_key:
-                        (u'%(latitude)s %(longitude)s '
-                            '%(altitude)s %(precision)s') % defaultdict(
-                            lambda: '', location_data.get(location_key))
-                    })
-
-                nested_dict = csv_dict_to_nested_dict(
-                    row, select_multiples=select_multiples)
-                row = flatten_split_select_multiples(
-                    nested_dict, select_multiples=select_multiples)
-                location_data = csv_dict_to_nested_dict(location_data)
-                # Merge location_data into the Row data
-                row = dict_merge(row, location_data)
-
-                submission_time = datetime.utcnow().isoformat()
-                row_uuid = row.get('meta/instanceID') or 'uuid:{}'.format(
-                    row.get(UUID)) if row.get(UUID) else None
-                submitted_by = row.get('_submitted_by')
-                submission_date = row.get('_submission_time', submission_time)
-
-                for key in list(row):
-                    # remove metadata (keys starting with '_')
-                    if key.startswith('_'):
-                        del row[key]
-
-                # Inject our forms uuid into the submission
-                row.update(ona_uuid)
-
-                old_meta = row.get('meta', {})
-                new_meta, update = get_submission_meta_dict(xform, row_uuid)
-                inserts += update
-                old_meta.update(new_meta)
-                row.update({'meta': old_meta})
-
-                row_uuid = row.get('meta').get('instanceID')
-                rollback_uuids.append(row_uuid.replace('uuid:', ''))
-
-                try:
-                    xml_file = BytesIO(
-                        dict2xmlsubmission(
-                            row, xform, row_uuid, submission_date))
-
-                    try:
-                        error, instance = safe_create_instance(
-                            username, xml_file, [], xform.uuid, None)
-                    except ValueError as e:
-                        error = e
-
-                    if error:
-                        if not (isinstance(error, OpenRosaResponse)
-                                and error.status_code == 202):
-                            Instance.objects.filter(
-                                uuid__in=rollback_uuids, xform=xform).delete()
-                            return async_status(FAILED, text(error))
-                        else:
-                            duplicates += 1
-                    else:
-                        additions += 1
-
-                        if additions % PROGRESS_BATCH_UPDATE == 0:
-                            try:
-                                current_task.update_state(
-                                    state='PROGRESS',
-                                    meta={
-                                        'progress': additions,
-                                        'total': num_rows,
-                                        'info': additional_col
-                                    })
-                            except Exception:
-                                logging.exception(
-                                    _(u'Could not update state of '
-                                        'import CSV batch process.'))
-                            finally:
-                                xform.submission_count(True)
-
-                        users = User.objects.filter(
-                            username=submitted_by) if submitted_by else []
-                        if users:
-                            instance.user = users[0]
-                            instance.save()
-                except Exception as e:
-                    failed_import(rollback_uuids, xform, e, text(e))
-                finally:
-                    xform.submission_count(True)
     except UnicodeDecodeError as e:
         return failed_import(rollback_uuids, xform, e,
                              'CSV file must be utf-8 encoded')
 
     if errors:
-        # Rollback all created instances if an error occurred during
-        # validation
-        Instance.objects.filter(
-            uuid__in=rollback_uuids, xform=xform).delete()
         return async_status(
             FAILED,
             u'Invalid CSV data imported in row(s): {}'.format(
                 errors) if errors else ''
         )
-    else:
-        added_submissions = additions - inserts
-        event_by = User.objects.get(username=username)
-        event_name = None
-        tracking_properties = {
-            'xform_id': xform.pk,
-            'submitted_by': event_by,
-            'label': f'csv-import-for-form-{xform.pk}',
-            'from': 'CSV Import',
-        }
-        if added_submissions > 0:
-            tracking_properties['value'] = added_submissions
-            event_name = INSTANCE_CREATE_EVENT
-            analytics.track(
-                event_by, event_name, properties=tracking_properties)
-
-        if inserts > 0:
-            tracking_properties['value'] = inserts
-            event_name = INSTANCE_UPDATE_EVENT
-            analytics.track(
-                event_by, event_name, properties=tracking_properties)
 
-        return {
-            'additions': added_submissions,
-            'duplicates': duplicates,
-            'updates': inserts,
-            'info': "Additional column(s) excluded from the upload: '{0}'."
-            .format(', '.join(list(additional_col)))}
+    if overwrite and not start_row:
+        instance_ids = [i['id'] for i in xform.instances.values('id')]
+        xform.instances.filter(deleted_at__isnull=True)\
+            .update(deleted_at=timezone.now(),
+                    deleted_by=User.objects.get(username=username))
+        bump_xform_data_version(xform.pk)
+        ColumnSchema.mark_stale(xform.pk)
+        # send message
+        send_message(
+            instance_id=instance_ids, target_id=xform.id,
+            target_type=XFORM, user=User.objects.get(username=username),
+            message_verb=SUBMISSION_DELETED)
+
+    # Change stream position to start of file
+    csv_file.seek(0)
+    csv_reader = ucsv.DictReader(csv_file, encoding='utf-8-sig')
+    for row_no, row in enumerate(csv_reader):
+        if row_no < start_row:
+            # imported before the import was resumed
+            continue
+
+        row, _error = validate_row(
+            _clean_row(row, additional_col), col_to_validate)
+        chunk.append(
+            (row_no,) + _row_to_submission(row, select_multiples))
+
+        if len(chunk) >= CSV_IMPORT_CHUNK_SIZE:
+            failed = submit_chunk(row_no + 1)
+            if failed:
+                return failed
+
+    if chunk:
+        failed = submit_chunk(num_rows)
+        if failed:
+            return failed
+
+    added_submissions = additions - inserts
+    event_by = User.objects.get(username=username)
+    event_name = None
+    tracking_properties = {
+        'xform_id': xform.pk,
+        'submitted_by': event_by,
+        'label': f'csv-import-for-form-{xform.pk}',
+        'from': 'CSV Import',
+    }
+    if added_submissions > 0:
+        tracking_properties['value'] = added_submissions
+        event_name = INSTANCE_CREATE_EVENT
+        analytics.track(
+            event_by, event_name, properties=tracking_properties)
+
+    if inserts > 0:
+        tracking_properties['value'] = inserts
+        event_name = INSTANCE_UPDATE_EVENT
+        analytics.track(
+            event_by, event_name, properties=tracking_properties)
+
+    return {
+        'additions': added_submissions,
+        'duplicates': duplicates,
+        'updates': inserts,
+        'info': "Additional column(s) excluded from the upload: '{0}'."
+        .format(', '.join(list(additional_col)))}
 
 
 def get_async_csv_submission_status(job_uuid):
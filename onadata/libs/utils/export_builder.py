@@ -5,7 +5,9 @@ ExportBuilder
 from __future__ import unicode_literals
 
 import csv
+import io
 import logging
+import shutil
 import sys
 import uuid
 import re
@@ -18,6 +20,7 @@ from django.conf import settings
 from django.core.files.temp import NamedTemporaryFile
 from django.utils.translation import ugettext as _
 from future.utils import iteritems
+from openpyxl import load_workbook
 from openpyxl.utils.datetime import to_excel
 from openpyxl.workbook import Workbook
 from pyxform.question import Question
@@ -34,6 +37,7 @@ from onadata.libs.utils.common_tags import (
     PARENT_TABLE_NAME, REPEAT_INDEX_TAGS, SAV_255_BYTES_TYPE,
     SAV_NUMERIC_TYPE, STATUS, SUBMISSION_TIME, SUBMITTED_BY, TAGS, UUID,
     VERSION, XFORM_ID_STRING, REVIEW_STATUS, REVIEW_COMMENT, SELECT_BIND_TYPE)
+from onadata.libs.utils.export_shards import ExportShards
 from onadata.libs.utils.mongo import _decode_from_mongo, _is_invalid_for_mongo
 # the bind type of select multiples that we use to compare
 GEOPOINT_BIND_TYPE = 'geopoint'
@@ -42,6 +46,8 @@ DEFAULT_UPDATE_BATCH = 100
 
 YES = 1
 NO = 0
+# matches ${name} references to other fields in a value
+DYNAMIC_VALUE_REGEX = re.compile(r'\$\{\w+\}')
 
 # savReaderWriter behaves differenlty depending on this
 IS_PY_3K = sys.version_info[0] > 2
@@ -110,6 +116,31 @@ def get_choice_label_value(key, value, data_dictionary, language=None):
     return label or value
 
 
+def compile_choice_label_value(key, data_dictionary, language=None):
+    """
+    Return a function of a value that returns what get_choice_label_value
+    returns for the key, with the labels of the key's choices looked up once.
+    """
+    select_multiple = key in data_dictionary.get_select_multiple_xpaths()
+    if not select_multiple and \
+            key not in data_dictionary.get_select_one_xpaths():
+        return lambda value: value
+
+    labels = {}
+    element = data_dictionary.get_survey_element(key)
+    for choice in (element.children if element is not None else []):
+        if choice.name not in labels:
+            labels[choice.name] = get_choice_label(
+                choice.label, data_dictionary, language)
+
+    if select_multiple:
+        return lambda value: ' '.join(
+            [labels.get(item) or item for item in value.split(' ')]) or value
+
+    return lambda value: (
+        labels.get(value) if isinstance(value, str) else None) or value
+
+
 def get_value_or_attachment_uri(  # pylint: disable=too-many-arguments
         key, value, row, data_dictionary, media_xpaths,
         attachment_list=None, show_choice_labels=False, language=None):
@@ -288,6 +319,27 @@ def string_to_date_with_xls_validation(date_str):
         return date_obj
 
 
+def _convert_submission_time(row):
+    if SUBMISSION_TIME in row:
+        row[SUBMISSION_TIME] = ExportBuilder.convert_type(
+            row[SUBMISSION_TIME], 'dateTime')
+
+
+def _map_dynamic_values(row):
+    for key, value in row.items():
+        # Find substrings that match ${`any_text`}
+        if isinstance(value, str) and '${' in value:
+            result = DYNAMIC_VALUE_REGEX.findall(value)
+            if result:
+                for val in result:
+                    val_key = val[2:-1]
+                    # Try retrieving value of ${`any_text`} from the
+                    # row data and replace the value
+                    if row.get(val_key):
+                        value = value.replace(val, row.get(val_key))
+                row[key] = value
+
+
 def decode_mongo_encoded_section_names(data):
     """ Recursively decode mongo keys.
 
@@ -352,6 +404,12 @@ class ExportBuilder(object):
         self.extra_columns = (
             self.EXTRA_FIELDS + getattr(settings, 'EXTRA_COLUMNS', []))
         self.osm_columns = []
+        # state of the last export, used to append submissions to it
+        self.checkpoint = {}
+        # the row processing functions of each section and the options
+        # they were built with
+        self._section_plans = {}
+        self._plan_options = None
 
     @classmethod
     def format_field_title(cls, abbreviated_xpath, field_delimiter,
@@ -565,6 +623,7 @@ class ExportBuilder(object):
             self.select_multiples, self.gps_fields, self.osm_fields,
             self.encoded_fields, self.select_ones, self.GROUP_DELIMITER,
             self.TRUNCATE_GROUP_TITLE)
+        self.compile_sections()
 
     def section_by_name(self, name):
         matches = [s for s in self.sections if s['name'] == name]
@@ -671,75 +730,245 @@ class ExportBuilder(object):
         except ValueError:
             return value
 
-    def pre_process_row(self, row, section):
+    def _get_plan_options(self):
+        return (self.SPLIT_SELECT_MULTIPLES, self.VALUE_SELECT_MULTIPLES,
+                self.BINARY_SELECT_MULTIPLES, self.SHOW_CHOICE_LABELS,
+                self.language)
+
+    def _compile_select_multiples(self, select_multiples):
         """
-        Split select multiples, gps and decode . and $
+        Return the function that splits the select multiples of a row into
+        a column per choice, see split_select_multiples.
+        """
+        show_choice_labels = self.SHOW_CHOICE_LABELS
+        select_values = self.VALUE_SELECT_MULTIPLES
+        compiled = []
+        for (xpath, choices) in iteritems(select_multiples):
+            if select_values:
+                columns = [
+                    (choice['label'] if show_choice_labels
+                     else choice['xpath'], choice['xpath'], choice['_label'])
+                    for choice in choices]
+            else:
+                columns = [
+                    (choice['label'] if show_choice_labels
+                     else choice['xpath'], choice['xpath'], None)
+                    for choice in choices]
+            label_value = compile_choice_label_value(
+                xpath, self.dd, self.language) if show_choice_labels else None
+            compiled.append((xpath, columns, label_value))
+
+        if select_values and show_choice_labels:
+            def fill(row, columns, selected):
+                for (column, choice_xpath, label) in columns:
+                    row[column] = label if choice_xpath in selected else None
+        elif select_values:
+            def fill(row, columns, selected):
+                for (column, choice_xpath, _label) in columns:
+                    row[column] = selected.get(choice_xpath)
+        elif self.BINARY_SELECT_MULTIPLES:
+            def fill(row, columns, selected):
+                for (column, choice_xpath, _label) in columns:
+                    row[column] = YES if choice_xpath in selected else NO
+        else:
+            def fill(row, columns, selected):
+                for (column, choice_xpath, _label) in columns:
+                    row[column] = choice_xpath in selected \
+                        if selected else None
+
+        def split(row):
+            for (xpath, columns, label_value) in compiled:
+                data = row.get(xpath) and text(row.get(xpath))
+                # the selected choice xpaths and their values
+                selected = {}
+                if data:
+                    for selection in data.split():
+                        selected.setdefault(
+                            '{0}/{1}'.format(xpath, selection), selection)
+                    if label_value is not None:
+                        row[xpath] = label_value(data)
+                fill(row, columns, selected)
+
+        return split
+
+    def _compile_section(self, section):
+        """
+        Return the list of functions that process a row of the section in
+        the order they are applied. The fields of the section and the export
+        options are looked up once for all rows.
         """
         section_name = section['name']
+        plan = []
 
         # first decode fields so that subsequent lookups
         # have decoded field names
-        if section_name in self.encoded_fields:
-            row = ExportBuilder.decode_mongo_encoded_fields(
-                row, self.encoded_fields[section_name])
-
-        if section_name in self.select_multiples:
-            select_multiples = self.select_multiples[section_name]
-            if self.SPLIT_SELECT_MULTIPLES:
-                row = ExportBuilder.split_select_multiples(
-                    row, select_multiples, self.VALUE_SELECT_MULTIPLES,
-                    self.BINARY_SELECT_MULTIPLES,
-                    show_choice_labels=self.SHOW_CHOICE_LABELS,
-                    data_dictionary=self.dd, language=self.language)
-            if not self.SPLIT_SELECT_MULTIPLES and self.SHOW_CHOICE_LABELS:
-                for xpath in select_multiples:
+        encoded_fields = list(iteritems(
+            self.encoded_fields.get(section_name, {})))
+        if encoded_fields:
+            def decode(row):
+                for (xpath, encoded_xpath) in encoded_fields:
+                    if row.get(encoded_xpath):
+                        row[xpath] = row.pop(encoded_xpath)
+            plan.append(decode)
+
+        select_multiples = self.select_multiples.get(section_name)
+        if select_multiples and self.SPLIT_SELECT_MULTIPLES:
+            plan.append(self._compile_select_multiples(select_multiples))
+        elif select_multiples and self.SHOW_CHOICE_LABELS:
+            labels = [(xpath, compile_choice_label_value(
+                xpath, self.dd, self.language)) for xpath in select_multiples]
+
+            def label_select_multiples(row):
+                for (xpath, label_value) in labels:
                     # get the data matching this xpath
                     data = row.get(xpath) and text(row.get(xpath))
                     if data:
-                        row[xpath] = get_choice_label_value(
-                            xpath, data, self.dd, self.language)
-
-        if section_name in self.gps_fields:
-            row = ExportBuilder.split_gps_components(
-                row, self.gps_fields[section_name])
-
-        if section_name in self.select_ones and self.SHOW_CHOICE_LABELS:
-            for key in self.select_ones[section_name]:
-                if key in row:
-                    row[key] = get_choice_label_value(key, row[key], self.dd,
-                                                      self.language)
-
-        # convert to native types
-        for elm in section['elements']:
-            # only convert if its in our list and its not empty, just to
-            # optimize
-            value = row.get(elm['xpath'])
-            if elm['type'] in ExportBuilder.TYPES_TO_CONVERT\
-                    and value is not None and value != '':
-                row[elm['xpath']] = ExportBuilder.convert_type(
-                    value, elm['type'])
-
-        if SUBMISSION_TIME in row:
-            row[SUBMISSION_TIME] = ExportBuilder.convert_type(
-                row[SUBMISSION_TIME], 'dateTime')
-
-        # Map dynamic values
-        for key, value in row.items():
-            if isinstance(value, str):
-                dynamic_val_regex = '\$\{\w+\}'  # noqa
-                # Find substrings that match ${`any_text`}
-                result = re.findall(dynamic_val_regex, value)
-                if result:
-                    for val in result:
-                        val_key = val.replace('${', '').replace('}', '')
-                        # Try retrieving value of ${`any_text`} from the
-                        # row data and replace the value
-                        if row.get(val_key):
-                            value = value.replace(val, row.get(val_key))
-                    row[key] = value
+                        row[xpath] = label_value(data)
+            plan.append(label_select_multiples)
+
+        gps_fields = list(iteritems(self.gps_fields.get(section_name, {})))
+        if gps_fields:
+            def split_gps(row):
+                for (xpath, gps_components) in gps_fields:
+                    data = row.get(xpath)
+                    if data:
+                        gps_parts = data.split()
+                        if gps_parts:
+                            row.update(zip(gps_components, gps_parts))
+            plan.append(split_gps)
+
+        select_ones = self.select_ones.get(section_name)
+        if select_ones and self.SHOW_CHOICE_LABELS:
+            labels = [(key, compile_choice_label_value(
+                key, self.dd, self.language)) for key in select_ones]
+
+            def label_select_ones(row):
+                for (key, label_value) in labels:
+                    if key in row:
+                        row[key] = label_value(row[key])
+            plan.append(label_select_ones)
+
+        # convert to native types, only the types in our list
+        conversions = [
+            (elm['xpath'], ExportBuilder.CONVERT_FUNCS[elm['type']])
+            for elm in section['elements']
+            if elm['type'] in ExportBuilder.TYPES_TO_CONVERT and
+            elm['type'] in ExportBuilder.CONVERT_FUNCS]
+        if conversions:
+            def convert(row):
+                for (xpath, func) in conversions:
+                    value = row.get(xpath)
+                    # only convert if its not empty, just to optimize
+                    if value is not None and value != '':
+                        try:
+                            row[xpath] = func(value)
+                        except ValueError:
+                            pass
+            plan.append(convert)
+
+        plan.append(_convert_submission_time)
+        plan.append(_map_dynamic_values)
+
+        return plan
+
+    def compile_sections(self):
+        """
+        Build the row processing plan of every section for the current
+        export options.
+        """
+        self._plan_options = self._get_plan_options()
+        self._section_plans = {
+            section['name']: self._compile_section(section)
+            for section in self.sections}
+
+    def get_section_plan(self, section):
+        """
+        Return the row processing plan of the section, the plans are built
+        again if the export options changed after set_survey.
+        """
+        if self._plan_options != self._get_plan_options():
+            self.compile_sections()
+
+        plan = self._section_plans.get(section['name'])
+        if plan is None:
+            plan = self._section_plans[section['name']] = \
+                self._compile_section(section)
+
+        return plan
+
+    def pre_process_row(self, row, section):
+        """
+        Split select multiples, gps and decode . and $
+        """
+        for process in self.get_section_plan(section):
+            process(row)
 
         return row
 
+    def iter_section_rows(self, data, index=1, indices=None,
+                          total_records=None, track_progress=True):
+        """
+        Yields the section name and the processed row of every row the
+        records in data add to the sections of the export.
+
+        index is the _index of the first record and indices maps repeats to
+        the last _index of their rows in earlier records. self.checkpoint
+        holds the index and indices that follow the yielded rows.
+        """
+        indices = {} if indices is None else dict(indices)
+        media_xpaths = [] if not self.INCLUDE_IMAGES \
+            else self.dd.get_media_survey_xpaths()
+        survey_name = self.survey.name
+        self.checkpoint = {'index': index, 'indices': indices}
+        plans = [(section['name'], self.get_section_plan(section))
+                 for section in self.sections]
+
+        for i, d in enumerate(data, start=1):
+            # decode mongo section names
+            joined_export = dict_to_joined_export(d, index, indices,
+                                                  survey_name,
+                                                  self.survey, d,
+                                                  media_xpaths)
+            output = decode_mongo_encoded_section_names(joined_export)
+            # attach meta fields (index, parent_index, parent_table)
+            # output has keys for every section
+            if survey_name not in output:
+                output[survey_name] = {}
+            output[survey_name][INDEX] = index
+            output[survey_name][PARENT_INDEX] = -1
+            for (section_name, plan) in plans:
+                # section name might not exist within the output, e.g. data
+                # was not provided for said repeat
+                rows = output.get(section_name)
+                if isinstance(rows, dict):
+                    rows = [rows]
+                elif not isinstance(rows, list):
+                    continue
+                for row in rows:
+                    for process in plan:
+                        process(row)
+                    yield section_name, row
+            index += 1
+            self.checkpoint['index'] = index
+            if track_progress:
+                track_task_progress(i, total_records)
+
+    def iter_export_section_rows(self, data, index=1, indices=None,
+                                 total_records=None):
+        """
+        Yields the section rows of the records in data, see
+        iter_section_rows. The records of ExportShards are processed in
+        parallel when possible.
+        """
+        if isinstance(data, ExportShards) and data.can_fork():
+            return data.iter_section_rows(
+                self, index=index, indices=indices,
+                total_records=total_records,
+                track_progress=track_task_progress)
+
+        return self.iter_section_rows(
+            data, index=index, indices=indices, total_records=total_records)
+
     def to_zipped_csv(self, path, data, *args, **kwargs):
         def write_row(row, csv_writer, fields):
             csv_writer.writerow(
@@ -748,6 +977,9 @@ class ExportBuilder(object):
         csv_defs = {}
         dataview = kwargs.get('dataview')
         total_records = kwargs.get('total_records')
+        previous_path = kwargs.get('previous_path')
+        checkpoint = kwargs.get('checkpoint')
+        append = previous_path is not None and checkpoint is not None
 
         for section in self.sections:
             csv_file = NamedTemporaryFile(suffix='.csv', mode='w')
@@ -755,26 +987,34 @@ class ExportBuilder(object):
             csv_defs[section['name']] = {
                 'csv_file': csv_file, 'csv_writer': csv_writer}
 
+        if append:
+            # copy the rows of the previous export, headers included
+            with ZipFile(previous_path) as zip_file:
+                for (section_name, csv_def) in iteritems(csv_defs):
+                    name = '_'.join(section_name.split('/')) + '.csv'
+                    with zip_file.open(name) as previous:
+                        shutil.copyfileobj(
+                            io.TextIOWrapper(
+                                previous, encoding='utf-8', newline=''),
+                            csv_def['csv_file'])
+
         # write headers
-        if not self.INCLUDE_LABELS_ONLY:
+        if not self.INCLUDE_LABELS_ONLY and not append:
             for section in self.sections:
                 fields = self.get_fields(dataview, section, 'title')
                 csv_defs[section['name']]['csv_writer'].writerow(
                     [f for f in fields])
 
         # write labels
-        if self.INCLUDE_LABELS or self.INCLUDE_LABELS_ONLY:
+        if (self.INCLUDE_LABELS or self.INCLUDE_LABELS_ONLY) and not append:
             for section in self.sections:
                 fields = self.get_fields(dataview, section, 'label')
                 csv_defs[section['name']]['csv_writer'].writerow(
                     [f for f in fields])
 
-        media_xpaths = [] if not self.INCLUDE_IMAGES \
-            else self.dd.get_media_survey_xpaths()
-
         columns_with_hxl = kwargs.get('columns_with_hxl')
         # write hxl row
-        if self.INCLUDE_HXL and columns_with_hxl:
+        if self.INCLUDE_HXL and columns_with_hxl and not append:
             for section in self.sections:
                 fields = self.get_fields(dataview, section, 'title')
                 hxl_row = [columns_with_hxl.get(col, '')
@@ -783,42 +1023,17 @@ class ExportBuilder(object):
                     writer = csv_defs[section['name']]['csv_writer']
                     writer.writerow(hxl_row)
 
-        index = 1
-        indices = {}
-        survey_name = self.survey.name
-        for i, d in enumerate(data, start=1):
-            # decode mongo section names
-            joined_export = dict_to_joined_export(d, index, indices,
-                                                  survey_name,
-                                                  self.survey, d,
-                                                  media_xpaths)
-            output = decode_mongo_encoded_section_names(joined_export)
-            # attach meta fields (index, parent_index, parent_table)
-            # output has keys for every section
-            if survey_name not in output:
-                output[survey_name] = {}
-            output[survey_name][INDEX] = index
-            output[survey_name][PARENT_INDEX] = -1
-            for section in self.sections:
-                # get data for this section and write to csv
-                section_name = section['name']
-                csv_def = csv_defs[section_name]
-                fields = self.get_fields(dataview, section, 'xpath')
-                csv_writer = csv_def['csv_writer']
-                # section name might not exist within the output, e.g. data was
-                # not provided for said repeat - write test to check this
-                row = output.get(section_name, None)
-                if isinstance(row, dict):
-                    write_row(
-                        self.pre_process_row(row, section),
-                        csv_writer, fields)
-                elif isinstance(row, list):
-                    for child_row in row:
-                        write_row(
-                            self.pre_process_row(child_row, section),
-                            csv_writer, fields)
-            index += 1
-            track_task_progress(i, total_records)
+        fields = {
+            section['name']: self.get_fields(dataview, section, 'xpath')
+            for section in self.sections}
+        # continue the indices of the previous export
+        section_rows = self.iter_export_section_rows(
+            data, index=checkpoint['index'] if append else 1,
+            indices=checkpoint['indices'] if append else None,
+            total_records=total_records)
+        for (section_name, row) in section_rows:
+            write_row(row, csv_defs[section_name]['csv_writer'],
+                      fields[section_name])
 
         # write zipfile
         with ZipFile(path, 'w', ZIP_DEFLATED, allowZip64=True) as zip_file:
@@ -863,6 +1078,9 @@ class ExportBuilder(object):
 
         dataview = kwargs.get('dataview')
         total_records = kwargs.get('total_records')
+        previous_path = kwargs.get('previous_path')
+        checkpoint = kwargs.get('checkpoint')
+        append = previous_path is not None and checkpoint is not None
 
         wb = Workbook(write_only=True)
         work_sheets = {}
@@ -876,8 +1094,17 @@ class ExportBuilder(object):
             work_sheets[section_name] = wb.create_sheet(
                 title=work_sheet_title)
 
+        if append:
+            # copy the rows of the previous export, headers included
+            previous_wb = load_workbook(previous_path, read_only=True)
+            for (section_name, ws) in iteritems(work_sheets):
+                previous_ws = previous_wb[work_sheet_titles[section_name]]
+                for row in previous_ws.iter_rows(values_only=True):
+                    ws.append(row)
+            previous_wb.close()
+
         # write the headers
-        if not self.INCLUDE_LABELS_ONLY:
+        if not self.INCLUDE_LABELS_ONLY and not append:
             for section in self.sections:
                 section_name = section['name']
                 headers = self.get_fields(dataview, section, 'title')
@@ -887,7 +1114,7 @@ class ExportBuilder(object):
                 ws.append(headers)
 
         # write labels
-        if self.INCLUDE_LABELS or self.INCLUDE_LABELS_ONLY:
+        if (self.INCLUDE_LABELS or self.INCLUDE_LABELS_ONLY) and not append:
             for section in self.sections:
                 section_name = section['name']
                 labels = self.get_fields(dataview, section, 'label')
@@ -896,12 +1123,9 @@ class ExportBuilder(object):
                 ws = work_sheets[section_name]
                 ws.append(labels)
 
-        media_xpaths = [] if not self.INCLUDE_IMAGES \
-            else self.dd.get_media_survey_xpaths()
-
         # write hxl header
         columns_with_hxl = kwargs.get('columns_with_hxl')
-        if self.INCLUDE_HXL and columns_with_hxl:
+        if self.INCLUDE_HXL and columns_with_hxl and not append:
             for section in self.sections:
                 section_name = section['name']
                 headers = self.get_fields(dataview, section, 'title')
@@ -913,41 +1137,17 @@ class ExportBuilder(object):
                            for col in headers]
                 hxl_row and ws.append(hxl_row)
 
-        index = 1
-        indices = {}
-        survey_name = self.survey.name
-        for i, d in enumerate(data, start=1):
-            joined_export = dict_to_joined_export(d, index, indices,
-                                                  survey_name,
-                                                  self.survey, d,
-                                                  media_xpaths)
-            output = decode_mongo_encoded_section_names(joined_export)
-            # attach meta fields (index, parent_index, parent_table)
-            # output has keys for every section
-            if survey_name not in output:
-                output[survey_name] = {}
-            output[survey_name][INDEX] = index
-            output[survey_name][PARENT_INDEX] = -1
-            for section in self.sections:
-                # get data for this section and write to xls
-                section_name = section['name']
-                fields = self.get_fields(dataview, section, 'xpath')
-
-                ws = work_sheets[section_name]
-                # section might not exist within the output, e.g. data was
-                # not provided for said repeat - write test to check this
-                row = output.get(section_name, None)
-                if isinstance(row, dict):
-                    write_row(
-                        self.pre_process_row(row, section),
-                        ws, fields, work_sheet_titles)
-                elif isinstance(row, list):
-                    for child_row in row:
-                        write_row(
-                            self.pre_process_row(child_row, section),
-                            ws, fields, work_sheet_titles)
-            index += 1
-            track_task_progress(i, total_records)
+        fields = {
+            section['name']: self.get_fields(dataview, section, 'xpath')
+            for section in self.sections}
+        # continue the indices of the previous export
+        section_rows = self.iter_export_section_rows(
+            data, index=checkpoint['index'] if append else 1,
+            indices=checkpoint['indices'] if append else None,
+            total_records=total_records)
+        for (section_name, row) in section_rows:
+            write_row(row, work_sheets[section_name], fields[section_name],
+                      work_sheet_titles)
 
         wb.save(filename=path)
 
@@ -981,7 +1181,10 @@ class ExportBuilder(object):
             show_choice_labels=show_choice_labels,
             include_reviews=self.INCLUDE_REVIEWS, language=language)
 
-        csv_builder.export_to(path, dataview=dataview)
+        csv_builder.export_to(path, dataview=dataview,
+                              previous_path=kwargs.get('previous_path'),
+                              checkpoint=kwargs.get('checkpoint'))
+        self.checkpoint = csv_builder.checkpoint
 
     def get_default_language(self, languages):
         language = self.dd.default_language
@@ -1186,7 +1389,7 @@ class ExportBuilder(object):
     def to_zipped_sav(self, path, data, *args, **kwargs):
         total_records = kwargs.get('total_records')
 
-        def write_row(row, csv_writer, fields):
+        def write_row(row, sav_writer, fields):
             # replace character for osm fields
             fields = [field.replace(':', '_') for field in fields]
             sav_writer.writerow(
@@ -1204,45 +1407,15 @@ class ExportBuilder(object):
             sav_defs[section['name']] = {
                 'sav_file': sav_file, 'sav_writer': sav_writer}
 
-        media_xpaths = [] if not self.INCLUDE_IMAGES \
-            else self.dd.get_media_survey_xpaths()
-
-        index = 1
-        indices = {}
-        survey_name = self.survey.name
-        for i, d in enumerate(data, start=1):
-            # decode mongo section names
-            joined_export = dict_to_joined_export(d, index, indices,
-                                                  survey_name,
-                                                  self.survey, d,
-                                                  media_xpaths)
-            output = decode_mongo_encoded_section_names(joined_export)
-            # attach meta fields (index, parent_index, parent_table)
-            # output has keys for every section
-            if survey_name not in output:
-                output[survey_name] = {}
-            output[survey_name][INDEX] = index
-            output[survey_name][PARENT_INDEX] = -1
-            for section in self.sections:
-                # get data for this section and write to csv
-                section_name = section['name']
-                sav_def = sav_defs[section_name]
-                fields = [
-                    element['xpath'] for element in
-                    section['elements']]
-                sav_writer = sav_def['sav_writer']
-                row = output.get(section_name, None)
-                if isinstance(row, dict):
-                    write_row(
-                        self.pre_process_row(row, section),
-                        sav_writer, fields)
-                elif isinstance(row, list):
-                    for child_row in row:
-                        write_row(
-                            self.pre_process_row(child_row, section),
-                            sav_writer, fields)
-            index += 1
-            track_task_progress(i, total_records)
+        fields = {
+            section['name']: [
+                element['xpath'] for element in section['elements']]
+            for section in self.sections}
+        section_rows = self.iter_export_section_rows(
+            data, total_records=total_records)
+        for (section_name, row) in section_rows:
+            write_row(row, sav_defs[section_name]['sav_writer'],
+                      fields[section_name])
 
         for (section_name, sav_def) in iteritems(sav_defs):
             sav_def['sav_writer'].closeSavFile(
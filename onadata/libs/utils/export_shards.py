@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel export of submissions in shards.
+
+The submissions of a form are split into shards of consecutive ids. Each
+shard is turned into section rows by ExportBuilder.iter_section_rows in a
+pool of worker processes and the rows are written out in shard order. The
+_index and _parent_index of the rows of a shard start at 1 in the worker and
+are offset by the number of rows of each section in the earlier shards.
+
+The pool is a billiard pool, which unlike a multiprocessing pool can be
+started from the daemonic processes of a Celery prefork worker.
+"""
+import os
+
+import billiard
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models.query import QuerySet
+
+from onadata.apps.logger.models import Instance
+from onadata.apps.viewer.models.parsed_instance import query_data
+from onadata.libs.utils.common_tags import INDEX, PARENT_INDEX, \
+    PARENT_TABLE_NAME
+from onadata.libs.utils.model_tools import QUERY_FETCH_SIZE
+from onadata.libs.utils.mongo import _decode_from_mongo
+
+# number of worker processes, 1 exports in the calling process
+EXPORT_PROCESSES = getattr(settings, 'EXPORT_PROCESSES', 1)
+# number of submissions in a shard
+EXPORT_SHARD_SIZE = getattr(settings, 'EXPORT_SHARD_SIZE', 1000)
+# number of submissions between updates of the progress of the export task
+EXPORT_TASK_PROGRESS_UPDATE_BATCH = getattr(
+    settings, 'EXPORT_TASK_PROGRESS_UPDATE_BATCH', 100)
+
+# the builder and shards of the export in progress, inherited by the forked
+# worker processes
+_shard_export = None
+# the database connections a worker inherited, kept so that they are not
+# closed, ending the sessions of the exporting process, when collected
+_inherited_connections = []
+
+
+def _init_shard_worker():
+    """Makes a forked worker open its own database connections."""
+    for conn in connections.all():
+        if conn.connection is not None:
+            _inherited_connections.append(conn.connection)
+            conn.connection = None
+
+
+def _export_shard(shard):
+    builder, shards = _shard_export
+    rows = list(builder.iter_section_rows(
+        shards.query_shard(*shard), track_progress=False))
+
+    return rows, builder.checkpoint['index'] - 1, \
+        builder.checkpoint['indices']
+
+
+class ExportShards(object):
+    """
+    The submissions of an export, split into shards that are exported in
+    parallel by ExportBuilder.iter_export_section_rows. Iterating over it
+    yields the submissions like query_data does.
+    """
+
+    def __init__(self, xform, query=None, start=None, end=None,
+                 processes=None, shard_size=None):
+        self.xform = xform
+        self.query = query
+        self.start = start
+        self.end = end
+        self.processes = processes or EXPORT_PROCESSES
+        self.shard_size = shard_size or EXPORT_SHARD_SIZE
+
+    def __iter__(self):
+        records = query_data(
+            self.xform, query=self.query, start=self.start, end=self.end)
+        if isinstance(records, QuerySet):
+            records = records.iterator(chunk_size=QUERY_FETCH_SIZE)
+
+        return iter(records)
+
+    @classmethod
+    def is_enabled(cls):
+        """Returns True if exports are processed in parallel."""
+        return EXPORT_PROCESSES > 1
+
+    def can_fork(self):
+        """
+        Returns True if worker processes can be started for this export.
+
+        The workers are forked and would not see the rows of an open
+        transaction.
+        """
+        return self.processes > 1 and hasattr(os, 'fork') and \
+            not connection.in_atomic_block
+
+    def get_instances(self):
+        """Returns the submissions of the form."""
+        if self.xform.is_merged_dataset:
+            xform_ids = list(self.xform.mergedxform.xforms.filter(
+                deleted_at__isnull=True).values_list('id', flat=True)) or \
+                [self.xform.pk]
+        else:
+            xform_ids = [self.xform.pk]
+
+        return Instance.objects.filter(
+            xform_id__in=xform_ids, deleted_at__isnull=True)
+
+    def get_shards(self):
+        """
+        Returns the (after id, up to id) ranges of the shards, None is an
+        open end.
+        """
+        sql, params = self.get_instances().order_by().values(
+            'id').query.sql_with_params()
+        sql = (u"SELECT id FROM (SELECT id, row_number() OVER (ORDER BY id)"
+               u" AS rn FROM (" + sql + u") AS instances) AS numbered"
+               u" WHERE rn %% %s = 0 ORDER BY id")
+        with connection.cursor() as cursor:
+            cursor.execute(sql, list(params) + [self.shard_size])
+            boundaries = [row[0] for row in cursor.fetchall()]
+
+        boundaries = [None] + boundaries + [None]
+
+        return list(zip(boundaries[:-1], boundaries[1:]))
+
+    def get_shard_query(self, after_id, up_to_id):
+        """Returns the query of the submissions of a shard."""
+        id_query = {}
+        if after_id is not None:
+            id_query['$gt'] = after_id
+        if up_to_id is not None:
+            id_query['$lte'] = up_to_id
+        if not id_query:
+            return self.query
+
+        return [self.query, {'_id': id_query}] if self.query \
+            else {'_id': id_query}
+
+    def query_shard(self, after_id, up_to_id):
+        """Returns the submissions of a shard."""
+        records = query_data(
+            self.xform, query=self.get_shard_query(after_id, up_to_id),
+            start=self.start, end=self.end)
+        if isinstance(records, QuerySet):
+            records = records.iterator(chunk_size=QUERY_FETCH_SIZE)
+
+        return records
+
+    def iter_section_rows(self, builder, index=1, indices=None,
+                          total_records=None, track_progress=None):
+        """
+        Yields the section rows of the submissions like
+        builder.iter_section_rows, processing the shards in worker
+        processes. track_progress is called with the number of exported
+        submissions and total_records as the shards are written.
+        """
+        global _shard_export
+
+        indices = {} if indices is None else dict(indices)
+        survey_name = builder.survey.name
+        # the _index of the last row of each section in earlier shards
+        offsets = {_decode_from_mongo(key): value
+                   for (key, value) in indices.items()}
+        offsets[survey_name] = index - 1
+        builder.checkpoint = {'index': index, 'indices': indices}
+        shards = self.get_shards()
+        batch = EXPORT_TASK_PROGRESS_UPDATE_BATCH
+        count = 0
+
+        _shard_export = (builder, self)
+        pool = billiard.get_context('fork').Pool(
+            self.processes, initializer=_init_shard_worker)
+        try:
+            # a few shards per worker at a time so that processed rows do not
+            # pile up while they are written
+            window = self.processes * 2
+            for i in range(0, len(shards), window):
+                results = pool.imap(_export_shard, shards[i:i + window])
+                for (rows, records, shard_indices) in results:
+                    for (section_name, row) in rows:
+                        row[INDEX] += offsets.get(section_name, 0)
+                        parent = row.get(PARENT_TABLE_NAME)
+                        if parent is not None:
+                            row[PARENT_INDEX] += offsets.get(
+                                _decode_from_mongo(parent), 0)
+                        yield section_name, row
+
+                    offsets[survey_name] += records
+                    for (key, value) in shard_indices.items():
+                        section_name = _decode_from_mongo(key)
+                        offsets[section_name] = \
+                            offsets.get(section_name, 0) + value
+                        indices[key] = indices.get(key, 0) + value
+                    builder.checkpoint['index'] += records
+
+                    if track_progress is not None and \
+                            (count + records) // batch > count // batch:
+                        track_progress(
+                            (count + records) // batch * batch,
+                            total_records)
+                    count += records
+        finally:
+            pool.terminate()
+            pool.join()
+            _shard_export = None
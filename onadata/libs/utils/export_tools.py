@@ -9,7 +9,9 @@ import json
 import os
 import re
 import sys
+from collections import defaultdict
 from datetime import datetime, timedelta
+from itertools import islice
 
 import builtins
 import six
@@ -18,9 +20,11 @@ from django.contrib.auth.models import User
 from django.core.files.base import File
 from django.core.files.storage import default_storage
 from django.core.files.temp import NamedTemporaryFile
+from django.db.models import Count, Max, Q
 from django.db.models.query import QuerySet
-from django.shortcuts import render
+from django.template.loader import get_template
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.translation import ugettext as _
 from future.moves.urllib.parse import urlparse
 from future.utils import iteritems
@@ -38,21 +42,24 @@ from onadata.libs.exceptions import J2XException, NoRecordsFoundError
 from onadata.libs.utils.common_tags import (DATAVIEW_EXPORT,
                                             GROUPNAME_REMOVED_FLAG)
 from onadata.libs.utils.common_tools import (str_to_bool,
-                                             cmp_to_key,
                                              report_exception,
                                              retry)
 from onadata.libs.utils.export_builder import ExportBuilder
-from onadata.libs.utils.model_tools import (get_columns_with_hxl,
-                                            queryset_iterator)
+from onadata.libs.utils.export_shards import ExportShards
+from onadata.libs.utils.model_tools import (QUERY_FETCH_SIZE,
+                                            get_columns_with_hxl)
 from onadata.libs.utils.osm import get_combined_osm
-from onadata.libs.utils.viewer_tools import (create_attachments_zipfile,
-                                             image_urls)
+from onadata.libs.utils.viewer_tools import create_attachments_zipfile
 
 DEFAULT_GROUP_DELIMITER = '/'
 DEFAULT_INDEX_TAGS = ('[', ']')
 SUPPORTED_INDEX_TAGS = ('[', ']', '(', ')', '{', '}', '.', '_')
 EXPORT_QUERY_KEY = 'query'
 MAX_RETRIES = 3
+INCREMENTAL_EXPORT_TYPES = [
+    Export.CSV_EXPORT, Export.CSV_ZIP_EXPORT, Export.XLS_EXPORT]
+SHARDED_EXPORT_TYPES = [
+    Export.CSV_ZIP_EXPORT, Export.SAV_ZIP_EXPORT, Export.XLS_EXPORT]
 
 
 def md5hash(string):
@@ -95,6 +102,70 @@ def get_or_create_export(export_id, xform, export_type, options):
     return create_export_object(xform, export_type, options)
 
 
+def is_incremental_export(xform, export_type, options):
+    """
+    Returns True if submissions can be appended to a previous export of the
+    form with the same options instead of rebuilding it.
+    """
+    return getattr(settings, 'INCREMENTAL_EXPORTS', False) and \
+        export_type in INCREMENTAL_EXPORT_TYPES and \
+        not xform.is_merged_dataset and \
+        not any(options.get(key) for key in (
+            EXPORT_QUERY_KEY, 'dataview_pk', 'start', 'end'))
+
+
+def get_export_checkpoint(xform):
+    """
+    Returns the checkpoint of the submissions of a form that an export
+    created now will contain:
+
+        last_id: the id of the last submission
+        count: the number of submissions
+        date_modified: the last time any submission was modified
+        xform_hash: the hash of the form's XML
+
+    last_id is None when the form has no submissions.
+    """
+    checkpoint = xform.instances.aggregate(
+        last_id=Max('id', filter=Q(deleted_at__isnull=True)),
+        count=Count('id', filter=Q(deleted_at__isnull=True)),
+        date_modified=Max('date_modified'))
+    if checkpoint['date_modified'] is not None:
+        checkpoint['date_modified'] = checkpoint['date_modified'].isoformat()
+    checkpoint['xform_hash'] = xform.hash
+
+    return checkpoint
+
+
+def get_appendable_export(xform, export_type, options, checkpoint):
+    """
+    Returns the latest export of a form with the same options to which the
+    submissions since its checkpoint can be appended, None if there is no
+    such export or if submissions in it have since been edited or deleted.
+    """
+    export = Export.objects.filter(
+        xform=xform, export_type=export_type, options=get_export_options(
+            options), internal_status=Export.SUCCESSFUL,
+        checkpoint__has_key='last_id').order_by('-created_on').first()
+    if export is None or not export.filepath or \
+            not default_storage.exists(export.filepath):
+        return None
+
+    previous = export.checkpoint
+    if previous['xform_hash'] != checkpoint['xform_hash'] or \
+            previous['last_id'] > checkpoint['last_id']:
+        return None
+
+    changes = xform.instances.filter(id__lte=previous['last_id']).aggregate(
+        count=Count('id', filter=Q(deleted_at__isnull=True)),
+        modified=Count('id', filter=Q(
+            date_modified__gt=parse_datetime(previous['date_modified']))))
+    if changes['count'] != previous['count'] or changes['modified']:
+        return None
+
+    return export
+
+
 # pylint: disable=too-many-locals, too-many-branches, too-many-statements
 @retry(MAX_RETRIES)
 def generate_export(export_type, xform, export_id=None, options=None):
@@ -137,15 +208,42 @@ def generate_export(export_type, xform, export_id=None, options=None):
         xform = XForm.objects.get(
             user__username__iexact=username, id_string__iexact=id_string)
 
+    # 'win_excel_utf8' is only relevant for CSV exports
+    if 'win_excel_utf8' in options and export_type != Export.CSV_EXPORT:
+        del options['win_excel_utf8']
+
+    checkpoint = None
+    previous_export = None
+    append_kwargs = {}
+    if is_incremental_export(xform, export_type, options):
+        checkpoint = get_export_checkpoint(xform)
+    if checkpoint and checkpoint['last_id'] is not None:
+        # submissions made while exporting are left for the next export
+        id_query = {'$lte': checkpoint['last_id']}
+        previous_export = get_appendable_export(
+            xform, export_type, options, checkpoint)
+        if previous_export is not None:
+            id_query['$gt'] = previous_export.checkpoint['last_id']
+            append_kwargs = {
+                'previous_path': previous_export.full_filepath,
+                'checkpoint': previous_export.checkpoint}
+        filter_query = json.dumps({'_id': id_query})
+    else:
+        checkpoint = None
+
     dataview = None
     if options.get("dataview_pk"):
         dataview = DataView.objects.get(pk=options.get("dataview_pk"))
         records = dataview.query_data(dataview, all_data=True,
-                                      filter_query=filter_query)
+                                      filter_query=filter_query, stream=True)
         total_records = dataview.query_data(dataview,
                                             count=True)[0].get('count')
     else:
-        records = query_data(xform, query=filter_query, start=start, end=end)
+        if export_type in SHARDED_EXPORT_TYPES and ExportShards.is_enabled():
+            records = ExportShards(xform, filter_query, start, end)
+        else:
+            records = query_data(
+                xform, query=filter_query, start=start, end=end)
 
         if filter_query:
             total_records = query_data(xform, query=filter_query, start=start,
@@ -154,7 +252,7 @@ def generate_export(export_type, xform, export_id=None, options=None):
             total_records = xform.num_of_submissions
 
     if isinstance(records, QuerySet):
-        records = records.iterator()
+        records = records.iterator(chunk_size=QUERY_FETCH_SIZE)
 
     export_builder = ExportBuilder()
     export_builder.TRUNCATE_GROUP_TITLE = True \
@@ -190,9 +288,6 @@ def generate_export(export_type, xform, export_id=None, options=None):
 
     export_builder.language = options.get('language')
 
-    # 'win_excel_utf8' is only relevant for CSV exports
-    if 'win_excel_utf8' in options and export_type != Export.CSV_EXPORT:
-        del options['win_excel_utf8']
     export_builder.INCLUDE_REVIEWS = include_reviews
     export_builder.set_survey(xform.survey, xform,
                               include_reviews=include_reviews)
@@ -209,7 +304,7 @@ def generate_export(export_type, xform, export_id=None, options=None):
             temp_file.name, records, username, id_string, filter_query,
             start=start, end=end, dataview=dataview, xform=xform,
             options=options, columns_with_hxl=columns_with_hxl,
-            total_records=total_records
+            total_records=total_records, **append_kwargs
         )
     except NoRecordsFoundError:
         pass
@@ -220,6 +315,13 @@ def generate_export(export_type, xform, export_id=None, options=None):
         export.save()
         report_exception("SAV Export Failure", e, sys.exc_info())
         return export
+    finally:
+        if previous_export is not None:
+            try:
+                default_storage.path(previous_export.filepath)
+            except NotImplementedError:
+                # remove the local copy of a remote export file
+                os.unlink(append_kwargs['previous_path'])
 
     # generate filename
     basename = "%s_%s" % (
@@ -258,6 +360,9 @@ def generate_export(export_type, xform, export_id=None, options=None):
     export.filedir = dir_name
     export.filename = basename
     export.internal_status = Export.SUCCESSFUL
+    if checkpoint is not None and export_builder.checkpoint:
+        checkpoint.update(export_builder.checkpoint)
+        export.checkpoint = checkpoint
     # do not persist exports that have a filter
     # Get URL of the exported sheet.
     if export_type == Export.GOOGLE_SHEETS_EXPORT:
@@ -414,7 +519,8 @@ def generate_attachments_zip_export(export_type, username, id_string,
             instance_id__in=[
                 rec.get('_id')
                 for rec in dataview.query_data(
-                    dataview, all_data=True, filter_query=filter_query)],
+                    dataview, all_data=True, filter_query=filter_query,
+                    stream=True)],
             instance__deleted_at__isnull=True)
     else:
         instance_ids = query_data(xform, fields='["_id"]', query=filter_query)
@@ -518,15 +624,9 @@ def generate_kml_export(export_type, username, id_string, export_id=None,
     """
     export_type = options.get("extension", export_type)
 
-    user = User.objects.get(username=username)
     if xform is None:
         xform = XForm.objects.get(user__username=username, id_string=id_string)
 
-    response = render(
-        None, 'survey.kml',
-        {'data': kml_export_data(id_string, user, xform=xform)}
-    )
-
     basename = "%s_%s" % (id_string,
                           datetime.now().strftime("%Y_%m_%d_%H_%M_%S"))
     filename = basename + "." + export_type.lower()
@@ -537,8 +637,12 @@ def generate_kml_export(export_type, username, id_string, export_id=None,
         export_type,
         filename)
 
-    export_filename = write_temp_file_to_path(
-        export_type.lower(), response.content, file_path)
+    temp_file = NamedTemporaryFile(suffix=export_type.lower())
+    write_kml_export(xform, temp_file)
+    temp_file.seek(0)
+    export_filename = default_storage.save(
+        file_path, File(temp_file, file_path))
+    temp_file.close()
 
     export = get_or_create_export_object(
         export_id, options, xform, export_type)
@@ -550,22 +654,56 @@ def generate_kml_export(export_type, username, id_string, export_id=None,
     return export
 
 
-def kml_export_data(id_string, user, xform=None):
+def _flatten_json(data, sort_key, parent=None):
     """
-    KML export data from form submissions.
+    Yields the xpath and value of the fields of a submission's json like the
+    flat dict of its XML, e.g. children[2]/name for the name in the second
+    children repeat. The fields are sorted by sort_key within the submission
+    and within every repeat item, so the fields of an item stay together.
+    """
+    fields = []
+    for (key, value) in iteritems(data):
+        path = key if parent is None else parent[1] + key[len(parent[0]):]
+        fields.append((sort_key(path), key, path, value))
+    fields.sort(key=lambda field: field[0])
+
+    for (_sort_key, key, path, value) in fields:
+        if not isinstance(value, list):
+            yield path, value
+            continue
+
+        for (index, item) in enumerate(value, start=1):
+            item_path = path if index == 1 else u'%s[%d]' % (path, index)
+            if isinstance(item, dict):
+                for pair in _flatten_json(item, sort_key, (key, item_path)):
+                    yield pair
+            else:
+                yield item_path, item
+
+
+def _get_image_urls(instance_ids):
+    """
+    Returns the urls of the medium thumbnails, or of the files, of the
+    attachments of the submissions like image_urls does.
     """
-    def cached_get_labels(xpath):
-        """
-        Get and Cache labels for the XForm.
-        """
-        if xpath in list(labels):
-            return labels[xpath]
-        labels[xpath] = xform.get_label(xpath)
+    urls = defaultdict(list)
+    attachments = Attachment.objects.filter(
+        instance_id__in=instance_ids).order_by('pk').values_list(
+            'instance_id', 'media_file', 'thumbnails')
+    for (instance_id, name, thumbnails) in attachments:
+        urls[instance_id].append(
+            default_storage.url(thumbnails.get('medium') or name))
 
-        return labels[xpath]
+    return urls
 
-    xform = xform or XForm.objects.get(id_string=id_string, user=user)
 
+def iter_kml_export_data(xform):
+    """
+    Yields the KML placemark data of the form's geocoded submissions.
+
+    The json and geom of the submissions are read with a server-side cursor
+    and the order and labels of the columns are computed once per form.
+    """
     data_kwargs = {'geom__isnull': False}
     if xform.is_merged_dataset:
         data_kwargs.update({
@@ -575,33 +713,91 @@ def kml_export_data(id_string, user, xform=None):
         })
     else:
         data_kwargs.update({'xform_id': xform.pk})
-    instances = Instance.objects.filter(**data_kwargs).order_by('id')
-    data_for_template = []
+    instances = Instance.objects.filter(**data_kwargs).order_by('id')\
+        .values_list('id', 'xform_id', 'json', 'geom')\
+        .iterator(chunk_size=QUERY_FETCH_SIZE)
+
+    xforms = {xform.pk: xform}
     labels = {}
-    for instance in queryset_iterator(instances):
-        # read the survey instances
-        data_for_display = instance.get_dict()
-        xpaths = list(data_for_display)
-        xpaths.sort(key=cmp_to_key(instance.xform.get_xpath_cmp()))
-        table_rows = [
-            '<tr><td>%s</td><td>%s</td></tr>' %
-            (cached_get_labels(xpath), data_for_display[xpath]) for xpath in
-            xpaths if not xpath.startswith(u"_")]
-        img_urls = image_urls(instance)
-
-        if instance.point:
-            data_for_template.append({
-                'name': instance.xform.id_string,
-                'id': instance.id,
-                'lat': instance.point.y,
-                'lng': instance.point.x,
+    # the sort keys of the columns of each form, like XForm.get_xpath_cmp
+    sort_keys = {}
+
+    def get_sort_key(xform_id, xpath):
+        if xform_id not in sort_keys:
+            positions = {}
+            for (i, e) in enumerate(xforms[xform_id].survey_elements):
+                positions.setdefault(e.get_abbreviated_xpath(), i)
+            sort_keys[xform_id] = ({}, positions)
+        keys, positions = sort_keys[xform_id]
+        if xpath not in keys:
+            position = positions.get(re.sub(r"\[\d+\]", u"", xpath))
+            keys[xpath] = (1, 0, u'') if position is None \
+                else (0, position, xpath)
+
+        return keys[xpath]
+
+    while True:
+        rows = list(islice(instances, QUERY_FETCH_SIZE))
+        if not rows:
+            break
+
+        urls = _get_image_urls([row[0] for row in rows])
+        for xform_id in set(row[1] for row in rows) - set(xforms):
+            xforms[xform_id] = XForm.objects.get(pk=xform_id)
+
+        for (pk, xform_id, data, geom) in rows:
+            point = geom[0] if geom and len(geom) else None
+            if not point:
+                continue
+
+            # the osm tags of the json are not fields of the submission
+            columns = _flatten_json(
+                data, lambda xpath: get_sort_key(xform_id, xpath))
+            table_rows = []
+            for (xpath, value) in columns:
+                if xpath.startswith(u"_") or u":" in xpath:
+                    continue
+                if xpath not in labels:
+                    labels[xpath] = xform.get_label(xpath)
+                table_rows.append('<tr><td>%s</td><td>%s</td></tr>' %
+                                  (labels[xpath], value))
+            img_urls = urls.get(pk, [])
+
+            yield {
+                'name': xforms[xform_id].id_string,
+                'id': pk,
+                'lat': point.y,
+                'lng': point.x,
                 'image_urls': img_urls,
                 'table': '<table border="1"><a href="#"><img width="210" '
                          'class="thumbnail" src="%s" alt=""></a>%s'
                          '</table>' % (img_urls[0] if img_urls else "",
-                                       ''.join(table_rows))})
+                                       ''.join(table_rows))}
+
+
+def kml_export_data(id_string, user, xform=None):
+    """
+    KML export data from form submissions.
+    """
+    xform = xform or XForm.objects.get(id_string=id_string, user=user)
+
+    return list(iter_kml_export_data(xform))
+
+
+def iter_kml_export(xform):
+    """Yields the KML export of the form a placemark at a time."""
+    placemark = get_template('survey_kml_placemark.kml')
+
+    yield get_template('survey_kml_header.kml').render()
+    for data in iter_kml_export_data(xform):
+        yield placemark.render({'d': data})
+    yield get_template('survey_kml_footer.kml').render()
+
 
-    return data_for_template
+def write_kml_export(xform, file_obj):
+    """Writes the KML export of the form to a binary file."""
+    for content in iter_kml_export(xform):
+        file_obj.write(content.encode('utf-8'))
 
 
 def get_osm_data_kwargs(xform):
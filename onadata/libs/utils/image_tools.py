@@ -45,15 +45,22 @@ def _save_thumbnails(image, path, size, suffix, extension):
         pass
 
     image.save(nm.name)
-    default_storage.save(
+    name = default_storage.save(
         get_path(path, suffix), ContentFile(nm.read()))
     nm.close()
 
+    return name
+
 
 def resize(filename, extension):
+    """
+    Saves the thumbnails of the image and returns the names they are saved
+    under by size, e.g. {'small': 'bob/attachments/1-small.jpg', ...}.
+    """
     if extension == 'non':
         extension = settings.DEFAULT_IMG_FILE_TYPE
     default_storage = get_storage_class()()
+    thumbnails = {}
 
     try:
         with default_storage.open(filename) as image_file:
@@ -61,7 +68,7 @@ def resize(filename, extension):
             conf = settings.THUMB_CONF
 
             for key in settings.THUMB_ORDER:
-                _save_thumbnails(
+                thumbnails[key] = _save_thumbnails(
                     image, filename,
                     conf[key]['size'],
                     conf[key]['suffix'],
@@ -69,8 +76,14 @@ def resize(filename, extension):
     except IOError:
         raise Exception("The image file couldn't be identified")
 
+    return thumbnails
+
 
 def resize_local_env(filename, extension):
+    """
+    Saves the thumbnails of the image in the local file system storage and
+    returns the names they are saved under by size.
+    """
     if extension == 'non':
         extension = settings.DEFAULT_IMG_FILE_TYPE
     default_storage = get_storage_class()()
@@ -78,41 +91,57 @@ def resize_local_env(filename, extension):
     image = Image.open(path)
     conf = settings.THUMB_CONF
 
-    [_save_thumbnails(
-        image, path, conf[key]['size'],
-        conf[key]['suffix'], extension) for key in settings.THUMB_ORDER]
+    return dict((key, _save_thumbnails(
+        image, filename, conf[key]['size'],
+        conf[key]['suffix'], extension)) for key in settings.THUMB_ORDER)
+
+
+def make_thumbnails(filename, extension, force=False):
+    """
+    Returns the names of the thumbnails of the image by size, generating
+    them unless they all exist already or if `force` is True.
+    """
+    default_storage = get_storage_class()()
+    fs = get_storage_class('django.core.files.storage.FileSystemStorage')()
+    paths = dict((key, get_path(filename, settings.THUMB_CONF[key]['suffix']))
+                 for key in settings.THUMB_ORDER)
+
+    if not force:
+        thumbnails = dict(
+            (key, path) for (key, path) in paths.items()
+            if default_storage.exists(path) and default_storage.size(path))
+        if len(thumbnails) == len(paths):
+            return thumbnails
+
+    # the thumbnails would otherwise be saved under new names
+    for path in paths.values():
+        if default_storage.exists(path):
+            default_storage.delete(path)
+
+    if default_storage.__class__ != fs.__class__:
+        return resize(filename, extension)
+
+    return resize_local_env(filename, extension)
 
 
 def image_url(attachment, suffix):
     '''Return url of an image given size(@param suffix)
-    e.g large, medium, small, or generate required thumbnail
+    e.g large, medium, small, or the url of the original image while the
+    required thumbnail is generated, None if the original image does not
+    exist
     '''
     url = attachment.media_file.url
 
-    if suffix == 'original':
-        return url
-    else:
+    if suffix in settings.THUMB_CONF:
         default_storage = get_storage_class()()
-        fs = get_storage_class('django.core.files.storage.FileSystemStorage')()
-
-        if suffix in settings.THUMB_CONF:
-            size = settings.THUMB_CONF[suffix]['suffix']
-            filename = attachment.media_file.name
-
-            if default_storage.exists(filename):
-                if default_storage.exists(get_path(filename, size)) and\
-                        default_storage.size(get_path(filename, size)) > 0:
-                    url = default_storage.url(
-                        get_path(filename, size))
-                else:
-                    if default_storage.__class__ != fs.__class__:
-                        resize(filename, extension=attachment.extension)
-                    else:
-                        resize_local_env(filename,
-                                         extension=attachment.extension)
-
-                    return image_url(attachment, suffix)
-            else:
+        if suffix not in attachment.thumbnails:
+            # the storage is only checked while the thumbnail is missing
+            if not default_storage.exists(attachment.media_file.name):
                 return None
+            attachment.request_thumbnails()
+
+        name = attachment.thumbnails.get(suffix)
+        if name:
+            url = default_storage.url(name)
 
     return url
@@ -3,9 +3,11 @@ import re
 import sys
 import tempfile
 from builtins import str as text
+from collections import defaultdict
 from datetime import datetime
 from hashlib import sha256
 from http.client import BadStatusLine
+from io import BytesIO
 from wsgiref.util import FileWrapper
 from xml.dom import Node
 from xml.parsers.expat import ExpatError
@@ -19,7 +21,7 @@ from django.core.exceptions import (MultipleObjectsReturned, PermissionDenied,
 from django.core.files.storage import get_storage_class
 from django.db import IntegrityError, transaction, DataError
 from django.db.models import Q
-from django.http import (HttpResponse, HttpResponseNotFound,
+from django.http import (Http404, HttpResponse, HttpResponseNotFound,
                          StreamingHttpResponse, UnreadablePostError)
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
@@ -31,33 +33,40 @@ from pyxform.errors import PyXFormError
 from pyxform.xform2json import create_survey_element_from_xml
 
 from onadata.apps.logger.models import Attachment, Instance, XForm
+from onadata.apps.logger.models.column_schema import (ColumnSchema,
+                                                      get_repeat_counts)
 from onadata.apps.logger.models.instance import (
     FormInactiveError, InstanceHistory, FormIsMergedDatasetError,
     get_id_string_from_xml_str)
+from onadata.apps.logger.models.survey_type import SurveyType
 from onadata.apps.logger.models.xform import XLSFormError
 from onadata.apps.logger.xform_instance_parser import (
-    DuplicateInstance, FailedValidation, InstanceEmptyError, InstanceInvalidUserError,
-    InstanceMultipleNodeError, NonUniqueFormIdError, clean_and_parse_xml,
-    get_deprecated_uuid_from_xml, get_submission_date_from_xml,
-    get_uuid_from_xml)
+    DuplicateInstance, FailedValidation, InstanceEmptyError,
+    InstanceInvalidUserError, InstanceMultipleNodeError, NonUniqueFormIdError,
+    SubmissionXML, clean_and_parse_xml, get_deprecated_uuid_from_xml,
+    get_submission_date_from_xml, get_uuid_from_xml)
 from onadata.apps.messaging.constants import XFORM, \
     SUBMISSION_EDITED, SUBMISSION_CREATED
 from onadata.apps.messaging.serializers import send_message
 from onadata.apps.viewer.models.data_dictionary import DataDictionary
 from onadata.apps.viewer.models.parsed_instance import ParsedInstance
 from onadata.apps.viewer.signals import process_submission
-from onadata.libs.utils.common_tags import METADATA_FIELDS
+from onadata.libs.utils.cache_tools import bump_xform_data_version
+from onadata.libs.utils.common_tags import METADATA_FIELDS, VERSION
 from onadata.libs.utils.common_tools import report_exception, get_uuid
+from onadata.libs.utils.counter_tools import increment_submission_count
 from onadata.libs.utils.model_tools import set_uuid
 from onadata.libs.utils.user_auth import get_user_default_project
 
-from onadata.libs.utils.validate_data import validate_data
+from onadata.libs.utils.validate_data import (
+    defer_species_name_validation, validate_data)
 
 OPEN_ROSA_VERSION_HEADER = 'X-OpenRosa-Version'
 HTTP_OPEN_ROSA_VERSION_HEADER = 'HTTP_X_OPENROSA_VERSION'
 OPEN_ROSA_VERSION = '1.0'
 DEFAULT_CONTENT_TYPE = 'text/xml; charset=utf-8'
 DEFAULT_CONTENT_LENGTH = settings.DEFAULT_CONTENT_LENGTH
+BULK_BATCH_SIZE = getattr(settings, 'BULK_SUBMISSION_BATCH_SIZE', 500)
 
 uuid_regex = re.compile(r'<formhub>\s*<uuid>\s*([^<]+)\s*</uuid>\s*</formhub>',
                         re.DOTALL)
@@ -68,6 +77,8 @@ def _get_instance(xml, new_uuid, submitted_by, status, xform, checksum,
     history = None
     instance = None
     message_verb = SUBMISSION_EDITED
+    if not isinstance(xml, SubmissionXML):
+        xml = SubmissionXML(xml)
     # check if its an edit submission
     old_uuid = get_deprecated_uuid_from_xml(xml)
     if old_uuid:
@@ -90,7 +101,7 @@ def _get_instance(xml, new_uuid, submitted_by, status, xform, checksum,
                 user=submitted_by,
                 geom=instance.geom,
                 submission_date=instance.last_edited or instance.date_created)
-            instance.xml = xml
+            instance.set_submission_xml(xml)
             instance.last_edited = last_edited
             instance.uuid = new_uuid
             instance.checksum = checksum
@@ -104,9 +115,10 @@ def _get_instance(xml, new_uuid, submitted_by, status, xform, checksum,
     if old_uuid is None or (instance is None and history is None):
         # new submission
         message_verb = SUBMISSION_CREATED
-        instance = Instance.objects.create(
-            xml=xml, user=submitted_by, status=status, xform=xform,
-            checksum=checksum)
+        instance = Instance(
+            user=submitted_by, status=status, xform=xform, checksum=checksum)
+        instance.set_submission_xml(xml)
+        instance.save(force_insert=True)
 
     # send notification on submission creation
     send_message(
@@ -169,7 +181,11 @@ def get_first_record(queryset):
 
 def get_uuid_from_submission(xml):
     # parse UUID from uploaded XML
-    split_xml = uuid_regex.split(xml.decode('utf-8'))
+    if isinstance(xml, SubmissionXML):
+        xml = xml.xml
+    elif isinstance(xml, bytes):
+        xml = xml.decode('utf-8')
+    split_xml = uuid_regex.split(xml)
 
     # check that xml has UUID
     return len(split_xml) > 1 and split_xml[1] or None
@@ -184,7 +200,7 @@ def get_xform_from_submission(
     retrievable from the XML. Only returns form if `request_user` has
     permission to submit.
 
-    :param (str) xml: The submission in XML form
+    :param (str or SubmissionXML) xml: The submission in XML form
     :param (str) username: The owner of the target XForm
     :param (str) uuid: The target XForms universally unique identifier.
     Default: None
@@ -284,6 +300,7 @@ def update_attachment_tracking(instance):
     instance.total_media = instance.num_of_media
     instance.media_count = instance.attachments_count
     instance.media_all_received = instance.media_count == instance.total_media
+    instance.mark_changed('attachments')
     instance.save(update_fields=['total_media', 'media_count',
                                  'media_all_received', 'json'])
 
@@ -323,6 +340,8 @@ def save_attachments(xform, instance, media_files, remove_deleted_media=False):
 
 def save_submission(xform, xml, media_files, new_uuid, submitted_by, status,
                     date_created_override, checksum, request=None):
+    if not isinstance(xml, SubmissionXML):
+        xml = SubmissionXML(xml)
     if not date_created_override:
         date_created_override = get_submission_date_from_xml(xml)
 
@@ -344,7 +363,6 @@ def save_submission(xform, xml, media_files, new_uuid, submitted_by, status,
         instance.save()
 
     if instance.xform is not None:
-        instance.save()
         pi, created = ParsedInstance.objects.get_or_create(instance=instance)
         if not created:
             pi.save()  # noqa
@@ -382,19 +400,18 @@ def create_instance(username,
         username = username.lower()
 
     xml = xml_file.read()
+    checksum = sha256(xml).hexdigest()
+    # parse the submission once and share it with every step below
+    submission = SubmissionXML(xml)
 
-    # print('x'*80)
-    # print(validate_data(xml))    
-    if validate_data(xml):
-        pass
-    else:
+    if not validate_data(submission):
         raise FailedValidation()
 
-    xform = get_xform_from_submission(xml, username, uuid, request=request)
+    xform = get_xform_from_submission(
+        submission, username, uuid, request=request)
     check_submission_permissions(request, xform)
-    checksum = sha256(xml).hexdigest()
 
-    new_uuid = get_uuid_from_xml(xml)
+    new_uuid = get_uuid_from_xml(submission)
     filtered_instances = get_filtered_instances(
         Q(checksum=checksum) | Q(uuid=new_uuid), xform_id=xform.pk)
     existing_instance = get_first_record(filtered_instances.only('id'))
@@ -436,12 +453,11 @@ def create_instance(username,
 
     try:
         with transaction.atomic():
-            if isinstance(xml, bytes):
-                xml = xml.decode('utf-8')
-            instance = save_submission(xform, xml, media_files, new_uuid,
-                                       submitted_by, status,
+            instance = save_submission(xform, submission, media_files,
+                                       new_uuid, submitted_by, status,
                                        date_created_override, checksum,
                                        request)
+            defer_species_name_validation(instance, submission)
     except IntegrityError:
         instance = get_first_record(Instance.objects.filter(
             Q(checksum=checksum) | Q(uuid=new_uuid),
@@ -461,66 +477,389 @@ def create_instance(username,
     return instance
 
 
-@use_master
-def safe_create_instance(username, xml_file, media_files, uuid, request):
-    """Create an instance and catch exceptions.
+SUBMISSION_EXCEPTIONS = (
+    InstanceInvalidUserError, InstanceEmptyError, FormInactiveError,
+    FormIsMergedDatasetError, XForm.DoesNotExist, ExpatError,
+    FailedValidation, DuplicateInstance, PermissionDenied,
+    UnreadablePostError, InstanceMultipleNodeError, DjangoUnicodeDecodeError,
+    NonUniqueFormIdError, DataError)
 
-    :returns: A list [error, instance] where error is None if there was no
-        error.
-    """
-    error = instance = None
 
-    try:
-        instance = create_instance(
-            username, xml_file, media_files, uuid=uuid, request=request)
-    except InstanceInvalidUserError:
-        error = OpenRosaResponseBadRequest(_(u"Username or ID required."))
-    except InstanceEmptyError:
-        error = OpenRosaResponseBadRequest(
+def get_submission_error_response(error, request=None):
+    """Returns the OpenRosa response for a submission exception.
+
+    :param error: An exception in SUBMISSION_EXCEPTIONS.
+    :param request: Request object. Default: None
+    """
+    if isinstance(error, InstanceInvalidUserError):
+        return OpenRosaResponseBadRequest(_(u"Username or ID required."))
+    if isinstance(error, InstanceEmptyError):
+        return OpenRosaResponseBadRequest(
             _(u"Received empty submission. No instance was created"))
-    except (FormInactiveError, FormIsMergedDatasetError) as e:
-        error = OpenRosaResponseNotAllowed(text(e))
-    except XForm.DoesNotExist:
-        error = OpenRosaResponseNotFound(
+    if isinstance(error, (FormInactiveError, FormIsMergedDatasetError)):
+        return OpenRosaResponseNotAllowed(text(error))
+    if isinstance(error, XForm.DoesNotExist):
+        return OpenRosaResponseNotFound(
             _(u"Form does not exist on this account"))
-    except ExpatError:
-        error = OpenRosaResponseBadRequest(_(u"Improperly formatted XML."))
-    except FailedValidation:
-        error = OpenRosaResponseBadRequest(_(u"Submission Failed Validation."))
-    except DuplicateInstance:
+    if isinstance(error, ExpatError):
+        return OpenRosaResponseBadRequest(_(u"Improperly formatted XML."))
+    if isinstance(error, FailedValidation):
+        return OpenRosaResponseBadRequest(_(u"Submission Failed Validation."))
+    if isinstance(error, DuplicateInstance):
         response = OpenRosaResponse(_(u"Duplicate submission"))
         response.status_code = 202
         if request:
             response['Location'] = request.build_absolute_uri(request.path)
-        error = response
-    except PermissionDenied as e:
-        error = OpenRosaResponseForbidden(e)
-    except UnreadablePostError as e:
-        error = OpenRosaResponseBadRequest(
+        return response
+    if isinstance(error, PermissionDenied):
+        return OpenRosaResponseForbidden(error)
+    if isinstance(error, UnreadablePostError):
+        return OpenRosaResponseBadRequest(
             _(u"Unable to read submitted file: %(error)s"
-              % {'error': text(e)}))
-    except InstanceMultipleNodeError as e:
-        error = OpenRosaResponseBadRequest(e)
-    except DjangoUnicodeDecodeError:
-        error = OpenRosaResponseBadRequest(
+              % {'error': text(error)}))
+    if isinstance(error, InstanceMultipleNodeError):
+        return OpenRosaResponseBadRequest(error)
+    if isinstance(error, DjangoUnicodeDecodeError):
+        return OpenRosaResponseBadRequest(
             _(u"File likely corrupted during "
               u"transmission, please try later."))
-    except NonUniqueFormIdError:
-        error = OpenRosaResponseBadRequest(
+    if isinstance(error, NonUniqueFormIdError):
+        return OpenRosaResponseBadRequest(
             _(u"Unable to submit because there are multiple forms with"
               u" this formID."))
-    except DataError as e:
-        error = OpenRosaResponseBadRequest((str(e)))
+    if isinstance(error, DataError):
+        return OpenRosaResponseBadRequest((str(error)))
+
+    raise error
+
+
+@use_master
+def safe_create_instance(username, xml_file, media_files, uuid, request):
+    """Create an instance and catch exceptions.
+
+    :returns: A list [error, instance] where error is None if there was no
+        error.
+    """
+    error = instance = None
+
+    try:
+        instance = create_instance(
+            username, xml_file, media_files, uuid=uuid, request=request)
+    except SUBMISSION_EXCEPTIONS as e:
+        error = get_submission_error_response(e, request)
     if isinstance(instance, DuplicateInstance):
-        response = OpenRosaResponse(_(u"Duplicate submission"))
-        response.status_code = 202
-        if request:
-            response['Location'] = request.build_absolute_uri(request.path)
-        error = response
+        error = get_submission_error_response(instance, request)
         instance = None
     return [error, instance]
 
 
+class BulkSubmission(object):
+    """
+    A single submission in a batch of submissions.
+
+    :param xml: The submission XML, bytes or a file like object.
+    :param media_files: The submission's media files, only files referenced
+                        in the XML are saved.
+    :param submitted_by: The user making the submission. Default: None
+    """
+
+    def __init__(self, xml, media_files=None, submitted_by=None):
+        if hasattr(xml, 'read'):
+            xml = xml.read()
+        self.xml = xml
+        self.media_files = media_files or []
+        self.submitted_by = submitted_by
+
+    def get_media_files(self, submission):
+        """Returns the media files that are referenced in the submission"""
+        return [f for f in self.media_files
+                if submission.xml.find(os.path.basename(f.name)) != -1]
+
+
+def _create_instance_from_bulk_submission(xform, item, status, request):
+    """Creates an instance for a batched submission through create_instance.
+
+    Used for edits, duplicates with new media files and when a batch cannot
+    be inserted in bulk.
+    """
+    try:
+        instance = create_instance(
+            xform.user.username, BytesIO(item.xml), item.media_files,
+            status=status, uuid=xform.uuid, request=request)
+    except SUBMISSION_EXCEPTIONS as e:
+        return e
+
+    if isinstance(instance, Instance) and item.submitted_by and \
+            instance.user_id != item.submitted_by.pk:
+        instance.user = item.submitted_by
+        instance.save()
+
+    return instance
+
+
+def _bulk_create_attachments(xform, instances, media_files):
+    attachments = []
+    for instance, files in zip(instances, media_files):
+        expected_media = instance.get_expected_media()
+        for f in files:
+            filename, extension = os.path.splitext(f.name)
+            extension = extension.replace('.', '')
+            content_type = u'text/xml' \
+                if extension == Attachment.OSM else f.content_type
+            if extension == Attachment.OSM and not xform.instances_with_osm:
+                xform.instances_with_osm = True
+                xform.save()
+            filename = os.path.basename(f.name)
+            if filename in expected_media or \
+                    instance.xml.find(filename) != -1:
+                attachments.append(Attachment(
+                    instance=instance,
+                    media_file=f,
+                    mimetype=content_type,
+                    name=filename,
+                    extension=extension,
+                    file_size=f.size or 0))
+    Attachment.objects.bulk_create(attachments, batch_size=BULK_BATCH_SIZE)
+
+    names = defaultdict(set)
+    for attachment in attachments:
+        names[attachment.instance_id].add(attachment.name)
+    for instance in instances:
+        instance.total_media = instance.num_of_media
+        instance.media_count = len(
+            names[instance.pk].intersection(instance.get_expected_media()))
+        instance.media_all_received = \
+            instance.media_count == instance.total_media
+
+
+def _bulk_insert_instances(xform, submissions, status):
+    """Inserts new instances and their parsed instances and attachments.
+
+    :param submissions: A list of (BulkSubmission, SubmissionXML, checksum)
+                        tuples.
+    """
+    survey_types = {}
+    instances = []
+    date_created_overrides = {}
+    for index, (item, submission, checksum) in enumerate(submissions):
+        instance = Instance(xform=xform, user=item.submitted_by,
+                            status=status, checksum=checksum)
+        instance.set_submission_xml(submission)
+        instance._set_geom()
+        instance._set_json()
+        root_node_name = instance.get_root_node_name()
+        if root_node_name not in survey_types:
+            survey_types[root_node_name] = SurveyType.get_by_slug(
+                root_node_name)
+        instance.survey_type = survey_types[root_node_name]
+        instance._set_uuid()
+        instance.version = instance.json.get(VERSION, xform.version)
+        date_created_override = submission.submission_date
+        if date_created_override:
+            if not timezone.is_aware(date_created_override):
+                date_created_override = timezone.make_aware(
+                    date_created_override, timezone.utc)
+            date_created_overrides[index] = date_created_override
+        instances.append(instance)
+
+    Instance.objects.bulk_create(instances, batch_size=BULK_BATCH_SIZE)
+
+    _bulk_create_attachments(
+        xform, instances,
+        [item.get_media_files(submission)
+         for item, submission, _checksum in submissions])
+
+    for index, instance in enumerate(instances):
+        if index in date_created_overrides:
+            instance.date_created = date_created_overrides[index]
+        instance.json = instance.get_full_dict()
+    Instance.objects.bulk_update(
+        instances, ['json', 'date_created', 'total_media', 'media_count',
+                    'media_all_received'], batch_size=BULK_BATCH_SIZE)
+
+    ParsedInstance.objects.bulk_create([
+        ParsedInstance(instance=instance,
+                       lat=instance.point.y if instance.point else None,
+                       lng=instance.point.x if instance.point else None)
+        for instance in instances], batch_size=BULK_BATCH_SIZE)
+
+    bump_xform_data_version(xform.pk)
+    repeat_counts = {}
+    for instance in instances:
+        get_repeat_counts(instance.json, repeat_counts)
+    ColumnSchema.add_repeat_counts(xform.pk, repeat_counts)
+    increment_submission_count(
+        xform, len(instances), max(i.date_created for i in instances))
+    xform.project.save(update_fields=['date_modified'])
+
+    return instances
+
+
+def _post_process_bulk_instances(xform, instances, submissions):
+    for instance, (_item, submission, _checksum) in zip(
+            instances, submissions):
+        defer_species_name_validation(instance, submission)
+
+    def _post_process():
+        for instance in instances:
+            # call webhooks and process OSM data
+            process_submission.send(sender=Instance, instance=instance)
+        send_message(
+            instance_id=[instance.pk for instance in instances],
+            target_id=xform.pk, target_type=XFORM, user=xform.user,
+            message_verb=SUBMISSION_CREATED)
+
+    transaction.on_commit(_post_process)
+
+
+@use_master
+def create_instances_in_bulk(xform, items, status=u'submitted_via_web',
+                             request=None):
+    """Creates instances for many submissions to the same XForm.
+
+    Duplicate submissions are detected with one query for the whole batch
+    and new submissions are inserted with bulk operations in a single
+    transaction. Edits and duplicates that come with new media files are
+    handled by create_instance.
+
+    :param xform: The XForm the submissions are made to.
+    :param items: A list of BulkSubmission objects.
+    :param status: The status of the instances.
+    :param request: Request object. Default: None
+    :returns: A list with an Instance or the exception raised for each item
+              in the same order as `items`.
+    """
+    check_submission_permissions(request, xform)
+    if xform.is_merged_dataset:
+        raise FormIsMergedDatasetError()
+    if not xform.downloadable:
+        raise FormInactiveError()
+
+    results = [None] * len(items)
+    parsed = {}
+    for index, item in enumerate(items):
+        try:
+            if not item.xml:
+                raise InstanceEmptyError()
+            submission = SubmissionXML(item.xml)
+            if not validate_data(submission):
+                raise FailedValidation()
+            if submission.id_string.lower() != xform.id_string.lower() and \
+                    get_uuid_from_submission(submission) != xform.uuid:
+                raise XForm.DoesNotExist()
+        except SUBMISSION_EXCEPTIONS as e:
+            results[index] = e
+        else:
+            parsed[index] = (submission, sha256(item.xml).hexdigest())
+
+    checksums = [checksum for _submission, checksum in parsed.values()]
+    uuids = [submission.uuid for submission, _checksum in parsed.values()
+             if submission.uuid]
+    existing_checksums = set()
+    existing_uuids = set()
+    for checksum, uuid in Instance.objects.filter(
+            Q(checksum__in=checksums) | Q(uuid__in=uuids),
+            xform_id=xform.pk).values_list('checksum', 'uuid'):
+        existing_checksums.add(checksum)
+        existing_uuids.add(uuid)
+    history_uuids = set(InstanceHistory.objects.filter(
+        xform_instance__xform_id=xform.pk,
+        xform_instance__deleted_at__isnull=True,
+        uuid__in=uuids).values_list('uuid', flat=True))
+
+    new_items = []
+    fallback_items = []
+    for index, (submission, checksum) in sorted(parsed.items()):
+        uuid = submission.uuid
+        is_duplicate = uuid in history_uuids or (
+            (checksum in existing_checksums or uuid in existing_uuids) and
+            (uuid or xform.has_start_time))
+        if is_duplicate or submission.deprecated_uuid:
+            if submission.deprecated_uuid or \
+                    items[index].get_media_files(submission):
+                fallback_items.append(index)
+            else:
+                results[index] = DuplicateInstance()
+            continue
+
+        existing_checksums.add(checksum)
+        if uuid:
+            existing_uuids.add(uuid)
+        new_items.append(index)
+
+    if new_items:
+        submissions = [(items[index],) + parsed[index] for index in new_items]
+        try:
+            with transaction.atomic():
+                instances = _bulk_insert_instances(xform, submissions, status)
+                _post_process_bulk_instances(xform, instances, submissions)
+        except IntegrityError:
+            # a submission was received while the batch was being processed
+            fallback_items.extend(new_items)
+        else:
+            for index, instance in zip(new_items, instances):
+                results[index] = instance
+
+    for index in sorted(fallback_items):
+        results[index] = _create_instance_from_bulk_submission(
+            xform, items[index], status, request)
+
+    return results
+
+
+@use_master
+def safe_create_instances_in_bulk(username, items, request=None,
+                                  status=u'submitted_via_web'):
+    """Creates instances for many submissions and catches exceptions.
+
+    The submissions may be made to different forms, each submission's XForm
+    is looked up once for all the submissions with the same form uuid and
+    id_string.
+
+    :returns: A list of [error, instance] for each item in the same order as
+        `items` where error is None if there was no error.
+    """
+    if username:
+        username = username.lower()
+
+    xforms = {}
+    groups = defaultdict(list)
+    results = [None] * len(items)
+    for index, item in enumerate(items):
+        try:
+            if not item.xml:
+                raise InstanceEmptyError()
+            submission = SubmissionXML(item.xml)
+            key = (get_uuid_from_submission(submission),
+                   submission.id_string)
+            if key not in xforms:
+                xforms[key] = get_xform_from_submission(
+                    submission, username, request=request)
+        except Http404:
+            results[index] = XForm.DoesNotExist()
+        except SUBMISSION_EXCEPTIONS as e:
+            results[index] = e
+        else:
+            groups[xforms[key].pk].append(index)
+
+    xforms = {xform.pk: xform for xform in xforms.values()}
+    for xform_id, indexes in groups.items():
+        try:
+            instances = create_instances_in_bulk(
+                xforms[xform_id], [items[index] for index in indexes],
+                status=status, request=request)
+        except SUBMISSION_EXCEPTIONS as e:
+            instances = [e] * len(indexes)
+        for index, instance in zip(indexes, instances):
+            results[index] = instance
+
+    return [
+        [get_submission_error_response(result, request), None]
+        if isinstance(result, Exception) else [None, result]
+        for result in results
+    ]
+
+
 def response_with_mimetype_and_name(mimetype,
                                     name,
                                     extension=None,
@@ -2,8 +2,14 @@
 """
 Model utility functions.
 """
+from django.conf import settings
+from django.db import connection
+
 from onadata.libs.utils.common_tools import get_uuid
 
+# number of rows fetched at a time when streaming the results of a query
+QUERY_FETCH_SIZE = getattr(settings, 'QUERY_FETCH_SIZE', 2000)
+
 
 def set_uuid(obj):
     """
@@ -28,6 +34,34 @@ def queryset_iterator(queryset, chunksize=100):
     return queryset.iterator(chunk_size=chunksize)
 
 
+def iter_query_rows(sql, params=None, fetch_size=None, server_side=True):
+    '''
+    Yields the rows of a raw SQL query.
+
+    The rows are fetched fetch_size (default: QUERY_FETCH_SIZE) rows at a
+    time from a server-side (named) cursor, like QuerySet.iterator() does,
+    so that the whole result set is never held in memory. A client-side
+    cursor is used when server_side is False or server-side cursors are
+    disabled for the database, e.g. behind a transaction pooling PgBouncer.
+    '''
+    fetch_size = fetch_size or QUERY_FETCH_SIZE
+    if server_side and connection.features.can_use_chunked_reads and \
+            not connection.settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+        cursor = connection.chunked_cursor()
+    else:
+        cursor = connection.cursor()
+
+    try:
+        cursor.execute(sql, params)
+        rows = cursor.fetchmany(fetch_size)
+        while rows:
+            for row in rows:
+                yield row
+            rows = cursor.fetchmany(fetch_size)
+    finally:
+        cursor.close()
+
+
 def get_columns_with_hxl(survey_elements):
     '''
     Returns a dictionary whose keys are xform field names and values are
@@ -215,6 +215,7 @@ def save_osm_data(instance_id):
                                                     osmd['geom'])
                                 osm_data.filename = filename
                                 osm_data.save()
+        instance.mark_changed('attachments')
         instance.save()
         trigger_webhook.send(sender=instance.__class__, instance=instance)
 
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Permission matrix of forms and projects.
+
+The user and group object permissions of a set of forms or projects are
+loaded in one query per permission model and cached per object until the
+object's permissions change. The users, their groups and their roles are
+resolved from the matrix in memory instead of with queries per permission.
+"""
+from collections import OrderedDict, defaultdict
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.serializers import ListSerializer
+
+from onadata.apps.logger.models.project import (Project,
+                                                ProjectGroupObjectPermission,
+                                                ProjectUserObjectPermission)
+from onadata.apps.logger.models.xform import (XForm,
+                                              XFormGroupObjectPermission,
+                                              XFormUserObjectPermission)
+from onadata.libs.permissions import get_role, is_organization
+from onadata.libs.utils.cache_tools import (PERMISSION_MATRIX_CACHE,
+                                            PROJ_PERM_CACHE,
+                                            XFORM_PERMISSIONS_CACHE)
+
+# the user and group object permission models of each model
+PERMISSION_MODELS = {
+    Project: (ProjectUserObjectPermission, ProjectGroupObjectPermission),
+    XForm: (XFormUserObjectPermission, XFormGroupObjectPermission),
+}
+# the caches of the users of each model built from its permissions
+USERS_CACHES = {
+    Project: PROJ_PERM_CACHE,
+    XForm: XFORM_PERMISSIONS_CACHE,
+}
+
+
+def _get_model(model):
+    # the permissions of merged datasets are those of their forms
+    return XForm if issubclass(model, XForm) else model
+
+
+def get_cache_key(model, object_id):
+    """Returns the cache key of the permissions of an object."""
+    return '{}{}-{}'.format(
+        PERMISSION_MATRIX_CACHE, _get_model(model)._meta.model_name,
+        object_id)
+
+
+def invalidate_permission_matrix(model, object_ids):
+    """
+    Removes the cached permissions of the objects, and again when the
+    current transaction commits since a read before the commit caches the
+    old permissions.
+    """
+    model = _get_model(model)
+    keys = [get_cache_key(model, object_id) for object_id in object_ids]
+    keys += ['{}{}'.format(USERS_CACHES[model], object_id)
+             for object_id in object_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class PermissionMatrix(object):
+    """
+    The users and groups with permissions on a set of forms or projects and
+    their permissions.
+    """
+
+    def __init__(self, model, object_ids):
+        self.model = _get_model(model)
+        object_ids = list(OrderedDict.fromkeys(object_ids))
+        keys = OrderedDict(
+            (get_cache_key(self.model, object_id), object_id)
+            for object_id in object_ids)
+        # the permission codenames of each user and group by object id
+        self.objects = {
+            keys[key]: value for (key, value) in
+            cache.get_many(list(keys)).items()}
+        missing = [
+            object_id for object_id in object_ids
+            if object_id not in self.objects]
+        if missing:
+            loaded = self._load(missing)
+            # permissions read in a transaction may not be committed
+            if not transaction.get_connection().in_atomic_block:
+                cache.set_many({
+                    get_cache_key(self.model, object_id): value
+                    for (object_id, value) in loaded.items()})
+            self.objects.update(loaded)
+        self.users = {}
+
+    def _load(self, object_ids):
+        user_model, group_model = PERMISSION_MODELS[self.model]
+        loaded = {object_id: {'users': OrderedDict(), 'groups': OrderedDict()}
+                  for object_id in object_ids}
+        for (model, field, key) in [(user_model, 'user_id', 'users'),
+                                    (group_model, 'group_id', 'groups')]:
+            rows = model.objects.filter(content_object_id__in=object_ids)\
+                .order_by('pk').values_list(
+                    'content_object_id', field, 'permission__codename')
+            for (object_id, identity, codename) in rows:
+                loaded[object_id][key].setdefault(identity, []).append(
+                    codename)
+
+        return loaded
+
+    def has_object(self, object_id):
+        """Returns True if the matrix has the object's permissions."""
+        return object_id in self.objects
+
+    def get_user_permissions(self, object_id):
+        """Returns the permission codenames of each user by user id."""
+        return self.objects[object_id]['users']
+
+    def get_group_permissions(self, object_id):
+        """Returns the permission codenames of each group by group id."""
+        return self.objects[object_id]['groups']
+
+    def get_permissions(self, object_id, user_id, group_ids=()):
+        """
+        Returns the permission codenames of a user on an object, including
+        the permissions of the user's groups.
+        """
+        permissions = set(
+            self.get_user_permissions(object_id).get(user_id, []))
+        group_permissions = self.get_group_permissions(object_id)
+        for group_id in group_ids:
+            permissions.update(group_permissions.get(group_id, []))
+
+        return permissions
+
+    def get_role(self, object_id, user_id, group_ids=()):
+        """Returns the name of the role of a user on an object."""
+        return get_role(
+            sorted(self.get_permissions(object_id, user_id, group_ids)),
+            self.model)
+
+    def load_users(self, user_ids):
+        """Returns the users by id, loading the users not loaded yet."""
+        missing = set(user_ids) - set(self.users)
+        if missing:
+            self.users.update(
+                (user.pk, user) for user in User.objects.filter(
+                    pk__in=missing).select_related(
+                        'profile__organizationprofile'))
+
+        return {user_id: self.users[user_id] for user_id in user_ids
+                if user_id in self.users}
+
+    def get_user_groups(self, user_ids):
+        """
+        Returns the ids of the groups with permissions in the matrix of each
+        user by user id.
+        """
+        group_ids = set()
+        for value in self.objects.values():
+            group_ids.update(value['groups'])
+        user_groups = defaultdict(set)
+        if group_ids and user_ids:
+            for (user_id, group_id) in User.groups.through.objects.filter(
+                    user_id__in=user_ids, group_id__in=group_ids)\
+                    .values_list('user_id', 'group_id'):
+                user_groups[user_id].add(group_id)
+
+        return user_groups
+
+    def get_users(self, object_id, users=None):
+        """
+        Returns the users with permissions on the object and their role.
+
+        :param users: only the users in users are returned when set.
+        """
+        user_permissions = self.get_user_permissions(object_id)
+        loaded = self.load_users(list(user_permissions))
+        results = []
+        for (user_id, permissions) in user_permissions.items():
+            user = loaded.get(user_id)
+            if user is None or (users is not None and user not in users):
+                continue
+            results.append(get_user_details(
+                user, get_role(sorted(permissions), self.model)))
+
+        return results
+
+
+def get_user_details(user, role):
+    """Returns the details of a user with a role on an object."""
+    return {
+        'is_org': is_organization(user.profile),
+        'metadata': user.profile.metadata,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'user': user.username,
+        'role': role
+    }
+
+
+def get_serializer_permission_matrix(serializer, model, obj):
+    """
+    Returns the permission matrix of the objects listed with obj by the
+    serializer's parent, loaded once per serializer context.
+    """
+    matrices = serializer.context.setdefault('permission_matrices', {})
+    matrix = matrices.get(_get_model(model))
+    if matrix is None or not matrix.has_object(obj.pk):
+        objs = [obj]
+        parent = getattr(serializer, 'parent', None)
+        if isinstance(parent, ListSerializer) and \
+                parent.instance is not None:
+            objs = list(parent.instance)
+        matrix = PermissionMatrix(
+            model, [item.pk for item in objs] + [obj.pk])
+        matrices[matrix.model] = matrix
+
+    return matrix
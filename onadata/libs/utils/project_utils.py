@@ -9,8 +9,10 @@ from django.db import IntegrityError
 
 from onadata.apps.logger.models import Project, XForm
 from onadata.celery import app
+from onadata.libs.models.share_project import ShareProject
 from onadata.libs.permissions import (ROLES, OwnerRole,
                                       get_object_users_with_permissions)
+from onadata.libs.utils.bulk_permissions import BulkPermissions
 from onadata.libs.utils.common_tags import OWNER_TEAM_NAME
 from onadata.libs.utils.common_tools import report_exception
 
@@ -28,6 +30,7 @@ def set_project_perms_to_xform(xform, project):
         xform.shared_data = project.shared
         xform.save()
 
+    permissions = BulkPermissions()
     # clear existing permissions
     for perm in get_object_users_with_permissions(
             xform, with_group_users=True):
@@ -36,14 +39,14 @@ def set_project_perms_to_xform(xform, project):
         role = ROLES.get(role_name)
         if role and (user != xform.user and project.user != user and
                      project.created_by != user):
-            role.remove_obj_permissions(user, xform)
+            permissions.remove(user, xform)
 
     owners = project.organization.team_set.filter(
         name="{}#{}".format(project.organization.username, OWNER_TEAM_NAME),
         organization=project.organization)
 
     if owners:
-        OwnerRole.add(owners[0], xform)
+        permissions.add(owners[0], OwnerRole, xform)
 
     for perm in get_object_users_with_permissions(
             project, with_group_users=True):
@@ -52,10 +55,12 @@ def set_project_perms_to_xform(xform, project):
         role = ROLES.get(role_name)
 
         if user == xform.created_by:
-            OwnerRole.add(user, xform)
+            permissions.add(user, OwnerRole, xform)
         else:
             if role:
-                role.add(user, xform)
+                permissions.add(user, role, xform)
+
+    permissions.apply()
 
 
 # pylint: disable=invalid-name
@@ -101,3 +106,18 @@ def set_project_perms_to_xform_async(self, xform_id, project_id):
         msg = '%s: Setting project %d permissions to form %d failed.' % (
             type(e), project_id, xform_id)
         report_exception(msg, e, sys.exc_info())
+
+
+@app.task(bind=True)
+def share_project_async(self, project_id, username, role, remove=False):
+    """
+    Shares the project ``project_id`` with a user, or removes the user's
+    permissions, reporting the number of objects shared as the task's
+    progress.
+    """
+    def progress(shared, total):
+        self.update_state(
+            state='PROGRESS', meta={'progress': shared, 'total': total})
+
+    project = Project.objects.get(pk=project_id)
+    ShareProject(project, username, role, remove).save(progress=progress)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide cache of compiled form surveys.
+
+Building the pyxform survey of a large form from its json and walking its
+elements is slow. A form's survey is built once per process with indexes
+of its elements and kept in a bounded LRU cache keyed by the form's pk and
+hash, so a republished form, whose hash changes, is built again.
+"""
+import threading
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from pyxform import constants
+
+from onadata.libs.utils.common_tags import KNOWN_MEDIA_TYPES
+
+# number of compiled surveys kept by a process
+SURVEY_CACHE_SIZE = getattr(settings, 'SURVEY_CACHE_SIZE', 64)
+
+_surveys = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+class CompiledSurvey(object):
+    """A form's survey and indexes of its elements."""
+
+    def __init__(self, survey, key=None):
+        self.survey = survey
+        self.key = key
+        self.elements = list(survey.iter_descendants())
+        self.elements_by_xpath = {}
+        self.elements_by_name = {}
+        self.elements_by_type = defaultdict(list)
+        # the position of the first element with an xpath
+        self.xpath_positions = {}
+        for (position, elem) in enumerate(self.elements):
+            xpath = elem.get_abbreviated_xpath()
+            self.elements_by_xpath[xpath] = elem
+            self.elements_by_name.setdefault(elem.name, elem)
+            self.elements_by_type[elem.type].append(elem)
+            self.xpath_positions.setdefault(xpath, position)
+
+        self.repeat_xpaths = self.get_xpaths_of_type('repeat')
+        # the choice names of every select multiple by xpath
+        self.select_multiple_choices = OrderedDict(
+            (elem.get_abbreviated_xpath(),
+             [choice.name for choice in elem.children])
+            for elem in self.elements_by_type[constants.SELECT_ALL_THAT_APPLY])
+        self.geopoint_xpaths = [
+            elem.get_abbreviated_xpath() for elem in self.elements
+            if elem.bind.get(u'type') == u'geopoint']
+        self.media_xpaths = sum(
+            [self.get_xpaths_of_type(media_type)
+             for media_type in KNOWN_MEDIA_TYPES], [])
+        self.osm_xpaths = self.get_xpaths_of_type('osm')
+        # values derived from the survey, e.g. the headers of the form
+        self.derived = {}
+
+    def get_xpaths_of_type(self, element_type):
+        """Returns the xpaths of the elements of a type."""
+        return [elem.get_abbreviated_xpath()
+                for elem in self.elements_by_type.get(element_type, [])]
+
+    def get_derived(self, name, func):
+        """Returns the value computed by func once for the survey."""
+        if name not in self.derived:
+            self.derived[name] = func()
+
+        return self.derived[name]
+
+
+def get_compiled_survey(pk, form_hash, build_survey):
+    """
+    Returns the compiled survey of the form, build_survey is called to build
+    the survey when it is not cached.
+    """
+    key = (pk, form_hash)
+    with _lock:
+        compiled = _surveys.get(key)
+        if compiled is not None:
+            _surveys.move_to_end(key)
+            _stats['hits'] += 1
+            return compiled
+        _stats['misses'] += 1
+
+    # built outside the lock, a form built twice at once is cached once
+    compiled = CompiledSurvey(build_survey(), key)
+    with _lock:
+        _surveys[key] = compiled
+        _surveys.move_to_end(key)
+        while len(_surveys) > SURVEY_CACHE_SIZE:
+            _surveys.popitem(last=False)
+            _stats['evictions'] += 1
+
+    return compiled
+
+
+def invalidate_survey(pk):
+    """Removes the compiled surveys of the form from the cache."""
+    with _lock:
+        for key in [key for key in _surveys if key[0] == pk]:
+            del _surveys[key]
+
+
+def clear_survey_cache():
+    """Empties the cache and resets its counters."""
+    with _lock:
+        _surveys.clear()
+        _stats.update(hits=0, misses=0, evictions=0)
+
+
+def get_survey_cache_stats():
+    """Returns the hits, misses, evictions and size of the cache."""
+    with _lock:
+        return dict(_stats, size=len(_surveys), max_size=SURVEY_CACHE_SIZE)
@@ -1,61 +1,282 @@
+import threading
+import time
+from collections import OrderedDict
+from xml.dom import Node
+
 import requests
-import xmltodict
-import json
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+from onadata.apps.logger.xform_instance_parser import SubmissionXML
+from onadata.celery import app
+from onadata.libs.utils.cache_tools import SPECIES_NAME_CACHE, safe_key
+
+GBIF_OCCURRENCE_SEARCH_URL = getattr(
+    settings, 'GBIF_OCCURRENCE_SEARCH_URL',
+    'https://api.gbif.org/v1/occurrence/search')
+# (connect, read) timeouts in seconds
+GBIF_REQUEST_TIMEOUT = getattr(settings, 'GBIF_REQUEST_TIMEOUT', (3.05, 10))
+GBIF_POOL_SIZE = getattr(settings, 'GBIF_POOL_SIZE', 10)
+SPECIES_NAME_CACHE_SIZE = getattr(settings, 'SPECIES_NAME_CACHE_SIZE', 1024)
+SPECIES_NAME_CACHE_TTL = getattr(settings, 'SPECIES_NAME_CACHE_TTL', 86400)
+DEFAULT_SPECIES_NAME_VALIDATOR = \
+    'onadata.libs.utils.validate_data.GBIFSpeciesNameValidator'
+INVALID_SPECIES_NAME_TAG = getattr(
+    settings, 'INVALID_SPECIES_NAME_TAG', 'invalid-species-name')
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_gbif_session():
+    '''Returns a requests session with pooled connections to GBIF'''
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=GBIF_POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+
+    return _session
 
 
 def check_gbif_data(name):
     '''check whether a name exists in gbif database'''
 
-    url = "https://api.gbif.org/v1/occurrence/search"
     querystring = {"scientificName": "{}".format(name)}
-    payload = ""
-    response = requests.request("GET", url, data=payload, params=querystring)
+    response = get_gbif_session().get(
+        GBIF_OCCURRENCE_SEARCH_URL, params=querystring,
+        timeout=GBIF_REQUEST_TIMEOUT)
+    response.raise_for_status()
 
     occurences = response.json()
 
-    occurence_list = set([name['species'] for name in occurences['results']])
+    occurence_list = set([name.get('species')
+                          for name in occurences['results']])
 
     return occurence_list
 
 
-def validate_data(xml):
-    '''Function that validates data'''
-    xml_str = json.dumps(xmltodict.parse(xml))
-    xml_json = json.loads(xml_str)
-    submission_json = xml_json['data']
-    valid = []
-
-    try:
-        if type(submission_json['repeat_group']) == list:
-
-            try:
-                insect_name_other = [interaction['capture_insect_details']['insect_scientific_name_other']
-                                     for interaction in submission_json['repeat_group'] if 'insect_scientific_name_other'
-                                     in interaction['capture_insect_details']]
-
-                if insect_name_other:
-                    for name in set(insect_name_other):
-
-                        if name in check_gbif_data(name):
-                            valid.append('T')
-                        else:
-                            valid.append('F')
-                else:
-                    pass
-            except:
-                pass
-        else:
-            try:
-                name = submission_json['repeat_group']['capture_insect_details']['insect_scientific_name_other']
-
-                if name in check_gbif_data(name):
-                    valid.append('T')
-                else:
-                    valid.append('F')
-            except:
-                pass
-
-        return False if 'F' in valid else True
-
-    except:
-        pass
+class SpeciesNameCache(object):
+    '''A bounded LRU cache of species name validation results.
+
+    Entries expire after `ttl` seconds. Lookups that miss the in process
+    cache fall back to the Django cache which is shared across processes.
+    '''
+
+    def __init__(self, maxsize=SPECIES_NAME_CACHE_SIZE,
+                 ttl=SPECIES_NAME_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cache_key(self, name):
+        return '{}{}'.format(SPECIES_NAME_CACHE, safe_key(name))
+
+    def get(self, name):
+        '''Returns True or False for a known name, None otherwise'''
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._data.move_to_end(name)
+                    return value
+                del self._data[name]
+
+        value = cache.get(self._cache_key(name))
+        if value is not None:
+            self._set_local(name, value)
+
+        return value
+
+    def set(self, name, value):
+        self._set_local(name, value)
+        cache.set(self._cache_key(name), value, self.ttl)
+
+    def _set_local(self, name, value):
+        with self._lock:
+            self._data[name] = (value, time.time() + self.ttl)
+            self._data.move_to_end(name)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class BaseSpeciesNameValidator(object):
+    '''Base class for species name validators
+
+    Sub classes implement `check_name` which looks up a single name. Results
+    of the lookups are cached so that a name is only looked up once per
+    cache lifetime.
+    '''
+    name_cache = SpeciesNameCache()
+
+    def check_name(self, name):
+        '''Returns True if the name is a known species name'''
+        raise NotImplementedError()
+
+    def is_valid_cached(self, names):
+        '''Validates names against the cache only
+
+        Returns True or False when all the names are in the cache, None when
+        some of the names have not been validated yet.
+        '''
+        results = [self.name_cache.get(name) for name in names]
+        if False in results:
+            return False
+        if None in results:
+            return None
+
+        return True
+
+    def is_valid(self, names):
+        '''Returns False if any of the names is not a known species name
+
+        Names that cannot be looked up, for example because the remote
+        service is unavailable, are treated as valid and are not cached.
+        '''
+        valid = True
+        for name in names:
+            value = self.name_cache.get(name)
+            if value is None:
+                try:
+                    value = self.check_name(name)
+                except (requests.RequestException, KeyError, ValueError):
+                    continue
+                self.name_cache.set(name, value)
+            valid = valid and value
+
+        return valid
+
+
+class GBIFSpeciesNameValidator(BaseSpeciesNameValidator):
+    '''Validates species names against the GBIF occurrence search API'''
+
+    def check_name(self, name):
+        return name in check_gbif_data(name)
+
+
+_validator = None
+
+
+def get_species_name_validator():
+    '''Returns the validator configured in settings.SPECIES_NAME_VALIDATOR'''
+    global _validator
+
+    path = getattr(settings, 'SPECIES_NAME_VALIDATOR',
+                   DEFAULT_SPECIES_NAME_VALIDATOR)
+    if _validator is None or _validator[0] != path:
+        _validator = (path, import_string(path)())
+
+    return _validator[1]
+
+
+def is_species_name_validation_deferred():
+    return getattr(settings, 'SPECIES_NAME_VALIDATION_DEFERRED', False)
+
+
+def _child_elements(node, name):
+    return [n for n in node.childNodes
+            if n.nodeType == Node.ELEMENT_NODE and n.nodeName == name]
+
+
+def _node_text(node):
+    return u''.join(
+        n.nodeValue for n in node.childNodes
+        if n.nodeType in (Node.TEXT_NODE, Node.CDATA_SECTION_NODE)).strip()
+
+
+def get_insect_names(submission):
+    '''Returns the other insect scientific names in a submission or None when
+    the submission has no repeat_group'''
+    survey_node = submission.survey_node
+    if survey_node.nodeName != 'data':
+        return None
+
+    repeat_groups = _child_elements(survey_node, 'repeat_group')
+    if not repeat_groups:
+        return None
+
+    names = set()
+    for repeat_group in repeat_groups:
+        for details in _child_elements(
+                repeat_group, 'capture_insect_details')[:1]:
+            for name_node in _child_elements(
+                    details, 'insect_scientific_name_other')[:1]:
+                name = _node_text(name_node)
+                if name:
+                    names.add(name)
+
+    return names
+
+
+def validate_data(xml, deferred=None):
+    '''Function that validates data
+
+    Accepts the submission XML string or an already parsed SubmissionXML so
+    that the submission is not parsed again.
+
+    In deferred mode only cached results are used and names that have not
+    been validated yet are accepted, see `defer_species_name_validation`.
+    '''
+    if not isinstance(xml, SubmissionXML):
+        xml = SubmissionXML(xml)
+
+    names = get_insect_names(xml)
+    if names is None:
+        return None
+
+    if deferred is None:
+        deferred = is_species_name_validation_deferred()
+
+    validator = get_species_name_validator()
+    if deferred:
+        return validator.is_valid_cached(names) is not False
+
+    return validator.is_valid(names)
+
+
+def defer_species_name_validation(instance, submission):
+    '''Schedules validation of the species names of a new instance whose
+    names are not in the cache yet'''
+    if not is_species_name_validation_deferred():
+        return
+
+    names = get_insect_names(submission)
+    if names and \
+            get_species_name_validator().is_valid_cached(names) is None:
+        instance_id = instance.pk
+        transaction.on_commit(
+            lambda: validate_species_names_async.delay(instance_id))
+
+
+@app.task(ignore_result=True)
+def validate_species_names_async(instance_id):
+    '''Validates the species names of a submission and tags it with
+    settings.INVALID_SPECIES_NAME_TAG if any of the names is not known'''
+    from onadata.apps.logger.models.instance import Instance
+
+    instance = Instance.objects.filter(pk=instance_id).first()
+    if instance is None:
+        return
+
+    names = get_insect_names(SubmissionXML(instance.xml))
+    if names and not get_species_name_validator().is_valid(names):
+        instance.tags.add(INVALID_SPECIES_NAME_TAG)
+        # refresh the tags in the instance json
+        instance.mark_changed('tags')
+        instance.save()
@@ -2,10 +2,17 @@
 """Util functions for data views."""
 import json
 import os
+import queue
 import requests
 import sys
+import threading
+import time
 import zipfile
 from builtins import open
+from builtins import str as text
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from future.utils import iteritems
 from json.decoder import JSONDecodeError
 from tempfile import NamedTemporaryFile
@@ -25,6 +32,13 @@ from onadata.libs.utils.common_tags import EXPORT_MIMES
 from onadata.libs.utils.common_tools import report_exception
 
 SLASH = u"/"
+# size of the blocks attachments are copied into ZIP files in
+ZIP_EXPORT_CHUNK_SIZE = getattr(settings, 'ZIP_EXPORT_CHUNK_SIZE', 64 * 1024)
+# number of attachments fetched from the storage at the same time
+ZIP_EXPORT_FETCH_THREADS = getattr(settings, 'ZIP_EXPORT_FETCH_THREADS', 4)
+# number of blocks of an attachment fetched ahead of the ZIP writer
+ZIP_EXPORT_PREFETCH_CHUNKS = getattr(settings, 'ZIP_EXPORT_PREFETCH_CHUNKS',
+                                     16)
 
 
 def image_urls_for_form(xform):
@@ -52,10 +66,9 @@ def image_urls(instance):
     """
     default_storage = get_storage_class()()
     urls = []
-    suffix = settings.THUMB_CONF['medium']['suffix']
     for attachment in instance.attachments.all():
-        path = get_path(attachment.media_file.name, suffix)
-        if default_storage.exists(path):
+        path = attachment.thumbnails.get('medium')
+        if path:
             url = default_storage.url(path)
         else:
             url = attachment.media_file.url
@@ -245,30 +258,154 @@ def generate_enketo_form_defaults(xform, **kwargs):
     return defaults
 
 
+class _ZipStream(object):
+    """A write only file that keeps what is written until it is popped."""
+
+    def __init__(self):
+        self._data = []
+
+    def write(self, data):
+        self._data.append(bytes(data))
+
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._data)
+        self._data = []
+
+        return data
+
+
+def _put(chunks, item, cancelled):
+    """Puts the item in the queue unless the ZIP file was abandoned."""
+    while not cancelled.is_set():
+        try:
+            chunks.put(item, timeout=1)
+        except queue.Full:
+            continue
+        return True
+
+    return False
+
+
+def _fetch_attachment(filename, file_size, chunks, cancelled):
+    """
+    Puts the blocks of an attachment file in the chunks queue followed by
+    None. An error reading the file is put in the queue instead of the
+    rest of the blocks.
+    """
+    default_storage = get_storage_class()()
+    limit = settings.ZIP_REPORT_ATTACHMENT_LIMIT
+
+    try:
+        if default_storage.exists(filename):
+            with default_storage.open(filename) as f:
+                if (file_size or f.size) > limit:
+                    raise IOError(
+                        "File is greater than {} bytes".format(limit))
+                for chunk in iter(partial(f.read, ZIP_EXPORT_CHUNK_SIZE),
+                                  b''):
+                    if not _put(chunks, chunk, cancelled):
+                        return
+    except Exception as e:  # pylint: disable=broad-except
+        _put(chunks, e, cancelled)
+    finally:
+        _put(chunks, None, cancelled)
+
+
+def _write_attachments(zip_file, attachments):
+    """
+    Copies the attachment files into the ZIP file block by block, yielding
+    after each block. The files are fetched from the storage by a bounded
+    pool of threads ahead of the writer.
+
+    A file that cannot be read is left out of the ZIP file, the error is
+    raised if part of the file was already written.
+    """
+    attachments = iter(attachments)
+    pending = deque()
+    cancelled = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=ZIP_EXPORT_FETCH_THREADS)
+
+    def fetch_next():
+        attachment = next(attachments, None)
+        if attachment is not None:
+            chunks = queue.Queue(maxsize=ZIP_EXPORT_PREFETCH_CHUNKS)
+            executor.submit(_fetch_attachment, attachment.media_file.name,
+                            attachment.file_size, chunks, cancelled)
+            pending.append((attachment, chunks))
+
+    try:
+        for _i in range(ZIP_EXPORT_FETCH_THREADS):
+            fetch_next()
+
+        while pending:
+            attachment, chunks = pending.popleft()
+            fetch_next()
+            entry = None
+            try:
+                for chunk in iter(chunks.get, None):
+                    if isinstance(chunk, Exception):
+                        report_exception("Create attachment zip exception",
+                                         text(chunk))
+                        if entry is not None:
+                            # the start of the file is already written,
+                            # the zip file is abandoned rather than
+                            # completed with a truncated file
+                            raise chunk
+                        continue
+                    if entry is None:
+                        zip_info = zipfile.ZipInfo(
+                            attachment.media_file.name,
+                            time.localtime(time.time())[:6])
+                        zip_info.compress_type = zipfile.ZIP_DEFLATED
+                        zip_info.external_attr = 0o600 << 16
+                        entry = zip_file.open(
+                            zip_info, 'w', force_zip64=(
+                                not attachment.file_size or
+                                attachment.file_size >= zipfile.ZIP64_LIMIT))
+                    entry.write(chunk)
+                    yield
+            finally:
+                if entry is not None:
+                    entry.close()
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False)
+
+
+def write_attachments_zipfile(attachments, file_obj):
+    """Writes a zip file with submission attachments to file_obj."""
+    with zipfile.ZipFile(file_obj, 'w', zipfile.ZIP_DEFLATED,
+                         allowZip64=True) as z:
+        for _i in _write_attachments(z, attachments):
+            pass
+
+
+def iter_attachments_zipfile(attachments):
+    """
+    Yields the blocks of a zip file with submission attachments while it is
+    written, for a streaming response.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED,
+                         allowZip64=True) as z:
+        for _i in _write_attachments(z, attachments):
+            data = stream.pop()
+            if data:
+                yield data
+
+    yield stream.pop()
+
+
 def create_attachments_zipfile(attachments):
     """Return a zip file with submission attachments."""
     # create zip_file
     tmp = NamedTemporaryFile()
-    with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as z:
-        for attachment in attachments:
-            default_storage = get_storage_class()()
-            filename = attachment.media_file.name
-
-            if default_storage.exists(filename):
-                try:
-                    with default_storage.open(filename) as f:
-                        if f.size > settings.ZIP_REPORT_ATTACHMENT_LIMIT:
-                            report_exception(
-                                "Create attachment zip exception",
-                                "File is greater than {} bytes".format(
-                                    settings.ZIP_REPORT_ATTACHMENT_LIMIT)
-                            )
-                            break
-                        else:
-                            z.writestr(attachment.media_file.name, f.read())
-                except IOError as e:
-                    report_exception("Create attachment zip exception", e)
-                    break
+    write_attachments_zipfile(attachments, tmp)
 
     return tmp
 
@@ -434,7 +434,9 @@ CELERY_RESULT_BACKEND = 'django-db'
 CELERY_TASK_ALWAYS_EAGER = False
 CELERY_TASK_IGNORE_RESULT = False
 CELERY_TASK_TRACK_STARTED = True
-CELERY_IMPORTS = ('onadata.libs.utils.csv_import',)
+CELERY_IMPORTS = ('onadata.libs.utils.csv_import',
+                  'onadata.libs.utils.counter_tools',
+                  'onadata.libs.utils.validate_data')
 
 
 CSV_FILESIZE_IMPORT_ASYNC_THRESHOLD = 100000  # Bytes